@@ -0,0 +1,63 @@
+"""Add listing sort key indexes
+
+Revision ID: a3b4c5d6e7f8
+Revises: f2a3b4c5d6e7
+Create Date: 2026-10-17 00:00:00.000000
+
+published_at and views are nullable, and keyset pages ordered by them used
+``OR col IS NULL`` plus NULLS LAST, which no index could serve (and SQLite
+got no index at all). Listings now sort by ``coalesce(published_at,
+created_at)`` and ``coalesce(views, 0)``; these expression indexes match
+that ORDER BY on every database and replace the PostgreSQL-only
+DESC NULLS LAST indexes.
+
+SQLite does not reflect expression indexes, so those two are guarded with
+IF [NOT] EXISTS rather than _index_exists.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a3b4c5d6e7f8"
+down_revision: Union[str, Sequence[str], None] = "f2a3b4c5d6e7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SORT_KEYS = (
+    ("ix_photos_status_published_key_id", "coalesce(published_at, created_at)"),
+    ("ix_photos_status_views_key_id", "coalesce(views, 0)"),
+)
+
+
+def _index_exists(table_name: str, index_name: str) -> bool:
+    conn = op.get_bind()
+    insp = inspect(conn)
+    return index_name in [index["name"] for index in insp.get_indexes(table_name)]
+
+
+def upgrade() -> None:
+    for index_name, expression in SORT_KEYS:
+        op.create_index(
+            index_name, "photos", [sa.text("status"), sa.text(expression), sa.text("id")], if_not_exists=True
+        )
+    for column in ("published_at", "views"):
+        if _index_exists("photos", f"ix_photos_status_{column}_id"):
+            op.drop_index(f"ix_photos_status_{column}_id", table_name="photos")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        for column in ("published_at", "views"):
+            name = f"ix_photos_status_{column}_id"
+            if not _index_exists("photos", name):
+                op.create_index(
+                    name,
+                    "photos",
+                    ["status", sa.text(f"{column} DESC NULLS LAST"), sa.text("id DESC")],
+                )
+    for index_name, _ in reversed(SORT_KEYS):
+        op.drop_index(index_name, table_name="photos", if_exists=True)
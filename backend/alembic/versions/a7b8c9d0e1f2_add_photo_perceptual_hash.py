@@ -0,0 +1,42 @@
+"""Add photo perceptual hash
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-10-17 00:00:00.000000
+
+Adds photos.perceptual_hash (64-bit dHash as hex) for near-duplicate
+detection. Lookups go through the in-process Hamming index, so the column
+is not indexed. Existing rows are filled by scripts/backfill_perceptual_hash.py.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a7b8c9d0e1f2"
+down_revision: Union[str, Sequence[str], None] = "f6a7b8c9d0e1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _column_exists(table_name: str, column_name: str) -> bool:
+    conn = op.get_bind()
+    insp = inspect(conn)
+    columns = [c["name"] for c in insp.get_columns(table_name)]
+    return column_name in columns
+
+
+def upgrade() -> None:
+    if not _column_exists("photos", "perceptual_hash"):
+        op.add_column(
+            "photos",
+            sa.Column("perceptual_hash", sa.String(length=16), nullable=True, comment="64 位 dHash（十六进制）"),
+        )
+
+
+def downgrade() -> None:
+    if _column_exists("photos", "perceptual_hash"):
+        op.drop_column("photos", "perceptual_hash")
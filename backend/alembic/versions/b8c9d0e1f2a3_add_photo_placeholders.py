@@ -0,0 +1,49 @@
+"""Add photo placeholders
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-17 00:00:00.000000
+
+Adds photos.blurhash and photos.dominant_color, computed while renditions
+are rendered so list responses can carry a placeholder for every thumbnail.
+Existing rows are filled by scripts/backfill_placeholders.py.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b8c9d0e1f2a3"
+down_revision: Union[str, Sequence[str], None] = "a7b8c9d0e1f2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _column_exists(table_name: str, column_name: str) -> bool:
+    conn = op.get_bind()
+    insp = inspect(conn)
+    columns = [c["name"] for c in insp.get_columns(table_name)]
+    return column_name in columns
+
+
+def upgrade() -> None:
+    if not _column_exists("photos", "blurhash"):
+        op.add_column(
+            "photos",
+            sa.Column("blurhash", sa.String(length=32), nullable=True, comment="BlurHash 占位图"),
+        )
+    if not _column_exists("photos", "dominant_color"):
+        op.add_column(
+            "photos",
+            sa.Column("dominant_color", sa.String(length=7), nullable=True, comment="主色调 #rrggbb"),
+        )
+
+
+def downgrade() -> None:
+    if _column_exists("photos", "dominant_color"):
+        op.drop_column("photos", "dominant_color")
+    if _column_exists("photos", "blurhash"):
+        op.drop_column("photos", "blurhash")
@@ -0,0 +1,64 @@
+"""Add listing keyset indexes
+
+Revision ID: c9d0e1f2a3b4
+Revises: b8c9d0e1f2a3
+Create Date: 2026-10-17 00:00:00.000000
+
+Composite indexes matching the ORDER BY of cursor-paginated listings
+(sort key, then id), so a page seeks straight to its cursor instead of
+scanning past earlier rows.
+
+published_at and views can be NULL and are ordered NULLS LAST in both
+directions. The usual (descending) order only matches an index declared
+DESC NULLS LAST, which SQLite cannot express, so those two are created on
+PostgreSQL only.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c9d0e1f2a3b4"
+down_revision: Union[str, Sequence[str], None] = "b8c9d0e1f2a3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _index_exists(table_name: str, index_name: str) -> bool:
+    conn = op.get_bind()
+    insp = inspect(conn)
+    return index_name in [index["name"] for index in insp.get_indexes(table_name)]
+
+
+def upgrade() -> None:
+    if not _index_exists("photos", "ix_photos_status_created_id"):
+        op.create_index("ix_photos_status_created_id", "photos", ["status", "created_at", "id"])
+    if not _index_exists("photos", "ix_photos_uploader_created_id"):
+        op.create_index("ix_photos_uploader_created_id", "photos", ["uploader_id", "created_at", "id"])
+    if not _index_exists("favorites", "ix_favorites_user_created_id"):
+        op.create_index("ix_favorites_user_created_id", "favorites", ["user_id", "created_at", "id"])
+
+    if op.get_bind().dialect.name == "postgresql":
+        for column in ("published_at", "views"):
+            name = f"ix_photos_status_{column}_id"
+            if not _index_exists("photos", name):
+                op.create_index(
+                    name,
+                    "photos",
+                    ["status", sa.text(f"{column} DESC NULLS LAST"), sa.text("id DESC")],
+                )
+
+
+def downgrade() -> None:
+    for table_name, index_name in (
+        ("photos", "ix_photos_status_views_id"),
+        ("photos", "ix_photos_status_published_at_id"),
+        ("favorites", "ix_favorites_user_created_id"),
+        ("photos", "ix_photos_uploader_created_id"),
+        ("photos", "ix_photos_status_created_id"),
+    ):
+        if _index_exists(table_name, index_name):
+            op.drop_index(index_name, table_name=table_name)
@@ -0,0 +1,122 @@
+"""Add photo search documents
+
+Revision ID: d0e1f2a3b4c5
+Revises: c9d0e1f2a3b4
+Create Date: 2026-10-17 00:00:00.000000
+
+One denormalized search document per photo (filename, description, tag
+names, taxonomy node names and aliases) so text search is served by an
+index instead of ILIKE over five tables:
+
+- SQLite: external-content FTS5 table with the trigram tokenizer, kept in
+  sync with photo_search_documents by triggers.
+- PostgreSQL: pg_trgm GIN indexes (substring ILIKE, works for Chinese).
+
+Existing photos are backfilled here; the application keeps documents
+current afterwards (app/models/search_document.py).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d0e1f2a3b4c5"
+down_revision: Union[str, Sequence[str], None] = "c9d0e1f2a3b4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS photo_search_fts USING fts5("
+    "document, tag_names, content='photo_search_documents', content_rowid='rowid', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS photo_search_documents_ai AFTER INSERT ON photo_search_documents BEGIN "
+    "INSERT INTO photo_search_fts(rowid, document, tag_names) VALUES (new.rowid, new.document, new.tag_names); END",
+    "CREATE TRIGGER IF NOT EXISTS photo_search_documents_ad AFTER DELETE ON photo_search_documents BEGIN "
+    "INSERT INTO photo_search_fts(photo_search_fts, rowid, document, tag_names) "
+    "VALUES ('delete', old.rowid, old.document, old.tag_names); END",
+    "CREATE TRIGGER IF NOT EXISTS photo_search_documents_au AFTER UPDATE ON photo_search_documents BEGIN "
+    "INSERT INTO photo_search_fts(photo_search_fts, rowid, document, tag_names) "
+    "VALUES ('delete', old.rowid, old.document, old.tag_names); "
+    "INSERT INTO photo_search_fts(rowid, document, tag_names) VALUES (new.rowid, new.document, new.tag_names); END",
+]
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_photo_search_documents_document_trgm "
+    "ON photo_search_documents USING gin (document gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_photo_search_documents_tag_names_trgm "
+    "ON photo_search_documents USING gin (tag_names gin_trgm_ops)",
+]
+
+
+def _table_exists(table_name: str) -> bool:
+    conn = op.get_bind()
+    insp = inspect(conn)
+    return table_name in insp.get_table_names()
+
+
+def _lines(*values) -> str:
+    return "\n".join(value for value in values if value)
+
+
+def _backfill() -> None:
+    conn = op.get_bind()
+    tags: dict[str, list[str]] = {}
+    for photo_id, name in conn.execute(sa.text(
+        "SELECT photo_tags.photo_id, tags.name FROM photo_tags JOIN tags ON tags.id = photo_tags.tag_id"
+    )):
+        tags.setdefault(photo_id, []).append(name)
+    terms: dict[str, list[str]] = {}
+    for photo_id, name in conn.execute(sa.text(
+        "SELECT pc.photo_id, n.name FROM photo_classifications pc JOIN taxonomy_nodes n ON n.id = pc.node_id"
+    )):
+        terms.setdefault(photo_id, []).append(name)
+    for photo_id, alias in conn.execute(sa.text(
+        "SELECT pc.photo_id, a.alias FROM photo_classifications pc JOIN taxonomy_aliases a ON a.node_id = pc.node_id"
+    )):
+        terms.setdefault(photo_id, []).append(alias)
+
+    insert = sa.text(
+        "INSERT INTO photo_search_documents (photo_id, document, tag_names, updated_at) "
+        "VALUES (:photo_id, :document, :tag_names, CURRENT_TIMESTAMP)"
+    )
+    rows = []
+    for photo_id, filename, description in conn.execute(sa.text("SELECT id, filename, description FROM photos")):
+        rows.append({
+            "photo_id": photo_id,
+            "document": _lines(filename, description, *tags.get(photo_id, []), *terms.get(photo_id, [])),
+            "tag_names": _lines(*tags.get(photo_id, [])),
+        })
+        if len(rows) >= BATCH_SIZE:
+            conn.execute(insert, rows)
+            rows = []
+    if rows:
+        conn.execute(insert, rows)
+
+
+def upgrade() -> None:
+    if _table_exists("photo_search_documents"):
+        return
+    op.create_table(
+        "photo_search_documents",
+        sa.Column("photo_id", sa.String(length=36), sa.ForeignKey("photos.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("document", sa.Text(), nullable=False, server_default=""),
+        sa.Column("tag_names", sa.Text(), nullable=False, server_default=""),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.current_timestamp()),
+    )
+    dialect = op.get_bind().dialect.name
+    statements = SQLITE_DDL if dialect == "sqlite" else POSTGRES_DDL if dialect == "postgresql" else []
+    for statement in statements:
+        op.execute(statement)
+    _backfill()
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP TABLE IF EXISTS photo_search_fts")
+    if _table_exists("photo_search_documents"):
+        op.drop_table("photo_search_documents")
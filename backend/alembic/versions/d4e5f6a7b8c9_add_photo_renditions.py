@@ -0,0 +1,46 @@
+"""Add photo renditions column
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-10-17 00:00:00.000000
+
+Adds photos.renditions, a JSON map of rendition width -> storage key
+produced at upload time (e.g. {"160": "thumbnails/<id>_160.jpg"}).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d4e5f6a7b8c9"
+down_revision: Union[str, Sequence[str], None] = "c3d4e5f6a7b8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _column_exists(table_name: str, column_name: str) -> bool:
+    conn = op.get_bind()
+    insp = inspect(conn)
+    columns = [c["name"] for c in insp.get_columns(table_name)]
+    return column_name in columns
+
+
+def upgrade() -> None:
+    if not _column_exists("photos", "renditions"):
+        op.add_column(
+            "photos",
+            sa.Column(
+                "renditions",
+                sa.JSON(),
+                nullable=True,
+                comment="按宽度存储的多尺寸缩略图 {width: key}",
+            ),
+        )
+
+
+def downgrade() -> None:
+    if _column_exists("photos", "renditions"):
+        op.drop_column("photos", "renditions")
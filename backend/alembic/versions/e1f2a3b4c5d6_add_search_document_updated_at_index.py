@@ -0,0 +1,37 @@
+"""Add search document updated_at index
+
+Revision ID: e1f2a3b4c5d6
+Revises: d0e1f2a3b4c5
+Create Date: 2026-10-17 00:00:00.000000
+
+The in-process search index (app/services/search_index.py) periodically
+pulls documents changed since its last sync by updated_at, so it picks up
+writes made by other workers or scripts without a full rebuild.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e1f2a3b4c5d6"
+down_revision: Union[str, Sequence[str], None] = "d0e1f2a3b4c5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _index_exists(table_name: str, index_name: str) -> bool:
+    conn = op.get_bind()
+    insp = inspect(conn)
+    return index_name in [index["name"] for index in insp.get_indexes(table_name)]
+
+
+def upgrade() -> None:
+    if not _index_exists("photo_search_documents", "ix_photo_search_documents_updated_at"):
+        op.create_index("ix_photo_search_documents_updated_at", "photo_search_documents", ["updated_at"])
+
+
+def downgrade() -> None:
+    if _index_exists("photo_search_documents", "ix_photo_search_documents_updated_at"):
+        op.drop_index("ix_photo_search_documents_updated_at", table_name="photo_search_documents")
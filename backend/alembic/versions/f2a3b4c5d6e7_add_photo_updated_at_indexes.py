@@ -0,0 +1,45 @@
+"""Add photo and classification updated_at indexes
+
+Revision ID: f2a3b4c5d6e7
+Revises: e1f2a3b4c5d6
+Create Date: 2026-10-17 00:00:00.000000
+
+The in-process facet index (app/services/facet_index.py) checks the newest
+updated_at of photos and photo_classifications before every query and
+re-reads rows changed since, so writes from other workers are picked up
+without a full rebuild.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f2a3b4c5d6e7"
+down_revision: Union[str, Sequence[str], None] = "e1f2a3b4c5d6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ("photos", "ix_photos_updated_at"),
+    ("photo_classifications", "ix_photo_classifications_updated_at"),
+)
+
+
+def _index_exists(table_name: str, index_name: str) -> bool:
+    conn = op.get_bind()
+    insp = inspect(conn)
+    return index_name in [index["name"] for index in insp.get_indexes(table_name)]
+
+
+def upgrade() -> None:
+    for table_name, index_name in INDEXES:
+        if not _index_exists(table_name, index_name):
+            op.create_index(index_name, table_name, ["updated_at"])
+
+
+def downgrade() -> None:
+    for table_name, index_name in reversed(INDEXES):
+        if _index_exists(table_name, index_name):
+            op.drop_index(index_name, table_name=table_name)
@@ -0,0 +1,44 @@
+"""Add photo content hash
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-10-17 00:00:00.000000
+
+Adds photos.content_hash (SHA-256 of the original, computed while the
+upload streams in) with an index for duplicate lookups at ingest time.
+Existing rows are filled by scripts/backfill_content_hash.py.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f6a7b8c9d0e1"
+down_revision: Union[str, Sequence[str], None] = "e5f6a7b8c9d0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _column_exists(table_name: str, column_name: str) -> bool:
+    conn = op.get_bind()
+    insp = inspect(conn)
+    columns = [c["name"] for c in insp.get_columns(table_name)]
+    return column_name in columns
+
+
+def upgrade() -> None:
+    if not _column_exists("photos", "content_hash"):
+        op.add_column(
+            "photos",
+            sa.Column("content_hash", sa.String(length=64), nullable=True, comment="原图 SHA-256"),
+        )
+        op.create_index(op.f("ix_photos_content_hash"), "photos", ["content_hash"], unique=False)
+
+
+def downgrade() -> None:
+    if _column_exists("photos", "content_hash"):
+        op.drop_index(op.f("ix_photos_content_hash"), table_name="photos")
+        op.drop_column("photos", "content_hash")
@@ -1,12 +1,15 @@
 """
 照片收藏 API 端点
 """
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.deps import get_db, get_current_active_user
 from app.crud import favorite as fav_crud
 from app.crud import photo as photo_crud
+from app.crud.pagination import InvalidCursor
 from app.models.user import User
 
 router = APIRouter()
@@ -54,11 +57,15 @@ async def get_favorite_status(
 async def get_my_favorites(
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
 ):
-    """获取我的收藏列表"""
-    photo_ids, total = await fav_crud.get_user_favorites(
-        db, current_user.id, skip=skip, limit=limit,
-    )
-    return {"photo_ids": photo_ids, "total": total}
+    """获取我的收藏列表（支持 skip 分页，或用上一页返回的 next_cursor 续页）"""
+    try:
+        photo_ids, total, next_cursor = await fav_crud.get_user_favorites(
+            db, current_user.id, skip=skip, limit=limit, cursor=cursor,
+        )
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {"photo_ids": photo_ids, "total": total, "next_cursor": next_cursor}
@@ -1,6 +1,7 @@
 """
 批量导入 API 端点
 """
+import asyncio
 import os
 import shutil
 from typing import Optional
@@ -13,8 +14,9 @@ from app.core.deps import get_db, get_current_admin_user
 from app.models.user import User
 from app.services.import_service import scan_and_parse_json_files, import_service, sanitize_exif_data
 from app.services.audit import log_audit
-from app.services.storage import ensure_upload_dirs
-from app.services.image_processing import process_uploaded_image
+from app.services.storage import ensure_upload_dirs, sha256_file
+from app.services.dedup import DUPLICATE_REJECT, duplicate_policy, find_duplicate, linked_media
+from app.services.image_workers import get_image_workers
 from app.crud import photo as photo_crud
 from app.crud import tag as tag_crud
 
@@ -118,20 +120,41 @@ async def import_photos(
                 error_count += 1
                 continue
             
-            # 复制图片到 uploads 目录
             file_extension = os.path.splitext(filename)[1] or '.jpg'
-            original_filename = f"{photo_uuid}{file_extension}"
-            original_relative = f"originals/{original_filename}"
-            original_dest = os.path.join(originals_dir, original_filename)
-            
-            shutil.copy2(image_path, original_dest)
-            logger.info(f"复制图片: {image_path} -> {original_dest}")
-            
-            # 处理图片 (生成缩略图, 提取 EXIF)
-            processing_result = process_uploaded_image(original_dest, photo_uuid)
-            
-            # 获取文件大小
-            file_size = os.path.getsize(original_dest)
+
+            # 内容去重: 同一文件已入库时按 UPLOAD_DUPLICATE_POLICY 跳过或复用已有媒体
+            content_hash = await asyncio.to_thread(sha256_file, image_path)
+            duplicate = await find_duplicate(db, content_hash)
+            if duplicate is not None and duplicate_policy() == DUPLICATE_REJECT:
+                logger.info(f"内容重复,跳过: {filename} (与 {duplicate.id} 相同)")
+                skipped_count += 1
+                continue
+
+            if duplicate is not None:
+                media, processing_result = linked_media(duplicate)
+                original_relative = media.original_path
+                thumb_path = media.thumb_path
+                renditions = media.renditions
+                file_size = media.file_size
+                logger.info(f"内容重复,复用已有媒体: {filename} -> {duplicate.id}")
+            else:
+                # 复制图片到 uploads 目录
+                original_filename = f"{photo_uuid}{file_extension}"
+                original_relative = f"originals/{original_filename}"
+                original_dest = os.path.join(originals_dir, original_filename)
+
+                shutil.copy2(image_path, original_dest)
+                logger.info(f"复制图片: {image_path} -> {original_dest}")
+
+                # 处理图片 (生成缩略图, 提取 EXIF)
+                processing_result = await get_image_workers().process_image(
+                    original_dest, photo_uuid, thumbnails_dir, wait=True
+                )
+                thumb_path = processing_result.get('thumb_path')
+                renditions = processing_result.get('renditions', {})
+
+                # 获取文件大小
+                file_size = os.path.getsize(original_dest)
             
             # 提取标签信息
             season, category, keywords = import_service.extract_tags_from_data(photo_data)
@@ -148,11 +171,18 @@ async def import_photos(
                 'id': photo_uuid,
                 'filename': filename,
                 'original_path': original_relative,
-                'thumb_path': processing_result.get('thumb_path'),
+                'thumb_path': thumb_path,
+                'renditions': {
+                    str(width): path for width, path in renditions.items()
+                } or None,
                 'width': photo_data.get('width') or processing_result.get('width'),
                 'height': photo_data.get('height') or processing_result.get('height'),
                 'file_size': file_size,
                 'mime_type': f'image/{file_extension[1:]}',
+                'content_hash': content_hash,
+                'perceptual_hash': processing_result.get('perceptual_hash'),
+                'blurhash': processing_result.get('blurhash'),
+                'dominant_color': processing_result.get('dominant_color'),
                 'exif_data': exif_data,
                 'captured_at': processing_result.get('captured_at'),
                 'description': photo_data.get('description'),
@@ -1,11 +1,18 @@
 """
 Photo API endpoints.
 """
+import asyncio
+import itertools
+import mimetypes
+import shutil
+import tempfile
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 from typing import List, Optional
 
-from fastapi import APIRouter, BackgroundTasks, Depends, File, Form, HTTPException, Request, UploadFile, status
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Form, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from sqlalchemy import and_, select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -20,28 +27,87 @@ from app.core.deps import (
     get_optional_current_user_for_media,
     get_portrait_visibility,
 )
+from app.crud import favorite as favorite_crud
 from app.crud import permission as permission_crud
+from app.crud.pagination import InvalidCursor
 from app.crud import photo as photo_crud
 from app.crud import tag as tag_crud
+from app.crud import user as user_crud
 from app.models.ai_analysis import AIAnalysisTask
 from app.models.photo import Photo
 from app.models.system_config import PortraitVisibility
+from app.models.upload_session import UploadSession
 from app.models.user import User
 from app.schemas.ai_analysis import AIAnalysisTaskCreate, AIAnalysisTaskResponse, AIApplyResponse
-from app.schemas.photo import PhotoListResponse, PhotoResponse, PhotoUpdate, PhotoUploadResponse
+from app.schemas.photo import (
+    BatchUploadItemResult,
+    BatchUploadResponse,
+    NearDuplicateCluster,
+    NearDuplicateClusterListResponse,
+    PhotoArchiveRequest,
+    PhotoListResponse,
+    PhotoResponse,
+    PhotoUpdate,
+    PhotoUploadResponse,
+    SimilarPhotoItem,
+    SimilarPhotosResponse,
+    UploadSessionCreate,
+    UploadSessionResponse,
+)
 from app.schemas.search import SearchInterpretRequest, SearchInterpretResponse
 from app.schemas.taxonomy import PhotoClassificationUpdateSchema
 from app.services.ai_tasks import (
     apply_ai_analysis_task,
     create_ai_analysis_task,
+    create_ai_analysis_tasks,
     get_ai_task,
     get_latest_ai_task_for_photo,
 )
-from app.services.image_processing import process_uploaded_image
+from app.services.archive import ArchiveEntry, archive_headers, stream_zip, unique_entry_name
+from app.services.dedup import (
+    DUPLICATE_ALLOW,
+    DUPLICATE_REJECT,
+    deletable_media_paths,
+    duplicate_policy,
+    find_duplicate,
+    linked_media,
+)
+from app.services.image_processing import pick_rendition
+from app.services.image_workers import ImageWorkersBusy, get_image_workers
+from app.services.media_http import media_validators, not_modified_response, range_header_for
 from app.services.runtime_settings import get_runtime_settings
 from app.services.search_interpreter import get_search_interpreter
-from app.services.storage import cleanup_staged_files, get_storage, stage_photo_upload
-from app.services.task_dispatcher import dispatch_ai_analysis_task
+from app.services.similarity import MAX_QUERY_DISTANCE, get_similarity_index
+from app.services.ingest import StreamingIngest, UploadTooLarge
+from app.services.storage import (
+    PersistedMedia,
+    StorageUnavailable,
+    cleanup_staged_files,
+    generate_unique_filename,
+    get_storage,
+    sha256_file,
+    stage_photo_upload,
+)
+from app.services.transforms import (
+    TransformNotAllowed,
+    derived_media_paths,
+    get_image_transformer,
+    resolve_transform,
+    transform_source,
+)
+from app.services.task_dispatcher import dispatch_ai_analysis_task, dispatch_photo_pipeline
+from app.services.upload_sessions import (
+    SESSION_ACTIVE,
+    UploadOffsetMismatch,
+    UploadSessionClosed,
+    UploadSessionError,
+    abort_upload_session,
+    append_chunk,
+    check_upload_complete,
+    create_upload_session,
+    get_upload_session,
+    store_completed_upload,
+)
 from app.services.taxonomy import ensure_default_taxonomy, serialize_classifications
 from app.services.audit import log_audit
 from app.services.notification import notify_user as send_notification
@@ -68,6 +134,18 @@ async def can_access_portrait_photo(
     return await permission_crud.check_permission(db, current_user.id, "category", "Portrait", "view")
 
 
+async def _should_filter_portrait(
+    db: AsyncSession,
+    current_user: Optional[User],
+    portrait_visibility: str,
+) -> bool:
+    if portrait_visibility == PortraitVisibility.LOGIN_REQUIRED:
+        return not current_user
+    if portrait_visibility == PortraitVisibility.AUTHORIZED_ONLY:
+        return not current_user or not await can_access_portrait_photo(db, current_user, portrait_visibility)
+    return False
+
+
 async def can_access_photo_publicly(
     db: AsyncSession,
     photo: Photo,
@@ -81,24 +159,77 @@ async def can_access_photo_publicly(
     return await can_access_portrait_photo(db, current_user, portrait_visibility)
 
 
-def _photo_free_tags(tags: list) -> list[str]:
-    return [tag.name for tag in tags]
+async def filter_visible_photos(
+    db: AsyncSession,
+    photos: List[Photo],
+    current_user: Optional[User],
+    portrait_visibility: str,
+) -> List[Photo]:
+    """The photos a user may open, in order; the portrait permission is checked at most once."""
+    if is_reviewer(current_user):
+        return list(photos)
+    portraits_visible: Optional[bool] = None
+    visible = []
+    for photo in photos:
+        if current_user and photo.uploader_id == current_user.id:
+            visible.append(photo)
+        elif photo.status != "approved":
+            continue
+        elif photo.category != "Portrait":
+            visible.append(photo)
+        else:
+            if portraits_visible is None:
+                portraits_visible = await can_access_portrait_photo(db, current_user, portrait_visibility)
+            if portraits_visible:
+                visible.append(photo)
+    return visible
 
 
-async def serialize_photo(db: AsyncSession, photo: Photo) -> PhotoResponse:
-    tags = await photo_crud.get_photo_tags(db, photo.id)
-    free_tags = _photo_free_tags(tags)
+def _photo_media_paths(photo: Photo) -> list[str]:
+    """All stored files for a photo, deduplicated (thumb_path is usually a rendition)."""
+    paths = [photo.original_path, photo.thumb_path, photo.processed_path]
+    paths.extend((photo.renditions or {}).values())
+    paths.extend(derived_media_paths(photo))
+    return list(dict.fromkeys(path for path in paths if path))
+
+
+def _photo_response(
+    photo: Photo,
+    tag_names: List[str],
+    favorite_count: int,
+    uploader_name: Optional[str],
+) -> PhotoResponse:
     photo_dict = {**photo.__dict__}
     photo_dict.pop("_sa_instance_state", None)
-    photo_dict["tags"] = free_tags
-    photo_dict["free_tags"] = free_tags
+    photo_dict["tags"] = tag_names
+    photo_dict["free_tags"] = tag_names
     photo_dict["classifications"] = serialize_classifications(photo)
-    photo_dict["uploader_name"] = None
+    photo_dict["favorite_count"] = favorite_count
+    photo_dict["uploader_name"] = uploader_name
     return PhotoResponse(**photo_dict)
 
 
 async def serialize_photos(db: AsyncSession, photos: List[Photo]) -> List[PhotoResponse]:
-    return [await serialize_photo(db, photo) for photo in photos]
+    """Serialize a page of photos in a fixed number of queries, whatever the page size.
+
+    Tags, favorite counts and uploader names are fetched for the whole page at
+    once; classifications are only queried for photos that were not loaded with them.
+    """
+    if not photos:
+        return []
+    photo_ids = [photo.id for photo in photos]
+    await photo_crud.load_photo_relations(db, photos)
+    tag_names = await photo_crud.get_tag_names_for_photos(db, photo_ids)
+    favorite_counts = await favorite_crud.get_favorite_counts(db, photo_ids)
+    uploader_names = await user_crud.get_user_names(db, [photo.uploader_id for photo in photos if photo.uploader_id])
+    return [
+        _photo_response(photo, tag_names[photo.id], favorite_counts[photo.id], uploader_names.get(photo.uploader_id))
+        for photo in photos
+    ]
+
+
+async def serialize_photo(db: AsyncSession, photo: Photo) -> PhotoResponse:
+    return (await serialize_photos(db, [photo]))[0]
 
 
 async def _assert_photo_access(
@@ -116,10 +247,54 @@ async def _assert_photo_access(
         raise HTTPException(status_code=404, detail="Photo not found")
 
 
+def _is_publicly_cacheable(photo: Photo, portrait_visibility: str) -> bool:
+    if photo.status != "approved":
+        return False
+    return photo.category != "Portrait" or portrait_visibility == PortraitVisibility.PUBLIC
+
+
+async def _media_response(
+    request: Request,
+    photo: Photo,
+    path: str,
+    kind: str,
+    portrait_visibility: str,
+    download_name: Optional[str] = None,
+):
+    """Answer revalidations from the photo row, otherwise hand off to storage."""
+    validators = media_validators(photo, path, kind, _is_publicly_cacheable(photo, portrait_visibility))
+    not_modified = not_modified_response(request, validators)
+    if not_modified is not None:
+        return not_modified
+    return await get_storage().abuild_media_response(
+        path,
+        download_name=download_name,
+        headers=validators.headers(),
+        range_header=range_header_for(request, validators),
+    )
+
+
+async def _photo_page(
+    db: AsyncSession,
+    limit: int,
+    sort_by: str = "created_at",
+    sort_order: str = "desc",
+    **filters,
+) -> tuple[List[Photo], int, Optional[str]]:
+    """One listing page plus the cursor for the next one (keyset when ``cursor`` is given)."""
+    try:
+        photos, total = await photo_crud.get_photos(
+            db, limit=limit + 1, sort_by=sort_by, sort_order=sort_order, **filters
+        )
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return photos[:limit], total, photo_crud.next_photo_cursor(photos, limit, sort_by, sort_order)
+
+
 @router.get("/public", response_model=PhotoListResponse)
 async def list_public_photos(
-    skip: int = 0,
-    limit: int = 20,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1),
     season: Optional[str] = None,
     category: Optional[str] = None,
     campus: Optional[str] = None,
@@ -132,6 +307,7 @@ async def list_public_photos(
     sort_by: str = "created_at",
     sort_order: str = "desc",
     smart: bool = False,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_optional_current_user),
     portrait_visibility: str = Depends(get_portrait_visibility),
@@ -142,12 +318,7 @@ async def list_public_photos(
     if sort_order not in ["asc", "desc"]:
         sort_order = "desc"
 
-    should_filter_portrait = False
-    if portrait_visibility == PortraitVisibility.LOGIN_REQUIRED and not current_user:
-        should_filter_portrait = True
-    elif portrait_visibility == PortraitVisibility.AUTHORIZED_ONLY:
-        if not current_user or not await can_access_portrait_photo(db, current_user, portrait_visibility):
-            should_filter_portrait = True
+    should_filter_portrait = await _should_filter_portrait(db, current_user, portrait_visibility)
 
     interpretation = None
     search_interpretation_data = None
@@ -168,10 +339,11 @@ async def list_public_photos(
         else:
             smart = False
 
-    photos, total = await photo_crud.get_photos(
+    photos, total, next_cursor = await _photo_page(
         db,
+        limit,
         skip=skip,
-        limit=limit,
+        cursor=cursor,
         status="approved",
         season=season,
         category=category,
@@ -189,9 +361,10 @@ async def list_public_photos(
     )
     return PhotoListResponse(
         total=total,
-        page=skip // limit + 1 if limit > 0 else 1,
+        page=skip // limit + 1,
         page_size=limit,
         items=await serialize_photos(db, photos),
+        next_cursor=next_cursor,
         search_interpretation=search_interpretation_data,
     )
 
@@ -230,6 +403,7 @@ async def get_public_photo(
 @router.get("/{photo_id}/image/original")
 async def get_photo_image(
     photo_id: str,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_optional_current_user_for_media),
     portrait_visibility: str = Depends(get_portrait_visibility),
@@ -238,12 +412,13 @@ async def get_photo_image(
     if photo is None:
         raise HTTPException(status_code=404, detail="Photo not found")
     await _assert_photo_access(db, photo, current_user, portrait_visibility)
-    return get_storage().build_media_response(photo.original_path)
+    return await _media_response(request, photo, photo.original_path, "original", portrait_visibility)
 
 
 @router.get("/{photo_id}/image/thumbnail")
 async def get_photo_thumbnail(
     photo_id: str,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_optional_current_user_for_media),
     portrait_visibility: str = Depends(get_portrait_visibility),
@@ -254,12 +429,73 @@ async def get_photo_thumbnail(
     await _assert_photo_access(db, photo, current_user, portrait_visibility)
     # Fall back to original if no thumbnail exists
     path = photo.thumb_path or photo.original_path
-    return get_storage().build_media_response(path)
+    return await _media_response(request, photo, path, "thumbnail", portrait_visibility)
+
+
+@router.get("/{photo_id}/image/transform")
+async def get_photo_transform(
+    photo_id: str,
+    request: Request,
+    preset: Optional[str] = None,
+    w: Optional[int] = Query(None, gt=0),
+    h: Optional[int] = Query(None, gt=0),
+    fit: Optional[str] = None,
+    image_format: Optional[str] = Query(None, alias="format"),
+    q: Optional[int] = Query(None, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_current_user_for_media),
+    portrait_visibility: str = Depends(get_portrait_visibility),
+):
+    """Serve a derived image (crop/format) for an allowlisted preset, rendered once and cached."""
+    try:
+        spec = resolve_transform(preset, w, h, fit, image_format, q)
+    except TransformNotAllowed as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    photo = await photo_crud.get_photo(db, photo_id)
+    if photo is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    await _assert_photo_access(db, photo, current_user, portrait_visibility)
+
+    source = transform_source(photo, spec)
+    validators = media_validators(
+        photo, f"{source}|{spec.digest}", "rendition", _is_publicly_cacheable(photo, portrait_visibility)
+    )
+    not_modified = not_modified_response(request, validators)
+    if not_modified is not None:
+        return not_modified
+    try:
+        data = await get_image_transformer().get(photo, spec)
+    except ImageWorkersBusy as exc:
+        raise _busy_response(exc) from exc
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail="Media file not found") from exc
+    return Response(content=data, media_type=spec.media_type, headers=validators.headers())
+
+
+@router.get("/{photo_id}/image/{size}")
+async def get_photo_rendition(
+    photo_id: str,
+    size: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_current_user_for_media),
+    portrait_visibility: str = Depends(get_portrait_visibility),
+):
+    """Serve the closest stored rendition for the requested width."""
+    if size <= 0:
+        raise HTTPException(status_code=400, detail="Size must be a positive width in pixels")
+    photo = await photo_crud.get_photo(db, photo_id)
+    if photo is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    await _assert_photo_access(db, photo, current_user, portrait_visibility)
+    path = pick_rendition(photo.renditions, size) or photo.thumb_path or photo.original_path
+    return await _media_response(request, photo, path, "rendition", portrait_visibility)
 
 
 @router.get("/{photo_id}/download")
 async def download_photo(
     photo_id: str,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_optional_current_user_for_media),
     portrait_visibility: str = Depends(get_portrait_visibility),
@@ -268,86 +504,461 @@ async def download_photo(
     if photo is None:
         raise HTTPException(status_code=404, detail="Photo not found")
     await _assert_photo_access(db, photo, current_user, portrait_visibility)
-    return get_storage().build_media_response(photo.original_path, download_name=photo.filename)
+    return await _media_response(
+        request, photo, photo.original_path, "download", portrait_visibility, download_name=photo.filename
+    )
+
+
+async def _archive_photos(
+    db: AsyncSession,
+    payload: PhotoArchiveRequest,
+    current_user: Optional[User],
+    portrait_visibility: str,
+) -> List[Photo]:
+    """Resolve and access-check every photo of an archive with a fixed number of queries."""
+    max_photos = settings.DOWNLOAD_ARCHIVE_MAX_PHOTOS
+    reviewer = is_reviewer(current_user)
+    if payload.photo_ids:
+        photo_ids = list(dict.fromkeys(payload.photo_ids))
+        if len(photo_ids) > max_photos:
+            raise HTTPException(status_code=400, detail=f"At most {max_photos} photos per archive")
+        found = await photo_crud.get_live_photos_by_ids(db, photo_ids)
+        portrait_allowed: Optional[bool] = None
+        photos, denied = [], []
+        for photo_id in photo_ids:
+            photo = found.get(photo_id)
+            allowed = photo is not None and (
+                reviewer or (current_user is not None and photo.uploader_id == current_user.id)
+            )
+            if photo is not None and not allowed and photo.status == "approved":
+                if photo.category != "Portrait":
+                    allowed = True
+                else:
+                    if portrait_allowed is None:
+                        portrait_allowed = await can_access_portrait_photo(db, current_user, portrait_visibility)
+                    allowed = portrait_allowed
+            if allowed:
+                photos.append(photo)
+            else:
+                denied.append(photo_id)
+        if denied:
+            raise HTTPException(status_code=404, detail={"message": "Photo not found", "photo_ids": denied[:50]})
+        return photos
+
+    exclude_portrait = not reviewer and await _should_filter_portrait(db, current_user, portrait_visibility)
+    photos, total = await photo_crud.get_photos(
+        db,
+        skip=0,
+        limit=max_photos,
+        status=payload.status if reviewer else "approved",
+        season=payload.season,
+        category=payload.category,
+        campus=payload.campus,
+        building=payload.building,
+        gallery_series=payload.gallery_series,
+        gallery_year=payload.gallery_year,
+        photo_type=payload.photo_type,
+        search=payload.search,
+        tag=payload.tag,
+        exclude_categories=["Portrait"] if exclude_portrait else None,
+        sort_order="asc",
+    )
+    if total > max_photos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Filter matches {total} photos; narrow it down to at most {max_photos} per archive",
+        )
+    return [photo for photo in photos if photo.status != "deleted"]
+
+
+async def _archive_response(
+    request: Request,
+    db: AsyncSession,
+    payload: PhotoArchiveRequest,
+    current_user: Optional[User],
+    portrait_visibility: str,
+) -> StreamingResponse:
+    photos = await _archive_photos(db, payload, current_user, portrait_visibility)
+    if not photos:
+        raise HTTPException(status_code=404, detail="No photos to download")
+
+    used_names: set[str] = set()
+    entries = []
+    for photo in photos:
+        path = (pick_rendition(photo.renditions, payload.size) if payload.size else None) or photo.original_path
+        filename = photo.filename or f"{photo.id}{Path(path).suffix}"
+        if path != photo.original_path:
+            filename = f"{Path(filename).stem}.jpg"  # renditions are always JPEG
+        entries.append(ArchiveEntry(unique_entry_name(filename, used_names), path, photo.captured_at or photo.created_at))
+
+    if current_user:
+        await log_audit(db, user_id=current_user.id, action="photo.download_archive",
+                        resource_type="photo", detail=f"打包下载 {len(entries)} 张照片", request=request)
+        await db.commit()
+    archive_name = Path(payload.filename or f"photos-{datetime.utcnow():%Y%m%d-%H%M%S}").name
+    return StreamingResponse(
+        stream_zip(entries),
+        media_type="application/zip",
+        headers=archive_headers(f"{archive_name}.zip"),
+    )
+
+
+@router.get("/download/archive")
+async def download_photo_archive(
+    request: Request,
+    ids: Optional[List[str]] = Query(None, description="Photo ids; without ids the gallery filters apply"),
+    status: Optional[str] = None,
+    season: Optional[str] = None,
+    category: Optional[str] = None,
+    campus: Optional[str] = None,
+    building: Optional[str] = None,
+    gallery_series: Optional[str] = None,
+    gallery_year: Optional[str] = None,
+    photo_type: Optional[str] = None,
+    search: Optional[str] = None,
+    tag: Optional[str] = None,
+    size: Optional[int] = Query(None, gt=0),
+    filename: Optional[str] = Query(None, max_length=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_current_user_for_media),
+    portrait_visibility: str = Depends(get_portrait_visibility),
+):
+    """批量打包下载（流式 ZIP）；GET 便于浏览器直接下载，token 可经 access_token 传入"""
+    payload = PhotoArchiveRequest(
+        photo_ids=ids,
+        status=status,
+        season=season,
+        category=category,
+        campus=campus,
+        building=building,
+        gallery_series=gallery_series,
+        gallery_year=gallery_year,
+        photo_type=photo_type,
+        search=search,
+        tag=tag,
+        size=size,
+        filename=filename,
+    )
+    return await _archive_response(request, db, payload, current_user, portrait_visibility)
+
+
+@router.post("/download/archive")
+async def download_photo_archive_post(
+    payload: PhotoArchiveRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_current_user_for_media),
+    portrait_visibility: str = Depends(get_portrait_visibility),
+):
+    """同上，照片 id 较多（超出 URL 长度）时使用 JSON 请求体"""
+    return await _archive_response(request, db, payload, current_user, portrait_visibility)
+
+
+def _validate_upload_fields(content_type: Optional[str], season: Optional[str], category: Optional[str]) -> None:
+    if not content_type or not content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    _validate_photo_fields(season, category)
+
+
+def _validate_photo_fields(season: Optional[str], category: Optional[str]) -> None:
+    if season and season not in ["Spring", "Summer", "Autumn", "Winter"]:
+        raise HTTPException(status_code=400, detail="Season must be one of: Spring, Summer, Autumn, Winter")
+    if category and category not in ["Landscape", "Portrait", "Activity", "Documentary"]:
+        raise HTTPException(status_code=400, detail="Category must be one of: Landscape, Portrait, Activity, Documentary")
+
+
+def _image_workers_or_503():
+    """Shared image pool, refusing new work with 503 while it is saturated."""
+    pool = get_image_workers()
+    try:
+        pool.check_capacity()
+    except ImageWorkersBusy as exc:
+        raise _busy_response(exc) from exc
+    return pool
+
+
+def _busy_response(exc: ImageWorkersBusy) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Image processing is busy, please retry shortly",
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _storage_unavailable_response(exc: StorageUnavailable) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Storage is temporarily unavailable, please retry shortly",
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _defer_processing(requested: Optional[bool]) -> bool:
+    return settings.UPLOAD_DEFER_PROCESSING if requested is None else requested
+
+
+def _upload_response(photo: Photo, duplicate_of: Optional[Photo] = None) -> PhotoUploadResponse:
+    if duplicate_of is not None:
+        message = "Duplicate of an existing photo, stored media reused"
+    elif photo.processing_status == "processing":
+        message = "Photo accepted, processing in background"
+    else:
+        message = "Photo uploaded successfully"
+    return PhotoUploadResponse(
+        id=photo.id,
+        filename=photo.filename,
+        original_path=photo.original_path,
+        thumb_path=photo.thumb_path,
+        width=photo.width,
+        height=photo.height,
+        status=photo.status,
+        content_hash=photo.content_hash,
+        processing_status=photo.processing_status,
+        duplicate_of=duplicate_of.id if duplicate_of is not None else None,
+        message=message,
+    )
+
+
+async def _check_duplicate(db: AsyncSession, content_hash: Optional[str]) -> Optional[Photo]:
+    """Existing photo to link to under UPLOAD_DUPLICATE_POLICY=link; 409 under reject."""
+    existing = await find_duplicate(db, content_hash)
+    if existing is not None and duplicate_policy() == DUPLICATE_REJECT:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "An identical photo has already been uploaded", "duplicate_of": existing.id},
+        )
+    return existing
+
+
+def _batch_item_error(exc: BaseException) -> str:
+    detail = getattr(exc, "detail", None)
+    if isinstance(detail, dict):
+        # e.g. the 409 body of _check_duplicate
+        message = detail.get("message") or str(detail)
+        return f"{message}: {detail['duplicate_of']}" if detail.get("duplicate_of") else message
+    return detail or str(exc) or type(exc).__name__
+
+
+def _is_linked(item: dict) -> bool:
+    """Batch item that reuses another photo's stored media instead of its own."""
+    return bool(item.get("duplicate_of") or item.get("linked_to"))
+
+
+def _link_batch_duplicates(outcomes: list) -> list:
+    """Give later copies of a file in one batch the stored media of its first copy.
+
+    Under UPLOAD_DUPLICATE_POLICY=link, copies skip processing and wait here
+    for the first copy (which may itself be linked to an existing photo).
+    If the first copy failed, so do its copies.
+    """
+    stored = {
+        outcome["photo_uuid"]: outcome
+        for outcome in outcomes
+        if not isinstance(outcome, BaseException) and "linked_to" not in outcome
+    }
+    linked = []
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException) or "linked_to" not in outcome:
+            linked.append(outcome)
+            continue
+        first_id, first_filename = outcome["linked_to"]
+        first = stored.get(first_id)
+        if first is None:
+            linked.append(ValueError(f"Duplicate of {first_filename} in this batch, which could not be stored"))
+            continue
+        linked.append({
+            **outcome,
+            "stored_media": first["stored_media"],
+            "processing_result": first["processing_result"],
+            "duplicate_of": first.get("duplicate_of"),
+        })
+    return linked
+
+
+def _uploaded_photo_row(
+    photo_uuid: str,
+    filename: str,
+    mime_type: str,
+    stored_media,
+    processing_result: dict,
+    *,
+    description: Optional[str],
+    season: Optional[str],
+    category: Optional[str],
+    campus: Optional[str],
+    processing_status: str,
+    content_hash: Optional[str] = None,
+) -> dict:
+    return {
+        "id": photo_uuid,
+        "filename": filename,
+        "original_path": stored_media.original_path,
+        "thumb_path": stored_media.thumb_path,
+        "renditions": stored_media.renditions or None,
+        "width": processing_result.get("width"),
+        "height": processing_result.get("height"),
+        "file_size": stored_media.file_size,
+        "mime_type": mime_type,
+        "content_hash": content_hash or processing_result.get("content_hash"),
+        "perceptual_hash": processing_result.get("perceptual_hash"),
+        "blurhash": processing_result.get("blurhash"),
+        "dominant_color": processing_result.get("dominant_color"),
+        "exif_data": processing_result.get("exif_data", {}),
+        "captured_at": processing_result.get("captured_at"),
+        "description": description,
+        "season": season,
+        "category": category,
+        "campus": campus,
+        "status": "pending",
+        "processing_status": processing_status,
+    }
+
+
+async def _register_uploaded_photo(
+    db: AsyncSession,
+    background_tasks: BackgroundTasks,
+    current_user: User,
+    *,
+    photo_uuid: str,
+    filename: str,
+    mime_type: str,
+    stored_media,
+    processing_result: dict,
+    description: Optional[str],
+    season: Optional[str],
+    category: Optional[str],
+    campus: Optional[str],
+    enable_ai: bool,
+    deferred: bool = False,
+    content_hash: Optional[str] = None,
+) -> Photo:
+    """Create the photo row for stored media and queue AI analysis if enabled.
+
+    With ``deferred`` only the original is stored yet: the row starts in
+    ``processing`` and the media pipeline fills in renditions, EXIF and AI.
+    """
+    if deferred:
+        processing_status = "processing"
+    else:
+        runtime_settings = await get_runtime_settings(db)
+        processing_status = "pending" if enable_ai and runtime_settings.ai_enabled else "manual"
+    photo = await photo_crud.create_photo(
+        db,
+        _uploaded_photo_row(
+            photo_uuid,
+            filename,
+            mime_type,
+            stored_media,
+            processing_result,
+            description=description,
+            season=season,
+            category=category,
+            campus=campus,
+            processing_status=processing_status,
+            content_hash=content_hash,
+        ),
+        str(current_user.id),
+    )
+    if deferred:
+        dispatch_photo_pipeline(background_tasks, photo.id, enable_ai, str(current_user.id))
+        return photo
+    await ensure_default_taxonomy(db)
+
+    if enable_ai and runtime_settings.ai_enabled:
+        task = await create_ai_analysis_task(
+            db,
+            photo=photo,
+            requested_by_id=current_user.id,
+            provider=runtime_settings.ai_provider,
+            model_id=runtime_settings.ai_model_id,
+        )
+        dispatch_ai_analysis_task(background_tasks, task.id)
+    return photo
 
 
 @router.post("/upload", response_model=PhotoUploadResponse, status_code=status.HTTP_201_CREATED)
 async def upload_photo(
     background_tasks: BackgroundTasks,
+    response: Response,
     file: UploadFile = File(..., description="Photo file to upload"),
     description: Optional[str] = Form(None, max_length=500),
     season: Optional[str] = Form(None),
     category: Optional[str] = Form(None),
     campus: Optional[str] = Form(None),
     enable_ai: bool = Form(True),
+    defer_processing: Optional[bool] = Form(None, description="Return 202 and process renditions in the background"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
-    if season and season not in ["Spring", "Summer", "Autumn", "Winter"]:
-        raise HTTPException(status_code=400, detail="Season must be one of: Spring, Summer, Autumn, Winter")
-    if category and category not in ["Landscape", "Portrait", "Activity", "Documentary"]:
-        raise HTTPException(status_code=400, detail="Category must be one of: Landscape, Portrait, Activity, Documentary")
+    _validate_upload_fields(file.content_type, season, category)
+    deferred = _defer_processing(defer_processing)
+    image_workers = None if deferred else _image_workers_or_503()
 
     staged_original_path = None
     staged_thumb_path = None
     try:
-        runtime_settings = await get_runtime_settings(db)
-        photo_uuid, staged_original_path, original_filename, _ = await stage_photo_upload(file)
-        processing_result = process_uploaded_image(
-            staged_original_path,
+        photo_uuid, staged_original_path, original_filename, content_hash = await stage_photo_upload(file)
+        duplicate = await _check_duplicate(db, content_hash)
+        if duplicate is not None:
+            stored_media, processing_result = linked_media(duplicate)
+            photo = await _register_uploaded_photo(
+                db,
+                background_tasks,
+                current_user,
+                photo_uuid=photo_uuid,
+                filename=original_filename,
+                mime_type=file.content_type,
+                stored_media=stored_media,
+                processing_result=processing_result,
+                description=description,
+                season=season,
+                category=category,
+                campus=campus,
+                enable_ai=False,
+                content_hash=content_hash,
+            )
+            return _upload_response(photo, duplicate_of=duplicate)
+
+        processing_result = {}
+        if not deferred:
+            try:
+                processing_result = await image_workers.process_image(
+                    staged_original_path,
+                    photo_uuid,
+                    str(Path(staged_original_path).parent),
+                )
+            except ImageWorkersBusy as exc:
+                raise _busy_response(exc) from exc
+        staged_thumb_path = processing_result.get("thumb_path")
+        stored_media = await get_storage().apersist_photo_files(
             photo_uuid,
-            output_dir=str(Path(staged_original_path).parent),
+            staged_original_path,
+            staged_thumb_path,
+            processing_result.get("renditions"),
         )
-        staged_thumb_path = processing_result.get("thumb_path")
-        stored_media = get_storage().persist_photo_files(photo_uuid, staged_original_path, staged_thumb_path)
-
-        processing_status = "pending" if enable_ai and runtime_settings.ai_enabled else "manual"
-        photo = await photo_crud.create_photo(
+        photo = await _register_uploaded_photo(
             db,
-            {
-                "id": photo_uuid,
-                "filename": original_filename,
-                "original_path": stored_media.original_path,
-                "thumb_path": stored_media.thumb_path,
-                "width": processing_result.get("width"),
-                "height": processing_result.get("height"),
-                "file_size": stored_media.file_size,
-                "mime_type": file.content_type,
-                "exif_data": processing_result.get("exif_data", {}),
-                "captured_at": processing_result.get("captured_at"),
-                "description": description,
-                "season": season,
-                "category": category,
-                "campus": campus,
-                "status": "pending",
-                "processing_status": processing_status,
-            },
-            str(current_user.id),
+            background_tasks,
+            current_user,
+            photo_uuid=photo_uuid,
+            filename=original_filename,
+            mime_type=file.content_type,
+            stored_media=stored_media,
+            processing_result=processing_result,
+            description=description,
+            season=season,
+            category=category,
+            campus=campus,
+            enable_ai=enable_ai,
+            deferred=deferred,
+            content_hash=content_hash,
         )
-        await ensure_default_taxonomy(db)
 
-        if enable_ai and runtime_settings.ai_enabled:
-            task = await create_ai_analysis_task(
-                db,
-                photo=photo,
-                requested_by_id=current_user.id,
-                provider=runtime_settings.ai_provider,
-                model_id=runtime_settings.ai_model_id,
-            )
-            dispatch_ai_analysis_task(background_tasks, task.id)
-
-        return PhotoUploadResponse(
-            id=photo.id,
-            filename=photo.filename,
-            original_path=photo.original_path,
-            thumb_path=photo.thumb_path,
-            width=photo.width,
-            height=photo.height,
-            status=photo.status,
-            message="Photo uploaded successfully",
-        )
+        if deferred:
+            response.status_code = status.HTTP_202_ACCEPTED
+        return _upload_response(photo)
+    except HTTPException:
+        raise
     except Exception as exc:  # noqa: BLE001
         cleanup_staged_files(staged_original_path, staged_thumb_path)
         raise HTTPException(status_code=500, detail=f"Failed to upload photo: {exc}") from exc
@@ -357,10 +968,628 @@ async def upload_photo(
             cleanup_staged_files(staged_original_path, staged_thumb_path)
 
 
+@router.post("/upload/stream", response_model=PhotoUploadResponse, status_code=status.HTTP_201_CREATED)
+async def upload_photo_stream(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    filename: str = Query(..., min_length=1, max_length=255, description="Original file name"),
+    description: Optional[str] = Query(None, max_length=500),
+    season: Optional[str] = None,
+    category: Optional[str] = None,
+    campus: Optional[str] = None,
+    enable_ai: bool = True,
+    defer_processing: Optional[bool] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Streaming upload: the raw request body is the image (Content-Type image/*).
+
+    The body goes straight into the storage backend (final local path or an S3
+    multipart upload) while size and SHA-256 are computed; oversized bodies are
+    rejected with 413 before they are stored. Metadata travels in the query.
+    With deferred processing the response is 202 as soon as the original is
+    stored; renditions follow in the background.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    _validate_upload_fields(content_type, season, category)
+    declared_length = request.headers.get("content-length")
+    if declared_length and declared_length.isdigit() and int(declared_length) > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail="File too large")
+    deferred = _defer_processing(defer_processing)
+    image_workers = None if deferred else _image_workers_or_503()
+
+    photo_uuid, extension = generate_unique_filename(filename)
+    extension = extension or mimetypes.guess_extension(content_type) or ".jpg"
+    storage = get_storage()
+    ingest = StreamingIngest(storage.open_writer(f"originals/{photo_uuid}{extension}", content_type))
+    try:
+        await ingest.consume(request.stream())
+        # The hash is known before the object is committed, so a duplicate never lands in storage
+        duplicate = await _check_duplicate(db, ingest.content_hash)
+        if duplicate is None:
+            await asyncio.to_thread(ingest.commit)
+        else:
+            await asyncio.to_thread(ingest.abort)
+    except UploadTooLarge:
+        await asyncio.to_thread(ingest.abort)
+        raise HTTPException(status_code=413, detail="File too large")
+    except HTTPException:
+        await asyncio.to_thread(ingest.abort)
+        raise
+    except Exception as exc:  # noqa: BLE001
+        await asyncio.to_thread(ingest.abort)
+        raise HTTPException(status_code=500, detail=f"Failed to upload photo: {exc}") from exc
+
+    if duplicate is not None:
+        stored_media, processing_result = linked_media(duplicate)
+        photo = await _register_uploaded_photo(
+            db,
+            background_tasks,
+            current_user,
+            photo_uuid=photo_uuid,
+            filename=filename,
+            mime_type=content_type,
+            stored_media=stored_media,
+            processing_result=processing_result,
+            description=description,
+            season=season,
+            category=category,
+            campus=campus,
+            enable_ai=False,
+            content_hash=ingest.content_hash,
+        )
+        return _upload_response(photo, duplicate_of=duplicate)
+
+    original_key = ingest.writer.key
+    thumb_key, renditions = None, {}
+    rendition_dir = tempfile.mkdtemp(prefix="buct-media-upload-")
+    try:
+        processing_result = {}
+        if not deferred:
+            # A path, never the bytes: the worker process decodes straight from disk
+            processing_result = await image_workers.process_image(ingest.decode_source(), photo_uuid, rendition_dir)
+            thumb_key, renditions = await storage.apersist_renditions(
+                photo_uuid, processing_result.get("thumb_path"), processing_result.get("renditions")
+            )
+        photo = await _register_uploaded_photo(
+            db,
+            background_tasks,
+            current_user,
+            photo_uuid=photo_uuid,
+            filename=filename,
+            mime_type=content_type,
+            stored_media=PersistedMedia(
+                original_path=original_key,
+                thumb_path=thumb_key,
+                file_size=ingest.size,
+                renditions=renditions,
+            ),
+            processing_result=processing_result,
+            description=description,
+            season=season,
+            category=category,
+            campus=campus,
+            enable_ai=enable_ai,
+            deferred=deferred,
+            content_hash=ingest.content_hash,
+        )
+    except Exception as exc:  # noqa: BLE001
+        await storage.adelete_files([original_key, thumb_key, *renditions.values()])
+        if isinstance(exc, ImageWorkersBusy):
+            raise _busy_response(exc) from exc
+        raise HTTPException(status_code=500, detail=f"Failed to upload photo: {exc}") from exc
+    finally:
+        ingest.close()
+        shutil.rmtree(rendition_dir, ignore_errors=True)
+
+    if deferred:
+        response.status_code = status.HTTP_202_ACCEPTED
+    return _upload_response(photo)
+
+
+def _session_response(session: UploadSession) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        id=session.id,
+        photo_id=session.photo_id,
+        filename=session.filename,
+        total_size=session.total_size,
+        offset=session.upload_offset,
+        chunk_size=max(settings.UPLOAD_SESSION_CHUNK_SIZE, (session.storage_state or {}).get("min_chunk_size", 0)),
+        min_chunk_size=(session.storage_state or {}).get("min_chunk_size", 0),
+        status=session.status,
+        expires_at=session.expires_at,
+    )
+
+
+async def _upload_session_or_404(db: AsyncSession, session_id: str, current_user: User) -> UploadSession:
+    session = await get_upload_session(db, session_id, str(current_user.id))
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+
+async def _read_chunk(request: Request, limit: int) -> bytes:
+    declared_length = request.headers.get("content-length")
+    if declared_length and declared_length.isdigit() and int(declared_length) > limit:
+        raise HTTPException(status_code=413, detail=f"Chunk larger than {limit} bytes")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise HTTPException(status_code=413, detail=f"Chunk larger than {limit} bytes")
+    return bytes(body)
+
+
+async def _process_stored_original(
+    image_workers, photo_uuid: str, original_key: str, check_duplicate, wait: bool = False
+):
+    """Hash an original that is already in storage, then render it unless it is a duplicate.
+
+    ``check_duplicate(content_hash)`` runs in between on the same local copy, so a
+    large S3 object is downloaded once; a truthy result skips rendering. Without
+    ``image_workers`` (deferred), or when the pool is busy, nothing is rendered
+    and processing_result is None. Returns (content_hash, duplicate,
+    processing_result, thumb_key, renditions).
+    """
+    storage = get_storage()
+    processing_result, thumb_key, renditions = None, None, {}
+    rendition_dir = tempfile.mkdtemp(prefix="buct-media-upload-")
+    try:
+        async with storage.alocal_copy(original_key) as local_path:
+            content_hash = await asyncio.to_thread(sha256_file, local_path)
+            duplicate = await check_duplicate(content_hash)
+            if not duplicate and image_workers is not None:
+                try:
+                    processing_result = await image_workers.process_image(
+                        local_path, photo_uuid, rendition_dir, wait=wait
+                    )
+                except ImageWorkersBusy:
+                    # The original is already stored; let the background pipeline render it
+                    pass
+        if processing_result is not None:
+            thumb_key, renditions = await storage.apersist_renditions(
+                photo_uuid, processing_result.get("thumb_path"), processing_result.get("renditions")
+            )
+    finally:
+        shutil.rmtree(rendition_dir, ignore_errors=True)
+    return content_hash, duplicate, processing_result, thumb_key, renditions
+
+
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_resumable_upload(
+    payload: UploadSessionCreate,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Resumable upload, step 1: create a session for a file of ``total_size`` bytes.
+
+    Then PATCH ``/uploads/{id}`` with ``Upload-Offset`` and the next chunk as the
+    raw body, ``HEAD`` to recover the offset after a dropped connection, and
+    ``POST /uploads/{id}/finalize`` once every byte is stored.
+    """
+    _validate_upload_fields(payload.mime_type, payload.season, payload.category)
+    try:
+        session = await create_upload_session(
+            db,
+            str(current_user.id),
+            filename=payload.filename,
+            mime_type=payload.mime_type,
+            total_size=payload.total_size,
+            metadata={
+                "description": payload.description,
+                "season": payload.season,
+                "category": payload.category,
+                "campus": payload.campus,
+                "enable_ai": payload.enable_ai,
+            },
+        )
+    except UploadSessionError as exc:
+        raise HTTPException(status_code=413, detail=str(exc)) from exc
+    except StorageUnavailable as exc:
+        raise _storage_unavailable_response(exc) from exc
+    response.headers["Location"] = str(request.url_for("get_resumable_upload", session_id=session.id))
+    return _session_response(session)
+
+
+@router.get("/uploads/{session_id}", response_model=UploadSessionResponse)
+async def get_resumable_upload(
+    session_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    return _session_response(await _upload_session_or_404(db, session_id, current_user))
+
+
+@router.head("/uploads/{session_id}")
+async def head_resumable_upload(
+    session_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    session = await _upload_session_or_404(db, session_id, current_user)
+    return Response(
+        status_code=status.HTTP_200_OK,
+        headers={
+            "Upload-Offset": str(session.upload_offset),
+            "Upload-Length": str(session.total_size),
+            "Cache-Control": "no-store",
+        },
+    )
+
+
+@router.patch("/uploads/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def append_resumable_upload(
+    session_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Store the raw body at ``Upload-Offset``; 409 (with the current offset) when out of sync."""
+    upload_offset = request.headers.get("upload-offset", "")
+    if not upload_offset.isdigit():
+        raise HTTPException(status_code=400, detail="Upload-Offset header is required")
+    session = await _upload_session_or_404(db, session_id, current_user)
+    if int(upload_offset) != session.upload_offset:
+        raise HTTPException(
+            status_code=409,
+            detail="Upload offset mismatch",
+            headers={"Upload-Offset": str(session.upload_offset)},
+        )
+    data = await _read_chunk(request, settings.UPLOAD_SESSION_MAX_CHUNK_SIZE)
+    try:
+        session = await append_chunk(db, session, int(upload_offset), data)
+    except UploadOffsetMismatch as exc:
+        raise HTTPException(
+            status_code=409, detail="Upload offset mismatch", headers={"Upload-Offset": str(exc.offset)}
+        ) from exc
+    except UploadSessionClosed as exc:
+        raise HTTPException(status_code=410, detail=str(exc)) from exc
+    except UploadSessionError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except StorageUnavailable as exc:
+        # Nothing was stored: the client re-sends the chunk at the same offset
+        raise _storage_unavailable_response(exc) from exc
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers={"Upload-Offset": str(session.upload_offset)})
+
+
+@router.post("/uploads/{session_id}/finalize", response_model=PhotoUploadResponse, status_code=status.HTTP_201_CREATED)
+async def finalize_resumable_upload(
+    session_id: str,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    defer_processing: Optional[bool] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Store the completed file as a photo and run the usual processing / AI dispatch."""
+    session = await _upload_session_or_404(db, session_id, current_user)
+    deferred = _defer_processing(defer_processing)
+    # Refuse before completing, so a busy pool leaves the session open for a retry
+    image_workers = None if deferred else _image_workers_or_503()
+    try:
+        # Marked completed, but only committed together with the photo row
+        await store_completed_upload(session)
+    except UploadSessionClosed as exc:
+        raise HTTPException(status_code=410, detail=str(exc)) from exc
+    except UploadSessionError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+
+    fields = session.upload_metadata or {}
+    thumb_key, renditions = None, {}
+    try:
+        content_hash, duplicate, processing_result, thumb_key, renditions = await _process_stored_original(
+            image_workers, session.photo_id, session.storage_key, partial(_check_duplicate, db)
+        )
+        if duplicate is not None:
+            stored_media, processing_result = linked_media(duplicate)
+        else:
+            stored_media = PersistedMedia(
+                original_path=session.storage_key,
+                thumb_path=thumb_key,
+                file_size=session.total_size,
+                renditions=renditions,
+            )
+        deferred = duplicate is None and processing_result is None
+        photo = await _register_uploaded_photo(
+            db,
+            background_tasks,
+            current_user,
+            photo_uuid=session.photo_id,
+            filename=session.filename,
+            mime_type=session.mime_type,
+            stored_media=stored_media,
+            processing_result=processing_result or {},
+            description=fields.get("description"),
+            season=fields.get("season"),
+            category=fields.get("category"),
+            campus=fields.get("campus"),
+            enable_ai=fields.get("enable_ai", True) and duplicate is None,
+            deferred=deferred,
+            content_hash=content_hash,
+        )
+    except Exception as exc:  # noqa: BLE001
+        await db.rollback()
+        await db.refresh(session)
+        if session.status == SESSION_ACTIVE:
+            # Nothing was registered: keep the original so finalize can be retried
+            await get_storage().adelete_files([thumb_key, *renditions.values()])
+        if isinstance(exc, HTTPException):
+            raise  # 409 for a duplicate under the reject policy
+        raise HTTPException(status_code=500, detail=f"Failed to upload photo: {exc}") from exc
+
+    if duplicate is not None:
+        # The photo reuses the existing media; the uploaded copy is not needed
+        await get_storage().adelete_file(session.storage_key)
+        return _upload_response(photo, duplicate_of=duplicate)
+    if deferred:
+        response.status_code = status.HTTP_202_ACCEPTED
+    return _upload_response(photo)
+
+
+@router.delete("/uploads/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_resumable_upload(
+    session_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    session = await _upload_session_or_404(db, session_id, current_user)
+    await abort_upload_session(db, session)
+
+
+@router.post("/upload/batch", response_model=BatchUploadResponse)
+async def upload_photo_batch(
+    background_tasks: BackgroundTasks,
+    files: Optional[List[UploadFile]] = File(None, description="Photo files to upload"),
+    session_ids: Optional[List[str]] = Form(None, description="Fully uploaded resumable upload sessions"),
+    description: Optional[str] = Form(None, max_length=500),
+    season: Optional[str] = Form(None),
+    category: Optional[str] = Form(None),
+    campus: Optional[str] = Form(None),
+    enable_ai: bool = Form(True),
+    defer_processing: Optional[bool] = Form(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Upload many photos with shared metadata in one request.
+
+    Files and/or ids of fully uploaded resumable sessions are stored and
+    processed in parallel (UPLOAD_BATCH_CONCURRENCY). All photo rows are then
+    inserted in one transaction, followed by a single taxonomy check and one
+    bulk AI task insert. Failures are reported per item; the rest still land.
+    Session items fall back to the metadata given when the session was created.
+    """
+    files = files or []
+    session_ids = list(dict.fromkeys(session_ids or []))
+    total = len(files) + len(session_ids)
+    if total == 0:
+        raise HTTPException(status_code=400, detail="No files or upload sessions given")
+    if total > settings.UPLOAD_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.UPLOAD_BATCH_MAX_ITEMS} items per batch")
+    _validate_photo_fields(season, category)
+
+    deferred = _defer_processing(defer_processing)
+    runtime_settings = await get_runtime_settings(db)
+    run_ai = enable_ai and runtime_settings.ai_enabled
+    image_workers = None if deferred else get_image_workers()
+    storage = get_storage()
+    semaphore = asyncio.Semaphore(max(settings.UPLOAD_BATCH_CONCURRENCY, 1))
+    shared = {"description": description, "season": season, "category": category, "campus": campus}
+
+    # Sessions are loaded up front: one AsyncSession cannot serve the parallel stage below
+    sessions = [await get_upload_session(db, session_id, str(current_user.id)) for session_id in session_ids]
+
+    db_lock = asyncio.Lock()
+    batch_hashes: dict[str, tuple[str, str]] = {}  # content hash -> (photo id, filename) of its first copy
+    completing: list[UploadSession] = []  # sessions marked completed, committed with the photo rows
+
+    async def batch_duplicate(content_hash: str, photo_uuid: str, filename: str) -> Optional[dict]:
+        """Item fields linking to an earlier copy in this batch or to an existing photo, if any."""
+        # The request session is shared by all items, so lookups take turns
+        async with db_lock:
+            first = batch_hashes.get(content_hash) if duplicate_policy() != DUPLICATE_ALLOW else None
+            if first is None:
+                batch_hashes[content_hash] = (photo_uuid, filename)
+            elif duplicate_policy() == DUPLICATE_REJECT:
+                raise ValueError(f"Duplicate of {first[1]} in this batch")
+            # A deferred first copy has no renditions to share yet (find_duplicate skips
+            # rows still processing for the same reason), so its copies are stored on their own
+            linked_to = first if not deferred else None
+            duplicate = await _check_duplicate(db, content_hash) if linked_to is None else None
+        if linked_to is not None:
+            # Linked to the first copy once the batch is stored, see _link_batch_duplicates
+            return {"linked_to": linked_to}
+        if duplicate is not None:
+            stored_media, processing_result = linked_media(duplicate)
+            return {
+                "stored_media": stored_media,
+                "processing_result": {**processing_result, "content_hash": content_hash},
+                "duplicate_of": duplicate,
+            }
+        return None
+
+    async def store_file(upload: UploadFile) -> dict:
+        if not (upload.content_type or "").startswith("image/"):
+            raise ValueError("File must be an image")
+        async with semaphore:
+            photo_uuid, staged_original_path, original_filename, content_hash = await stage_photo_upload(upload)
+            staged_thumb_path = None
+            try:
+                linked = await batch_duplicate(content_hash, photo_uuid, original_filename)
+                if linked is not None:
+                    return {
+                        "photo_uuid": photo_uuid,
+                        "filename": original_filename,
+                        "mime_type": upload.content_type,
+                        "fields": shared,
+                        **linked,
+                    }
+                processing_result = {"content_hash": content_hash}
+                if not deferred:
+                    processing_result.update(
+                        await image_workers.process_image(
+                            staged_original_path, photo_uuid, str(Path(staged_original_path).parent), wait=True
+                        )
+                    )
+                staged_thumb_path = processing_result.get("thumb_path")
+                stored_media = await storage.apersist_photo_files(
+                    photo_uuid, staged_original_path, staged_thumb_path, processing_result.get("renditions")
+                )
+            finally:
+                cleanup_staged_files(staged_original_path, staged_thumb_path)
+        return {
+            "photo_uuid": photo_uuid,
+            "filename": original_filename,
+            "mime_type": upload.content_type,
+            "stored_media": stored_media,
+            "processing_result": processing_result,
+            "fields": shared,
+        }
+
+    async def store_session(session: Optional[UploadSession]) -> dict:
+        if session is None:
+            raise LookupError("Upload session not found")
+        check_upload_complete(session)
+        async with semaphore:
+            await store_completed_upload(session)
+            completing.append(session)
+            content_hash, linked, processing_result, thumb_key, renditions = await _process_stored_original(
+                image_workers,
+                session.photo_id,
+                session.storage_key,
+                partial(batch_duplicate, photo_uuid=session.photo_id, filename=session.filename),
+                wait=True,
+            )
+        session_fields = session.upload_metadata or {}
+        item = {
+            "session_id": session.id,
+            "photo_uuid": session.photo_id,
+            "filename": session.filename,
+            "mime_type": session.mime_type,
+            "stored_media": PersistedMedia(
+                original_path=session.storage_key,
+                thumb_path=thumb_key,
+                file_size=session.total_size,
+                renditions=renditions,
+            ),
+            "processing_result": {**(processing_result or {}), "content_hash": content_hash},
+            "fields": {key: value if value is not None else session_fields.get(key) for key, value in shared.items()},
+        }
+        if linked:
+            # Reuses other media; the session's own copy is deleted once the batch is stored
+            item.update(linked, unused_original=session.storage_key)
+        return item
+
+    outcomes = await asyncio.gather(
+        *(store_file(upload) for upload in files),
+        *(store_session(session) for session in sessions),
+        return_exceptions=True,
+    )
+    outcomes = _link_batch_duplicates(outcomes)
+    failed_sessions = {
+        session_id for session_id, outcome in zip(session_ids, outcomes[len(files):]) if isinstance(outcome, BaseException)
+    }
+    for session in completing:
+        if session.id in failed_sessions:
+            # The bulk commit below must not close a failed session: it stays
+            # retryable, with its original in place
+            session.status = SESSION_ACTIVE
+    labels = [(upload.filename, None) for upload in files] + [(None, session_id) for session_id in session_ids]
+    results: list[BatchUploadItemResult] = []
+    stored_items: list[tuple[int, dict]] = []
+    for index, ((filename, session_id), outcome) in enumerate(zip(labels, outcomes)):
+        if isinstance(outcome, BaseException):
+            results.append(
+                BatchUploadItemResult(
+                    index=index,
+                    filename=filename,
+                    session_id=session_id,
+                    success=False,
+                    error=_batch_item_error(outcome),
+                )
+            )
+            continue
+        results.append(BatchUploadItemResult(index=index, filename=outcome["filename"], session_id=session_id, success=True))
+        stored_items.append((index, outcome))
+
+    processing_status = "processing" if deferred else ("pending" if run_ai else "manual")
+    photos: list[Photo] = []
+    if stored_items:
+        try:
+            photos = await photo_crud.create_photos(
+                db,
+                [
+                    _uploaded_photo_row(
+                        item["photo_uuid"],
+                        item["filename"],
+                        item["mime_type"],
+                        item["stored_media"],
+                        item["processing_result"],
+                        # Linked duplicates reuse finished media and skip AI
+                        processing_status="manual" if _is_linked(item) else processing_status,
+                        **item["fields"],
+                    )
+                    for _, item in stored_items
+                ],
+                str(current_user.id),
+            )
+        except Exception as exc:  # noqa: BLE001
+            # Sessions roll back to active, so their originals stay for a retry
+            await db.rollback()
+            await storage.adelete_files(
+                path
+                for _, item in stored_items
+                if not _is_linked(item)
+                for path in (
+                    None if item.get("session_id") else item["stored_media"].original_path,
+                    item["stored_media"].thumb_path,
+                    *(item["stored_media"].renditions or {}).values(),
+                )
+            )
+            for index, _ in stored_items:
+                results[index].success = False
+                results[index].error = f"Failed to save photo: {exc}"
+            stored_items = []
+
+    new_media: list[Photo] = []
+    created = {photo.id: photo for photo in photos}
+    for (index, item), photo in zip(stored_items, photos):
+        duplicate_of = item.get("duplicate_of") or created.get(item.get("linked_to", (None,))[0])
+        results[index].photo = _upload_response(photo, duplicate_of=duplicate_of)
+        if not _is_linked(item):
+            new_media.append(photo)
+    # Session uploads that turned out to be duplicates reuse other media
+    await storage.adelete_files(item.get("unused_original") for _, item in stored_items)
+
+    if new_media and deferred:
+        for photo in new_media:
+            dispatch_photo_pipeline(background_tasks, photo.id, enable_ai, str(current_user.id))
+    elif photos:
+        await ensure_default_taxonomy(db)
+        if run_ai and new_media:
+            tasks = await create_ai_analysis_tasks(
+                db,
+                new_media,
+                requested_by_id=current_user.id,
+                provider=runtime_settings.ai_provider,
+                model_id=runtime_settings.ai_model_id,
+            )
+            for task in tasks:
+                dispatch_ai_analysis_task(background_tasks, task.id)
+
+    succeeded = sum(1 for result in results if result.success)
+    return BatchUploadResponse(total=total, succeeded=succeeded, failed=total - succeeded, items=results)
+
+
 @router.get("", response_model=PhotoListResponse)
 async def list_photos(
-    skip: int = 0,
-    limit: int = 20,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1),
     status: Optional[str] = None,
     season: Optional[str] = None,
     category: Optional[str] = None,
@@ -371,14 +1600,16 @@ async def list_photos(
     photo_type: Optional[str] = None,
     search: Optional[str] = None,
     tag: Optional[str] = None,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_auditor_user),
 ):
     limit = min(limit, 100)
-    photos, total = await photo_crud.get_photos(
+    photos, total, next_cursor = await _photo_page(
         db,
+        limit,
         skip=skip,
-        limit=limit,
+        cursor=cursor,
         status=status,
         season=season,
         category=category,
@@ -392,29 +1623,32 @@ async def list_photos(
     )
     return PhotoListResponse(
         total=total,
-        page=skip // limit + 1 if limit > 0 else 1,
+        page=skip // limit + 1,
         page_size=limit,
         items=await serialize_photos(db, photos),
+        next_cursor=next_cursor,
     )
 
 
 @router.get("/my-submissions", response_model=PhotoListResponse)
 async def list_my_submissions(
-    skip: int = 0,
-    limit: int = 20,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1),
     status: Optional[str] = None,
     season: Optional[str] = None,
     category: Optional[str] = None,
     campus: Optional[str] = None,
     search: Optional[str] = None,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     limit = min(limit, 100)
-    photos, total = await photo_crud.get_photos(
+    photos, total, next_cursor = await _photo_page(
         db,
+        limit,
         skip=skip,
-        limit=limit,
+        cursor=cursor,
         status=status,
         season=season,
         category=category,
@@ -424,9 +1658,43 @@ async def list_my_submissions(
     )
     return PhotoListResponse(
         total=total,
-        page=skip // limit + 1 if limit > 0 else 1,
+        page=skip // limit + 1,
         page_size=limit,
         items=await serialize_photos(db, photos),
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/near-duplicates", response_model=NearDuplicateClusterListResponse)
+async def list_near_duplicate_clusters(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1),
+    max_distance: Optional[int] = Query(None, ge=0, le=MAX_QUERY_DISTANCE),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_auditor_user),
+):
+    """审核用：按感知哈希（dHash）聚类的近似重复照片组"""
+    limit = min(limit, 100)
+    max_distance = settings.SIMILARITY_MAX_DISTANCE if max_distance is None else max_distance
+    clusters = await get_similarity_index().clusters(db, max_distance)
+    page = clusters[skip:skip + limit]
+
+    photos_by_id = await photo_crud.get_live_photos_by_ids(db, [photo_id for cluster in page for photo_id in cluster])
+
+    # Members deleted since the index was last synced drop out here
+    members = [[photos_by_id[photo_id] for photo_id in cluster if photo_id in photos_by_id] for cluster in page]
+    members = [photos for photos in members if len(photos) > 1]
+    serialized = iter(await serialize_photos(db, [photo for photos in members for photo in photos]))
+    items = [
+        NearDuplicateCluster(size=len(photos), photos=list(itertools.islice(serialized, len(photos))))
+        for photos in members
+    ]
+    return NearDuplicateClusterListResponse(
+        total=len(clusters),
+        page=skip // limit + 1,
+        page_size=limit,
+        max_distance=max_distance,
+        clusters=items,
     )
 
 
@@ -444,6 +1712,45 @@ async def get_photo(
     return await serialize_photo(db, photo)
 
 
+@router.get("/{photo_id}/similar", response_model=SimilarPhotosResponse)
+async def list_similar_photos(
+    photo_id: str,
+    limit: int = Query(20, ge=1),
+    max_distance: Optional[int] = Query(None, ge=0, le=MAX_QUERY_DISTANCE),
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_current_user),
+    portrait_visibility: str = Depends(get_portrait_visibility),
+):
+    """感知哈希相近（缩放、重新压缩、重新导出）的照片，按距离排序
+
+    本进程内的上传、删除即时生效；其他 worker 的写入在下一次查询时按 updated_at 同步，
+    其他 worker 的硬删除在索引定期重建前由数据库查询过滤。
+    """
+    photo = await photo_crud.get_photo(db, photo_id)
+    if photo is None or photo.status == "deleted":
+        raise HTTPException(status_code=404, detail="Photo not found")
+    await _assert_photo_access(db, photo, current_user, portrait_visibility)
+
+    limit = min(limit, 100)
+    max_distance = settings.SIMILARITY_MAX_DISTANCE if max_distance is None else max_distance
+    matches = await get_similarity_index().similar(db, photo, max_distance)
+
+    distances = dict(matches)
+    candidates = await photo_crud.get_live_photos_by_ids(db, [match_id for match_id, _ in matches])
+    visible = await filter_visible_photos(
+        db,
+        [candidates[match_id] for match_id, _ in matches if match_id in candidates],
+        current_user,
+        portrait_visibility,
+    )
+    visible = visible[:limit]
+    items = [
+        SimilarPhotoItem(distance=distances[candidate.id], photo=serialized)
+        for candidate, serialized in zip(visible, await serialize_photos(db, visible))
+    ]
+    return SimilarPhotosResponse(photo_id=photo.id, max_distance=max_distance, items=items)
+
+
 @router.patch("/{photo_id}", response_model=PhotoResponse)
 async def update_photo(
     photo_id: str,
@@ -472,10 +1779,7 @@ async def delete_photo(
         raise HTTPException(status_code=404, detail="Photo not found")
     if photo.uploader_id != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to delete this photo")
-    storage = get_storage()
-    storage.delete_file(photo.original_path)
-    storage.delete_file(photo.thumb_path)
-    storage.delete_file(photo.processed_path)
+    await get_storage().adelete_files(await deletable_media_paths(db, photo, _photo_media_paths(photo)))
     # Log BEFORE delete — photo_crud.delete_photo internally calls db.commit()
     # which also commits the flushed audit log
     await log_audit(db, user_id=current_user.id, action="photo.delete",
@@ -589,9 +1893,7 @@ async def batch_delete_photos(
     for photo_id in photo_ids:
         photo = await photo_crud.get_photo(db, photo_id)
         if photo:
-            storage.delete_file(photo.original_path)
-            storage.delete_file(photo.thumb_path)
-            storage.delete_file(photo.processed_path)
+            await storage.adelete_files(await deletable_media_paths(db, photo, _photo_media_paths(photo)))
             await photo_crud.delete_photo(db, photo)
             deleted_count += 1
     await log_audit(db, user_id=current_user.id, action="photo.batch_delete",
@@ -5,11 +5,16 @@ from typing import Any, List
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import func, desc, select
+from sqlalchemy import func, desc, select, update
 from app.core import deps
 from app.models.photo import Photo
 from app.models.tag import Tag, PhotoTag
 from app.models.user import User
+from app.services.facet_index import get_photo_facet_index
+from app.services.image_workers import get_image_workers
+from app.services.search_index import get_photo_search_index
+from app.services.storage import get_storage
+from app.services.transforms import get_image_transformer
 
 router = APIRouter()
 
@@ -62,11 +67,16 @@ async def increment_view(
     if not _should_count_view(client_ip, photo_id):
         return {"message": "View count not incremented (cooldown)", "views": photo.views or 0}
 
-    # 使用 coalesce 处理可能的 None 值
-    current_views = photo.views if photo.views is not None else 0
-    photo.views = current_views + 1
+    # 原子自增（coalesce 处理可能的 None 值）；显式保留 updated_at，浏览计数不算照片修改
+    await db.execute(
+        update(Photo)
+        .where(Photo.id == photo_id)
+        .values(views=func.coalesce(Photo.views, 0) + 1, updated_at=Photo.updated_at)
+        .execution_options(synchronize_session=False)
+    )
     await db.commit()
-    return {"message": "View count incremented", "views": photo.views}
+    views = (await db.execute(select(Photo.views).where(Photo.id == photo_id))).scalar_one()
+    return {"message": "View count incremented", "views": views}
 
 @router.get("/dashboard")
 async def get_dashboard_stats(
@@ -136,3 +146,53 @@ async def get_dashboard_stats(
             "thumb_path": p.thumb_path
         } for p in top_photos]
     }
+
+
+@router.get("/storage")
+async def get_storage_metrics(
+    current_user: User = Depends(deps.get_current_admin_user),
+):
+    """
+    Storage backend connection-pool metrics (admin only)
+    """
+    return get_storage().metrics()
+
+
+@router.get("/image-workers")
+async def get_image_worker_metrics(
+    current_user: User = Depends(deps.get_current_admin_user),
+):
+    """
+    Upload image-processing pool load and per-job timings (admin only)
+    """
+    return get_image_workers().metrics()
+
+
+@router.get("/image-transforms")
+async def get_image_transform_metrics(
+    current_user: User = Depends(deps.get_current_admin_user),
+):
+    """
+    Derived-image cache usage, renders and coalesced requests (admin only)
+    """
+    return get_image_transformer().metrics()
+
+
+@router.get("/search-index")
+async def get_search_index_metrics(
+    current_user: User = Depends(deps.get_current_admin_user),
+):
+    """
+    In-process photo search index size, postings and sync counters (admin only)
+    """
+    return get_photo_search_index().metrics()
+
+
+@router.get("/facet-index")
+async def get_facet_index_metrics(
+    current_user: User = Depends(deps.get_current_admin_user),
+):
+    """
+    In-process facet bitmap index size, refreshes and rebuilds (admin only)
+    """
+    return get_photo_facet_index().metrics()
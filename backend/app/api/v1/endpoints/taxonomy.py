@@ -6,6 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import get_settings
 from app.core.deps import get_current_auditor_user, get_db
 from app.models.photo import Photo
 from app.models.taxonomy import PhotoClassification, TaxonomyFacet, TaxonomyNode
@@ -18,6 +19,7 @@ from app.schemas.taxonomy import (
     TaxonomyNodeResponse,
     TaxonomyNodeUpdate,
 )
+from app.services.facet_index import get_photo_facet_index
 from app.services.taxonomy import (
     build_node_tree,
     ensure_default_taxonomy,
@@ -28,6 +30,7 @@ from app.services.taxonomy import (
 )
 
 router = APIRouter()
+settings = get_settings()
 
 
 class TaxonomyFacetInsight(BaseModel):
@@ -59,6 +62,48 @@ def _serialize_facet(facet: TaxonomyFacet) -> TaxonomyFacetResponse:
     return TaxonomyFacetResponse.model_validate(facet)
 
 
+async def _facet_counts(db: AsyncSession) -> list[tuple[str, str, str, int]]:
+    """(facet key, facet name, node name, photos) for every used node name, most used first per facet."""
+    if not settings.FACET_INDEX_ENABLED:
+        result = await db.execute(
+            select(
+                TaxonomyFacet.key,
+                TaxonomyFacet.name,
+                TaxonomyNode.name,
+                func.count(Photo.id),
+            )
+            .join(TaxonomyNode, TaxonomyNode.facet_id == TaxonomyFacet.id)
+            .join(TaxonomyNode.photo_classifications)
+            .join(Photo)
+            .group_by(TaxonomyFacet.key, TaxonomyFacet.name, TaxonomyNode.name)
+            .order_by(TaxonomyFacet.sort_order.asc(), func.count(Photo.id).desc(), TaxonomyNode.sort_order.asc())
+        )
+        return [tuple(row) for row in result.all()]
+
+    node_counts = await get_photo_facet_index().node_counts(db)
+    nodes = await db.execute(
+        select(
+            TaxonomyNode.id,
+            TaxonomyFacet.key,
+            TaxonomyFacet.name,
+            TaxonomyNode.name,
+            TaxonomyFacet.sort_order,
+            TaxonomyNode.sort_order,
+        ).join(TaxonomyFacet, TaxonomyFacet.id == TaxonomyNode.facet_id)
+    )
+    # Same grouping as the SQL path: nodes sharing a name within a facet are counted together
+    groups: dict[tuple[str, str, str], list[int]] = {}
+    for node_id, facet_key, facet_name, node_name, facet_order, node_order in nodes.all():
+        count = node_counts.get(node_id, 0)
+        if not count:
+            continue
+        group = groups.setdefault((facet_key, facet_name, node_name), [facet_order, node_order, 0])
+        group[1] = min(group[1], node_order)
+        group[2] += count
+    ordered = sorted(groups.items(), key=lambda item: (item[1][0], item[0][0], -item[1][2], item[1][1]))
+    return [(facet_key, facet_name, node_name, count) for (facet_key, facet_name, node_name), (_, _, count) in ordered]
+
+
 @router.get("/public", response_model=list[TaxonomyFacetResponse])
 async def list_public_taxonomy(
     db: AsyncSession = Depends(get_db),
@@ -88,19 +133,7 @@ async def get_taxonomy_insights(
     await ensure_default_taxonomy(db)
     await db.commit()
 
-    facet_count_rows = await db.execute(
-        select(
-            TaxonomyFacet.key,
-            TaxonomyFacet.name,
-            TaxonomyNode.name,
-            func.count(Photo.id),
-        )
-        .join(TaxonomyNode, TaxonomyNode.facet_id == TaxonomyFacet.id)
-        .join(TaxonomyNode.photo_classifications)
-        .join(Photo)
-        .group_by(TaxonomyFacet.key, TaxonomyFacet.name, TaxonomyNode.name)
-        .order_by(TaxonomyFacet.sort_order.asc(), func.count(Photo.id).desc(), TaxonomyNode.sort_order.asc())
-    )
+    facet_count_rows = await _facet_counts(db)
 
     unclassified_exists = (
         select(PhotoClassification.id)
@@ -132,7 +165,7 @@ async def get_taxonomy_insights(
                 node_name=node_name,
                 count=count,
             )
-            for facet_key, facet_name, node_name, count in facet_count_rows.all()
+            for facet_key, facet_name, node_name, count in facet_count_rows
         ],
     )
 
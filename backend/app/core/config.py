@@ -1,7 +1,7 @@
 """
 应用配置管理模块
 """
-from typing import Literal
+from typing import Any, Literal
 from functools import lru_cache
 
 from pydantic import Field
@@ -28,6 +28,9 @@ class Settings(BaseSettings):
     # 文件存储配置
     STORAGE_BACKEND: Literal["local", "s3"] = "local"
     UPLOAD_DIR: str = "./uploads"
+    # 本地存储媒体下发：none 由 Python 读文件；x-accel / x-sendfile 校验权限后交给 nginx / Apache 发送
+    LOCAL_MEDIA_OFFLOAD: Literal["none", "x-accel", "x-sendfile"] = "none"
+    LOCAL_MEDIA_ACCEL_PREFIX: str = "/_protected_media/"  # nginx internal location，对应 UPLOAD_DIR
     MAX_UPLOAD_SIZE: int = 20971520  # 20MB
     S3_ENDPOINT: str | None = None
     S3_BUCKET: str | None = None
@@ -36,6 +39,94 @@ class Settings(BaseSettings):
     S3_REGION: str | None = None
     S3_USE_SSL: bool = False
     S3_PRESIGN_EXPIRE_SECONDS: int = 600
+    # proxy: 由 API 进程转发字节；redirect: 校验权限后 307 跳转到预签名 URL
+    S3_MEDIA_DELIVERY: Literal["proxy", "redirect"] = "proxy"
+    S3_PRESIGN_ENDPOINT: str | None = None  # 浏览器可访问的 MinIO 地址，未设置时使用 S3_ENDPOINT
+    S3_PRESIGN_CACHE_SIZE: int = 4096
+    # boto3 连接池：单例 client 在所有请求/任务间共享
+    S3_MAX_POOL_CONNECTIONS: int = 32
+    S3_TCP_KEEPALIVE: bool = True
+    S3_CONNECT_TIMEOUT: float = 5.0
+    S3_READ_TIMEOUT: float = 60.0
+    S3_MULTIPART_PART_SIZE: int = 8 * 1024 * 1024  # 流式上传分片大小（S3 下限 5MB）
+    # S3 读穿透本地磁盘缓存：前缀命中的对象（缩略图、派生图）首次读取后落盘，同机 worker 共享，按 LRU 淘汰；0 关闭
+    S3_MEDIA_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    S3_MEDIA_CACHE_DIR: str = ""  # 空则使用系统临时目录
+    S3_MEDIA_CACHE_PREFIXES: list[str] = ["thumbnails/", "derived/"]
+    # VPN 下 MinIO 写操作被防火墙拦截，回退为 SSH + mc；所有命令复用一条 ControlMaster 连接
+    SSH_WRITE_HOST: str = "121.195.148.85"
+    SSH_WRITE_USER: str | None = "yanp"
+    SSH_MAX_CONCURRENCY: int = 4  # 不应超过服务端 sshd MaxSessions（默认 10）
+    SSH_CONTROL_PERSIST: int = 600
+    SSH_PUT_TIMEOUT: float = 120.0
+    SSH_RM_TIMEOUT: float = 30.0
+
+    # 多尺寸缩略图配置（按宽度生成，上传时一次性产出）
+    IMAGE_RENDITION_SIZES: list[int] = [160, 400, 800, 1600]
+    IMAGE_RENDITION_QUALITY: int = 85
+    IMAGE_THUMBNAIL_SIZE: int = 800  # thumb_path / image/thumbnail 对应的档位
+    # 上传图片处理进程池：0 表示在单个后台线程中处理（开发/测试）
+    IMAGE_PROCESS_WORKERS: int = 2
+    IMAGE_PROCESS_QUEUE_SIZE: int = 8  # 超出 workers + queue 的任务直接 503
+    IMAGE_PROCESS_RETRY_AFTER: int = 5
+    # 快速受理：上传只保存原图并返回 202，缩略图/EXIF/AI 由后台流水线完成（processing_status 跟踪进度）
+    UPLOAD_DEFER_PROCESSING: bool = False
+    # 与已有照片内容（SHA-256）完全相同的上传：reject 返回 409；link 新建记录并复用已有原图/缩略图；allow 照常处理
+    UPLOAD_DUPLICATE_POLICY: Literal["reject", "link", "allow"] = "reject"
+    # 近似重复（dHash 汉明距离）：默认阈值，以及进程内索引全量重建的间隔（秒）；
+    # 两次重建之间按会话提交与 updated_at 增量同步，重建只为清掉其他 worker 硬删除的照片
+    SIMILARITY_MAX_DISTANCE: int = 6
+    SIMILARITY_INDEX_REFRESH_SECONDS: int = 300
+    # 进程内搜索倒排索引（字符 bigram + 分类词典分词）：每次搜索前按 updated_at 同步其他进程的写入；
+    # SYNC_SECONDS 为删除与词典变化的检查间隔，REBUILD_SECONDS 为全量重建（压缩墓碑）间隔（秒）；
+    # 命中照片数超过上限时改用数据库索引过滤，避免超长 IN 列表
+    SEARCH_INDEX_ENABLED: bool = True
+    SEARCH_INDEX_SYNC_SECONDS: int = 30
+    SEARCH_INDEX_REBUILD_SECONDS: int = 1800
+    SEARCH_INDEX_MAX_CANDIDATES: int = 5000
+    # 进程内分类位图索引（状态 / 分类 / 分类节点 -> 照片位图）：列表筛选与计数走位图运算；
+    # 每次查询前按 updated_at 同步其他进程的写入；其他进程的硬删除靠行数比对发现（COUNT 扫表，
+    # 按间隔秒数检查）；全量重建间隔（秒）只用于压缩；筛选结果超过上限时改用数据库子查询
+    FACET_INDEX_ENABLED: bool = True
+    FACET_INDEX_DELETE_CHECK_SECONDS: int = 30
+    FACET_INDEX_REBUILD_SECONDS: int = 1800
+    FACET_INDEX_MAX_CANDIDATES: int = 5000
+    # 可续传分块上传（tus 风格）：单文件上限、建议/最大分块、会话有效期与过期清理间隔（秒，0 关闭）
+    UPLOAD_SESSION_MAX_SIZE: int = 200 * 1024 * 1024
+    UPLOAD_SESSION_CHUNK_SIZE: int = 8 * 1024 * 1024
+    UPLOAD_SESSION_MAX_CHUNK_SIZE: int = 16 * 1024 * 1024
+    UPLOAD_SESSION_TTL_HOURS: int = 24
+    UPLOAD_SESSION_CLEANUP_INTERVAL: int = 3600
+    # 批量上传：单次最多文件/会话数，及并行处理（暂存、缩略图、写存储）的并发度
+    UPLOAD_BATCH_MAX_ITEMS: int = 300
+    UPLOAD_BATCH_CONCURRENCY: int = 4
+
+    # 批量打包下载（流式 ZIP）：单次最多照片数；预取对象数与每个对象的缓冲分块数（每块 256KB），决定内存上限
+    DOWNLOAD_ARCHIVE_MAX_PHOTOS: int = 2000
+    DOWNLOAD_ARCHIVE_PREFETCH: int = 4
+    DOWNLOAD_ARCHIVE_BUFFER_CHUNKS: int = 8
+
+    # 按需裁剪/转码（/photos/{id}/image/transform）：只允许白名单预设，fit 为 inside（等比缩放）或 cover（填满后居中裁剪）
+    IMAGE_TRANSFORM_PRESETS: dict[str, dict[str, Any]] = Field(default_factory=lambda: {
+        "card": {"width": 600, "height": 400, "fit": "cover", "format": "webp", "quality": 80},
+        "square": {"width": 320, "height": 320, "fit": "cover", "format": "webp", "quality": 80},
+        "og": {"width": 1200, "height": 630, "fit": "cover", "format": "jpeg", "quality": 85},
+        "hero": {"width": 1920, "height": 800, "fit": "cover", "format": "jpeg", "quality": 82},
+        "preview": {"width": 1200, "fit": "inside", "format": "webp", "quality": 80},
+    })
+    # 派生图本地磁盘缓存（按字节数上限 LRU 淘汰）；目录为空时使用系统临时目录
+    IMAGE_TRANSFORM_CACHE_DIR: str = ""
+    IMAGE_TRANSFORM_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    # 热门预设额外写入存储后端（derived/ 前缀），缓存被淘汰或新实例启动时无需重新计算
+    IMAGE_TRANSFORM_PERSIST_PRESETS: list[str] = ["card"]
+
+    # 媒体响应缓存策略（秒），0 表示每次都需向服务端校验
+    MEDIA_CACHE_MAX_AGE: dict[str, int] = Field(default_factory=lambda: {
+        "thumbnail": 604800,
+        "rendition": 604800,
+        "original": 86400,
+        "download": 0,
+    })
     
     # 安全配置
     SECRET_KEY: str = DEFAULT_SECRET_KEY
@@ -1,9 +1,10 @@
 """
 收藏 CRUD 操作
 """
-from typing import List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, delete
+from app.crud.pagination import decode_cursor, keyset_after, keyset_order, next_cursor
 from app.models.favorite import Favorite
 from app.models.photo import Photo
 
@@ -49,26 +50,33 @@ async def get_user_favorites(
     user_id: str,
     skip: int = 0,
     limit: int = 20,
-) -> Tuple[List[str], int]:
+    cursor: Optional[str] = None,
+) -> Tuple[List[str], int, Optional[str]]:
     """
-    获取用户收藏的照片 ID 列表
+    获取用户收藏的照片 ID 列表（最近收藏在前）
+
+    传入 cursor 时按游标（收藏时间 + 收藏 id）续页，忽略 skip；
+    返回 (photo_ids, total, next_cursor)，最后一页 next_cursor 为 None。
+    游标无效时抛出 InvalidCursor。
     """
-    query = (
-        select(Favorite.photo_id)
-        .filter(Favorite.user_id == user_id)
-        .order_by(Favorite.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-    )
+    query = select(Favorite.photo_id, Favorite.created_at, Favorite.id).filter(Favorite.user_id == user_id)
+    if cursor:
+        after = decode_cursor(cursor, "created_at", "desc", Favorite.created_at)
+        query = query.where(keyset_after(Favorite.created_at, Favorite.id, True, after))
+    else:
+        query = query.offset(skip)
+    query = query.order_by(*keyset_order(Favorite.created_at, Favorite.id, True)).limit(limit + 1)
     count_query = select(func.count(Favorite.id)).filter(Favorite.user_id == user_id)
 
     result = await db.execute(query)
-    photo_ids = [row[0] for row in result.all()]
+    rows = result.all()
+    photo_ids = [row.photo_id for row in rows[:limit]]
 
     count_result = await db.execute(count_query)
     total = count_result.scalar() or 0
 
-    return photo_ids, total
+    following = next_cursor(rows, limit, "created_at", "desc", lambda row: row.created_at, lambda row: row.id)
+    return photo_ids, total, following
 
 
 async def get_photo_favorite_count(db: AsyncSession, photo_id: str) -> int:
@@ -77,3 +85,17 @@ async def get_photo_favorite_count(db: AsyncSession, photo_id: str) -> int:
         select(func.count(Favorite.id)).filter(Favorite.photo_id == photo_id)
     )
     return result.scalar() or 0
+
+
+async def get_favorite_counts(db: AsyncSession, photo_ids: Iterable[str]) -> Dict[str, int]:
+    """批量获取照片收藏数（一次查询），没有收藏的照片为 0"""
+    counts = {photo_id: 0 for photo_id in photo_ids}
+    if not counts:
+        return counts
+    result = await db.execute(
+        select(Favorite.photo_id, func.count(Favorite.id))
+        .filter(Favorite.photo_id.in_(list(counts)))
+        .group_by(Favorite.photo_id)
+    )
+    counts.update({photo_id: count for photo_id, count in result.all()})
+    return counts
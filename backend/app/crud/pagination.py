@@ -0,0 +1,84 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor is the sort key of the last row on a page plus its id as a
+tiebreaker, base64url-encoded so clients treat it as opaque. The next page is
+``WHERE (sort_key, id) < (last_key, last_id)`` (``>`` when ascending) on an
+index that matches the ORDER BY, so every page costs the same as the first
+instead of scanning and discarding ``skip`` rows.
+
+Sort keys must never be NULL: ``OR key IS NULL`` and ``NULLS LAST`` keep
+an index from serving the seek. Nullable columns are sorted through a
+``coalesce`` expression instead, with a matching expression index (see
+crud.photo.SORT_KEYS).
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional
+
+from sqlalchemy import DateTime, and_, or_
+from sqlalchemy.sql.elements import ColumnElement
+
+
+class InvalidCursor(ValueError):
+    """The cursor is malformed or was issued for a different sort order."""
+
+
+@dataclass
+class PageCursor:
+    sort_by: str
+    sort_order: str
+    value: Any
+    id: str
+
+
+def _dump(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def encode_cursor(sort_by: str, sort_order: str, value: Any, row_id: str) -> str:
+    payload = json.dumps([sort_by, sort_order, _dump(value), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, sort_by: str, sort_order: str, column) -> PageCursor:
+    """Parse ``token`` for a listing sorted by ``column``; raises InvalidCursor."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        cursor_sort_by, cursor_order, value, row_id = json.loads(raw)
+        if value is not None and isinstance(column.type, DateTime):
+            value = datetime.fromisoformat(value)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+    if value is None:
+        raise InvalidCursor("Invalid cursor")
+    if (cursor_sort_by, cursor_order) != (sort_by, sort_order) or not isinstance(row_id, str):
+        raise InvalidCursor("Cursor does not match the requested sort order")
+    return PageCursor(sort_by, sort_order, value, row_id)
+
+
+def keyset_order(column, id_column, descending: bool) -> List[ColumnElement]:
+    """ORDER BY for keyset pages: sort key (never NULL), then id in the same direction."""
+    if descending:
+        return [column.desc(), id_column.desc()]
+    return [column.asc(), id_column.asc()]
+
+
+def keyset_after(column, id_column, descending: bool, cursor: PageCursor) -> ColumnElement:
+    """Rows that come after ``cursor`` in :func:`keyset_order`."""
+    id_after = id_column < cursor.id if descending else id_column > cursor.id
+    key_after = column < cursor.value if descending else column > cursor.value
+    return or_(key_after, and_(column == cursor.value, id_after))
+
+
+def next_cursor(rows: list, limit: int, sort_by: str, sort_order: str, value_of, id_of) -> Optional[str]:
+    """Cursor for the page after ``rows`` (fetched with ``limit + 1``), None on the last page."""
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(sort_by, sort_order, value_of(last), id_of(last))
@@ -3,20 +3,39 @@ CRUD operations for photos.
 """
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, List, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
 
-from sqlalchemy import and_, func, or_, select
+from sqlalchemy import and_, column, func, inspect, literal_column, or_, select, table
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
+from app.core.config import get_settings
+from app.crud.pagination import decode_cursor, keyset_after, keyset_order, next_cursor
 from app.models.photo import Photo
+from app.models.search_document import FTS_TABLE, PhotoSearchDocument
 from app.models.tag import PhotoTag, Tag
-from app.models.taxonomy import PhotoClassification, TaxonomyAlias, TaxonomyFacet, TaxonomyNode
+from app.models.taxonomy import PhotoClassification, TaxonomyFacet, TaxonomyNode
 from app.schemas.photo import PhotoUpdate
+from app.services.facet_index import get_photo_facet_index
+from app.services.search_index import get_photo_search_index
 
 if TYPE_CHECKING:
     from app.services.search_interpreter import SearchInterpretation
 
+settings = get_settings()
+
+# Listing sort keys: SQL expression (never NULL, matching the ix_photos_status_*_id indexes)
+# and the same value computed from a loaded photo for the next cursor
+SORT_KEYS = {
+    "created_at": (Photo.created_at, lambda photo: photo.created_at),
+    # Photos approved before published_at existed sort by their upload time
+    "published_at": (func.coalesce(Photo.published_at, Photo.created_at),
+                     lambda photo: photo.published_at or photo.created_at),
+    # Inline 0: a bound parameter would not match the index expression
+    "views": (func.coalesce(Photo.views, literal_column("0")), lambda photo: photo.views or 0),
+}
+
 
 def _photo_with_relations():
     return (
@@ -38,6 +57,18 @@ async def create_photo(
     return photo
 
 
+async def create_photos(
+    db: AsyncSession,
+    photos_data: List[dict],
+    uploader_id: str,
+) -> List[Photo]:
+    """Insert several photos in one transaction (batch upload)."""
+    photos = [Photo(uploader_id=uploader_id, **photo_data) for photo_data in photos_data]
+    db.add_all(photos)
+    await db.commit()
+    return photos
+
+
 async def get_photo(db: AsyncSession, photo_id: str) -> Optional[Photo]:
     result = await db.execute(select(Photo).where(Photo.id == photo_id))
     return result.scalar_one_or_none()
@@ -52,6 +83,18 @@ async def get_photo_with_tags(db: AsyncSession, photo_id: str) -> Optional[Photo
     return result.scalar_one_or_none()
 
 
+async def get_live_photos_by_ids(db: AsyncSession, photo_ids: List[str]) -> dict[str, Photo]:
+    """Non-deleted photos (with tags and classifications) keyed by id."""
+    if not photo_ids:
+        return {}
+    result = await db.execute(
+        select(Photo)
+        .options(*_photo_with_relations())
+        .where(Photo.id.in_(photo_ids), Photo.status != "deleted")
+    )
+    return {photo.id: photo for photo in result.scalars().all()}
+
+
 async def get_photos(
     db: AsyncSession,
     skip: int = 0,
@@ -71,7 +114,18 @@ async def get_photos(
     gallery_year: Optional[str] = None,
     photo_type: Optional[str] = None,
     interpretation: Optional["SearchInterpretation"] = None,
+    cursor: Optional[str] = None,
 ) -> tuple[List[Photo], int]:
+    """Filtered, sorted page of photos and the total match count.
+
+    With ``cursor`` (from :func:`next_photo_cursor`) the page starts after
+    that row instead of at ``skip``. Raises InvalidCursor for a bad cursor.
+    """
+    sort_column = SORT_KEYS.get(sort_by, SORT_KEYS["created_at"])[0]
+    descending = sort_order != "asc"
+    after = decode_cursor(cursor, sort_by, sort_order, sort_column) if cursor else None
+    dialect = db.get_bind().dialect.name
+
     query = select(Photo)
     count_query = select(func.count(Photo.id.distinct()))
 
@@ -83,49 +137,19 @@ async def get_photos(
         query = query.where(Photo.status == status)
         count_query = count_query.where(Photo.status == status)
 
-    if season:
-        season_subquery = (
-            select(PhotoClassification.photo_id)
-            .join(TaxonomyFacet, TaxonomyFacet.id == PhotoClassification.facet_id)
-            .join(TaxonomyNode, TaxonomyNode.id == PhotoClassification.node_id)
-            .where(
-                TaxonomyFacet.key == "season",
-                TaxonomyNode.name == season,
-            )
-        )
-        query = query.where(Photo.id.in_(season_subquery))
-        count_query = count_query.where(Photo.id.in_(season_subquery))
-
     if category:
         query = query.where(Photo.category == category)
         count_query = count_query.where(Photo.category == category)
 
-    if campus:
-        campus_subquery = (
-            select(PhotoClassification.photo_id)
-            .join(TaxonomyFacet, TaxonomyFacet.id == PhotoClassification.facet_id)
-            .join(TaxonomyNode, TaxonomyNode.id == PhotoClassification.node_id)
-            .where(
-                TaxonomyFacet.key == "campus",
-                TaxonomyNode.name == campus,
-            )
-        )
-        query = query.where(Photo.id.in_(campus_subquery))
-        count_query = count_query.where(Photo.id.in_(campus_subquery))
-
     if exclude_categories:
         for exc_cat in exclude_categories:
             query = query.where(Photo.category != exc_cat)
             count_query = count_query.where(Photo.category != exc_cat)
 
     if tag:
-        tag_subquery = (
-            select(PhotoTag.photo_id)
-            .join(Tag)
-            .where(Tag.name.ilike(f"%{tag.lower()}%"))
-        )
-        query = query.where(Photo.id.in_(tag_subquery))
-        count_query = count_query.where(Photo.id.in_(tag_subquery))
+        tag_filter = _search_document_match(dialect, tag.lower(), "tag_names")
+        query = query.where(tag_filter)
+        count_query = count_query.where(tag_filter)
 
     has_interpretation = interpretation and (interpretation.facet_filters or interpretation.keywords)
 
@@ -135,7 +159,7 @@ async def get_photos(
 
     keyword_text_filter = None
     if has_interpretation and interpretation.keywords and not search:
-        keyword_text_filter = _build_keyword_filter(interpretation.keywords)
+        keyword_text_filter = await _build_keyword_filter(db, interpretation.keywords, dialect)
 
     interp_filter = None
     if facet_classification_filter is not None and keyword_text_filter is not None:
@@ -145,7 +169,7 @@ async def get_photos(
     elif keyword_text_filter is not None:
         interp_filter = keyword_text_filter
 
-    text_filter = _build_text_search_filter(search) if search else None
+    text_filter = await _build_text_search_filter(db, search, dialect) if search else None
 
     if interp_filter is not None and text_filter is not None:
         combined = or_(interp_filter, text_filter)
@@ -162,45 +186,66 @@ async def get_photos(
     if has_interpretation and interpretation.facet_filters:
         interpreted_facet_keys = set(interpretation.facet_filters.keys())
 
-    facet_filters = {
-        "landmark": building,
-        "gallery_series": gallery_series,
-        "gallery_year": gallery_year,
-        "photo_type": photo_type,
-    }
-    for facet_key, facet_value in facet_filters.items():
-        if not facet_value:
-            continue
-        if facet_key in interpreted_facet_keys:
-            continue
-        normalized_key = facet_value.lower().replace(" ", "-")
-        classification_subquery = (
-            select(PhotoClassification.photo_id)
-            .join(TaxonomyFacet, TaxonomyFacet.id == PhotoClassification.facet_id)
-            .join(TaxonomyNode, TaxonomyNode.id == PhotoClassification.node_id)
-            .where(
-                TaxonomyFacet.key == facet_key,
-                or_(
-                    TaxonomyNode.name == facet_value,
-                    TaxonomyNode.key == normalized_key,
-                ),
-            )
+    # (facet key, value, also match the node key); season / campus only match by name
+    facet_values = [("season", season, False), ("campus", campus, False)] + [
+        (facet_key, facet_value, True)
+        for facet_key, facet_value in {
+            "landmark": building,
+            "gallery_series": gallery_series,
+            "gallery_year": gallery_year,
+            "photo_type": photo_type,
+        }.items()
+        if facet_key not in interpreted_facet_keys
+    ]
+    facet_values = [(facet_key, value, match_key) for facet_key, value, match_key in facet_values if value]
+
+    # Status, category and classification filters from the in-process bitmap index
+    indexed = None
+    if settings.FACET_INDEX_ENABLED:
+        facet_index = get_photo_facet_index()
+        indexed = await facet_index.select(
+            db,
+            status=status,
+            category=category,
+            exclude_categories=exclude_categories or (),
+            facets=facet_values,
         )
-        query = query.where(Photo.id.in_(classification_subquery))
-        count_query = count_query.where(Photo.id.in_(classification_subquery))
-
-    total_result = await db.execute(count_query)
-    total = total_result.scalar_one()
 
-    sort_column = getattr(Photo, sort_by, Photo.created_at)
-    query = query.order_by(sort_column.asc() if sort_order == "asc" else sort_column.desc())
-    query = query.offset(skip).limit(limit)
+    if facet_values:
+        if indexed is not None and indexed.bit_count() <= settings.FACET_INDEX_MAX_CANDIDATES:
+            facet_filters = [Photo.id.in_(facet_index.ids(indexed))]
+        else:
+            facet_filters = [_facet_value_filter(*facet_value) for facet_value in facet_values]
+        query = query.where(*facet_filters)
+        count_query = count_query.where(*facet_filters)
+
+    if indexed is not None and not uploader_id and not tag and interp_filter is None and text_filter is None:
+        total = indexed.bit_count()
+    else:
+        total_result = await db.execute(count_query)
+        total = total_result.scalar_one()
+
+    if after is not None:
+        query = query.where(keyset_after(sort_column, Photo.id, descending, after))
+    else:
+        query = query.offset(skip)
+    query = query.order_by(*keyset_order(sort_column, Photo.id, descending)).limit(limit)
 
     result = await db.execute(query.options(*_photo_with_relations()))
     photos = result.scalars().all()
     return list(photos), total
 
 
+def next_photo_cursor(
+    photos: List[Photo],
+    limit: int,
+    sort_by: str = "created_at",
+    sort_order: str = "desc",
+) -> Optional[str]:
+    """Cursor after a page fetched with ``limit + 1``; None when it was the last page."""
+    return next_cursor(photos, limit, sort_by, sort_order, SORT_KEYS[sort_by][1], lambda photo: photo.id)
+
+
 async def update_photo(
     db: AsyncSession,
     photo: Photo,
@@ -264,6 +309,65 @@ async def get_photo_tags(db: AsyncSession, photo_id: str) -> List[Tag]:
     return list(result.scalars().all())
 
 
+async def get_tag_names_for_photos(db: AsyncSession, photo_ids: Iterable[str]) -> Dict[str, List[str]]:
+    """Tag names of several photos in one query, keyed by photo id."""
+    names: Dict[str, List[str]] = {photo_id: [] for photo_id in photo_ids}
+    if not names:
+        return names
+    result = await db.execute(
+        select(PhotoTag.photo_id, Tag.name)
+        .join(Tag, Tag.id == PhotoTag.tag_id)
+        .where(PhotoTag.photo_id.in_(list(names)))
+    )
+    for photo_id, name in result.all():
+        names[photo_id].append(name)
+    return names
+
+
+async def load_photo_relations(db: AsyncSession, photos: List[Photo]) -> None:
+    """Make ``serialize_classifications`` safe for ``photos`` without per-photo lazy loads.
+
+    Photos fetched without :func:`_photo_with_relations` get their classifications in
+    one query; taxonomy node ancestors (for the node path) are then loaded one query
+    per tree level rather than one per node.
+    """
+    missing = [photo.id for photo in photos if "classifications" in inspect(photo).unloaded]
+    if missing:
+        await db.execute(select(Photo).where(Photo.id.in_(missing)).options(*_photo_with_relations()))
+
+    pending = {
+        classification.node
+        for photo in photos
+        for classification in photo.classifications
+        if classification.node is not None
+    }
+    pending = {node for node in pending if node.parent_id is not None and "parent" in inspect(node).unloaded}
+    while pending:
+        result = await db.execute(
+            select(TaxonomyNode).where(TaxonomyNode.id.in_({node.parent_id for node in pending}))
+        )
+        parents = {node.id: node for node in result.scalars().all()}
+        for node in pending:
+            set_committed_value(node, "parent", parents.get(node.parent_id))
+        pending = {
+            node for node in parents.values()
+            if node.parent_id is not None and "parent" in inspect(node).unloaded
+        }
+
+
+def _facet_value_filter(facet_key: str, value: str, match_key: bool):
+    node_match = TaxonomyNode.name == value
+    if match_key:
+        node_match = or_(node_match, TaxonomyNode.key == value.lower().replace(" ", "-"))
+    classification_subquery = (
+        select(PhotoClassification.photo_id)
+        .join(TaxonomyFacet, TaxonomyFacet.id == PhotoClassification.facet_id)
+        .join(TaxonomyNode, TaxonomyNode.id == PhotoClassification.node_id)
+        .where(TaxonomyFacet.key == facet_key, node_match)
+    )
+    return Photo.id.in_(classification_subquery)
+
+
 def _build_facet_classification_filter(interpretation: "SearchInterpretation"):
     facet_subqueries = []
     for facet_key, node_name in interpretation.facet_filters.items():
@@ -287,62 +391,46 @@ def _build_facet_classification_filter(interpretation: "SearchInterpretation"):
     return and_(*facet_subqueries) if len(facet_subqueries) > 1 else facet_subqueries[0]
 
 
-def _build_keyword_filter(keywords: list[str]):
-    keyword_filters = []
-    for kw in keywords:
-        pattern = f"%{kw}%"
-        tag_sub = (
-            select(PhotoTag.photo_id)
-            .join(Tag)
-            .where(Tag.name.ilike(pattern))
-        )
-        node_sub = (
-            select(PhotoClassification.photo_id)
-            .join(TaxonomyNode, TaxonomyNode.id == PhotoClassification.node_id)
-            .where(TaxonomyNode.name.ilike(pattern))
-        )
-        alias_sub = (
-            select(PhotoClassification.photo_id)
-            .join(TaxonomyNode, TaxonomyNode.id == PhotoClassification.node_id)
-            .join(TaxonomyAlias, TaxonomyAlias.node_id == TaxonomyNode.id)
-            .where(TaxonomyAlias.alias.ilike(pattern))
-        )
-        keyword_filters.append(
-            or_(
-                Photo.filename.ilike(pattern),
-                Photo.description.ilike(pattern),
-                Photo.id.in_(tag_sub),
-                Photo.id.in_(node_sub),
-                Photo.id.in_(alias_sub),
-            )
+# FTS5 trigram 只能用 3 个字符及以上的子串查索引；更短的词（如两字中文词）扫描文档表
+FTS_MIN_TERM_LENGTH = 3
+
+
+def _search_document_match(dialect: str, term: str, field: str = "document"):
+    """Photos whose search document (or tag list) contains ``term``, case-insensitively.
+
+    Same substring semantics as the former ILIKE over filename, description, tags,
+    taxonomy nodes and aliases, but against one denormalized row per photo that an
+    index can serve: pg_trgm GIN on PostgreSQL, the FTS5 trigram table on SQLite.
+    """
+    pattern = f"%{term}%"
+    if dialect == "sqlite" and len(term) >= FTS_MIN_TERM_LENGTH:
+        fts = table(FTS_TABLE, column("rowid"), column(field))
+        matching_rows = select(fts.c.rowid).where(fts.c[field].like(pattern))
+        documents = select(PhotoSearchDocument.photo_id).where(
+            literal_column(f"{PhotoSearchDocument.__tablename__}.rowid").in_(matching_rows)
         )
+    else:
+        documents = select(PhotoSearchDocument.photo_id).where(getattr(PhotoSearchDocument, field).ilike(pattern))
+    return Photo.id.in_(documents)
+
+
+async def _build_keyword_filter(db: AsyncSession, keywords: list[str], dialect: str):
+    keyword_filters = [await _build_text_search_filter(db, kw, dialect) for kw in keywords]
     if not keyword_filters:
         return None
     return or_(*keyword_filters) if len(keyword_filters) > 1 else keyword_filters[0]
 
 
-def _build_text_search_filter(search: str):
-    search_pattern = f"%{search}%"
-    tag_photo_subquery = (
-        select(PhotoTag.photo_id)
-        .join(Tag)
-        .where(Tag.name.ilike(search_pattern))
-    )
-    taxonomy_node_subquery = (
-        select(PhotoClassification.photo_id)
-        .join(TaxonomyNode, TaxonomyNode.id == PhotoClassification.node_id)
-        .where(TaxonomyNode.name.ilike(search_pattern))
-    )
-    taxonomy_alias_subquery = (
-        select(PhotoClassification.photo_id)
-        .join(TaxonomyNode, TaxonomyNode.id == PhotoClassification.node_id)
-        .join(TaxonomyAlias, TaxonomyAlias.node_id == TaxonomyNode.id)
-        .where(TaxonomyAlias.alias.ilike(search_pattern))
-    )
-    return or_(
-        Photo.filename.ilike(search_pattern),
-        Photo.description.ilike(search_pattern),
-        Photo.id.in_(tag_photo_subquery),
-        Photo.id.in_(taxonomy_node_subquery),
-        Photo.id.in_(taxonomy_alias_subquery),
-    )
+async def _build_text_search_filter(db: AsyncSession, search: str, dialect: str):
+    """Photos whose search document contains every segment of ``search``.
+
+    Resolved by the in-process index when it is enabled and the hit list is
+    small enough for an IN clause; otherwise one indexed document match per segment.
+    """
+    index = get_photo_search_index()
+    if settings.SEARCH_INDEX_ENABLED:
+        photo_ids = await index.search(db, search)
+        if photo_ids is not None and len(photo_ids) <= settings.SEARCH_INDEX_MAX_CANDIDATES:
+            return Photo.id.in_(photo_ids)
+    terms = index.terms(search) or [search]
+    return and_(*[_search_document_match(dialect, term) for term in terms])
@@ -3,7 +3,7 @@ User CRUD operations
 
 用户相关的数据库操作。
 """
-from typing import Optional, List, Tuple
+from typing import Dict, Iterable, Optional, List, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, delete
 from app.models.user import User
@@ -41,6 +41,17 @@ async def get_user_by_id(db: AsyncSession, user_id: str) -> Optional[User]:
     return result.scalar_one_or_none()
 
 
+async def get_user_names(db: AsyncSession, user_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+    """
+    批量查询用户显示名（一次查询），按用户 ID 返回。
+    """
+    ids = list(set(user_ids))
+    if not ids:
+        return {}
+    result = await db.execute(select(User.id, User.full_name).filter(User.id.in_(ids)))
+    return dict(result.all())
+
+
 async def create_user(db: AsyncSession, user: UserCreate, role: str = "user") -> User:
     """
     Create a new user
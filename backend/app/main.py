@@ -5,7 +5,8 @@ FastAPI 应用主入口。
 """
 import logging
 import time
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -17,6 +18,10 @@ from slowapi.errors import RateLimitExceeded
 import os
 from app.core.config import get_settings, DEFAULT_SECRET_KEY
 from app.core.database import init_db
+from app.services.facet_index import warm_photo_facet_index
+from app.services.image_workers import close_image_workers, init_image_workers
+from app.services.storage import close_storage, init_storage
+from app.services.upload_sessions import run_cleanup_loop
 from app.api.v1.router import api_router
 import app.models  # noqa: F401  确保所有模型被导入，create_all 才能发现它们
 
@@ -93,10 +98,32 @@ openapi_tags = [
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """应用生命周期：启动时自动建表"""
+    """应用生命周期：启动时自动建表并创建共享存储后端、图片处理池、上传会话清理任务与分类位图索引，关闭时释放"""
     await init_db()
     logger.info("数据库表已同步")
-    yield
+    storage = init_storage()
+    logger.info("存储后端已初始化: %s", type(storage).__name__)
+    image_workers = init_image_workers()
+    logger.info("图片处理池已启动: %d workers", image_workers.workers)
+    cleanup_task = None
+    if settings.UPLOAD_SESSION_CLEANUP_INTERVAL > 0:
+        cleanup_task = asyncio.create_task(run_cleanup_loop(settings.UPLOAD_SESSION_CLEANUP_INTERVAL))
+    facet_index_task = None
+    if settings.FACET_INDEX_ENABLED:
+        facet_index_task = asyncio.create_task(warm_photo_facet_index())
+    try:
+        yield
+    finally:
+        if facet_index_task is not None:
+            facet_index_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await facet_index_task
+        if cleanup_task is not None:
+            cleanup_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await cleanup_task
+        close_image_workers()
+        close_storage()
 
 
 app = FastAPI(
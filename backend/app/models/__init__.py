@@ -13,6 +13,8 @@ from app.models.ai_provider import AIProviderConfig, AIProviderType
 from app.models.audit_log import AuditLog
 from app.models.notification import Notification
 from app.models.favorite import Favorite
+from app.models.upload_session import UploadSession
+from app.models.search_document import PhotoSearchDocument
 
 __all__ = [
     "User",
@@ -37,5 +39,7 @@ __all__ = [
     "AuditLog",
     "Notification",
     "Favorite",
+    "UploadSession",
+    "PhotoSearchDocument",
 ]
 
@@ -5,7 +5,7 @@
 """
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, String, DateTime, ForeignKey, Index, UniqueConstraint
 from app.core.database import Base
 
 
@@ -24,6 +24,7 @@ class Favorite(Base):
 
     __table_args__ = (
         UniqueConstraint("user_id", "photo_id", name="uq_user_photo_favorite"),
+        Index("ix_favorites_user_created_id", "user_id", "created_at", "id"),  # 我的收藏游标分页
     )
 
     def __repr__(self):
@@ -3,7 +3,7 @@
 """
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, DateTime, JSON, Text, ForeignKey
+from sqlalchemy import Column, String, Integer, DateTime, JSON, Text, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
@@ -18,10 +18,15 @@ class Photo(Base):
     original_path = Column(Text)
     processed_path = Column(Text)
     thumb_path = Column(Text)
+    renditions = Column(JSON)  # {"160": "thumbnails/<id>_160.jpg", ...} 按宽度存储的多尺寸缩略图
     width = Column(Integer)
     height = Column(Integer)
     file_size = Column(Integer)  # File size in bytes
     mime_type = Column(String(50))  # MIME type (e.g., image/jpeg)
+    content_hash = Column(String(64), index=True)  # 原图 SHA-256，上传时计算，用于精确去重
+    perceptual_hash = Column(String(16))  # 64 位 dHash（十六进制），用于近似重复检测
+    blurhash = Column(String(32))  # BlurHash 占位图（4x3 分量），列表页在缩略图加载前先渲染模糊预览
+    dominant_color = Column(String(7))  # 主色调 #rrggbb，占位背景色
     season = Column(String(20))  # Spring/Summer/Autumn/Winter
     category = Column(String(50))  # Landscape/Portrait/Activity/Documentary
     campus = Column(String(50))  # 校区信息
@@ -30,7 +35,7 @@ class Photo(Base):
     status = Column(String(20), default="pending", nullable=False)  # pending/approved/rejected/deleted
     processing_status = Column(String(20), default="pending", nullable=False)  # pending/processing/completed/failed/manual
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, index=True)
     captured_at = Column(DateTime)  # 拍摄时间
     published_at = Column(DateTime)  # 上线时间
     views = Column(Integer, default=0)  # 浏览量
@@ -50,5 +55,14 @@ class Photo(Base):
         cascade="all, delete-orphan",
     )
 
+    # 游标分页：与列表排序 (排序键, id) 一致的复合索引，第 N 页与第 1 页代价相同；
+    # 可为空的 published_at / views 按 coalesce 表达式排序（见 crud.photo.SORT_KEYS），索引表达式须与之一致
+    __table_args__ = (
+        Index("ix_photos_status_created_id", "status", "created_at", "id"),
+        Index("ix_photos_uploader_created_id", "uploader_id", "created_at", "id"),
+        Index("ix_photos_status_published_key_id", "status", func.coalesce(published_at, created_at), "id"),
+        Index("ix_photos_status_views_key_id", "status", func.coalesce(views, 0), "id"),
+    )
+
     def __repr__(self):
         return f"<Photo(filename='{self.filename}', status='{self.status}')>"
@@ -0,0 +1,276 @@
+"""
+照片搜索文档（反规范化）
+
+每张照片一行：文件名、描述、标签名、分类节点名及其别名拼成一段文本，
+供 ``search`` / ``tag`` / 解析出的关键词检索使用，替代对五张表的 ILIKE 扇出扫描。
+
+- SQLite：外部内容 FTS5 表 ``photo_search_fts``（trigram 分词，支持子串 LIKE，
+  对中文同样有效），由触发器与本表同步。
+- PostgreSQL：pg_trgm GIN 索引，ILIKE '%词%' 直接走索引。
+
+文档在提交事务前重建（见本文件末尾的会话事件）：照片、照片标签、分类、
+标签改名、分类节点改名、别名变化都会把受影响的照片标记为待刷新，
+包括 ``table.delete()`` 这类不经过 ORM 对象的 DELETE 语句
+（UPDATE 语句不跟踪：目前没有用它修改可检索字段的代码）。
+"""
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import DDL, Column, DateTime, ForeignKey, String, Text, delete, event, inspect, insert, select, true
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import Delete
+
+from app.core.database import Base
+from app.models.photo import Photo
+from app.models.tag import PhotoTag, Tag
+from app.models.taxonomy import PhotoClassification, TaxonomyAlias, TaxonomyNode
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "photo_search_fts"
+# 同一次重建每批处理的照片数（IN 列表长度）
+REBUILD_BATCH_SIZE = 500
+_STALE_KEY = "search_documents_stale"
+_CHANGES_KEY = "search_documents_changed"
+# 提交后回调：{photo_id: 新文档，None 表示已删除}，供进程内索引增量更新
+_commit_listeners: List[Callable[[Dict[str, Optional[str]]], None]] = []
+
+
+class PhotoSearchDocument(Base):
+    """照片搜索文档表"""
+    __tablename__ = "photo_search_documents"
+
+    photo_id = Column(String(36), ForeignKey("photos.id", ondelete="CASCADE"), primary_key=True)
+    document = Column(Text, nullable=False, default="")  # 文件名、描述、标签、分类节点及别名，换行分隔
+    tag_names = Column(Text, nullable=False, default="")  # 仅标签名，供 tag 过滤
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, index=True)
+
+
+# ── 索引 DDL：create_all（开发/测试）与迁移使用同一份语句 ──
+
+SQLITE_FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "document, tag_names, content='photo_search_documents', content_rowid='rowid', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS photo_search_documents_ai AFTER INSERT ON photo_search_documents BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, document, tag_names) VALUES (new.rowid, new.document, new.tag_names); END",
+    f"CREATE TRIGGER IF NOT EXISTS photo_search_documents_ad AFTER DELETE ON photo_search_documents BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, document, tag_names) "
+    "VALUES ('delete', old.rowid, old.document, old.tag_names); END",
+    f"CREATE TRIGGER IF NOT EXISTS photo_search_documents_au AFTER UPDATE ON photo_search_documents BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, document, tag_names) "
+    "VALUES ('delete', old.rowid, old.document, old.tag_names); "
+    f"INSERT INTO {FTS_TABLE}(rowid, document, tag_names) VALUES (new.rowid, new.document, new.tag_names); END",
+]
+
+POSTGRES_TRGM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_photo_search_documents_document_trgm "
+    "ON photo_search_documents USING gin (document gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_photo_search_documents_tag_names_trgm "
+    "ON photo_search_documents USING gin (tag_names gin_trgm_ops)",
+]
+
+for _statement in SQLITE_FTS_DDL:
+    event.listen(PhotoSearchDocument.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+for _statement in POSTGRES_TRGM_DDL:
+    event.listen(PhotoSearchDocument.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+event.listen(
+    PhotoSearchDocument.__table__,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {FTS_TABLE}").execute_if(dialect="sqlite"),
+)
+
+
+# ── 文档构建 ──
+
+def _document_lines(*values: Optional[str]) -> str:
+    return "\n".join(value for value in values if value)
+
+
+def rebuild_search_documents(session: Session, photo_ids: Iterable[str]) -> int:
+    """重建给定照片的搜索文档（照片已不存在则删除其文档），返回写入的文档数。
+
+    同步接口：在会话事件中直接调用，异步代码通过 ``AsyncSession.run_sync`` 调用。
+    """
+    ids = list(dict.fromkeys(photo_ids))
+    written = 0
+    for start in range(0, len(ids), REBUILD_BATCH_SIZE):
+        batch = ids[start:start + REBUILD_BATCH_SIZE]
+        photos = session.execute(
+            select(Photo.id, Photo.filename, Photo.description).where(Photo.id.in_(batch))
+        ).all()
+        tags: dict[str, list[str]] = {}
+        for photo_id, name in session.execute(
+            select(PhotoTag.photo_id, Tag.name).join(Tag, Tag.id == PhotoTag.tag_id).where(PhotoTag.photo_id.in_(batch))
+        ):
+            tags.setdefault(photo_id, []).append(name)
+        terms: dict[str, list[str]] = {}
+        for photo_id, name in session.execute(
+            select(PhotoClassification.photo_id, TaxonomyNode.name)
+            .join(TaxonomyNode, TaxonomyNode.id == PhotoClassification.node_id)
+            .where(PhotoClassification.photo_id.in_(batch))
+        ):
+            terms.setdefault(photo_id, []).append(name)
+        for photo_id, alias in session.execute(
+            select(PhotoClassification.photo_id, TaxonomyAlias.alias)
+            .join(TaxonomyAlias, TaxonomyAlias.node_id == PhotoClassification.node_id)
+            .where(PhotoClassification.photo_id.in_(batch))
+        ):
+            terms.setdefault(photo_id, []).append(alias)
+
+        session.execute(delete(PhotoSearchDocument).where(PhotoSearchDocument.photo_id.in_(batch)))
+        rows = [
+            {
+                "photo_id": photo_id,
+                "document": _document_lines(filename, description, *tags.get(photo_id, []), *terms.get(photo_id, [])),
+                "tag_names": _document_lines(*tags.get(photo_id, [])),
+                "updated_at": datetime.utcnow(),
+            }
+            for photo_id, filename, description in photos
+        ]
+        if rows:
+            session.execute(insert(PhotoSearchDocument), rows)
+        written += len(rows)
+        changes = session.info.setdefault(_CHANGES_KEY, {})
+        changes.update(dict.fromkeys(batch))
+        changes.update({row["photo_id"]: row["document"] for row in rows})
+    return written
+
+
+def on_documents_committed(listener: Callable[[Dict[str, Optional[str]]], None]):
+    """注册提交后回调（进程内搜索索引用），回调异常只记录日志。"""
+    _commit_listeners.append(listener)
+    return listener
+
+
+# ── 变更跟踪：标记受影响的照片，提交前统一重建 ──
+
+def _stale(session: Session) -> Set[str]:
+    return session.info.setdefault(_STALE_KEY, set())
+
+
+def _mark(session: Session, photo_ids: Iterable[Optional[str]]) -> None:
+    _stale(session).update(photo_id for photo_id in photo_ids if photo_id is not None)
+
+
+def _photos_of(session: Session, tag_ids: Set[int], node_ids: Set[int]) -> list[str]:
+    photo_ids: list[str] = []
+    connection = session.connection()
+    if tag_ids:
+        photo_ids += connection.execute(select(PhotoTag.photo_id).where(PhotoTag.tag_id.in_(tag_ids))).scalars()
+    if node_ids:
+        photo_ids += connection.execute(
+            select(PhotoClassification.photo_id).where(PhotoClassification.node_id.in_(node_ids))
+        ).scalars()
+    return photo_ids
+
+
+def _changed(obj, *fields: str) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+@event.listens_for(Session, "before_flush")
+def _track_vocabulary(session: Session, flush_context, instances) -> None:
+    """标签、分类节点、别名的变化：在本次 flush 删除关联行之前查出涉及的照片。"""
+    tag_ids: Set[int] = set()
+    node_ids: Set[int] = set()
+    for obj in session.new:
+        if isinstance(obj, TaxonomyAlias):
+            node_ids.add(obj.node_id)
+    for obj in session.dirty:
+        if isinstance(obj, Tag) and _changed(obj, "name"):
+            tag_ids.add(obj.id)
+        elif isinstance(obj, TaxonomyNode) and _changed(obj, "name"):
+            node_ids.add(obj.id)
+        elif isinstance(obj, TaxonomyAlias) and _changed(obj, "alias", "node_id"):
+            node_ids.update(inspect(obj).attrs.node_id.history.sum())
+    for obj in session.deleted:
+        if isinstance(obj, Tag):
+            tag_ids.add(obj.id)
+        elif isinstance(obj, TaxonomyNode):
+            node_ids.add(obj.id)
+        elif isinstance(obj, TaxonomyAlias):
+            node_ids.add(obj.node_id)
+    tag_ids.discard(None)
+    node_ids.discard(None)
+    if tag_ids or node_ids:
+        _mark(session, _photos_of(session, tag_ids, node_ids))
+
+
+@event.listens_for(Session, "after_flush")
+def _track_photos(session: Session, flush_context) -> None:
+    """照片及其标签、分类的变化（新对象的主键此时才有值）。"""
+    for obj in session.new:
+        if isinstance(obj, Photo):
+            _mark(session, [obj.id])
+        elif isinstance(obj, (PhotoTag, PhotoClassification)):
+            _mark(session, [obj.photo_id])
+    for obj in session.dirty:
+        if isinstance(obj, Photo) and _changed(obj, "filename", "description"):
+            _mark(session, [obj.id])
+        elif isinstance(obj, PhotoClassification) and _changed(obj, "node_id"):
+            _mark(session, [obj.photo_id])
+    for obj in session.deleted:
+        if isinstance(obj, Photo):
+            _mark(session, [obj.id])
+        elif isinstance(obj, (PhotoTag, PhotoClassification)):
+            _mark(session, [obj.photo_id])
+
+
+# DELETE 语句所在表 -> 受影响照片 ID 的查询
+_DELETE_TRACKERS = {
+    Photo.__tablename__: lambda where: select(Photo.id).where(where),
+    PhotoTag.__tablename__: lambda where: select(PhotoTag.photo_id).where(where),
+    PhotoClassification.__tablename__: lambda where: select(PhotoClassification.photo_id).where(where),
+    Tag.__tablename__: lambda where: select(PhotoTag.photo_id).where(PhotoTag.tag_id.in_(select(Tag.id).where(where))),
+    TaxonomyNode.__tablename__: lambda where: select(PhotoClassification.photo_id).where(
+        PhotoClassification.node_id.in_(select(TaxonomyNode.id).where(where))
+    ),
+    TaxonomyAlias.__tablename__: lambda where: select(PhotoClassification.photo_id).where(
+        PhotoClassification.node_id.in_(select(TaxonomyAlias.node_id).where(where))
+    ),
+}
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_delete_statement(orm_execute_state) -> None:
+    """``delete(PhotoTag).where(...)`` 等绕过 ORM 对象的删除。"""
+    statement = orm_execute_state.statement
+    if not isinstance(statement, Delete):
+        return
+    tracker = _DELETE_TRACKERS.get(statement.table.name)
+    if tracker is None:
+        return
+    where = statement.whereclause if statement.whereclause is not None else true()
+    # 必须在删除执行前查询，之后关联行就不在了
+    session = orm_execute_state.session
+    _mark(session, session.connection().execute(tracker(where)).scalars())
+
+
+@event.listens_for(Session, "before_commit")
+def _refresh_before_commit(session: Session) -> None:
+    if not session.info.get(_STALE_KEY) and not (session.new or session.dirty or session.deleted):
+        return
+    session.flush()
+    while session.info.get(_STALE_KEY):
+        rebuild_search_documents(session, session.info.pop(_STALE_KEY))
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_after_commit(session: Session) -> None:
+    changes = session.info.pop(_CHANGES_KEY, None)
+    if not changes:
+        return
+    for listener in _commit_listeners:
+        try:
+            listener(changes)
+        except Exception:  # noqa: BLE001 - 事务已提交，索引会在下次同步时补上
+            logger.exception("Search document listener failed")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_STALE_KEY, None)
+    session.info.pop(_CHANGES_KEY, None)
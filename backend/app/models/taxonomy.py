@@ -103,7 +103,7 @@ class PhotoClassification(Base):
     facet_id = Column(Integer, ForeignKey("taxonomy_facets.id"), nullable=False, index=True)
     node_id = Column(Integer, ForeignKey("taxonomy_nodes.id"), nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, index=True)
 
     photo = relationship("Photo", back_populates="classifications")
     facet = relationship("TaxonomyFacet", back_populates="photo_classifications")
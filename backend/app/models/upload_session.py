@@ -0,0 +1,43 @@
+"""
+可续传上传会话模型
+
+大文件按块上传（tus 风格）：创建会话 → 按偏移 PATCH 分块 → 查询偏移 → 完成。
+分块直接写入存储（S3 分片或本地追加文件），storage_state 记录后端续传状态。
+"""
+import uuid
+from datetime import datetime
+from sqlalchemy import BigInteger, Column, String, DateTime, JSON, ForeignKey
+from app.core.database import Base
+
+
+class UploadSession(Base):
+    """
+    上传会话表
+
+    Attributes:
+        photo_id: 预分配的照片 ID，完成后即为 photos.id
+        storage_key: 原图最终存储 key（originals/<photo_id>.<ext>）
+        upload_offset: 已持久化的字节数，客户端据此续传
+        storage_state: 后端续传状态（S3 UploadId 与已上传分片 / 本地追加文件）
+        upload_metadata: 上传表单字段（description/season/category/campus/enable_ai）
+        status: active/completed/aborted/expired
+    """
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    photo_id = Column(String(36), nullable=False)
+    filename = Column(String(255), nullable=False)
+    mime_type = Column(String(50), nullable=False)
+    storage_key = Column(String(255), nullable=False)
+    total_size = Column(BigInteger, nullable=False)
+    upload_offset = Column(BigInteger, default=0, nullable=False)
+    storage_state = Column(JSON)
+    upload_metadata = Column(JSON)
+    status = Column(String(20), default="active", nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<UploadSession(id='{self.id}', offset={self.upload_offset}/{self.total_size}, status='{self.status}')>"
@@ -40,10 +40,14 @@ class PhotoInDB(PhotoBase):
     original_path: str
     processed_path: Optional[str] = None
     thumb_path: Optional[str] = None
+    renditions: Optional[Dict[str, str]] = None
     width: Optional[int] = None
     height: Optional[int] = None
     file_size: Optional[int] = None
     mime_type: Optional[str] = None
+    perceptual_hash: Optional[str] = None
+    blurhash: Optional[str] = None
+    dominant_color: Optional[str] = None
     campus: Optional[str] = None
     exif_data: Optional[Dict[str, Any]] = None
     captured_at: Optional[datetime] = None
@@ -58,6 +62,7 @@ class PhotoInDB(PhotoBase):
 class PhotoResponse(PhotoInDB):
     """Photo response schema"""
     uploader_name: Optional[str] = None
+    favorite_count: int = 0
     tags: List[str] = Field(default_factory=list, description="Associated tags")
     free_tags: List[str] = Field(default_factory=list, description="User-visible free tags")
     classifications: Dict[str, TaxonomyValueResponse] | Dict[str, Dict[str, Any]] = Field(
@@ -85,6 +90,7 @@ class PhotoListResponse(BaseModel):
     page: int
     page_size: int
     items: List[PhotoResponse]
+    next_cursor: Optional[str] = Field(None, description="Pass as ?cursor= for the next page; null on the last page")
     search_interpretation: Optional[Dict[str, Any]] = Field(None, description="Smart search interpretation result")
 
 
@@ -97,6 +103,92 @@ class PhotoUploadResponse(BaseModel):
     width: Optional[int] = None
     height: Optional[int] = None
     status: str
+    content_hash: Optional[str] = None  # SHA-256，仅流式上传返回
+    processing_status: Optional[str] = None  # 快速受理时为 processing，后台处理完成后变化
+    duplicate_of: Optional[str] = None  # UPLOAD_DUPLICATE_POLICY=link 时复用其媒体文件的已有照片
     message: str = "Photo uploaded successfully"
     
     model_config = ConfigDict(from_attributes=True)
+
+
+class BatchUploadItemResult(BaseModel):
+    """Outcome for one file / upload session of a batch upload"""
+    index: int
+    filename: Optional[str] = None
+    session_id: Optional[str] = None
+    success: bool
+    photo: Optional[PhotoUploadResponse] = None
+    error: Optional[str] = None
+
+
+class BatchUploadResponse(BaseModel):
+    """Per-item results of a batch upload"""
+    total: int
+    succeeded: int
+    failed: int
+    items: List[BatchUploadItemResult]
+
+
+class UploadSessionCreate(PhotoBase):
+    """Start a resumable upload; form fields are applied when the session is finalized"""
+    total_size: int = Field(..., gt=0, description="Total file size in bytes")
+    mime_type: str = Field(..., description="Image MIME type, e.g. image/jpeg")
+    enable_ai: bool = True
+
+
+class UploadSessionResponse(BaseModel):
+    """Resumable upload session state"""
+    id: str
+    photo_id: str
+    filename: str
+    total_size: int
+    offset: int
+    chunk_size: int  # 建议分块大小
+    min_chunk_size: int = 0  # 非最后一块的最小长度（S3 分片 5MB）
+    status: str
+    expires_at: datetime
+
+
+class SimilarPhotoItem(BaseModel):
+    """A near-duplicate candidate and its dHash Hamming distance"""
+    distance: int
+    photo: PhotoResponse
+
+
+class SimilarPhotosResponse(BaseModel):
+    """Photos whose perceptual hash is close to the requested photo"""
+    photo_id: str
+    max_distance: int
+    items: List[SimilarPhotoItem]
+
+
+class NearDuplicateCluster(BaseModel):
+    """Photos connected by dHash distance within the threshold"""
+    size: int
+    photos: List[PhotoResponse]
+
+
+class NearDuplicateClusterListResponse(BaseModel):
+    """Near-duplicate clusters for reviewers, largest first"""
+    total: int
+    page: int
+    page_size: int
+    max_distance: int
+    clusters: List[NearDuplicateCluster]
+
+
+class PhotoArchiveRequest(BaseModel):
+    """Photos to pack into a ZIP download: explicit ids, or the gallery filters"""
+    photo_ids: Optional[List[str]] = Field(None, description="Photo ids, kept in this order")
+    status: Optional[str] = Field(None, description="Reviewers only; others always get approved photos")
+    season: Optional[str] = None
+    category: Optional[str] = None
+    campus: Optional[str] = None
+    building: Optional[str] = None
+    gallery_series: Optional[str] = None
+    gallery_year: Optional[str] = None
+    photo_type: Optional[str] = None
+    search: Optional[str] = None
+    tag: Optional[str] = None
+    size: Optional[int] = Field(None, gt=0, description="Pack the closest rendition of this width instead of originals")
+    filename: Optional[str] = Field(None, max_length=100, description="Archive name without extension")
@@ -50,6 +50,29 @@ async def create_ai_analysis_task(
     return task
 
 
+async def create_ai_analysis_tasks(
+    db: AsyncSession,
+    photos: list[Photo],
+    requested_by_id: Optional[str],
+    provider: str,
+    model_id: str,
+) -> list[AIAnalysisTask]:
+    """Create pending tasks for several photos in one commit."""
+    tasks = [
+        AIAnalysisTask(
+            photo_id=photo.id,
+            requested_by_id=requested_by_id,
+            provider=provider,
+            model_id=model_id,
+            status="pending",
+        )
+        for photo in photos
+    ]
+    db.add_all(tasks)
+    await db.commit()
+    return tasks
+
+
 async def get_ai_task(db: AsyncSession, task_id: str) -> Optional[AIAnalysisTask]:
     result = await db.execute(select(AIAnalysisTask).where(AIAnalysisTask.id == task_id))
     return result.scalar_one_or_none()
@@ -122,7 +145,7 @@ async def run_ai_analysis_task(task_id: str) -> Optional[AIAnalysisTask]:
         try:
             context = _build_photo_context(photo)
             runtime_settings = await get_runtime_settings(db)
-            with storage.local_copy(photo.original_path) as local_path:
+            async with storage.alocal_copy(photo.original_path) as local_path:
                 result = await analyze_photo_with_runtime_settings(
                     local_path,
                     providers=runtime_settings.providers,
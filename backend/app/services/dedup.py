@@ -0,0 +1,88 @@
+"""
+Exact-duplicate detection by content hash at ingest time.
+
+Uploads and imports compute the SHA-256 of the original while it is copied
+or streamed in. Before renditions, storage writes or AI tasks are paid for,
+the hash is looked up in ``photos.content_hash`` and UPLOAD_DUPLICATE_POLICY
+decides what happens: ``reject`` refuses the upload, ``link`` creates the
+new row on top of the existing media files, ``allow`` ingests it as usual.
+
+Linked rows share storage keys, so deleting a photo must keep files that
+another row still references (see :func:`media_paths_in_use`).
+"""
+from __future__ import annotations
+
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.models.photo import Photo
+from app.services.storage import PersistedMedia
+
+settings = get_settings()
+
+DUPLICATE_REJECT = "reject"
+DUPLICATE_LINK = "link"
+DUPLICATE_ALLOW = "allow"
+
+
+def duplicate_policy() -> str:
+    return settings.UPLOAD_DUPLICATE_POLICY
+
+
+async def find_duplicate(db: AsyncSession, content_hash: Optional[str]) -> Optional[Photo]:
+    """Oldest live photo with the same content whose media is usable."""
+    if not content_hash or duplicate_policy() == DUPLICATE_ALLOW:
+        return None
+    result = await db.execute(
+        select(Photo)
+        .where(
+            Photo.content_hash == content_hash,
+            Photo.status != "deleted",
+            Photo.processing_status.notin_(("processing", "failed")),
+        )
+        .order_by(Photo.created_at)
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+def linked_media(existing: Photo) -> tuple[PersistedMedia, dict]:
+    """Stored media and processing results to reuse for a duplicate of ``existing``."""
+    media = PersistedMedia(
+        original_path=existing.original_path,
+        thumb_path=existing.thumb_path,
+        file_size=existing.file_size,
+        renditions=dict(existing.renditions or {}),
+    )
+    processing_result = {
+        "width": existing.width,
+        "height": existing.height,
+        "exif_data": existing.exif_data or {},
+        "captured_at": existing.captured_at,
+        "perceptual_hash": existing.perceptual_hash,
+        "blurhash": existing.blurhash,
+        "dominant_color": existing.dominant_color,
+    }
+    return media, processing_result
+
+
+async def media_paths_in_use(db: AsyncSession, photo: Photo) -> set[str]:
+    """Storage keys of ``photo`` that other (linked) rows still reference."""
+    if not photo.content_hash:
+        return set()
+    result = await db.execute(
+        select(Photo).where(Photo.content_hash == photo.content_hash, Photo.id != photo.id)
+    )
+    in_use: set[str] = set()
+    for other in result.scalars().all():
+        in_use.update(path for path in (other.original_path, other.thumb_path, other.processed_path) if path)
+        in_use.update((other.renditions or {}).values())
+    return in_use
+
+
+async def deletable_media_paths(db: AsyncSession, photo: Photo, paths: Iterable[str]) -> list[str]:
+    in_use = await media_paths_in_use(db, photo)
+    return [path for path in paths if path not in in_use]
@@ -0,0 +1,225 @@
+"""
+Byte-capped LRU file cache on local disk, shared by all workers on a host.
+
+Used as a read-through cache for S3 objects (storage.S3StorageBackend) and for
+derived images (services.transforms).
+
+- Entries are addressed by the SHA-256 of their key, fanned out over 256
+  subdirectories; the file keeps the key's extension so its media type can
+  still be guessed.
+- Entries are written to a temp file in the same directory and renamed into
+  place, so a reader never sees a partial file.
+- :meth:`DiskCache.fill` takes a per-key file lock (one of 256 lock stripes),
+  so concurrent misses for one key across workers cause one fetch; the others
+  wait and then find the entry.
+- Recency is the file's mtime, refreshed on every hit, so it is shared by all
+  processes. When the size estimate passes ``max_bytes`` one process (holding
+  the eviction lock) scans the directory and deletes the least recently used
+  files until the total is below 90% of the cap.
+
+On platforms without ``fcntl`` the locks are no-ops: entries stay atomic, but
+concurrent misses may fetch the same object more than once.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+from typing import Callable, Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development machines
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOCK_STRIPES = 256
+LOW_WATER_RATIO = 0.9
+# Temp files older than this belong to a worker that died mid-write
+STALE_TEMP_SECONDS = 3600
+_TEMP_PREFIX = ".tmp-"
+
+
+class DiskCache:
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._locks_dir = self.directory / ".locks"
+        self._locks_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Estimate of the shared directory: exact after each scan, plus what this process added since
+        self._bytes = 0
+        self._entries = 0
+        self._scan_and_evict(force=True)
+
+    # ── addressing and locking ──
+
+    def path_for(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        suffix = PurePosixPath(key).suffix.lower()
+        return self.directory / digest[:2] / f"{digest}{suffix}"
+
+    @contextmanager
+    def _file_lock(self, name: str, blocking: bool = True) -> Iterator[bool]:
+        if fcntl is None:
+            yield True
+            return
+        with open(self._locks_dir / name, "a+b") as handle:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(handle, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _key_lock(self, key: str):
+        stripe = int(hashlib.sha256(key.encode("utf-8")).hexdigest()[:8], 16) % LOCK_STRIPES
+        return self._file_lock(f"{stripe:02x}.lock")
+
+    # ── reads ──
+
+    def _lookup(self, key: str) -> Optional[Path]:
+        path = self.path_for(key)
+        try:
+            os.utime(path)  # mark as recently used for every worker
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get(self, key: str) -> Optional[Path]:
+        """Path of the cached entry for ``key``, or None on a miss."""
+        path = self._lookup(key)
+        with self._lock:
+            if path is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return path
+
+    def fill(self, key: str, loader: Callable[[str], None]) -> Path:
+        """Cached path for ``key``, calling ``loader(temp_path)`` to write it on a miss.
+
+        Exceptions from ``loader`` propagate and leave nothing behind.
+        """
+        path = self.get(key)
+        if path is not None:
+            return path
+        with self._key_lock(key):
+            # Another worker may have filled it while we waited for the lock
+            path = self._lookup(key)
+            if path is not None:
+                return path
+            path = self._install(key, loader)
+        self._maybe_evict()
+        return path
+
+    # ── writes ──
+
+    def _install(self, key: str, loader: Callable[[str], None]) -> Path:
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{_TEMP_PREFIX}{uuid.uuid4().hex}")
+        try:
+            loader(str(temp_path))
+            size = temp_path.stat().st_size
+            os.replace(temp_path, path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        with self._lock:
+            self.fills += 1
+            self._bytes += size
+            self._entries += 1
+        return path
+
+    def put_bytes(self, key: str, data: bytes) -> Path:
+        path = self._install(key, lambda temp_path: Path(temp_path).write_bytes(data))
+        self._maybe_evict()
+        return path
+
+    def invalidate(self, key: str) -> bool:
+        """Drop ``key`` (for every worker, since the directory is shared)."""
+        path = self.path_for(key)
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            self.invalidations += 1
+            self._bytes = max(self._bytes - size, 0)
+            self._entries = max(self._entries - 1, 0)
+        return True
+
+    # ── eviction ──
+
+    def _maybe_evict(self) -> None:
+        if self._bytes > self.max_bytes:
+            self._scan_and_evict()
+
+    def _scan_and_evict(self, force: bool = False) -> None:
+        with self._file_lock("evict.lock", blocking=force) as acquired:
+            if not acquired:
+                return  # another worker is already evicting
+            now = time.time()
+            entries = []
+            for path in self.directory.glob("[0-9a-f][0-9a-f]/*"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                if path.name.startswith(_TEMP_PREFIX):
+                    if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                        path.unlink(missing_ok=True)
+                    continue
+                entries.append((stat.st_mtime_ns, str(path), stat.st_size))
+            total = sum(size for _, _, size in entries)
+            evicted = 0
+            if total > self.max_bytes:
+                target = self.max_bytes * LOW_WATER_RATIO
+                entries.sort()
+                for _, path, size in entries:
+                    if total <= target:
+                        break
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    evicted += 1
+            with self._lock:
+                self._bytes = total
+                self._entries = len(entries) - evicted
+                self.evictions += evicted
+        if evicted:
+            logger.debug("Disk cache %s: evicted %d file(s)", self.directory, evicted)
+
+    def metrics(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "fills": self.fills,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
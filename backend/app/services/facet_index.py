@@ -0,0 +1,473 @@
+"""
+In-process bitmap index over photo status, category and taxonomy classification.
+
+Listing filters (season, campus, landmark, gallery series/year, photo type)
+otherwise cost a PhotoClassification / TaxonomyFacet / TaxonomyNode join
+subquery each, evaluated twice: once for the page and once for the count.
+Here every photo gets a small integer ordinal, and each status, category and
+taxonomy node maps to a bitset of ordinals held in a Python int, so a filter
+combination is a few big-integer AND / OR operations and its total is a
+popcount.
+
+Ordinals are dense (assigned in load order, reused when a photo changes),
+so a bitmap is at most one bit per photo: ~12 KB per key at 100k photos.
+Removed photos leave their ordinal unused until the next rebuild.
+
+The index is built at startup and on first use. Before every query it reads
+the newest ``updated_at`` of photos and of classifications (two index
+lookups; see ``_read_version``) and, if either moved or photos were marked by
+session events in this process, re-reads those photos plus the photos and
+classifications updated since. That covers uploads, approvals, soft deletes
+and reclassification by any worker, and every change made in this process.
+
+Hard deletes by other processes leave no ``updated_at`` behind. They show up
+as row counts the index does not have, and trigger a rebuild; as COUNT(*)
+scans both tables, the counts are only compared every
+FACET_INDEX_DELETE_CHECK_SECONDS, so totals can include such photos for up
+to that long (the page itself is loaded from the database and never does).
+The index is also rebuilt every FACET_INDEX_REBUILD_SECONDS (drops unused
+ordinals) and when queried through a different database (tests, scripts).
+
+The SQL join subqueries remain the fallback when the index is disabled or
+a filter matches too many photos to pass as an IN list.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Dict, Hashable, Iterable, Optional, Sequence, Set
+
+from sqlalchemy import event, func, inspect, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import Delete
+
+from app.core.config import get_settings
+from app.core.database import AsyncSessionLocal
+from app.models.photo import Photo
+from app.models.taxonomy import PhotoClassification, TaxonomyFacet, TaxonomyNode
+from app.services.search_index import bitmap_members
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Photos re-read per IN query when syncing changed photos
+REFRESH_BATCH_SIZE = 500
+# Rows written by other workers can carry an updated_at slightly older than the
+# newest one already seen (clock skew, commit later than flush)
+_SYNC_OVERLAP = timedelta(seconds=5)
+_STALE_KEY = "facet_index_stale"
+
+FacetKey = tuple[str, Hashable]  # ("status", "approved"), ("category", None), ("node", 12)
+# (facet key, value, also match the node key): one listing filter, see resolve_nodes
+FacetValue = tuple[str, str, bool]
+
+
+def _bitmap(ordinals: Iterable[int]) -> int:
+    ordinals = list(ordinals)
+    if not ordinals:
+        return 0
+    bits = bytearray((max(ordinals) >> 3) + 1)
+    for ordinal in ordinals:
+        bits[ordinal >> 3] |= 1 << (ordinal & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _node_count(keys: Iterable[FacetKey]) -> int:
+    return sum(1 for key in keys if key[0] == "node")
+
+
+class FacetBitmaps:
+    """Bitsets of photo ordinals per facet key."""
+
+    def __init__(self, photos: Iterable[tuple[str, Iterable[FacetKey]]] = ()) -> None:
+        self._ordinals: dict[str, int] = {}  # photo id -> ordinal
+        self._ids: list[Optional[str]] = []  # ordinal -> photo id, None once removed
+        self._keys: list[frozenset[FacetKey]] = []  # ordinal -> facet keys
+        members: dict[FacetKey, list[int]] = {}
+        for photo_id, keys in photos:
+            ordinal = self._assign(photo_id, keys)
+            for key in self._keys[ordinal]:
+                members.setdefault(key, []).append(ordinal)
+        self._bitmaps: dict[FacetKey, int] = {key: _bitmap(ordinals) for key, ordinals in members.items()}
+        self._live = _bitmap(self._ordinals.values())
+        # Photo/node pairs held, i.e. photo_classifications rows
+        self.classifications = sum(len(ordinals) for key, ordinals in members.items() if key[0] == "node")
+
+    def __len__(self) -> int:
+        return len(self._ordinals)
+
+    def _assign(self, photo_id: str, keys: Iterable[FacetKey]) -> int:
+        ordinal = len(self._ids)
+        self._ordinals[photo_id] = ordinal
+        self._ids.append(photo_id)
+        self._keys.append(frozenset(keys))
+        return ordinal
+
+    def set(self, photo_id: str, keys: Iterable[FacetKey]) -> None:
+        """Replace a photo's facet keys (adds the photo if it is new)."""
+        keys = frozenset(keys)
+        ordinal = self._ordinals.get(photo_id)
+        if ordinal is None:
+            ordinal = self._assign(photo_id, keys)
+            old: frozenset[FacetKey] = frozenset()
+            self._live |= 1 << ordinal
+        else:
+            old = self._keys[ordinal]
+            self._keys[ordinal] = keys
+        bit = 1 << ordinal
+        for key in old - keys:
+            self._bitmaps[key] &= ~bit
+        for key in keys - old:
+            self._bitmaps[key] = self._bitmaps.get(key, 0) | bit
+        self.classifications += _node_count(keys) - _node_count(old)
+
+    def remove(self, photo_id: str) -> None:
+        ordinal = self._ordinals.pop(photo_id, None)
+        if ordinal is None:
+            return
+        bit = 1 << ordinal
+        for key in self._keys[ordinal]:
+            self._bitmaps[key] &= ~bit
+        self._live &= ~bit
+        self.classifications -= _node_count(self._keys[ordinal])
+        self._ids[ordinal] = None
+        self._keys[ordinal] = frozenset()
+
+    def bitmap(self, key: FacetKey) -> int:
+        return self._bitmaps.get(key, 0)
+
+    def select(
+        self,
+        status: Optional[str] = None,
+        category: Optional[str] = None,
+        exclude_categories: Sequence[str] = (),
+        node_groups: Sequence[Set[int]] = (),
+    ) -> int:
+        """Photos matching every given filter; each node group matches any of its nodes.
+
+        Same semantics as the SQL filters in ``get_photos``, including
+        ``category != x`` also excluding photos without a category.
+        """
+        result = self._live
+        if status:
+            result &= self.bitmap(("status", status))
+        if category:
+            result &= self.bitmap(("category", category))
+        if exclude_categories:
+            result &= ~self.bitmap(("category", None))
+            for excluded in exclude_categories:
+                result &= ~self.bitmap(("category", excluded))
+        for group in node_groups:
+            union = 0
+            for node_id in group:
+                union |= self.bitmap(("node", node_id))
+            result &= union
+        return result
+
+    def ids(self, bitmap: int) -> list[str]:
+        ids = self._ids
+        return [ids[ordinal] for ordinal in bitmap_members(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little"))]
+
+    def node_counts(self, within: Optional[int] = None) -> Dict[int, int]:
+        """Photos per taxonomy node, optionally only among the photos in ``within``."""
+        return {
+            key[1]: (bitmap if within is None else bitmap & within).bit_count()
+            for key, bitmap in self._bitmaps.items()
+            if key[0] == "node"
+        }
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "photos": len(self._ordinals),
+            "unused_ordinals": len(self._ids) - len(self._ordinals),
+            "keys": len(self._bitmaps),
+            "bytes": sum((bitmap.bit_length() + 7) // 8 for bitmap in self._bitmaps.values()),
+        }
+
+
+class PhotoFacetIndex:
+    """:class:`FacetBitmaps` over the photos table, synced with the database before every query."""
+
+    def __init__(self, rebuild_seconds: int, delete_check_seconds: int) -> None:
+        self.rebuild_seconds = rebuild_seconds
+        self.delete_check_seconds = delete_check_seconds
+        self.bitmaps = FacetBitmaps()
+        self.built_at: Optional[float] = None
+        self.counted_at: Optional[float] = None  # last row count comparison
+        self._source: Optional[str] = None  # database URL the index was built from
+        self._version: Optional[tuple] = None  # _read_version() as of the last build / sync
+        self._stale: Set[str] = set()  # photos changed by commits in this process
+        self._lock = asyncio.Lock()
+        self.queries = 0
+        self.syncs = 0
+        self.rebuilds = 0
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.built_at is not None
+
+    def mark(self, photo_ids: Iterable[str]) -> None:
+        """Re-read these photos before the next query."""
+        self._stale.update(photo_ids)
+
+    def _needs_rebuild(self, source: str) -> bool:
+        return (
+            self.built_at is None
+            or source != self._source
+            or time.monotonic() - self.built_at >= self.rebuild_seconds
+        )
+
+    def _counts_due(self) -> bool:
+        return self.counted_at is None or time.monotonic() - self.counted_at >= self.delete_check_seconds
+
+    @staticmethod
+    async def _read_version(db: AsyncSession, with_counts: bool = False) -> tuple[tuple, Optional[tuple]]:
+        """Newest updated_at of photos and classifications, and optionally their row counts.
+
+        The maxima are index lookups and move with every insert or update by
+        any process; the counts, which catch deletes, are table scans.
+        """
+        columns = [
+            select(func.max(Photo.updated_at)).scalar_subquery(),
+            select(func.max(PhotoClassification.updated_at)).scalar_subquery(),
+        ]
+        if with_counts:
+            columns += [
+                select(func.count()).select_from(Photo).scalar_subquery(),
+                select(func.count()).select_from(PhotoClassification).scalar_subquery(),
+            ]
+        row = tuple((await db.execute(select(*columns))).one())
+        return row[:2], (row[2:] if with_counts else None)
+
+    def _counts_match(self, counts: Optional[tuple]) -> bool:
+        return counts is None or counts == (len(self.bitmaps), self.bitmaps.classifications)
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        """Bring the index up to date with ``db``.
+
+        Callers must read ``self.bitmaps`` right after this returns, without
+        awaiting anything in between, so a concurrent rebuild cannot swap it.
+        """
+        source = str(db.get_bind().url)
+        counts_due = self._counts_due()
+        version, counts = await self._read_version(db, with_counts=counts_due)
+        if counts_due:
+            self.counted_at = time.monotonic()
+        if (
+            not self._needs_rebuild(source)
+            and not self._stale
+            and version == self._version
+            and self._counts_match(counts)
+        ):
+            return
+        async with self._lock:
+            if self._needs_rebuild(source):
+                await self._rebuild(db, source, version)
+            else:
+                await self._sync(db, version, counts)
+
+    async def warm(self, db: AsyncSession) -> None:
+        """Build the index unless a query already has; never replaces a loaded one."""
+        async with self._lock:
+            if not self.is_loaded:
+                version, _ = await self._read_version(db)
+                await self._rebuild(db, str(db.get_bind().url), version)
+
+    @staticmethod
+    async def _load(db: AsyncSession, photo_ids: Optional[list[str]] = None) -> dict[str, set[FacetKey]]:
+        photo_query = select(Photo.id, Photo.status, Photo.category)
+        classification_query = select(PhotoClassification.photo_id, PhotoClassification.node_id)
+        if photo_ids is not None:
+            photo_query = photo_query.where(Photo.id.in_(photo_ids))
+            classification_query = classification_query.where(PhotoClassification.photo_id.in_(photo_ids))
+        photos: dict[str, set[FacetKey]] = {
+            photo_id: {("status", status), ("category", category)}
+            for photo_id, status, category in await db.execute(photo_query)
+        }
+        for photo_id, node_id in await db.execute(classification_query):
+            keys = photos.get(photo_id)
+            if keys is not None:
+                keys.add(("node", node_id))
+        return photos
+
+    async def _rebuild(self, db: AsyncSession, source: str, version: tuple) -> None:
+        # Writes after the version was read show up as a newer version and are synced afterwards
+        self._stale = set()
+        photos = await self._load(db)
+        # ~0.5 s at 100k photos: build off the event loop, then swap
+        self.bitmaps = await asyncio.to_thread(FacetBitmaps, photos.items())
+        self._source = source
+        self._version = version
+        self.built_at = self.counted_at = time.monotonic()
+        self.rebuilds += 1
+        logger.info("Facet index built: %s", self.bitmaps.metrics())
+
+    async def _sync(self, db: AsyncSession, version: tuple, counts: Optional[tuple]) -> None:
+        """Re-read photos changed here or, going by updated_at, in other processes.
+
+        Deletes by other processes leave no updated_at behind; when ``counts``
+        were read and disagree with the index afterwards, it is rebuilt.
+        """
+        changed = set(self._stale)
+        self._stale = set()
+        photos_updated, classifications_updated = self._version or (None, None)
+        if photos_updated is not None:
+            changed.update((await db.execute(
+                select(Photo.id).where(Photo.updated_at >= photos_updated - _SYNC_OVERLAP)
+            )).scalars())
+        if classifications_updated is not None:
+            changed.update((await db.execute(
+                select(PhotoClassification.photo_id)
+                .where(PhotoClassification.updated_at >= classifications_updated - _SYNC_OVERLAP)
+            )).scalars())
+        changed = list(changed)
+        for start in range(0, len(changed), REFRESH_BATCH_SIZE):
+            batch = changed[start:start + REFRESH_BATCH_SIZE]
+            photos = await self._load(db, batch)
+            for photo_id in batch:
+                keys = photos.get(photo_id)
+                if keys is None:
+                    self.bitmaps.remove(photo_id)
+                else:
+                    self.bitmaps.set(photo_id, keys)
+        self.syncs += 1
+        if not self._counts_match(counts):
+            await self._rebuild(db, self._source, version)
+        else:
+            self._version = version
+
+    @staticmethod
+    async def resolve_nodes(db: AsyncSession, facets: Sequence[FacetValue]) -> list[Set[int]]:
+        """Node ids each listing filter matches: the node name, or also its slug-style key."""
+        if not facets:
+            return []
+        rows = (await db.execute(
+            select(TaxonomyNode.id, TaxonomyNode.name, TaxonomyNode.key, TaxonomyFacet.key)
+            .join(TaxonomyFacet, TaxonomyFacet.id == TaxonomyNode.facet_id)
+            .where(TaxonomyFacet.key.in_({facet_key for facet_key, _, _ in facets}))
+        )).all()
+        groups = []
+        for facet_key, value, match_key in facets:
+            normalized_key = value.lower().replace(" ", "-")
+            groups.append({
+                node_id
+                for node_id, name, key, node_facet_key in rows
+                if node_facet_key == facet_key and (name == value or (match_key and key == normalized_key))
+            })
+        return groups
+
+    async def select(
+        self,
+        db: AsyncSession,
+        status: Optional[str] = None,
+        category: Optional[str] = None,
+        exclude_categories: Sequence[str] = (),
+        facets: Sequence[FacetValue] = (),
+    ) -> int:
+        """Bitmap of photos matching the given listing filters (see :meth:`FacetBitmaps.select`)."""
+        node_groups = await self.resolve_nodes(db, facets)
+        await self.ensure_loaded(db)
+        self.queries += 1
+        return self.bitmaps.select(status, category, exclude_categories, node_groups)
+
+    def ids(self, bitmap: int) -> list[str]:
+        return self.bitmaps.ids(bitmap)
+
+    async def node_counts(self, db: AsyncSession) -> Dict[int, int]:
+        await self.ensure_loaded(db)
+        self.queries += 1
+        return self.bitmaps.node_counts()
+
+    def metrics(self) -> Dict[str, object]:
+        return {
+            **self.bitmaps.metrics(),
+            "stale": len(self._stale),
+            "queries": self.queries,
+            "syncs": self.syncs,
+            "rebuilds": self.rebuilds,
+        }
+
+
+_facet_index: Optional[PhotoFacetIndex] = None
+
+
+def get_photo_facet_index() -> PhotoFacetIndex:
+    global _facet_index
+    if _facet_index is None:
+        _facet_index = PhotoFacetIndex(settings.FACET_INDEX_REBUILD_SECONDS, settings.FACET_INDEX_DELETE_CHECK_SECONDS)
+    return _facet_index
+
+
+def reset_photo_facet_index() -> None:
+    """Drop the in-process index (tests, after bulk changes by scripts)."""
+    global _facet_index
+    _facet_index = None
+
+
+async def warm_photo_facet_index() -> None:
+    """Build the index at startup so the first listing does not pay for it."""
+    try:
+        async with AsyncSessionLocal() as db:
+            await get_photo_facet_index().warm(db)
+    except Exception as exc:  # noqa: BLE001 - built on first use instead
+        logger.warning("Facet index warm-up failed: %s", exc)
+
+
+# ── Change tracking: photos whose facet keys may have changed in a transaction ──
+
+def _mark(session: Session, photo_ids: Iterable[Optional[str]]) -> None:
+    session.info.setdefault(_STALE_KEY, set()).update(photo_id for photo_id in photo_ids if photo_id is not None)
+
+
+def _changed(obj, *fields: str) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_photos(session: Session, flush_context) -> None:
+    for obj in (*session.new, *session.deleted):
+        if isinstance(obj, Photo):
+            _mark(session, [obj.id])
+        elif isinstance(obj, PhotoClassification):
+            _mark(session, [obj.photo_id])
+    for obj in session.dirty:
+        if isinstance(obj, Photo) and _changed(obj, "status", "category"):
+            _mark(session, [obj.id])
+        elif isinstance(obj, PhotoClassification) and _changed(obj, "node_id", "photo_id"):
+            _mark(session, inspect(obj).attrs.photo_id.history.sum())
+
+
+# DELETE statement table -> query for the photos it affects
+_DELETE_TRACKERS = {
+    Photo.__tablename__: lambda where: select(Photo.id).where(where),
+    PhotoClassification.__tablename__: lambda where: select(PhotoClassification.photo_id).where(where),
+}
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_delete_statement(orm_execute_state) -> None:
+    statement = orm_execute_state.statement
+    if not isinstance(statement, Delete):
+        return
+    tracker = _DELETE_TRACKERS.get(statement.table.name)
+    if tracker is None:
+        return
+    where = statement.whereclause if statement.whereclause is not None else true()
+    session = orm_execute_state.session
+    _mark(session, session.connection().execute(tracker(where)).scalars())
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_after_commit(session: Session) -> None:
+    stale = session.info.pop(_STALE_KEY, None)
+    if stale and _facet_index is not None:
+        _facet_index.mark(stale)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_STALE_KEY, None)
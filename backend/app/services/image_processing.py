@@ -1,10 +1,11 @@
 """
 Image processing service for thumbnails and EXIF extraction
 """
+import math
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any
-from PIL import Image
+from typing import Optional, Dict, Any, List
+from PIL import Image, ImageOps
 from PIL.ExifTags import TAGS
 from app.core.config import get_settings
 
@@ -64,6 +65,50 @@ def get_image_dimensions(image_path: str) -> tuple[int, int]:
         return img.size
 
 
+def _normalize_exif(exif_raw: Optional[Dict[int, Any]]) -> Dict[str, Any]:
+    """Map raw EXIF tag ids to readable, JSON-serializable values."""
+    exif_data = {}
+    for tag_id, value in (exif_raw or {}).items():
+        tag = TAGS.get(tag_id, tag_id)
+
+        # 处理特殊类型以保证JSON可序列化
+        # Convert bytes to string
+        if isinstance(value, bytes):
+            try:
+                value = value.decode('utf-8', errors='ignore')
+            except:
+                value = str(value)
+        # Convert IFDRational to float
+        elif hasattr(value, '__class__') and value.__class__.__name__ == 'IFDRational':
+            try:
+                value = float(value)
+            except:
+                value = str(value)
+        # Convert tuple of IFDRational to list of float
+        elif isinstance(value, tuple):
+            try:
+                value = [
+                    float(v) if hasattr(v, '__class__') and v.__class__.__name__ == 'IFDRational' else v
+                    for v in value
+                ]
+            except:
+                value = str(value)
+        # Convert other non-serializable types
+        elif not isinstance(value, (str, int, float, bool, list, dict, type(None))):
+            value = str(value)
+
+        exif_data[tag] = value
+    return exif_data
+
+
+def _read_exif(img: Image.Image) -> Dict[str, Any]:
+    # EXIF lives in the file header, so this works before (and without) decoding pixels
+    try:
+        return _normalize_exif(img._getexif())
+    except Exception:
+        return {}
+
+
 def extract_exif(image_path: str) -> Dict[str, Any]:
     """
     Extract EXIF metadata from image
@@ -71,48 +116,12 @@ def extract_exif(image_path: str) -> Dict[str, Any]:
     Returns:
         dict: EXIF data with readable keys (JSON-serializable)
     """
-    exif_data = {}
-    
     try:
         with Image.open(image_path) as img:
-            exif_raw = img._getexif()
-            
-            if exif_raw:
-                for tag_id, value in exif_raw.items():
-                    tag = TAGS.get(tag_id, tag_id)
-                    
-                    # 处理特殊类型以保证JSON可序列化
-                    # Convert bytes to string
-                    if isinstance(value, bytes):
-                        try:
-                            value = value.decode('utf-8', errors='ignore')
-                        except:
-                            value = str(value)
-                    # Convert IFDRational to float
-                    elif hasattr(value, '__class__') and value.__class__.__name__ == 'IFDRational':
-                        try:
-                            value = float(value)
-                        except:
-                            value = str(value)
-                    # Convert tuple of IFDRational to list of float
-                    elif isinstance(value, tuple):
-                        try:
-                            value = [
-                                float(v) if hasattr(v, '__class__') and v.__class__.__name__ == 'IFDRational' else v
-                                for v in value
-                            ]
-                        except:
-                            value = str(value)
-                    # Convert other non-serializable types
-                    elif not isinstance(value, (str, int, float, bool, list, dict, type(None))):
-                        value = str(value)
-                    
-                    exif_data[tag] = value
-    except Exception as e:
+            return _read_exif(img)
+    except Exception:
         # If EXIF extraction fails, return empty dict
-        pass
-    
-    return exif_data
+        return {}
 
 
 def extract_date_taken(exif_data: Dict[str, Any]) -> Optional[datetime]:
@@ -140,16 +149,304 @@ def extract_date_taken(exif_data: Dict[str, Any]) -> Optional[datetime]:
     return None
 
 
+def compute_dhash(img: Image.Image, hash_size: int = 8) -> str:
+    """
+    64-bit difference hash (dHash) as 16 hex digits
+
+    The image is reduced to (hash_size + 1) x hash_size grey pixels and each
+    bit records whether a pixel is brighter than its right neighbour. Resizing,
+    re-compression and small colour edits leave most bits unchanged, so near
+    duplicates are a small Hamming distance apart.
+    """
+    grey = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+    pixels = grey.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{value:0{hash_size * hash_size // 4}x}"
+
+
+def dhash_file(image_path) -> Optional[str]:
+    """dHash of an image file, None if it cannot be decoded."""
+    try:
+        with Image.open(image_path) as img:
+            img.draft('L', (64, 64))
+            return compute_dhash(img)
+    except Exception:
+        return None
+
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+_SRGB_TO_LINEAR = [
+    value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+    for value in (channel / 255 for channel in range(256))
+]
+BLURHASH_COMPONENTS = (4, 3)
+# BlurHash only keeps a few cosine components, a 32px sample is already exact enough
+_BLURHASH_SAMPLE = 32
+
+
+def _base83(value: int, length: int) -> str:
+    return ''.join(_BASE83[(value // 83 ** (length - i - 1)) % 83] for i in range(length))
+
+
+def _linear_to_srgb(value: float) -> int:
+    value = min(max(value, 0.0), 1.0)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def compute_blurhash(img: Image.Image, components: tuple[int, int] = BLURHASH_COMPONENTS) -> str:
+    """
+    BlurHash (https://blurha.sh) of an image, 28 characters for 4 x 3 components
+
+    The client decodes it into a blurred preview of the layout and colours
+    while the real thumbnail loads. The cosine transform is separable, so it
+    runs per row and then per column on a small sample.
+    """
+    x_components, y_components = components
+    sample = img.convert('RGB')
+    sample.thumbnail((_BLURHASH_SAMPLE, _BLURHASH_SAMPLE), Image.Resampling.BOX)
+    width, height = sample.size
+    pixels = sample.tobytes()
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(y_components)]
+
+    # row_sums[i][y] = sum over x of cos_x[i][x] * linear(pixel(x, y)), per channel
+    row_sums = [[[0.0, 0.0, 0.0] for _ in range(height)] for _ in range(x_components)]
+    for y in range(height):
+        row = [_SRGB_TO_LINEAR[value] for value in pixels[y * width * 3:(y + 1) * width * 3]]
+        for i in range(x_components):
+            weights = cos_x[i]
+            sums = row_sums[i][y]
+            for x in range(width):
+                weight = weights[x]
+                sums[0] += weight * row[3 * x]
+                sums[1] += weight * row[3 * x + 1]
+                sums[2] += weight * row[3 * x + 2]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            scale = (1 if i == 0 and j == 0 else 2) / (width * height)
+            factor = [0.0, 0.0, 0.0]
+            for y in range(height):
+                weight = cos_y[j][y]
+                sums = row_sums[i][y]
+                for channel in range(3):
+                    factor[channel] += weight * sums[channel]
+            factors.append([value * scale for value in factor])
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        quantised_max = max(0, min(82, int(max(abs(value) for factor in ac for value in factor) * 166 - 0.5)))
+        max_value = (quantised_max + 1) / 166
+        result += _base83(quantised_max, 1)
+    else:
+        max_value = 1.0
+        result += _base83(0, 1)
+    result += _base83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+
+    def quantise(value: float) -> int:
+        scaled = value / max_value
+        signed = math.copysign(abs(scaled) ** 0.5, scaled)
+        return max(0, min(18, int(math.floor(signed * 9 + 9.5))))
+
+    for factor in ac:
+        result += _base83(quantise(factor[0]) * 19 * 19 + quantise(factor[1]) * 19 + quantise(factor[2]), 2)
+    return result
+
+
+def compute_dominant_color(img: Image.Image) -> str:
+    """Most common colour after reducing the image to a 5-colour palette, as ``#rrggbb``."""
+    sample = img.convert('RGB')
+    sample.thumbnail((64, 64), Image.Resampling.BOX)
+    quantised = sample.quantize(colors=5, method=Image.Quantize.MEDIANCUT)
+    _, index = max(quantised.getcolors())
+    palette = quantised.getpalette()
+    red, green, blue = palette[index * 3:index * 3 + 3]
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+
+def compute_placeholder(img: Image.Image) -> Dict[str, Optional[str]]:
+    """BlurHash and dominant colour for gallery placeholders."""
+    return {'blurhash': compute_blurhash(img), 'dominant_color': compute_dominant_color(img)}
+
+
+def placeholder_file(image_path) -> Optional[Dict[str, Optional[str]]]:
+    """Placeholder fields of an image file, None if it cannot be decoded."""
+    try:
+        with Image.open(image_path) as img:
+            img.draft('RGB', (_BLURHASH_SAMPLE * 2, _BLURHASH_SAMPLE * 2))
+            return compute_placeholder(img)
+    except Exception:
+        return None
+
+
+def _render_renditions(
+    img: Image.Image,
+    output_dir: str,
+    photo_uuid: str,
+    sizes: List[int],
+    quality: int,
+) -> tuple[Dict[int, str], Image.Image]:
+    """Write renditions from an opened, not yet loaded image.
+
+    The original is decoded once. For JPEG, ``draft()`` asks libjpeg for a
+    DCT-scaled decode (1/2, 1/4, 1/8) that is still at least as large as the
+    widest rendition. Each resize uses ``reducing_gap`` so Pillow first
+    shrinks with a cheap ``reduce()`` before the final LANCZOS pass. Smaller
+    renditions are then cascaded from the previous one instead of from full
+    resolution.
+
+    Returns the rendition paths and the smallest rendered image.
+    """
+    width, height = img.size
+    targets: List[int] = []
+    for size in sizes:
+        targets.append(size)
+        if size >= width:
+            break
+
+    widest = min(targets[-1], width)
+    img.draft('RGB', (widest, max(1, int(height * widest / width))))
+    source = img if img.mode in ('RGB', 'L') else img.convert('RGB')
+
+    renditions: Dict[int, str] = {}
+    for size in reversed(targets):
+        rendition_path = str(Path(output_dir) / f"{photo_uuid}_{size}.jpg")
+        if size >= width:
+            # draft() never reduces below the requested native width
+            rendered = source
+        else:
+            new_height = max(1, int(height * size / width))
+            rendered = source.resize((size, new_height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        rendered.save(rendition_path, 'JPEG', quality=quality, optimize=True)
+        renditions[size] = rendition_path
+        source = rendered
+    return dict(sorted(renditions.items())), source
+
+
+def create_renditions(
+    image_path,
+    output_dir: str,
+    photo_uuid: str,
+    sizes: Optional[List[int]] = None,
+    quality: Optional[int] = None,
+) -> Dict[int, str]:
+    """
+    Create one JPEG rendition per configured width from a single decode
+
+    Widths at or above the original width collapse into one native-width
+    rendition, so small images never get upscaled copies.
+
+    Args:
+        image_path: Path (or binary file object) of the original image
+        output_dir: Directory to write renditions to
+        photo_uuid: UUID of the photo
+        sizes: Target widths, defaults to IMAGE_RENDITION_SIZES
+        quality: JPEG quality, defaults to IMAGE_RENDITION_QUALITY
+
+    Returns:
+        dict: {width: rendition_path}
+    """
+    sizes = sorted(set(sizes or settings.IMAGE_RENDITION_SIZES))
+    quality = quality or settings.IMAGE_RENDITION_QUALITY
+    with Image.open(image_path) as img:
+        return _render_renditions(img, output_dir, photo_uuid, sizes, quality)[0]
+
+
+def pick_rendition(renditions: Optional[Dict[Any, str]], size: int) -> Optional[str]:
+    """
+    Pick the closest stored rendition for a requested width
+
+    Prefers the smallest rendition at least as wide as requested and falls
+    back to the widest one available.
+
+    Returns:
+        str or None: Stored rendition path
+    """
+    if not renditions:
+        return None
+    widths = sorted(int(width) for width in renditions)
+    chosen = next((width for width in widths if width >= size), widths[-1])
+    return renditions.get(str(chosen)) or renditions.get(chosen)
+
+
+TRANSFORM_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'png': ('PNG', 'image/png', 'png'),
+}
+
+
+def render_transform(
+    source_path: str,
+    output_path: str,
+    width: int,
+    height: Optional[int],
+    fit: str,
+    image_format: str,
+    quality: int,
+) -> tuple[int, int]:
+    """
+    Render one derived image (see services.transforms)
+
+    ``fit="inside"`` scales into the width x height box keeping the aspect
+    ratio; ``fit="cover"`` fills the box and center-crops the overflow.
+    Neither enlarges the source: a cover crop from a too-small source keeps
+    the box's aspect ratio at the source's resolution.
+
+    Returns:
+        tuple: (width, height) of the written image
+    """
+    pil_format = TRANSFORM_FORMATS[image_format][0]
+    with Image.open(source_path) as img:
+        src_width, src_height = img.size
+        box_height = height or max(1, round(src_height * width / src_width))
+        if fit == 'cover':
+            scale = max(width / src_width, box_height / src_height)
+        else:
+            scale = min(width / src_width, box_height / src_height)
+        img.draft('RGB', (max(1, int(src_width * scale)), max(1, int(src_height * scale))))
+        source = img if img.mode in ('RGB', 'L') else img.convert('RGB')
+
+        if fit == 'cover':
+            target = (width, box_height)
+            if scale > 1:
+                target = (max(1, round(width / scale)), max(1, round(box_height / scale)))
+            rendered = ImageOps.fit(source, target, Image.Resampling.LANCZOS)
+        else:
+            scale = min(scale, 1.0)
+            target = (max(1, round(src_width * scale)), max(1, round(src_height * scale)))
+            # draft() may already have decoded at (about) the target size
+            rendered = source if source.size == target else source.resize(
+                target, Image.Resampling.LANCZOS, reducing_gap=3.0
+            )
+
+        options: Dict[str, Any] = {'optimize': True}
+        if pil_format in ('JPEG', 'WEBP'):
+            options['quality'] = quality
+        if pil_format == 'JPEG':
+            options['progressive'] = True
+        rendered.save(output_path, pil_format, **options)
+        return rendered.size
+
+
 def process_uploaded_image(
     original_path: str,
     photo_uuid: str,
     output_dir: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
-    Process uploaded image: extract EXIF, create thumbnail, get dimensions
+    Process uploaded image: extract EXIF, create renditions, get dimensions
     
     Args:
-        original_path: Path to original image
+        original_path: Path (or binary file object) of the original image
         photo_uuid: UUID of the photo
         
     Returns:
@@ -159,34 +456,41 @@ def process_uploaded_image(
         'width': None,
         'height': None,
         'thumb_path': None,
+        'renditions': {},
         'exif_data': {},
-        'captured_at': None
+        'captured_at': None,
+        'perceptual_hash': None,
+        'blurhash': None,
+        'dominant_color': None,
     }
     
     try:
-        # Get dimensions
-        width, height = get_image_dimensions(original_path)
-        results['width'] = width
-        results['height'] = height
-        
-        # Extract EXIF
-        exif_data = extract_exif(original_path)
-        results['exif_data'] = exif_data
-        
-        # Extract date taken
-        captured_at = extract_date_taken(exif_data)
-        results['captured_at'] = captured_at
-        
-        # Create thumbnail
         thumbnails_dir = Path(output_dir) if output_dir else (Path(settings.UPLOAD_DIR) / "thumbnails")
         thumbnails_dir.mkdir(parents=True, exist_ok=True)
 
-        thumb_filename = f"{photo_uuid}_thumb.jpg"
-        thumb_path = str(thumbnails_dir / thumb_filename)
-        
-        create_thumbnail(original_path, thumb_path)
-        results['thumb_path'] = thumb_path
-        
+        # One open: size and EXIF come from the header, pixels are decoded once for all renditions
+        with Image.open(original_path) as img:
+            width, height = img.size
+            results['width'] = width
+            results['height'] = height
+
+            exif_data = _read_exif(img)
+            results['exif_data'] = exif_data
+            results['captured_at'] = extract_date_taken(exif_data)
+
+            renditions, smallest = _render_renditions(
+                img,
+                str(thumbnails_dir),
+                photo_uuid,
+                sorted(set(settings.IMAGE_RENDITION_SIZES)),
+                settings.IMAGE_RENDITION_QUALITY,
+            )
+            # The smallest rendition is still in memory, so hashing and placeholders cost no extra decode
+            results['perceptual_hash'] = compute_dhash(smallest)
+            results.update(compute_placeholder(smallest))
+        results['renditions'] = renditions
+        results['thumb_path'] = pick_rendition(renditions, settings.IMAGE_THUMBNAIL_SIZE)
+
     except Exception as e:
         # Log error but don't fail
         print(f"Error processing image: {e}")
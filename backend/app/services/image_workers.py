@@ -0,0 +1,192 @@
+"""
+Bounded worker pool for CPU-bound image processing on the upload path.
+
+PIL decoding and resampling hold the GIL for long stretches, so running them
+on the event loop (or in its thread pool) stalls every other request on the
+worker. Jobs are sent to a ``ProcessPoolExecutor`` instead. The number of
+outstanding jobs (queued + running) is capped; past the cap ``submit`` raises
+:class:`ImageWorkersBusy`, which endpoints turn into ``503`` + ``Retry-After``.
+
+``IMAGE_PROCESS_WORKERS=0`` runs jobs on a single background thread instead
+(development, tests); the same cap and metrics apply.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+from app.core.config import get_settings
+from app.services.image_processing import process_uploaded_image
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Timings kept for the percentile figures in metrics()
+_RECENT_JOBS = 256
+
+
+class ImageWorkersBusy(Exception):
+    """The pool already holds its maximum number of outstanding jobs."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Image processing is busy, retry later")
+        self.retry_after = retry_after
+
+
+def _timed_call(func: Callable[..., Any], args: tuple) -> tuple[Any, float]:
+    # Runs in the worker: report pure processing time separately from queueing
+    started = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 1)
+
+
+class ImageWorkerPool:
+    """Process (or thread) pool with a hard cap on outstanding jobs."""
+
+    def __init__(self, workers: int, max_pending: int, retry_after: int = 5) -> None:
+        self.workers = workers
+        self.max_outstanding = max(workers, 1) + max(max_pending, 0)
+        self.retry_after = retry_after
+        self._executor: Executor = (
+            # spawn: never fork a process that already runs an event loop and boto3 threads
+            ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            if workers > 0
+            else ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-worker")
+        )
+        self._lock = threading.Lock()
+        self.outstanding = 0
+        self.peak_outstanding = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._queue_ms: Deque[float] = deque(maxlen=_RECENT_JOBS)
+        self._run_ms: Deque[float] = deque(maxlen=_RECENT_JOBS)
+
+    def check_capacity(self) -> None:
+        """Raise ImageWorkersBusy if a job submitted now would be rejected.
+
+        Lets endpoints refuse a burst before storing the upload. Only
+        ``/upload/stream`` gets to do that before reading the body; a multipart
+        ``/upload`` has already been parsed by FastAPI when the endpoint runs.
+        """
+        with self._lock:
+            if self.outstanding >= self.max_outstanding:
+                self.rejected += 1
+                raise ImageWorkersBusy(self.retry_after)
+
+    def _try_reserve(self) -> bool:
+        with self._lock:
+            if self.outstanding >= self.max_outstanding:
+                return False
+            self.outstanding += 1
+            self.submitted += 1
+            self.peak_outstanding = max(self.peak_outstanding, self.outstanding)
+            return True
+
+    async def submit(self, func: Callable[..., Any], *args: Any, wait: bool = False) -> Any:
+        """Run ``func(*args)`` in the pool and await its result.
+
+        ``func`` and its arguments must be picklable (module-level function,
+        plain data). When the pool is full, raises ImageWorkersBusy, or with
+        ``wait=True`` (batch jobs such as imports) waits for a free slot.
+        """
+        while not self._try_reserve():
+            if not wait:
+                with self._lock:
+                    self.rejected += 1
+                raise ImageWorkersBusy(self.retry_after)
+            await asyncio.sleep(0.1)
+        started = time.perf_counter()
+        ok = False
+        try:
+            future = self._executor.submit(_timed_call, func, args)
+            result, run_ms = await asyncio.wrap_future(future)
+            ok = True
+        finally:
+            total_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.outstanding -= 1
+                if ok:
+                    self.completed += 1
+                    self._run_ms.append(run_ms)
+                    self._queue_ms.append(max(total_ms - run_ms, 0.0))
+                else:
+                    self.failed += 1
+        logger.debug("image job %s: %.1fms run, %.1fms queued", getattr(func, "__name__", func), run_ms, total_ms - run_ms)
+        return result
+
+    async def process_image(
+        self,
+        source_path: str,
+        photo_uuid: str,
+        output_dir: str,
+        wait: bool = False,
+    ) -> Dict[str, Any]:
+        """Dimensions, EXIF and renditions for the image at ``source_path`` (see process_uploaded_image)."""
+        return await self.submit(process_uploaded_image, source_path, photo_uuid, output_dir, wait=wait)
+
+    def metrics(self) -> Dict[str, object]:
+        with self._lock:
+            run_ms = list(self._run_ms)
+            queue_ms = list(self._queue_ms)
+            return {
+                "mode": "process" if self.workers > 0 else "thread",
+                "workers": self.workers,
+                "max_outstanding": self.max_outstanding,
+                "outstanding": self.outstanding,
+                "peak_outstanding": self.peak_outstanding,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "run_ms_p50": _percentile(run_ms, 0.5),
+                "run_ms_p95": _percentile(run_ms, 0.95),
+                "queue_ms_p50": _percentile(queue_ms, 0.5),
+                "queue_ms_p95": _percentile(queue_ms, 0.95),
+            }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+# 进程级单例，与存储后端一致：FastAPI lifespan 中创建/关闭，其余入口懒加载
+_pool: Optional[ImageWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def init_image_workers() -> ImageWorkerPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ImageWorkerPool(
+                settings.IMAGE_PROCESS_WORKERS,
+                settings.IMAGE_PROCESS_QUEUE_SIZE,
+                settings.IMAGE_PROCESS_RETRY_AFTER,
+            )
+        return _pool
+
+
+def get_image_workers() -> ImageWorkerPool:
+    return _pool or init_image_workers()
+
+
+def close_image_workers() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
@@ -0,0 +1,105 @@
+"""
+Streaming upload ingest: request body -> storage writer in a single pass.
+
+While the body streams in, the size limit is enforced, a SHA-256 content
+hash is computed and the bytes go straight into the backend writer (final
+local path or S3 multipart). When the writer does not leave a local file
+behind, the bytes are also staged in a temporary file, so thumbnail
+generation reads from disk in the image worker instead of the upload being
+held in memory and pickled across the process boundary.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from app.core.config import get_settings
+from app.services.storage import MediaWriter
+
+settings = get_settings()
+
+# Request chunks are batched to this size before each hop to a worker thread
+INGEST_FLUSH_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """The body exceeded MAX_UPLOAD_SIZE."""
+
+    def __init__(self, limit: int) -> None:
+        super().__init__(f"Upload exceeds the maximum size of {limit} bytes")
+        self.limit = limit
+
+
+class StreamingIngest:
+    """Hash, size-check and tee one upload into a MediaWriter."""
+
+    def __init__(self, writer: MediaWriter, max_size: Optional[int] = None) -> None:
+        self.writer = writer
+        self.max_size = max_size or settings.MAX_UPLOAD_SIZE
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._decode_file = (
+            tempfile.NamedTemporaryFile(
+                prefix="buct-upload-decode-", suffix=Path(writer.key).suffix or ".bin", delete=False
+            )
+            if not writer.is_local
+            else None
+        )
+
+    @property
+    def content_hash(self) -> str:
+        return self._sha256.hexdigest()
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise UploadTooLarge(self.max_size)
+        self._sha256.update(data)
+        self.writer.write(data)
+        if self._decode_file is not None:
+            self._decode_file.write(data)
+
+    async def consume(self, chunks: AsyncIterator[bytes]) -> None:
+        """Feed an async body stream through ``write`` off the event loop."""
+        pending = bytearray()
+        received = self.size
+        async for chunk in chunks:
+            received += len(chunk)
+            if received > self.max_size:
+                # Fail before buffering or writing anything past the limit
+                raise UploadTooLarge(self.max_size)
+            pending += chunk
+            if len(pending) >= INGEST_FLUSH_SIZE:
+                await asyncio.to_thread(self.write, bytes(pending))
+                pending.clear()
+        if pending:
+            await asyncio.to_thread(self.write, bytes(pending))
+
+    def commit(self) -> None:
+        self.writer.commit()
+
+    def abort(self) -> None:
+        try:
+            self.writer.abort()
+        finally:
+            self.close()
+
+    def decode_source(self) -> str:
+        """Path of the committed local file, or of the staged copy (valid until ``close``)."""
+        if self._decode_file is None:
+            return self.writer.local_path
+        self._decode_file.flush()
+        return self._decode_file.name
+
+    def close(self) -> None:
+        if self._decode_file is not None:
+            self._decode_file.close()
+            try:
+                os.remove(self._decode_file.name)
+            except FileNotFoundError:
+                pass
+            self._decode_file = None
@@ -0,0 +1,231 @@
+"""
+HTTP helpers for media responses (validators, conditional GET, Cache-Control, byte ranges).
+
+Validators are derived from the photo row alone, so revalidation requests can be
+answered with 304 before the storage backend is touched. Only the media columns
+feed them: metadata edits and view counts must not invalidate cached bytes.
+
+There is no Last-Modified: no column records when the stored media last
+changed (a deferred pipeline adds renditions long after created_at), and a
+date that does not move with the bytes would let If-Modified-Since return a
+stale 304. The ETag is the only validator; date-based If-Modified-Since and
+If-Range are ignored.
+"""
+from __future__ import annotations
+
+import hashlib
+import inspect
+import secrets
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+from app.core.config import get_settings
+from app.models.photo import Photo
+
+settings = get_settings()
+
+# Requests asking for more (non-overlapping) ranges than this get the full body
+MAX_RANGES = 16
+RANGE_CHUNK_SIZE = 64 * 1024
+
+ByteRange = Tuple[int, int]
+
+
+class RangeNotSatisfiable(Exception):
+    """None of the requested byte ranges overlap the representation."""
+
+
+@dataclass
+class MediaValidators:
+    etag: str
+    cache_control: str
+
+    def headers(self) -> Dict[str, str]:
+        return {"ETag": self.etag, "Cache-Control": self.cache_control}
+
+
+def cache_control_for(kind: str, public: bool) -> str:
+    """Cache-Control for a media kind (thumbnail/rendition/original/download).
+
+    Restricted photos (pending, or portraits behind a visibility policy) are
+    always ``private`` so shared caches such as nginx never store them.
+    """
+    max_age = settings.MEDIA_CACHE_MAX_AGE.get(kind, 0)
+    if max_age <= 0:
+        return "no-cache"
+    scope = "public" if public else "private"
+    return f"{scope}, max-age={max_age}"
+
+
+def _media_fingerprint(photo: Photo, path: str) -> str:
+    # Stored files are replaced by writing new paths (reprocessing, re-upload), so
+    # the paths plus the original's hash and size change whenever the bytes do.
+    renditions = sorted((photo.renditions or {}).items())
+    return "|".join(str(part) for part in (
+        photo.id, path, photo.original_path, photo.processed_path, photo.thumb_path,
+        renditions, photo.content_hash, photo.file_size,
+    ))
+
+
+def media_validators(photo: Photo, path: str, kind: str, public: bool) -> MediaValidators:
+    """Build a strong ETag from the photo's stored media, not from updated_at.
+
+    ``updated_at`` moves on every metadata edit, and nothing dates the media
+    itself, so there is no Last-Modified.
+    """
+    digest = hashlib.sha1(_media_fingerprint(photo, path).encode("utf-8")).hexdigest()
+    return MediaValidators(etag=f'"{digest[:32]}"', cache_control=cache_control_for(kind, public))
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison (RFC 9110 §13.1.2)
+    candidates = [item.strip().removeprefix("W/") for item in header.split(",")]
+    return etag in candidates
+
+
+def is_not_modified(request: Request, validators: MediaValidators) -> bool:
+    # If-Modified-Since is ignored: without Last-Modified there is no date to compare
+    if_none_match = request.headers.get("if-none-match")
+    return if_none_match is not None and _etag_matches(if_none_match, validators.etag)
+
+
+def not_modified_response(request: Request, validators: MediaValidators) -> Optional[Response]:
+    """Return a 304 when the client's cached copy is still valid, else None."""
+    if request.method not in ("GET", "HEAD") or not is_not_modified(request, validators):
+        return None
+    return Response(status_code=304, headers=validators.headers())
+
+
+def range_header_for(request: Request, validators: Optional[MediaValidators]) -> Optional[str]:
+    """Return the Range header to honour, dropping it when If-Range no longer matches."""
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if not range_header or not if_range or validators is None:
+        return range_header
+    # If-Range requires a strong comparison; a date cannot match, so the full body is sent
+    return range_header if if_range.strip() == validators.etag else None
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[List[ByteRange]]:
+    """Parse a ``bytes=`` Range header into sorted, merged inclusive ranges.
+
+    Returns None when the header should be ignored (absent, malformed, other
+    units, too many ranges) and raises RangeNotSatisfiable when it is valid
+    but no range overlaps the ``size`` bytes available.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.strip().partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges: List[ByteRange] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start_text, dash, end_text = part.partition("-")
+        if not dash:
+            return None
+        try:
+            if start_text == "":
+                suffix = int(end_text)
+                if suffix <= 0:
+                    continue
+                start, end = max(size - suffix, 0), size - 1
+            else:
+                start = int(start_text)
+                end = int(end_text) if end_text else size - 1
+                if end_text and start > end:
+                    return None
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+        if start < size and start <= end:
+            ranges.append((start, end))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged: List[ByteRange] = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def range_not_satisfiable_response(size: int) -> Response:
+    return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+
+def partial_content_response(
+    ranges: List[ByteRange],
+    size: int,
+    media_type: str,
+    read_range: Callable[[int, int], Union[Iterator[bytes], AsyncIterator[bytes]]],
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Build a 206 response for one range or a multipart/byteranges body for many.
+
+    ``read_range(start, end)`` yields the bytes of an inclusive range; it may
+    be a plain or an async generator function.
+    """
+    headers = {**(headers or {}), "Accept-Ranges": "bytes"}
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            read_range(start, end),
+            status_code=206,
+            media_type=media_type,
+            headers=headers,
+        )
+
+    boundary = secrets.token_hex(16)
+    part_headers = [
+        (
+            f"--{boundary}\r\n"
+            f"Content-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode("latin-1")
+        for start, end in ranges
+    ]
+    closing = f"--{boundary}--\r\n".encode("latin-1")
+    headers["Content-Length"] = str(
+        sum(len(head) + (end - start + 1) + 2 for head, (start, end) in zip(part_headers, ranges))
+        + len(closing)
+    )
+
+    def body() -> Iterator[bytes]:
+        for head, (start, end) in zip(part_headers, ranges):
+            yield head
+            yield from read_range(start, end)
+            yield b"\r\n"
+        yield closing
+
+    async def abody() -> AsyncIterator[bytes]:
+        for head, (start, end) in zip(part_headers, ranges):
+            yield head
+            async for chunk in read_range(start, end):
+                yield chunk
+            yield b"\r\n"
+        yield closing
+
+    return StreamingResponse(
+        abody() if inspect.isasyncgenfunction(read_range) else body(),
+        status_code=206,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers=headers,
+    )
@@ -0,0 +1,104 @@
+"""
+Deferred media pipeline for accept-fast uploads.
+
+With deferred processing the upload endpoint only persists the original and
+creates the photo row with ``processing_status="processing"``, then returns
+202. This stage runs afterwards (FastAPI background task or Celery worker):
+renditions, dimensions and EXIF, default taxonomy, then AI analysis when
+enabled. Clients follow progress through ``processing_status``:
+
+    processing -> pending (AI queued) -> completed / failed
+    processing -> manual (AI disabled)
+    processing -> failed (media could not be processed)
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Optional
+
+from app.core.celery_app import celery_app
+from app.core.config import get_settings
+from app.core.database import AsyncSessionLocal
+from app.crud import photo as photo_crud
+from app.services.ai_tasks import create_ai_analysis_task, run_ai_analysis_task
+from app.services.image_workers import get_image_workers
+from app.services.runtime_settings import get_runtime_settings
+from app.services.storage import get_storage, sha256_file
+from app.services.taxonomy import ensure_default_taxonomy
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+async def run_photo_pipeline(photo_id: str, enable_ai: bool = True, requested_by_id: Optional[str] = None) -> Optional[str]:
+    """Process a deferred upload; returns the resulting processing_status."""
+    storage = get_storage()
+    async with AsyncSessionLocal() as db:
+        photo = await photo_crud.get_photo(db, photo_id)
+        if photo is None:
+            return None
+        if photo.processing_status != "processing":
+            # Already handled (e.g. a redelivered Celery message)
+            return photo.processing_status
+
+        rendition_dir = tempfile.mkdtemp(prefix="buct-media-upload-")
+        try:
+            async with storage.alocal_copy(photo.original_path) as local_path:
+                result = await get_image_workers().process_image(local_path, photo.id, rendition_dir, wait=True)
+                if not photo.content_hash:
+                    # Rows stored before uploads recorded their hash
+                    photo.content_hash = await asyncio.to_thread(sha256_file, local_path)
+            if not result.get("renditions"):
+                raise RuntimeError("image could not be decoded")
+            thumb_key, renditions = await storage.apersist_renditions(
+                photo.id, result.get("thumb_path"), result.get("renditions")
+            )
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Media pipeline failed for photo %s: %s", photo_id, exc)
+            photo.processing_status = "failed"
+            photo.updated_at = datetime.utcnow()
+            await db.commit()
+            return photo.processing_status
+        finally:
+            shutil.rmtree(rendition_dir, ignore_errors=True)
+
+        photo.thumb_path = thumb_key
+        photo.renditions = renditions or None
+        photo.width = result.get("width")
+        photo.height = result.get("height")
+        photo.exif_data = result.get("exif_data", {})
+        photo.captured_at = result.get("captured_at")
+        photo.perceptual_hash = result.get("perceptual_hash")
+        photo.blurhash = result.get("blurhash")
+        photo.dominant_color = result.get("dominant_color")
+        photo.updated_at = datetime.utcnow()
+
+        runtime_settings = await get_runtime_settings(db)
+        run_ai = enable_ai and runtime_settings.ai_enabled
+        photo.processing_status = "pending" if run_ai else "manual"
+        await db.commit()
+        await ensure_default_taxonomy(db)
+
+        task_id = None
+        if run_ai:
+            task = await create_ai_analysis_task(
+                db,
+                photo=photo,
+                requested_by_id=requested_by_id,
+                provider=runtime_settings.ai_provider,
+                model_id=runtime_settings.ai_model_id,
+            )
+            task_id = task.id
+        status = photo.processing_status
+
+    if task_id is not None:
+        if settings.TASK_QUEUE_BACKEND == "celery" and celery_app is not None:
+            celery_app.send_task("app.tasks.ai.run_photo_ai_analysis", args=[task_id])
+        else:
+            # Already off the request path, so analyse in this background task
+            await run_ai_analysis_task(task_id)
+    return status
@@ -0,0 +1,447 @@
+"""
+In-process inverted index over photo search documents.
+
+Most queries and metadata are Chinese ("秋天图书馆银杏"), which has no spaces to
+split on, so the SQL side can only match the whole query as one substring.
+Here a query is segmented instead, and every segment must occur in the
+photo's search document (filename, description, tags, taxonomy nodes and
+aliases; see models.search_document):
+
+- Segmentation is forward maximum matching against a dictionary seeded from
+  taxonomy node names, aliases and tag names, so "秋天图书馆银杏" becomes
+  ``秋天 / 图书馆 / 银杏`` when those are known terms. Text between known
+  terms stays one segment; particles such as "的" split it further.
+- Documents are indexed by character bigram, plus unigrams for CJK
+  characters so one-character segments work. A segment's candidates are the
+  intersection of its n-gram posting lists; candidates are then checked
+  against the stored document text, so results are exactly "contains every
+  segment", with no bigram false positives.
+- Posting lists are sorted ``array('I')`` of document numbers, switching to
+  a bitmap once more than 1/32 of all documents contain the n-gram (smaller
+  than the array from then on). Arrays are intersected smallest first by
+  binary search, bitmaps as big integers. An updated photo gets a new
+  number appended at the end, so arrays stay sorted and bitmaps just set a
+  bit; the old number is tombstoned until the next full rebuild compacts it.
+
+The index is loaded from ``photo_search_documents`` on first use and then
+applies this process's commits immediately (commit hook). Its result is used
+as an authoritative id filter, so before every search it also pulls the rows
+other workers changed since the last one: an ``updated_at`` range on an
+indexed column, usually empty. Deletions leave no row to find that way, so
+every SEARCH_INDEX_SYNC_SECONDS the document count is compared with the
+index and, on a mismatch, photos that are gone are dropped; the same check
+reloads the dictionary only if its tables changed. A full rebuild every
+SEARCH_INDEX_REBUILD_SECONDS compacts tombstones. :func:`query_terms` is
+shared with the SQL fallback, so both paths mean the same thing by a query.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, Optional, Union
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.search_document import PhotoSearchDocument, on_documents_committed
+from app.models.tag import Tag
+from app.models.taxonomy import TaxonomyAlias, TaxonomyNode
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Same separators as AliasIndex; particles only split text that is not a dictionary word
+_SEPARATORS = re.compile(r"[\s,，、；;：:！!？?·\-\|。.\"'“”‘’()（）\[\]【】/\\_]+")
+_PARTICLES = re.compile(r"[的了吗呢吧啊呀哦哇嘛咯]+")
+# A posting list turns into a bitmap (one bit per document number) once that is
+# smaller than the array (four bytes per entry), like roaring bitmaps' dense containers
+DENSE_MIN_POSTINGS = 1024
+Posting = Union[array, bytearray, bytes]
+# Rows written by other workers may commit slightly out of updated_at order
+_SYNC_OVERLAP = timedelta(seconds=5)
+
+
+def is_cjk(char: str) -> bool:
+    return "㐀" <= char <= "鿿" or "豈" <= char <= "﫿"
+
+
+def normalize(text: str) -> str:
+    return text.lower()
+
+
+def segment(text: str, dictionary: frozenset[str], max_word_length: int) -> list[str]:
+    """Forward maximum matching: dictionary words, with the text between them kept whole."""
+    segments: list[str] = []
+    pending: list[str] = []
+    position = 0
+    while position < len(text):
+        for length in range(min(max_word_length, len(text) - position), 1, -1):
+            word = text[position:position + length]
+            if word in dictionary:
+                if pending:
+                    segments.append("".join(pending))
+                    pending = []
+                segments.append(word)
+                position += length
+                break
+        else:
+            pending.append(text[position])
+            position += 1
+    if pending:
+        segments.append("".join(pending))
+    return segments
+
+
+def query_terms(query: str, dictionary: frozenset[str] = frozenset(), max_word_length: int = 0) -> list[str]:
+    """Segments of ``query`` that must all occur in a matching document (lower-cased, de-duplicated)."""
+    terms: list[str] = []
+    for part in _SEPARATORS.split(normalize(query)):
+        if not part:
+            continue
+        for piece in segment(part, dictionary, max_word_length) if max_word_length >= 2 else [part]:
+            chunks = [piece] if piece in dictionary else _PARTICLES.split(piece)
+            for chunk in chunks:
+                if len(chunk) > 1 or (chunk and is_cjk(chunk)):
+                    terms.append(chunk)
+    return list(dict.fromkeys(terms))
+
+
+def document_grams(text: str) -> set[str]:
+    """Index keys of a document: every character bigram, plus each CJK character."""
+    grams = {text[i:i + 2] for i in range(len(text) - 1)}
+    grams.update(char for char in text if is_cjk(char))
+    return grams
+
+
+def term_grams(term: str) -> list[str]:
+    if len(term) == 1:
+        return [term]
+    return list({term[i:i + 2] for i in range(len(term) - 1)})
+
+
+def intersect(a: array, b: array) -> array:
+    """Sorted intersection of two sorted arrays, probing the longer one by binary search."""
+    if len(a) > len(b):
+        a, b = b, a
+    result = array("I")
+    low, size = 0, len(b)
+    for value in a:
+        low = bisect_left(b, value, low)
+        if low == size:
+            break
+        if b[low] == value:
+            result.append(value)
+    return result
+
+
+def to_bitmap(posting: array) -> bytearray:
+    bitmap = bytearray((posting[-1] >> 3) + 1) if posting else bytearray()
+    for number in posting:
+        bitmap[number >> 3] |= 1 << (number & 7)
+    return bitmap
+
+
+def bitmap_members(bitmap: bytes) -> Iterator[int]:
+    for position, byte in enumerate(bitmap):
+        while byte:
+            low = byte & -byte
+            yield (position << 3) + low.bit_length() - 1
+            byte ^= low
+
+
+def intersect_all(postings: list[Posting]) -> Posting:
+    """Intersection of sorted arrays and bitmaps: a bitmap only if every input is one.
+
+    Bitmaps are AND-ed as big integers (C speed); an array is filtered
+    through bitmaps with one byte lookup per element.
+    """
+    arrays = sorted((posting for posting in postings if isinstance(posting, array)), key=len)
+    bitmaps = [posting for posting in postings if not isinstance(posting, array)]
+    if not arrays:
+        combined = int.from_bytes(bitmaps[0], "little")
+        for bitmap in bitmaps[1:]:
+            combined &= int.from_bytes(bitmap, "little")
+        return combined.to_bytes(min(len(bitmap) for bitmap in bitmaps), "little")
+    result = arrays[0]
+    for other in arrays[1:]:
+        if not result:
+            return result
+        result = intersect(result, other)
+    for bitmap in bitmaps:
+        size = len(bitmap)
+        result = array("I", [n for n in result if (n >> 3) < size and bitmap[n >> 3] >> (n & 7) & 1])
+    return result
+
+
+class NgramIndex:
+    """Bigram inverted index over documents keyed by photo id."""
+
+    def __init__(self, documents: Iterable[tuple[str, str]] = ()) -> None:
+        self._postings: dict[str, Posting] = {}
+        self._keys: list[str] = []  # document number -> photo id
+        self._texts: list[Optional[str]] = []  # document number -> text, None once replaced/removed
+        self._numbers: dict[str, int] = {}  # photo id -> live document number
+        for key, text in documents:
+            self.add(key, text)
+
+    def __len__(self) -> int:
+        return len(self._numbers)
+
+    @property
+    def tombstones(self) -> int:
+        return len(self._keys) - len(self._numbers)
+
+    def text(self, key: str) -> Optional[str]:
+        number = self._numbers.get(key)
+        return None if number is None else self._texts[number]
+
+    def add(self, key: str, text: str) -> None:
+        text = normalize(text)
+        if self.text(key) == text:
+            return
+        self.remove(key)
+        number = len(self._keys)
+        self._keys.append(key)
+        self._texts.append(text)
+        self._numbers[key] = number
+        postings = self._postings
+        for gram in document_grams(text):
+            posting = postings.get(gram)
+            if posting is None:
+                postings[gram] = array("I", (number,))
+            elif isinstance(posting, array):
+                posting.append(number)  # numbers only grow, so the list stays sorted
+                if len(posting) >= DENSE_MIN_POSTINGS and len(posting) * 32 >= number:
+                    postings[gram] = to_bitmap(posting)
+            else:
+                byte = number >> 3
+                if byte >= len(posting):
+                    posting.extend(bytes(byte - len(posting) + 1))
+                posting[byte] |= 1 << (number & 7)
+
+    def keys(self) -> list[str]:
+        return list(self._numbers)
+
+    def remove(self, key: str) -> None:
+        number = self._numbers.pop(key, None)
+        if number is not None:
+            self._texts[number] = None
+
+    def _candidates(self, term: str) -> Posting:
+        postings = []
+        for gram in term_grams(term):
+            posting = self._postings.get(gram)
+            if posting is None:
+                return array("I")
+            postings.append(posting)
+        return intersect_all(postings)
+
+    def search(self, terms: list[str]) -> list[str]:
+        """Photo ids whose document contains every term, in index order."""
+        if not terms:
+            return []
+        candidates = intersect_all([self._candidates(term) for term in terms])
+        numbers = candidates if isinstance(candidates, array) else bitmap_members(candidates)
+        texts, keys = self._texts, self._keys
+        matches = []
+        for number in numbers:
+            text = texts[number]
+            if text is not None and all(term in text for term in terms):
+                matches.append(keys[number])
+        return matches
+
+    def metrics(self) -> Dict[str, int]:
+        bitmaps = [posting for posting in self._postings.values() if not isinstance(posting, array)]
+        return {
+            "documents": len(self._numbers),
+            "tombstones": self.tombstones,
+            "grams": len(self._postings),
+            "bitmaps": len(bitmaps),
+            "bytes": sum(
+                len(posting) * posting.itemsize if isinstance(posting, array) else len(posting)
+                for posting in self._postings.values()
+            ),
+        }
+
+
+class PhotoSearchIndex:
+    """:class:`NgramIndex` over ``photo_search_documents`` plus the segmentation dictionary."""
+
+    def __init__(self, sync_seconds: int, rebuild_seconds: int) -> None:
+        self.sync_seconds = sync_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.index = NgramIndex()
+        self.dictionary: frozenset[str] = frozenset()
+        self.max_word_length = 0
+        self.built_at: Optional[float] = None
+        self.checked_at: Optional[float] = None  # last deletion / dictionary check
+        self.dictionary_stale = False  # this process changed a tag, taxonomy node or alias
+        self._dictionary_version: Optional[tuple] = None
+        self._high_water: Optional[datetime] = None  # newest updated_at seen
+        self._pending: Optional[list[Dict[str, Optional[str]]]] = None  # commits seen during a rebuild
+        self._lock = asyncio.Lock()
+        self.searches = 0
+        self.syncs = 0
+        self.removals = 0
+        self.dictionary_loads = 0
+        self.rebuilds = 0
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.built_at is not None
+
+    def _needs_rebuild(self) -> bool:
+        return self.built_at is None or time.monotonic() - self.built_at >= self.rebuild_seconds
+
+    def _needs_check(self) -> bool:
+        return self.checked_at is None or time.monotonic() - self.checked_at >= self.sync_seconds
+
+    def apply(self, changes: Dict[str, Optional[str]]) -> None:
+        """Apply committed document changes (``None`` removes the photo)."""
+        if self._pending is not None:
+            self._pending.append(changes)
+        for photo_id, document in changes.items():
+            if document is None:
+                self.index.remove(photo_id)
+            else:
+                self.index.add(photo_id, document)
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        async with self._lock:
+            if self._needs_rebuild():
+                await self._rebuild(db)
+                return
+            await self._sync(db)
+            if self.dictionary_stale or self._needs_check():
+                await self._check(db)
+
+    @staticmethod
+    async def _read_dictionary_version(db: AsyncSession) -> tuple:
+        # Tags and aliases carry no updated_at: additions and deletions move their
+        # count or max id; renames in this process set dictionary_stale
+        return tuple((await db.execute(select(
+            select(func.count()).select_from(TaxonomyNode).scalar_subquery(),
+            select(func.max(TaxonomyNode.updated_at)).scalar_subquery(),
+            select(func.count()).select_from(TaxonomyAlias).scalar_subquery(),
+            select(func.max(TaxonomyAlias.id)).scalar_subquery(),
+            select(func.count()).select_from(Tag).scalar_subquery(),
+            select(func.max(Tag.id)).scalar_subquery(),
+        ))).one())
+
+    async def _load_dictionary(self, db: AsyncSession, version: tuple) -> None:
+        self.dictionary_stale = False
+        words: set[str] = set()
+        for column in (TaxonomyNode.name, TaxonomyAlias.alias, Tag.name):
+            words.update(normalize(value).strip() for value in (await db.execute(select(column))).scalars() if value)
+        self.dictionary = frozenset(word for word in words if len(word) >= 2)
+        self.max_word_length = max((len(word) for word in self.dictionary), default=0)
+        self._dictionary_version = version
+        self.dictionary_loads += 1
+
+    async def _rebuild(self, db: AsyncSession) -> None:
+        # Commits that land while the snapshot is read and indexed are replayed onto the new index
+        self._pending = []
+        try:
+            await self._load_dictionary(db, await self._read_dictionary_version(db))
+            rows = (await db.execute(
+                select(PhotoSearchDocument.photo_id, PhotoSearchDocument.document, PhotoSearchDocument.updated_at)
+            )).all()
+            # Seconds at 100k photos: build off the event loop, then swap
+            index = await asyncio.to_thread(NgramIndex, ((photo_id, document) for photo_id, document, _ in rows))
+            pending = self._pending
+        finally:
+            self._pending = None
+        self.index = index
+        for changes in pending:
+            self.apply(changes)
+        self._high_water = max((updated_at for _, _, updated_at in rows), default=None)
+        self.built_at = self.checked_at = time.monotonic()
+        self.rebuilds += 1
+        logger.info("Search index built: %s, %d dictionary words", index.metrics(), len(self.dictionary))
+
+    async def _sync(self, db: AsyncSession) -> None:
+        query = select(PhotoSearchDocument.photo_id, PhotoSearchDocument.document, PhotoSearchDocument.updated_at)
+        if self._high_water is not None:
+            query = query.where(PhotoSearchDocument.updated_at >= self._high_water - _SYNC_OVERLAP)
+        rows = (await db.execute(query)).all()
+        for photo_id, document, updated_at in rows:
+            self.index.add(photo_id, document)
+            if self._high_water is None or updated_at > self._high_water:
+                self._high_water = updated_at
+        self.syncs += 1
+
+    async def _check(self, db: AsyncSession) -> None:
+        version = await self._read_dictionary_version(db)
+        if self.dictionary_stale or version != self._dictionary_version:
+            await self._load_dictionary(db, version)
+        if self._needs_check():
+            count = (await db.execute(select(func.count()).select_from(PhotoSearchDocument))).scalar_one()
+            if count != len(self.index):
+                live = set((await db.execute(select(PhotoSearchDocument.photo_id))).scalars())
+                for photo_id in self.index.keys():
+                    if photo_id not in live:
+                        self.index.remove(photo_id)
+                        self.removals += 1
+            self.checked_at = time.monotonic()
+
+    def terms(self, query: str) -> list[str]:
+        return query_terms(query, self.dictionary, self.max_word_length)
+
+    async def search(self, db: AsyncSession, query: str) -> Optional[list[str]]:
+        """Ids of photos matching every segment of ``query``; None when there is nothing to search for."""
+        await self.ensure_loaded(db)
+        terms = self.terms(query)
+        if not terms:
+            return None
+        self.searches += 1
+        return self.index.search(terms)
+
+    def metrics(self) -> Dict[str, object]:
+        return {
+            **self.index.metrics(),
+            "dictionary_words": len(self.dictionary),
+            "searches": self.searches,
+            "syncs": self.syncs,
+            "removals": self.removals,
+            "dictionary_loads": self.dictionary_loads,
+            "rebuilds": self.rebuilds,
+        }
+
+
+_search_index: Optional[PhotoSearchIndex] = None
+
+
+def get_photo_search_index() -> PhotoSearchIndex:
+    global _search_index
+    if _search_index is None:
+        _search_index = PhotoSearchIndex(settings.SEARCH_INDEX_SYNC_SECONDS, settings.SEARCH_INDEX_REBUILD_SECONDS)
+    return _search_index
+
+
+def reset_photo_search_index() -> None:
+    """Drop the in-process index (tests, after a bulk rebuild)."""
+    global _search_index
+    _search_index = None
+
+
+@on_documents_committed
+def _apply_committed_documents(changes: Dict[str, Optional[str]]) -> None:
+    if _search_index is not None and _search_index.is_loaded:
+        _search_index.apply(changes)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_dictionary(session: Session, flush_context) -> None:
+    if _search_index is None:
+        return
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Tag, TaxonomyNode, TaxonomyAlias)):
+            _search_index.dictionary_stale = True
+            return
@@ -16,6 +16,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.taxonomy import TaxonomyAlias, TaxonomyFacet, TaxonomyNode
+from app.services.search_index import segment
 
 logger = logging.getLogger(__name__)
 
@@ -54,6 +55,8 @@ class AliasIndex:
         self._alias_map: dict[str, list[TokenMatch]] = {}
         self._node_name_map: dict[str, list[TokenMatch]] = {}
         self._all_keys_sorted: list[str] = []
+        self._keys: frozenset[str] = frozenset()
+        self._max_key_length = 0
         self._loaded_at: datetime | None = None
         self._ttl = timedelta(seconds=ttl_seconds)
 
@@ -130,6 +133,8 @@ class AliasIndex:
         self._node_name_map = node_name_map
         all_keys = set(alias_map.keys()) | set(node_name_map.keys())
         self._all_keys_sorted = sorted(all_keys, key=len, reverse=True)
+        self._keys = frozenset(all_keys)
+        self._max_key_length = max((len(key) for key in all_keys), default=0)
         self._loaded_at = datetime.utcnow()
         logger.info(
             "AliasIndex built: %d aliases, %d node names, %d total keys",
@@ -170,6 +175,11 @@ class AliasIndex:
             if not part:
                 continue
             tokens.append(part)
+            # Unspaced queries like "秋天图书馆银杏": dictionary words anywhere in the part
+            if self._max_key_length >= 2:
+                tokens.extend(
+                    word for word in segment(part.lower(), self._keys, self._max_key_length) if word in self._keys
+                )
             if len(part) >= 4:
                 tokens.append(part[:3])
                 tokens.append(part[:2])
@@ -0,0 +1,323 @@
+"""
+Near-duplicate lookup over perceptual hashes (64-bit dHash).
+
+Re-exported, resized or re-compressed copies of the same shot have dHashes a
+few bits apart, which the byte-level ``content_hash`` cannot see.
+:class:`HammingIndex` finds every hash within Hamming distance ``k`` without
+scanning the library (multi-index hashing): each hash is split into four
+16-bit chunks with one table per chunk position. Two hashes at distance
+``<= k`` agree on at least one chunk up to ``k // 4`` flipped bits, so a query
+probes each chunk value within that radius and verifies the few candidates
+with a popcount. For the default ``k <= 7`` that is 4 x 17 dict lookups per
+query, independent of library size.
+
+The index lives in the API process. It is built from
+``photos.perceptual_hash`` on first use and then follows changes: photos
+added, deleted, re-hashed or soft-deleted in this process are marked by
+session events, and every lookup also pulls rows changed by other workers
+since the last one (by ``updated_at``) before querying. It is rebuilt from
+scratch every SIMILARITY_INDEX_REFRESH_SECONDS, which drops photos deleted by
+other workers; callers load result rows from the database, so those are
+filtered there in the meantime. Lookups take well under a millisecond at
+100k photos; the reviewer cluster list walks all pairs in a worker thread
+and is cached until the index changes.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import event, inspect, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.photo import Photo
+
+settings = get_settings()
+
+CHUNKS = 4
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+# Probe count grows combinatorially with the per-chunk radius; 12 keeps it at 3 bits
+MAX_QUERY_DISTANCE = 12
+# Rows written by other workers can carry an updated_at slightly older than the newest one seen
+_SYNC_OVERLAP = timedelta(seconds=5)
+_STALE_KEY = "similarity_index_stale"
+
+
+@lru_cache(maxsize=None)
+def _flip_masks(radius: int) -> tuple[int, ...]:
+    """All 16-bit masks with at most ``radius`` bits set."""
+    masks = [0]
+    for bits in range(1, radius + 1):
+        for positions in itertools.combinations(range(CHUNK_BITS), bits):
+            masks.append(sum(1 << position for position in positions))
+    return tuple(masks)
+
+
+def parse_hash(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return int(value, 16)
+    except ValueError:
+        return None
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class HammingIndex:
+    """Multi-index hash tables over 64-bit hashes, keyed by photo id."""
+
+    def __init__(self, items: Iterable[tuple[str, int]] = ()) -> None:
+        self._hashes: dict[str, int] = {}
+        self._tables: list[dict[int, set[str]]] = [{} for _ in range(CHUNKS)]
+        for key, value in items:
+            self.add(key, value)
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._hashes
+
+    def get(self, key: str) -> Optional[int]:
+        return self._hashes.get(key)
+
+    def items(self) -> list[tuple[str, int]]:
+        return list(self._hashes.items())
+
+    @staticmethod
+    def _chunks(value: int) -> list[int]:
+        return [(value >> (position * CHUNK_BITS)) & CHUNK_MASK for position in range(CHUNKS)]
+
+    def add(self, key: str, value: int) -> None:
+        if key in self._hashes:
+            self.remove(key)
+        self._hashes[key] = value
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            table.setdefault(chunk, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        value = self._hashes.pop(key, None)
+        if value is None:
+            return
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            bucket = table.get(chunk)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del table[chunk]
+
+    def query(self, value: int, max_distance: int) -> list[tuple[str, int]]:
+        """``(key, distance)`` for every hash within ``max_distance``, closest first."""
+        masks = _flip_masks(max_distance // CHUNKS)
+        seen: set[str] = set()
+        matches: list[tuple[str, int]] = []
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            for mask in masks:
+                bucket = table.get(chunk ^ mask)
+                if not bucket:
+                    continue
+                for key in bucket:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    distance = hamming_distance(value, self._hashes[key])
+                    if distance <= max_distance:
+                        matches.append((key, distance))
+        matches.sort(key=lambda match: (match[1], match[0]))
+        return matches
+
+    def pairs(self, max_distance: int) -> Iterator[tuple[str, str]]:
+        """Every pair of keys within ``max_distance`` (a pair may repeat across tables)."""
+        masks = _flip_masks(max_distance // CHUNKS)
+        hashes = self._hashes
+        for table in self._tables:
+            for chunk, bucket in table.items():
+                for mask in masks:
+                    neighbour = chunk ^ mask
+                    if neighbour < chunk:
+                        continue  # visit each pair of buckets once
+                    other_bucket = table.get(neighbour)
+                    if not other_bucket:
+                        continue
+                    for key in bucket:
+                        value = hashes[key]
+                        for other in other_bucket:
+                            if key < other if mask == 0 else key != other:
+                                if (value ^ hashes[other]).bit_count() <= max_distance:
+                                    yield key, other
+
+    def clusters(self, max_distance: int) -> list[list[str]]:
+        """Groups of two or more keys connected by distance ``<= max_distance``, largest first."""
+        parent: dict[str, str] = {}
+
+        def find(key: str) -> str:
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        for key, other in self.pairs(max_distance):
+            parent.setdefault(key, key)
+            parent.setdefault(other, other)
+            root, other_root = find(key), find(other)
+            if root != other_root:
+                parent[max(root, other_root)] = min(root, other_root)
+
+        groups: dict[str, list[str]] = {}
+        for key in parent:
+            groups.setdefault(find(key), []).append(key)
+        return sorted((sorted(group) for group in groups.values()), key=lambda group: (-len(group), group[0]))
+
+
+class SimilarityIndex:
+    """:class:`HammingIndex` over ``photos.perceptual_hash``, kept in step with the database."""
+
+    def __init__(self, refresh_seconds: int) -> None:
+        self.refresh_seconds = refresh_seconds
+        self.index = HammingIndex()
+        self.loaded_at: Optional[float] = None
+        self._high_water: Optional[datetime] = None  # newest updated_at seen
+        self._stale: set[str] = set()  # photos changed by commits in this process
+        self._clusters: dict[int, list[list[str]]] = {}
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.refresh_seconds
+
+    def mark(self, photo_ids: Iterable[str]) -> None:
+        """Re-read these photos before the next lookup."""
+        self._stale.update(photo_ids)
+
+    def _apply(self, photo_id: str, perceptual_hash: Optional[str], status: Optional[str]) -> bool:
+        value = parse_hash(perceptual_hash) if status != "deleted" else None
+        if value is None:
+            if photo_id not in self.index:
+                return False
+            self.index.remove(photo_id)
+        elif self.index.get(photo_id) == value:
+            return False
+        else:
+            self.index.add(photo_id, value)
+        return True
+
+    def _advance(self, updated_at: Optional[datetime]) -> None:
+        if updated_at is not None and (self._high_water is None or updated_at > self._high_water):
+            self._high_water = updated_at
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        async with self._lock:
+            if not self._is_fresh():
+                await self._rebuild(db)
+            else:
+                await self._sync(db)
+
+    async def _rebuild(self, db: AsyncSession) -> None:
+        self._stale = set()
+        rows = (await db.execute(
+            select(Photo.id, Photo.perceptual_hash, Photo.updated_at).where(
+                Photo.perceptual_hash.isnot(None), Photo.status != "deleted"
+            )
+        )).all()
+        self.index = HammingIndex(
+            (photo_id, value)
+            for photo_id, perceptual_hash, _ in rows
+            if (value := parse_hash(perceptual_hash)) is not None
+        )
+        self._high_water = max((updated_at for _, _, updated_at in rows), default=self._high_water)
+        self._clusters = {}
+        self.loaded_at = time.monotonic()
+
+    async def _sync(self, db: AsyncSession) -> None:
+        """Apply photos marked here and rows other workers changed since the last lookup."""
+        stale, self._stale = self._stale, set()
+        changed = [Photo.id.in_(stale)] if stale else []
+        if self._high_water is not None:
+            changed.append(Photo.updated_at >= self._high_water - _SYNC_OVERLAP)
+        if not changed:
+            return
+        rows = (await db.execute(
+            select(Photo.id, Photo.perceptual_hash, Photo.status, Photo.updated_at).where(or_(*changed))
+        )).all()
+        modified = False
+        for photo_id, perceptual_hash, status, updated_at in rows:
+            modified |= self._apply(photo_id, perceptual_hash, status)
+            self._advance(updated_at)
+        seen = {row[0] for row in rows}
+        for photo_id in stale - seen:  # deleted
+            modified |= self._apply(photo_id, None, None)
+        if modified:
+            self._clusters = {}
+
+    async def similar(self, db: AsyncSession, photo: Photo, max_distance: int) -> list[tuple[str, int]]:
+        """Other photos within ``max_distance`` of ``photo``, closest first."""
+        value = parse_hash(photo.perceptual_hash)
+        if value is None:
+            return []
+        await self.ensure_loaded(db)
+        return [match for match in self.index.query(value, max_distance) if match[0] != photo.id]
+
+    async def clusters(self, db: AsyncSession, max_distance: int) -> list[list[str]]:
+        """Near-duplicate groups, computed once per distance until the index changes."""
+        await self.ensure_loaded(db)
+        cached = self._clusters
+        if max_distance not in cached:
+            # Seconds at 100k photos: keep it off the event loop. The live index keeps
+            # changing, so the worker thread gets its own copy built from a snapshot.
+            snapshot = self.index.items()
+            cached[max_distance] = await asyncio.to_thread(
+                lambda: HammingIndex(snapshot).clusters(max_distance)
+            )
+        return cached[max_distance]
+
+
+_similarity_index: Optional[SimilarityIndex] = None
+
+
+def get_similarity_index() -> SimilarityIndex:
+    global _similarity_index
+    if _similarity_index is None:
+        _similarity_index = SimilarityIndex(settings.SIMILARITY_INDEX_REFRESH_SECONDS)
+    return _similarity_index
+
+
+def reset_similarity_index() -> None:
+    """Drop the in-process index (tests, after a bulk backfill)."""
+    global _similarity_index
+    _similarity_index = None
+
+
+# ── Change tracking: photos whose hash may have appeared, changed or gone ──
+
+@event.listens_for(Session, "after_flush")
+def _track_photos(session: Session, flush_context) -> None:
+    stale = session.info.setdefault(_STALE_KEY, set())
+    for obj in (*session.new, *session.deleted):
+        if isinstance(obj, Photo):
+            stale.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, Photo):
+            state = inspect(obj)
+            if state.attrs.perceptual_hash.history.has_changes() or state.attrs.status.history.has_changes():
+                stale.add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_after_commit(session: Session) -> None:
+    stale = session.info.pop(_STALE_KEY, None)
+    if stale and _similarity_index is not None:
+        _similarity_index.mark(stale)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_STALE_KEY, None)
@@ -1,20 +1,42 @@
 """
 Storage backends for local filesystem and S3-compatible object storage.
+
+Backends implement a synchronous API (used by scripts and worker code).
+Async callers use the ``a*`` counterparts on :class:`StorageBackend`,
+which run the blocking parts (boto3 calls, ssh/mc fallbacks, file moves)
+in worker threads so the event loop keeps serving other requests.
 """
+import asyncio
+import hashlib
 import logging
+import mimetypes
 import os
 import shutil
 import tempfile
+import threading
+import time
 import uuid
-from contextlib import contextmanager
-from dataclasses import dataclass
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Iterator, Optional
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, Optional
+from urllib.parse import quote
 
+from cachetools import LRUCache
 from fastapi import UploadFile
-from fastapi.responses import FileResponse, RedirectResponse, Response
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 
 from app.core.config import get_settings
+from app.services.disk_cache import DiskCache
+from app.services.media_http import (
+    RANGE_CHUNK_SIZE,
+    RangeNotSatisfiable,
+    parse_range_header,
+    partial_content_response,
+    range_not_satisfiable_response,
+)
+from app.services.ssh_channel import MinioSSHWriter, SSHChannel
 
 settings = get_settings()
 
@@ -25,12 +47,64 @@ except ModuleNotFoundError:  # pragma: no cover - optional dependency in local m
     boto3 = None
     BotoConfig = None
 
+# Upper bound on concurrent deletes per adelete_files call (each may fall back to ssh)
+DELETE_CONCURRENCY = 8
+# Read size when copying / hashing staged uploads
+COPY_CHUNK_SIZE = 1024 * 1024
+# S3 rejects multipart parts below 5 MiB except the last one
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+
+# Presigned GET URLs keyed by (bucket, key, download name, expiry bucket) so hot
+# media reuse one signature per half-expiry window instead of re-signing per hit.
+_presign_cache: LRUCache = LRUCache(maxsize=settings.S3_PRESIGN_CACHE_SIZE)
+_presign_cache_lock = threading.Lock()
+
+
+class StorageUnavailable(Exception):
+    """Object storage rejected a request that is safe to retry later (mapped to 503)."""
+
+    retry_after = 5
+
 
 @dataclass
 class PersistedMedia:
     original_path: str
     thumb_path: Optional[str]
     file_size: Optional[int]
+    renditions: Dict[str, str] = field(default_factory=dict)
+
+
+def rendition_key(photo_uuid: str, width: int) -> str:
+    """Storage key for a width-bound JPEG rendition."""
+    return f"thumbnails/{photo_uuid}_{width}.jpg"
+
+
+def plan_rendition_keys(
+    photo_uuid: str,
+    staged_thumbnail_path: Optional[str],
+    staged_renditions: Optional[Dict[int, str]],
+) -> tuple[list[tuple[str, str]], Optional[str], Dict[str, str]]:
+    """Map staged thumbnail/rendition files to their storage keys.
+
+    Returns (uploads, thumb_key, renditions) where ``uploads`` lists each
+    (staged_path, key) pair once, even when the legacy thumbnail is one of
+    the renditions.
+    """
+    uploads: list[tuple[str, str]] = []
+    renditions: Dict[str, str] = {}
+    thumb_key = None
+    for width, staged_path in sorted((staged_renditions or {}).items()):
+        if not staged_path or not os.path.exists(staged_path):
+            continue
+        key = rendition_key(photo_uuid, int(width))
+        uploads.append((staged_path, key))
+        renditions[str(width)] = key
+        if staged_path == staged_thumbnail_path:
+            thumb_key = key
+    if thumb_key is None and staged_thumbnail_path and os.path.exists(staged_thumbnail_path):
+        thumb_key = f"thumbnails/{photo_uuid}_thumb.jpg"
+        uploads.append((staged_thumbnail_path, thumb_key))
+    return uploads, thumb_key, renditions
 
 
 def generate_unique_filename(original_filename: str) -> tuple[str, str]:
@@ -50,24 +124,44 @@ def ensure_upload_dirs() -> tuple[str, str]:
     return str(originals_dir), str(thumbnails_dir)
 
 
+def _copy_to_path(source, destination: str) -> str:
+    """Copy ``source`` to ``destination``; returns the SHA-256 of the copied bytes."""
+    digest = hashlib.sha256()
+    with open(destination, "wb") as buffer:
+        for chunk in iter(lambda: source.read(COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            buffer.write(chunk)
+    return digest.hexdigest()
+
+
 async def save_upload_file(upload_file: UploadFile, destination: str) -> str:
-    """Save uploaded file to a temporary or final destination."""
+    """Save uploaded file to a temporary or final destination; returns its SHA-256."""
     try:
-        with open(destination, "wb") as buffer:
-            shutil.copyfileobj(upload_file.file, buffer)
-        return destination
+        # The spooled upload may already be on disk; copy it off the event loop
+        return await asyncio.to_thread(_copy_to_path, upload_file.file, destination)
     finally:
         upload_file.file.close()
 
 
 async def stage_photo_upload(upload_file: UploadFile) -> tuple[str, str, str, str]:
-    """Persist an uploaded file to a temporary local path for processing."""
+    """Persist an uploaded file to a temporary local path for processing.
+
+    Returns (photo_uuid, staged path, original filename, SHA-256 content hash).
+    """
     photo_uuid, file_extension = generate_unique_filename(upload_file.filename)
     temp_dir = tempfile.mkdtemp(prefix="buct-media-upload-")
     original_filename = f"{photo_uuid}{file_extension}"
     staged_original_path = os.path.join(temp_dir, original_filename)
-    await save_upload_file(upload_file, staged_original_path)
-    return photo_uuid, staged_original_path, upload_file.filename, file_extension
+    content_hash = await save_upload_file(upload_file, staged_original_path)
+    return photo_uuid, staged_original_path, upload_file.filename, content_hash
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 
 class StorageBackend:
@@ -78,9 +172,52 @@ class StorageBackend:
         photo_uuid: str,
         staged_original_path: str,
         staged_thumbnail_path: Optional[str],
+        staged_renditions: Optional[Dict[int, str]] = None,
     ) -> PersistedMedia:
         raise NotImplementedError
 
+    def persist_renditions(
+        self,
+        photo_uuid: str,
+        staged_thumbnail_path: Optional[str],
+        staged_renditions: Optional[Dict[int, str]],
+    ) -> tuple[Optional[str], Dict[str, str]]:
+        """Store staged thumbnail/rendition files; returns (thumb_key, renditions)."""
+        raise NotImplementedError
+
+    def open_writer(self, key: str, content_type: Optional[str] = None) -> "MediaWriter":
+        """Open an incremental writer that stores ``key`` when committed."""
+        raise NotImplementedError
+
+    # ── Resumable uploads ──
+    # The state dict is JSON-serialisable and kept by the caller (upload_sessions
+    # table) between requests; every call returns the state to store next.
+
+    def begin_resumable(self, key: str, content_type: Optional[str] = None) -> Dict[str, Any]:
+        """Start a resumable upload of ``key``; ``min_chunk_size`` applies to non-final chunks.
+
+        Raises StorageUnavailable when the backend cannot take it right now.
+        """
+        raise NotImplementedError
+
+    def append_resumable(self, key: str, state: Dict[str, Any], offset: int, data: bytes) -> Dict[str, Any]:
+        """Store ``data`` at byte ``offset``. Re-sending a chunk at the same offset is safe.
+
+        Raises StorageUnavailable when the chunk was not stored; the state is unchanged.
+        """
+        raise NotImplementedError
+
+    def complete_resumable(self, key: str, state: Dict[str, Any]) -> None:
+        """Move the received object into place under ``key``.
+
+        Repeating it is safe: finalize retries after a rolled-back attempt find
+        the object already there.
+        """
+        raise NotImplementedError
+
+    def abort_resumable(self, key: str, state: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
     def delete_file(self, file_path: Optional[str]) -> bool:
         raise NotImplementedError
 
@@ -88,6 +225,8 @@ class StorageBackend:
         self,
         file_path: str,
         download_name: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        range_header: Optional[str] = None,
     ) -> Response:
         raise NotImplementedError
 
@@ -95,6 +234,84 @@ class StorageBackend:
     def local_copy(self, file_path: str) -> Iterator[str]:
         raise NotImplementedError
 
+    def metrics(self) -> Dict[str, object]:
+        return {"backend": "unknown"}
+
+    def close(self) -> None:
+        """Release pooled resources; the backend must not be used afterwards."""
+
+    # ── Async API ──
+    # Default implementations offload the sync methods to a worker thread.
+
+    async def apersist_photo_files(
+        self,
+        photo_uuid: str,
+        staged_original_path: str,
+        staged_thumbnail_path: Optional[str],
+        staged_renditions: Optional[Dict[int, str]] = None,
+    ) -> PersistedMedia:
+        return await asyncio.to_thread(
+            self.persist_photo_files,
+            photo_uuid,
+            staged_original_path,
+            staged_thumbnail_path,
+            staged_renditions,
+        )
+
+    async def apersist_renditions(
+        self,
+        photo_uuid: str,
+        staged_thumbnail_path: Optional[str],
+        staged_renditions: Optional[Dict[int, str]],
+    ) -> tuple[Optional[str], Dict[str, str]]:
+        return await asyncio.to_thread(
+            self.persist_renditions, photo_uuid, staged_thumbnail_path, staged_renditions
+        )
+
+    async def adelete_file(self, file_path: Optional[str]) -> bool:
+        if not file_path:
+            return False
+        return await asyncio.to_thread(self.delete_file, file_path)
+
+    async def adelete_files(self, file_paths: Iterable[Optional[str]]) -> int:
+        """Delete several objects concurrently; returns how many were removed."""
+        semaphore = asyncio.Semaphore(DELETE_CONCURRENCY)
+
+        async def delete_one(path: str) -> bool:
+            async with semaphore:
+                return await self.adelete_file(path)
+
+        results = await asyncio.gather(*(delete_one(path) for path in file_paths if path))
+        return sum(1 for deleted in results if deleted)
+
+    async def abuild_media_response(
+        self,
+        file_path: str,
+        download_name: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        range_header: Optional[str] = None,
+    ) -> Response:
+        return await asyncio.to_thread(
+            self.build_media_response, file_path, download_name, headers, range_header
+        )
+
+    async def aiter_file(self, file_path: str, chunk_size: int = COPY_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Stream a stored object in chunks without buffering it whole."""
+        raise NotImplementedError
+        yield b""  # pragma: no cover - marks this as an async generator
+
+    @asynccontextmanager
+    async def alocal_copy(self, file_path: str) -> AsyncIterator[str]:
+        manager = self.local_copy(file_path)
+        local_path = await asyncio.to_thread(manager.__enter__)
+        try:
+            yield local_path
+        except BaseException as exc:
+            if not await asyncio.to_thread(manager.__exit__, type(exc), exc, exc.__traceback__):
+                raise
+        else:
+            await asyncio.to_thread(manager.__exit__, None, None, None)
+
 
 class LocalStorageBackend(StorageBackend):
     """Local filesystem storage backend."""
@@ -123,6 +340,7 @@ class LocalStorageBackend(StorageBackend):
         photo_uuid: str,
         staged_original_path: str,
         staged_thumbnail_path: Optional[str],
+        staged_renditions: Optional[Dict[int, str]] = None,
     ) -> PersistedMedia:
         extension = Path(staged_original_path).suffix.lower()
         original_relative = f"originals/{photo_uuid}{extension}"
@@ -130,18 +348,58 @@ class LocalStorageBackend(StorageBackend):
         original_target.parent.mkdir(parents=True, exist_ok=True)
         shutil.move(staged_original_path, original_target)
 
-        thumb_relative = None
-        if staged_thumbnail_path:
-            thumb_relative = f"thumbnails/{photo_uuid}_thumb.jpg"
-            thumb_target = Path(settings.UPLOAD_DIR) / thumb_relative
-            thumb_target.parent.mkdir(parents=True, exist_ok=True)
-            shutil.move(staged_thumbnail_path, thumb_target)
-
+        thumb_relative, renditions = self.persist_renditions(
+            photo_uuid, staged_thumbnail_path, staged_renditions
+        )
         return PersistedMedia(
             original_path=original_relative,
             thumb_path=thumb_relative,
             file_size=original_target.stat().st_size if original_target.exists() else None,
+            renditions=renditions,
+        )
+
+    def persist_renditions(
+        self,
+        photo_uuid: str,
+        staged_thumbnail_path: Optional[str],
+        staged_renditions: Optional[Dict[int, str]],
+    ) -> tuple[Optional[str], Dict[str, str]]:
+        uploads, thumb_relative, renditions = plan_rendition_keys(
+            photo_uuid, staged_thumbnail_path, staged_renditions
         )
+        for staged_path, relative in uploads:
+            target = Path(settings.UPLOAD_DIR) / relative
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(staged_path, target)
+        return thumb_relative, renditions
+
+    def open_writer(self, key: str, content_type: Optional[str] = None) -> "MediaWriter":
+        target = Path(settings.UPLOAD_DIR) / key
+        target.parent.mkdir(parents=True, exist_ok=True)
+        return LocalMediaWriter(key, target)
+
+    def _resumable_path(self, key: str) -> Path:
+        target = Path(settings.UPLOAD_DIR) / key
+        return target.with_name(target.name + ".part")
+
+    def begin_resumable(self, key: str, content_type: Optional[str] = None) -> Dict[str, Any]:
+        part_path = self._resumable_path(key)
+        part_path.parent.mkdir(parents=True, exist_ok=True)
+        part_path.touch()
+        return {"mode": "append", "min_chunk_size": 0}
+
+    def append_resumable(self, key: str, state: Dict[str, Any], offset: int, data: bytes) -> Dict[str, Any]:
+        _write_at(self._resumable_path(key), offset, data)
+        return state
+
+    def complete_resumable(self, key: str, state: Dict[str, Any]) -> None:
+        part_path, target = self._resumable_path(key), Path(settings.UPLOAD_DIR) / key
+        if not part_path.exists() and target.exists():
+            return
+        os.replace(part_path, target)
+
+    def abort_resumable(self, key: str, state: Dict[str, Any]) -> None:
+        self._resumable_path(key).unlink(missing_ok=True)
 
     def delete_file(self, file_path: Optional[str]) -> bool:
         if not file_path:
@@ -159,17 +417,51 @@ class LocalStorageBackend(StorageBackend):
         self,
         file_path: str,
         download_name: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        range_header: Optional[str] = None,
     ) -> Response:
         target = self._normalize(file_path)
         if not os.path.exists(target):
             from fastapi import HTTPException
             raise HTTPException(status_code=404, detail=f"Media file not found: {file_path}")
-        return FileResponse(target, filename=download_name)
+        headers = _with_download_name({**(headers or {}), "Accept-Ranges": "bytes"}, download_name)
+        if settings.LOCAL_MEDIA_OFFLOAD != "none":
+            offloaded = self._offload_response(target, headers)
+            if offloaded is not None:
+                return offloaded
+        return _file_media_response(target, headers, range_header)
+
+    def _offload_response(self, target: str, headers: Dict[str, str]) -> Optional[Response]:
+        """Hand the file to the front proxy (X-Accel-Redirect / X-Sendfile).
+
+        The proxy then serves the bytes (including Range requests) with
+        sendfile; files outside UPLOAD_DIR fall back to in-process streaming.
+        """
+        upload_root = Path(settings.UPLOAD_DIR).resolve()
+        try:
+            relative = Path(target).resolve().relative_to(upload_root)
+        except ValueError:
+            return None
+        headers = dict(headers)
+        if settings.LOCAL_MEDIA_OFFLOAD == "x-accel":
+            prefix = settings.LOCAL_MEDIA_ACCEL_PREFIX.rstrip("/")
+            headers["X-Accel-Redirect"] = f"{prefix}/{quote(relative.as_posix())}"
+        else:
+            headers["X-Sendfile"] = str(upload_root / relative)
+        media_type = mimetypes.guess_type(target)[0] or "application/octet-stream"
+        return Response(status_code=200, media_type=media_type, headers=headers)
 
     @contextmanager
     def local_copy(self, file_path: str) -> Iterator[str]:
         yield self._normalize(file_path)
 
+    async def aiter_file(self, file_path: str, chunk_size: int = COPY_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        async for chunk in _aiter_local_file(self._normalize(file_path), chunk_size):
+            yield chunk
+
+    def metrics(self) -> Dict[str, object]:
+        return {"backend": "local"}
+
 
 class S3StorageBackend(StorageBackend):
     """S3-compatible object storage backend.
@@ -179,9 +471,8 @@ class S3StorageBackend(StorageBackend):
     by the firewall when accessing MinIO from outside.
     """
 
-    # SSH connection info for write operations
-    _ssh_host = "121.195.148.85"
-    _ssh_user = "yanp"
+    # Read-through disk cache for small, hot objects (S3_MEDIA_CACHE_*); None when disabled
+    media_cache: Optional[DiskCache] = None
 
     def __init__(self) -> None:
         if boto3 is None or BotoConfig is None:
@@ -190,95 +481,284 @@ class S3StorageBackend(StorageBackend):
             raise RuntimeError("S3 storage backend requires endpoint, bucket, access key, and secret key.")
 
         self.bucket = settings.S3_BUCKET
-        self.client = boto3.client(
+        self.client = self._build_client(settings.S3_ENDPOINT)
+        self.pool_metrics = S3PoolMetrics(self.client, settings.S3_MAX_POOL_CONNECTIONS)
+        # Presigning is local computation, so the presign client never opens a connection
+        self.presign_client = (
+            self._build_client(settings.S3_PRESIGN_ENDPOINT)
+            if settings.S3_PRESIGN_ENDPOINT
+            else self.client
+        )
+        self.ssh_channel = SSHChannel(
+            settings.SSH_WRITE_HOST,
+            settings.SSH_WRITE_USER,
+            control_persist=settings.SSH_CONTROL_PERSIST,
+            max_concurrency=settings.SSH_MAX_CONCURRENCY,
+        )
+        self.ssh_writer = MinioSSHWriter(self.ssh_channel, self.bucket)
+        self.media_cache = self._build_media_cache()
+
+    @staticmethod
+    def _build_media_cache() -> Optional[DiskCache]:
+        if settings.S3_MEDIA_CACHE_MAX_BYTES <= 0:
+            return None
+        directory = settings.S3_MEDIA_CACHE_DIR or os.path.join(tempfile.gettempdir(), "buct-media-cache")
+        return DiskCache(directory, settings.S3_MEDIA_CACHE_MAX_BYTES)
+
+    @staticmethod
+    def _build_client(endpoint_url: str):
+        return boto3.client(
             "s3",
-            endpoint_url=settings.S3_ENDPOINT,
+            endpoint_url=endpoint_url,
             aws_access_key_id=settings.S3_ACCESS_KEY,
             aws_secret_access_key=settings.S3_SECRET_KEY,
             region_name=settings.S3_REGION,
             use_ssl=settings.S3_USE_SSL,
-            config=BotoConfig(signature_version="s3v4"),
+            config=BotoConfig(
+                signature_version="s3v4",
+                max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                tcp_keepalive=settings.S3_TCP_KEEPALIVE,
+                connect_timeout=settings.S3_CONNECT_TIMEOUT,
+                read_timeout=settings.S3_READ_TIMEOUT,
+            ),
         )
 
     # ── SSH helpers for write operations ──
 
     def _mc_pipe(self, local_path: str, key: str) -> None:
         """Upload a local file to MinIO via SSH + mc pipe."""
-        import subprocess
-        cmd = f"mc pipe local/{self.bucket}/{key}"
-        with open(local_path, "rb") as fh:
-            proc = subprocess.run(
-                ["ssh", f"{self._ssh_user}@{self._ssh_host}", cmd],
-                stdin=fh,
-                capture_output=True,
-                timeout=120,
-            )
-        if proc.returncode != 0:
-            stderr = proc.stderr.decode("utf-8", errors="replace").strip()
-            raise RuntimeError(f"mc pipe failed for {key}: {stderr}")
+        self.ssh_writer.put_file(local_path, key, timeout=settings.SSH_PUT_TIMEOUT)
 
     def _mc_rm(self, key: str) -> bool:
         """Delete an object from MinIO via SSH + mc rm."""
-        import subprocess
-        cmd = f"mc rm local/{self.bucket}/{key}"
-        proc = subprocess.run(
-            ["ssh", f"{self._ssh_user}@{self._ssh_host}", cmd],
-            capture_output=True,
-            timeout=30,
-        )
-        return proc.returncode == 0
+        return self.ssh_writer.remove(key, timeout=settings.SSH_RM_TIMEOUT)
+
+    def ssh_put_bytes(self, data: bytes, key: str) -> None:
+        """Upload in-memory bytes via SSH + mc pipe (used by backfill scripts)."""
+        self.ssh_writer.put_bytes(data, key, timeout=settings.SSH_PUT_TIMEOUT)
+
+    # ── Read-through disk cache ──
+
+    def _is_cached_key(self, key: str) -> bool:
+        return self.media_cache is not None and key.startswith(tuple(settings.S3_MEDIA_CACHE_PREFIXES))
+
+    def cached_copy(self, key: str) -> Optional[str]:
+        """Local path of ``key`` from the disk cache, fetched on a miss.
+
+        None when the key is not cached (prefix, cache disabled) or the fetch
+        failed; callers then read from S3 as before.
+        """
+        if not self._is_cached_key(key):
+            return None
+        try:
+            return str(self.media_cache.fill(
+                key, lambda temp_path: self.client.download_file(self.bucket, key, temp_path)
+            ))
+        except Exception as exc:
+            logging.getLogger(__name__).debug("Media cache fill failed for key=%s: %s", key, exc)
+            return None
+
+    def invalidate_cached(self, key: Optional[str]) -> None:
+        if key and self._is_cached_key(key):
+            self.media_cache.invalidate(key)
 
     # ── StorageBackend interface ──
 
+    def _upload(self, local_path: str, key: str) -> None:
+        # Try direct upload first (works when running on the server),
+        # fall back to SSH + mc pipe (works through VPN)
+        try:
+            self.client.upload_file(local_path, self.bucket, key)
+        except Exception:
+            self._mc_pipe(local_path, key)
+        self.invalidate_cached(key)
+
     def persist_photo_files(
         self,
         photo_uuid: str,
         staged_original_path: str,
         staged_thumbnail_path: Optional[str],
+        staged_renditions: Optional[Dict[int, str]] = None,
     ) -> PersistedMedia:
         extension = Path(staged_original_path).suffix.lower()
         original_key = f"originals/{photo_uuid}{extension}"
+        self._upload(staged_original_path, original_key)
+        thumb_key, renditions = self.persist_renditions(
+            photo_uuid, staged_thumbnail_path, staged_renditions
+        )
 
-        # Try direct upload first (works when running on the server),
-        # fall back to SSH + mc pipe (works through VPN)
+        size = os.path.getsize(staged_original_path) if os.path.exists(staged_original_path) else None
+        return PersistedMedia(
+            original_path=original_key,
+            thumb_path=thumb_key,
+            file_size=size,
+            renditions=renditions,
+        )
+
+    def persist_renditions(
+        self,
+        photo_uuid: str,
+        staged_thumbnail_path: Optional[str],
+        staged_renditions: Optional[Dict[int, str]],
+    ) -> tuple[Optional[str], Dict[str, str]]:
+        uploads, thumb_key, renditions = plan_rendition_keys(
+            photo_uuid, staged_thumbnail_path, staged_renditions
+        )
+        for staged_path, key in uploads:
+            self._upload(staged_path, key)
+        return thumb_key, renditions
+
+    def open_writer(self, key: str, content_type: Optional[str] = None) -> "MediaWriter":
+        return S3MultipartWriter(self, key, content_type, settings.S3_MULTIPART_PART_SIZE)
+
+    def begin_resumable(self, key: str, content_type: Optional[str] = None) -> Dict[str, Any]:
+        content_type = content_type or mimetypes.guess_type(key)[0] or "application/octet-stream"
+        # No local spool fallback: a session may resume on another worker or host,
+        # so every byte has to be in the bucket; the client retries on 503 instead
         try:
-            self.client.upload_file(staged_original_path, self.bucket, original_key)
+            created = self.client.create_multipart_upload(Bucket=self.bucket, Key=key, ContentType=content_type)
+        except Exception as exc:
+            logging.getLogger(__name__).warning("Multipart upload unavailable for %s: %s", key, exc)
+            raise StorageUnavailable(f"Multipart upload unavailable: {exc}") from exc
+        return {
+            "mode": "multipart",
+            "upload_id": created["UploadId"],
+            "parts": [],
+            "min_chunk_size": S3_MIN_PART_SIZE,
+        }
+
+    def append_resumable(self, key: str, state: Dict[str, Any], offset: int, data: bytes) -> Dict[str, Any]:
+        # One chunk = one part; the caller only persists parts together with the new offset,
+        # so a retried chunk gets the same part number and replaces the earlier attempt.
+        parts = list(state["parts"])
+        number = len(parts) + 1
+        try:
+            sent = self.client.upload_part(
+                Bucket=self.bucket, Key=key, UploadId=state["upload_id"], PartNumber=number, Body=data
+            )
+        except Exception as exc:
+            logging.getLogger(__name__).warning("Upload of part %d of %s failed: %s", number, key, exc)
+            raise StorageUnavailable(f"Chunk upload failed: {exc}") from exc
+        parts.append({"ETag": sent["ETag"], "PartNumber": number})
+        return {**state, "parts": parts}
+
+    def complete_resumable(self, key: str, state: Dict[str, Any]) -> None:
+        try:
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=state["upload_id"],
+                MultipartUpload={"Parts": state["parts"]},
+            )
         except Exception:
-            self._mc_pipe(staged_original_path, original_key)
+            # The upload id is gone once completed; an earlier finalize attempt may have done it
+            if not self._object_exists(key):
+                raise
 
-        thumb_key = None
-        if staged_thumbnail_path and os.path.exists(staged_thumbnail_path):
-            thumb_key = f"thumbnails/{photo_uuid}_thumb.jpg"
-            try:
-                self.client.upload_file(staged_thumbnail_path, self.bucket, thumb_key)
-            except Exception:
-                self._mc_pipe(staged_thumbnail_path, thumb_key)
+    def _object_exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except Exception:
+            return False
+        return True
 
-        size = os.path.getsize(staged_original_path) if os.path.exists(staged_original_path) else None
-        return PersistedMedia(original_path=original_key, thumb_path=thumb_key, file_size=size)
+    def abort_resumable(self, key: str, state: Dict[str, Any]) -> None:
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=state["upload_id"])
+        except Exception:
+            pass
 
     def delete_file(self, file_path: Optional[str]) -> bool:
         if not file_path:
             return False
         try:
             self.client.delete_object(Bucket=self.bucket, Key=file_path)
-            return True
         except Exception:
-            return self._mc_rm(file_path)
+            if not self._mc_rm(file_path):
+                return False
+        # Only once the object is gone: invalidating earlier lets a concurrent read refill the cache from it
+        self.invalidate_cached(file_path)
+        return True
+
+    def presigned_url(self, file_path: str, download_name: Optional[str] = None) -> tuple[str, int]:
+        """Return a cached presigned GET URL and the seconds it may still be reused.
+
+        URLs are signed for S3_PRESIGN_EXPIRE_SECONDS but only handed out during
+        the first half of that period, so a redirect always leaves the client at
+        least half the expiry to follow it.
+        """
+        expire = max(settings.S3_PRESIGN_EXPIRE_SECONDS, 2)
+        window = expire // 2
+        now = int(time.time())
+        expiry_bucket = now // window
+        cache_key = (self.bucket, file_path, download_name, expiry_bucket)
+
+        with _presign_cache_lock:
+            url = _presign_cache.get(cache_key)
+        if url is None:
+            params = {"Bucket": self.bucket, "Key": file_path}
+            if download_name:
+                params["ResponseContentDisposition"] = _with_download_name({}, download_name)["Content-Disposition"]
+            url = self.presign_client.generate_presigned_url("get_object", Params=params, ExpiresIn=expire)
+            with _presign_cache_lock:
+                _presign_cache[cache_key] = url
+        return url, (expiry_bucket + 1) * window - now
+
+    def build_redirect_response(self, file_path: str, download_name: Optional[str] = None) -> Response:
+        url, reusable_for = self.presigned_url(file_path, download_name)
+        # No validators here: revalidating a cached redirect must never revive an expired URL
+        return RedirectResponse(
+            url,
+            status_code=307,
+            headers={"Cache-Control": f"private, max-age={reusable_for}"},
+        )
 
     def build_media_response(
         self,
         file_path: str,
         download_name: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        range_header: Optional[str] = None,
     ) -> Response:
+        if settings.S3_MEDIA_DELIVERY == "redirect":
+            return self.build_redirect_response(file_path, download_name)
+        cached = self.cached_copy(file_path)
+        if cached is not None:
+            try:
+                return _open_file_media_response(
+                    cached, _with_download_name({**(headers or {}), "Accept-Ranges": "bytes"}, download_name), range_header
+                )
+            except FileNotFoundError:
+                pass  # evicted by another worker since the lookup: read from S3
         try:
-            from fastapi.responses import StreamingResponse
+            headers = _with_download_name({**(headers or {}), "Accept-Ranges": "bytes"}, download_name)
+
+            if range_header:
+                head = self.client.head_object(Bucket=self.bucket, Key=file_path)
+                size = head["ContentLength"]
+                try:
+                    ranges = parse_range_header(range_header, size)
+                except RangeNotSatisfiable:
+                    return range_not_satisfiable_response(size)
+                if ranges is not None:
+                    async def read_range(start: int, end: int) -> AsyncIterator[bytes]:
+                        part = await asyncio.to_thread(
+                            self.client.get_object,
+                            Bucket=self.bucket,
+                            Key=file_path,
+                            Range=f"bytes={start}-{end}",
+                        )
+                        async for chunk in _aiter_body(part["Body"]):
+                            yield chunk
+
+                    media_type = head.get("ContentType", "image/jpeg")
+                    return partial_content_response(ranges, size, media_type, read_range, headers)
+
             response = self.client.get_object(Bucket=self.bucket, Key=file_path)
-            headers = {}
-            if download_name:
-                headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+            if response.get("ContentLength") is not None:
+                headers["Content-Length"] = str(response["ContentLength"])
             return StreamingResponse(
-                response["Body"],
+                _aiter_body(response["Body"]),
                 media_type=response.get("ContentType", "image/jpeg"),
                 headers=headers,
             )
@@ -290,8 +770,28 @@ class S3StorageBackend(StorageBackend):
             from fastapi import HTTPException
             raise HTTPException(status_code=404, detail="Media file not found")
 
+    async def aiter_file(self, file_path: str, chunk_size: int = COPY_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        cached = await asyncio.to_thread(self.cached_copy, file_path)
+        if cached is not None:
+            try:
+                fh = await asyncio.to_thread(open, cached, "rb")
+            except FileNotFoundError:
+                fh = None  # evicted by another worker since the lookup
+            if fh is not None:
+                async for chunk in _aiter_open_file(fh, chunk_size):
+                    yield chunk
+                return
+        response = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=file_path)
+        async for chunk in _aiter_body(response["Body"], chunk_size):
+            yield chunk
+
     @contextmanager
     def local_copy(self, file_path: str) -> Iterator[str]:
+        cached = self.cached_copy(file_path)
+        if cached is not None:
+            # Shared with other readers: callers must treat local copies as read-only
+            yield cached
+            return
         suffix = Path(file_path).suffix or ".bin"
         with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
             temp_path = temp_file.name
@@ -302,6 +802,371 @@ class S3StorageBackend(StorageBackend):
             if os.path.exists(temp_path):
                 os.remove(temp_path)
 
+    def metrics(self) -> Dict[str, object]:
+        return {
+            "backend": "s3",
+            "bucket": self.bucket,
+            **self.pool_metrics.snapshot(),
+            "ssh_commands": self.ssh_channel.commands,
+            "ssh_reconnects": self.ssh_channel.reconnects,
+            "media_cache": self.media_cache.metrics() if self.media_cache is not None else None,
+        }
+
+    def close(self) -> None:
+        self.client.close()
+        if self.presign_client is not self.client:
+            self.presign_client.close()
+        self.ssh_channel.close()
+
+
+class MediaWriter:
+    """Incremental writer for one stored object.
+
+    ``write`` is called with consecutive chunks, then exactly one of
+    ``commit`` (make the object visible under ``key``) or ``abort``.
+    """
+
+    # Local-disk writers expose the committed file at ``local_path``
+    is_local = False
+    local_path: Optional[str] = None
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.size = 0
+
+    def write(self, data: bytes) -> None:
+        raise NotImplementedError
+
+    def commit(self) -> None:
+        raise NotImplementedError
+
+    def abort(self) -> None:
+        raise NotImplementedError
+
+
+class LocalMediaWriter(MediaWriter):
+    """Writes to ``<target>.part`` and renames into place on commit."""
+
+    is_local = True
+
+    def __init__(self, key: str, target: Path) -> None:
+        super().__init__(key)
+        self.target = target
+        self.part_path = target.with_name(target.name + ".part")
+        self._fh = open(self.part_path, "wb")
+
+    def write(self, data: bytes) -> None:
+        self._fh.write(data)
+        self.size += len(data)
+
+    def commit(self) -> None:
+        self._fh.close()
+        os.replace(self.part_path, self.target)
+        self.local_path = str(self.target)
+
+    def abort(self) -> None:
+        self._fh.close()
+        self.part_path.unlink(missing_ok=True)
+
+
+class S3MultipartWriter(MediaWriter):
+    """Streams an object into S3 as multipart parts of ``part_size`` bytes.
+
+    Objects smaller than one part go up with a single PutObject. When the
+    S3 API refuses writes before any part was sent (MinIO behind the VPN
+    firewall), the writer spools to a temp file and falls back to
+    ``S3StorageBackend._upload`` (ssh + mc pipe) on commit.
+    """
+
+    def __init__(self, backend: "S3StorageBackend", key: str, content_type: Optional[str], part_size: int) -> None:
+        super().__init__(key)
+        self.backend = backend
+        self.content_type = content_type or mimetypes.guess_type(key)[0] or "application/octet-stream"
+        # S3 requires every part except the last to be at least 5 MiB
+        self.part_size = max(part_size, S3_MIN_PART_SIZE)
+        self.upload_id: Optional[str] = None
+        self.parts: list[dict] = []
+        self._buffer = bytearray()
+        self._spool = None
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self._spool is not None:
+            self._spool.write(data)
+            return
+        self._buffer += data
+        while self._spool is None and len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._send_part(part)
+        if self._spool is not None and self._buffer:
+            self._spool.write(self._buffer)
+            self._buffer.clear()
+
+    def _send_part(self, body: bytes) -> None:
+        client, bucket = self.backend.client, self.backend.bucket
+        try:
+            if self.upload_id is None:
+                created = client.create_multipart_upload(Bucket=bucket, Key=self.key, ContentType=self.content_type)
+                self.upload_id = created["UploadId"]
+            number = len(self.parts) + 1
+            sent = client.upload_part(
+                Bucket=bucket, Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=body
+            )
+            self.parts.append({"ETag": sent["ETag"], "PartNumber": number})
+        except Exception as exc:
+            if self.parts:
+                # Earlier parts are gone from memory, so there is nothing to replay
+                raise
+            logging.getLogger(__name__).warning(
+                "Multipart upload unavailable for %s, spooling for fallback upload: %s", self.key, exc
+            )
+            self._abort_multipart()
+            self._start_spool(body)
+
+    def _start_spool(self, initial: bytes) -> None:
+        self._spool = tempfile.NamedTemporaryFile(delete=False, suffix=Path(self.key).suffix or ".bin")
+        self._spool.write(initial)
+
+    def _abort_multipart(self) -> None:
+        if self.upload_id is None:
+            return
+        try:
+            self.backend.client.abort_multipart_upload(
+                Bucket=self.backend.bucket, Key=self.key, UploadId=self.upload_id
+            )
+        except Exception:
+            pass
+        self.upload_id = None
+
+    def commit(self) -> None:
+        try:
+            self._commit()
+        finally:
+            self.backend.invalidate_cached(self.key)
+
+    def _commit(self) -> None:
+        client, bucket = self.backend.client, self.backend.bucket
+        if self._spool is None and self.upload_id is None:
+            try:
+                client.put_object(Bucket=bucket, Key=self.key, Body=bytes(self._buffer), ContentType=self.content_type)
+                return
+            except Exception:
+                self._start_spool(bytes(self._buffer))
+        if self._spool is not None:
+            self._spool.close()
+            try:
+                self.backend._upload(self._spool.name, self.key)
+            finally:
+                os.remove(self._spool.name)
+                self._spool = None
+            return
+        if self._buffer:
+            self._send_part(bytes(self._buffer))
+        client.complete_multipart_upload(
+            Bucket=bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": self.parts},
+        )
+
+    def abort(self) -> None:
+        self._abort_multipart()
+        if self._spool is not None:
+            self._spool.close()
+            os.remove(self._spool.name)
+            self._spool = None
+        self._buffer.clear()
+
+
+class S3PoolMetrics:
+    """Request and connection-pool counters for a boto3 client.
+
+    In-flight requests are counted from botocore's ``before-send`` /
+    ``response-received`` events (one pair per attempt). Connection usage is
+    read from the urllib3 pools behind the client, since a streamed GetObject
+    body keeps its connection checked out after the response event. A request
+    that starts while every pooled connection is busy is counted as saturated:
+    urllib3 opens an extra connection for it and discards it afterwards.
+    """
+
+    def __init__(self, client, max_connections: int) -> None:
+        self.max_connections = max_connections
+        self._client = client
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.saturated = 0
+        self.peak_connections_in_use = 0
+        events = client.meta.events
+        events.register("before-send.s3", self._on_before_send)
+        events.register("response-received.s3", self._on_response_received)
+
+    def _pools(self) -> list:
+        try:
+            manager = self._client._endpoint.http_session._manager
+            return [manager.pools[key] for key in manager.pools.keys()]
+        except (AttributeError, KeyError):
+            return []
+
+    def connections(self) -> tuple[int, int]:
+        """Return (checked out, idle) connections across the client's pools."""
+        in_use = idle = 0
+        for pool in self._pools():
+            queue = pool.pool
+            if queue is None:
+                continue
+            available = queue.qsize()
+            in_use += max(queue.maxsize - available, 0)
+            idle += sum(1 for conn in list(queue.queue) if conn is not None)
+        return in_use, idle
+
+    def _on_before_send(self, **kwargs) -> None:
+        in_use, _ = self.connections()
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self.peak_connections_in_use = max(self.peak_connections_in_use, in_use)
+            if in_use >= self.max_connections:
+                self.saturated += 1
+
+    def _on_response_received(self, exception=None, **kwargs) -> None:
+        with self._lock:
+            self.in_flight = max(self.in_flight - 1, 0)
+            if exception is not None:
+                self.errors += 1
+
+    def snapshot(self) -> Dict[str, object]:
+        in_use, idle = self.connections()
+        with self._lock:
+            return {
+                "max_pool_connections": self.max_connections,
+                "connections_in_use": in_use,
+                "connections_idle": idle,
+                "peak_connections_in_use": max(self.peak_connections_in_use, in_use),
+                "requests": self.requests,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "saturated_requests": self.saturated,
+                "saturation_ratio": round(self.saturated / self.requests, 4) if self.requests else 0.0,
+            }
+
+
+async def _aiter_local_file(path: str, chunk_size: int) -> AsyncIterator[bytes]:
+    async for chunk in _aiter_open_file(await asyncio.to_thread(open, path, "rb"), chunk_size):
+        yield chunk
+
+
+async def _aiter_open_file(fh, chunk_size: int) -> AsyncIterator[bytes]:
+    try:
+        while True:
+            chunk = await asyncio.to_thread(fh.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fh.close()
+
+
+async def _aiter_body(body, chunk_size: int = RANGE_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Read a botocore StreamingBody in worker threads.
+
+    The body is closed in ``finally`` so an aborted download (client gone
+    mid-stream) returns its connection to the pool instead of leaking it.
+    """
+    try:
+        while True:
+            chunk = await asyncio.to_thread(body.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        body.close()
+
+
+def _file_media_response(target: str, headers: Dict[str, str], range_header: Optional[str]) -> Response:
+    """Serve a local file, honouring a Range header."""
+    size = os.path.getsize(target)
+    try:
+        ranges = parse_range_header(range_header, size)
+    except RangeNotSatisfiable:
+        return range_not_satisfiable_response(size)
+    if ranges is None:
+        return FileResponse(target, headers=headers)
+
+    def read_range(start: int, end: int) -> Iterator[bytes]:
+        with open(target, "rb") as fh:
+            fh.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = fh.read(min(RANGE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    media_type = mimetypes.guess_type(target)[0] or "application/octet-stream"
+    return partial_content_response(ranges, size, media_type, read_range, headers)
+
+
+def _open_file_media_response(target: str, headers: Dict[str, str], range_header: Optional[str]) -> Response:
+    """Serve a shared local copy (media cache), honouring a Range header.
+
+    The file is opened before the response is built: another worker may evict
+    and unlink it at any time, and an open file stays readable. Raises
+    FileNotFoundError when it is already gone.
+    """
+    fh = open(target, "rb")
+    size = os.fstat(fh.fileno()).st_size
+    try:
+        ranges = parse_range_header(range_header, size)
+    except RangeNotSatisfiable:
+        fh.close()
+        return range_not_satisfiable_response(size)
+
+    def read_range(start: int, end: int) -> Iterator[bytes]:
+        fh.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = fh.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    media_type = mimetypes.guess_type(target)[0] or "application/octet-stream"
+    if ranges is None:
+        response = StreamingResponse(
+            read_range(0, size - 1), media_type=media_type, headers={**headers, "Content-Length": str(size)}
+        )
+    else:
+        response = partial_content_response(ranges, size, media_type, read_range, headers)
+    response.background = BackgroundTask(fh.close)
+    return response
+
+
+def _with_download_name(headers: Dict[str, str], download_name: Optional[str]) -> Dict[str, str]:
+    if download_name:
+        quoted = quote(download_name)
+        if quoted != download_name:
+            # Non-ASCII (e.g. Chinese) filenames need the RFC 5987 form
+            headers["Content-Disposition"] = f"attachment; filename*=utf-8''{quoted}"
+        else:
+            headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+    return headers
+
+
+def _write_at(path: Path, offset: int, data: bytes) -> None:
+    """Write ``data`` at ``offset`` and drop anything after it (e.g. a half-written retry)."""
+    with open(path, "r+b") as fh:
+        fh.truncate(offset)
+        fh.seek(offset)
+        fh.write(data)
+
 
 def cleanup_staged_files(*paths: Optional[str]) -> None:
     """Remove temporary staged files and their temp directories."""
@@ -322,17 +1187,51 @@ def cleanup_staged_files(*paths: Optional[str]) -> None:
 
 
 def get_storage_backend() -> StorageBackend:
-    """Return the configured storage backend."""
+    """Build a new instance of the configured storage backend."""
     if settings.STORAGE_BACKEND == "s3":
         return S3StorageBackend()
     return LocalStorageBackend()
 
 
+# 进程级单例：FastAPI 在 lifespan 中创建/关闭；Celery worker 与脚本首次调用时懒加载。
+# 记录创建时的 pid，fork 出的子进程不会复用父进程的 boto3 连接池。
+_storage: Optional[StorageBackend] = None
+_storage_pid: Optional[int] = None
+_storage_lock = threading.Lock()
+
+
+def init_storage() -> StorageBackend:
+    """Create the process-wide storage backend if it does not exist yet."""
+    global _storage, _storage_pid
+    with _storage_lock:
+        if _storage is None or _storage_pid != os.getpid():
+            _storage = get_storage_backend()
+            _storage_pid = os.getpid()
+        return _storage
+
+
 def get_storage() -> StorageBackend:
-    """Convenience accessor for callers that do not need DI."""
-    return get_storage_backend()
+    """Return the shared storage backend for callers that do not need DI."""
+    backend = _storage
+    if backend is None or _storage_pid != os.getpid():
+        backend = init_storage()
+    return backend
+
+
+def close_storage() -> None:
+    """Close and drop the shared backend (FastAPI shutdown, end of a script)."""
+    global _storage, _storage_pid
+    with _storage_lock:
+        backend, _storage, _storage_pid = _storage, None, None
+    if backend is not None:
+        backend.close()
 
 
 def delete_file(file_path: Optional[str]) -> bool:
     """Backward-compatible delete helper."""
     return get_storage().delete_file(file_path)
+
+
+async def adelete_file(file_path: Optional[str]) -> bool:
+    """Async counterpart of :func:`delete_file`."""
+    return await get_storage().adelete_file(file_path)
@@ -1,11 +1,14 @@
 """
 Task dispatch helpers.
 """
+from typing import Optional
+
 from fastapi import BackgroundTasks
 
 from app.core.config import get_settings
 from app.core.celery_app import celery_app
 from app.services.ai_tasks import run_ai_analysis_task
+from app.services.photo_pipeline import run_photo_pipeline
 
 settings = get_settings()
 
@@ -16,3 +19,20 @@ def dispatch_ai_analysis_task(background_tasks: BackgroundTasks, task_id: str) -
         celery_app.send_task("app.tasks.ai.run_photo_ai_analysis", args=[task_id])
         return
     background_tasks.add_task(run_ai_analysis_task, task_id)
+
+
+def dispatch_photo_pipeline(
+    background_tasks: BackgroundTasks,
+    photo_id: str,
+    enable_ai: bool = True,
+    requested_by_id: Optional[str] = None,
+) -> None:
+    """Dispatch the deferred media pipeline for an accept-fast upload."""
+    if settings.TASK_QUEUE_BACKEND == "celery" and celery_app is not None:
+        celery_app.send_task(
+            "app.tasks.media.process_photo_media",
+            args=[photo_id],
+            kwargs={"enable_ai": enable_ai, "requested_by_id": requested_by_id},
+        )
+        return
+    background_tasks.add_task(run_photo_pipeline, photo_id, enable_ai, requested_by_id)
@@ -0,0 +1,288 @@
+"""
+On-the-fly derived images (crops, format conversions) for an allowlist of presets.
+
+- Only presets from IMAGE_TRANSFORM_PRESETS can be rendered, so the set of
+  derivatives per photo is bounded and cannot be used to burn CPU or fill
+  the cache with arbitrary sizes. Explicit parameters are accepted when they
+  describe one of those presets.
+- Each derivative is rendered from the smallest stored rendition that still
+  covers the target box (the original only when no rendition is large
+  enough), in the shared image worker pool.
+- Results are kept in a local disk cache (services.disk_cache) capped at
+  IMAGE_TRANSFORM_CACHE_MAX_BYTES with least-recently-used eviction. Presets
+  listed in IMAGE_TRANSFORM_PERSIST_PRESETS are also written to the storage
+  backend under ``derived/``, so a cold cache (new instance, eviction)
+  fetches them instead of rendering again.
+- Concurrent requests for the same derivative share one render
+  (single flight), so a burst against a cold cache costs one job, not N.
+
+The cache directory is shared by the workers on a host; the in-flight table
+is per process, so two workers missing at the same moment may each render
+the derivative once.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import tempfile
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.config import get_settings
+from app.models.photo import Photo
+from app.services.disk_cache import DiskCache
+from app.services.image_processing import TRANSFORM_FORMATS, pick_rendition, render_transform
+from app.services.image_workers import get_image_workers
+from app.services.storage import COPY_CHUNK_SIZE, StorageBackend, get_storage
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+TRANSFORM_FITS = ("inside", "cover")
+DERIVED_PREFIX = "derived"
+
+
+class TransformNotAllowed(ValueError):
+    """The requested transform is not one of the configured presets."""
+
+
+@dataclass(frozen=True)
+class TransformSpec:
+    name: str
+    width: int
+    height: Optional[int]
+    fit: str
+    format: str
+    quality: int
+
+    @property
+    def media_type(self) -> str:
+        return TRANSFORM_FORMATS[self.format][1]
+
+    @property
+    def extension(self) -> str:
+        return TRANSFORM_FORMATS[self.format][2]
+
+    @property
+    def digest(self) -> str:
+        """Short fingerprint of the rendering parameters (not the name)."""
+        params = f"{self.width}x{self.height or ''}|{self.fit}|{self.format}|{self.quality}"
+        return hashlib.sha1(params.encode("utf-8")).hexdigest()[:10]
+
+
+def _spec_from_config(name: str, options: Dict[str, Any]) -> TransformSpec:
+    spec = TransformSpec(
+        name=name,
+        width=int(options["width"]),
+        height=int(options["height"]) if options.get("height") else None,
+        fit=options.get("fit", "inside"),
+        format=options.get("format", "jpeg"),
+        quality=int(options.get("quality", settings.IMAGE_RENDITION_QUALITY)),
+    )
+    if spec.fit not in TRANSFORM_FITS or spec.format not in TRANSFORM_FORMATS:
+        raise ValueError(f"Invalid image transform preset {name!r}: {options}")
+    if spec.fit == "cover" and spec.height is None:
+        raise ValueError(f"Image transform preset {name!r}: fit=cover needs a height")
+    return spec
+
+
+def transform_presets() -> Dict[str, TransformSpec]:
+    return {name: _spec_from_config(name, options) for name, options in settings.IMAGE_TRANSFORM_PRESETS.items()}
+
+
+def resolve_transform(
+    preset: Optional[str] = None,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    fit: Optional[str] = None,
+    image_format: Optional[str] = None,
+    quality: Optional[int] = None,
+) -> TransformSpec:
+    """The allowlisted preset named by ``preset`` or matching the given parameters.
+
+    Parameters left out match anything, so ``width=600&format=webp`` resolves
+    as long as exactly one preset fits. Raises TransformNotAllowed otherwise.
+    """
+    presets = transform_presets()
+    requested = {"width": width, "height": height, "fit": fit, "format": image_format, "quality": quality}
+    requested = {key: value for key, value in requested.items() if value is not None}
+    if preset is not None:
+        candidates = [presets[preset]] if preset in presets else []
+    else:
+        if not requested:
+            raise TransformNotAllowed("Specify a preset or transform parameters")
+        candidates = list(presets.values())
+    matches = [spec for spec in candidates if all(asdict(spec)[key] == value for key, value in requested.items())]
+    if len(matches) != 1:
+        allowed = ", ".join(sorted(presets)) or "none"
+        if len(matches) > 1:
+            raise TransformNotAllowed(f"Ambiguous transform, use one of the presets: {allowed}")
+        raise TransformNotAllowed(f"Transform not allowed, use one of the presets: {allowed}")
+    return matches[0]
+
+
+def required_source_width(photo: Photo, spec: TransformSpec) -> int:
+    """Narrowest source width from which ``spec`` can be rendered without upscaling."""
+    if not spec.height or not photo.width or not photo.height:
+        return spec.width
+    height_as_width = math.ceil(spec.height * photo.width / photo.height)
+    if spec.fit == "cover":
+        return max(spec.width, height_as_width)
+    return min(spec.width, height_as_width)
+
+
+def transform_source(photo: Photo, spec: TransformSpec) -> str:
+    """Storage key to render ``spec`` from: the nearest sufficient rendition, else the original."""
+    needed = required_source_width(photo, spec)
+    path = pick_rendition(photo.renditions, needed)
+    if path:
+        widest = max(int(width) for width in photo.renditions)
+        if widest >= needed or not photo.width or photo.width <= widest:
+            return path
+    return photo.original_path
+
+
+def derived_key(photo_id: str, source: str, spec: TransformSpec) -> str:
+    """Storage key of a persisted derivative of ``source``.
+
+    The source is part of the key: once a deferred pipeline stores renditions,
+    the derivative rendered from the original is not served in their place.
+    """
+    source_digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:10]
+    return f"{DERIVED_PREFIX}/{photo_id}_{spec.name}_{spec.digest}_{source_digest}.{spec.extension}"
+
+
+def derived_media_paths(photo: Photo) -> list[str]:
+    """Storage keys a photo may own under ``derived/`` (for deletion).
+
+    Besides the current source, a derivative may still exist from the
+    original, rendered before the photo had renditions.
+    """
+    presets = transform_presets()
+    paths = []
+    for name in settings.IMAGE_TRANSFORM_PERSIST_PRESETS:
+        if name in presets:
+            spec = presets[name]
+            for source in dict.fromkeys((transform_source(photo, spec), photo.original_path)):
+                if source:
+                    paths.append(derived_key(photo.id, source, spec))
+    return paths
+
+
+class SingleFlight:
+    """Run at most one coroutine per key; concurrent callers await the same result."""
+
+    def __init__(self) -> None:
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # A client hanging up must not cancel the render for everyone else waiting on it
+        return await asyncio.shield(task)
+
+
+class ImageTransformer:
+    def __init__(self, cache: DiskCache, storage: Optional[StorageBackend] = None) -> None:
+        self.cache = cache
+        self.storage = storage
+        self.flights = SingleFlight()
+        self.rendered = 0
+        self.fetched = 0
+
+    def _storage(self) -> StorageBackend:
+        return self.storage or get_storage()
+
+    async def get(self, photo: Photo, spec: TransformSpec) -> bytes:
+        """Bytes of ``spec`` rendered for ``photo``, from cache when possible."""
+        source = transform_source(photo, spec)
+        key = hashlib.sha1(f"{photo.id}|{source}|{spec.digest}".encode("utf-8")).hexdigest() + f".{spec.extension}"
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            try:
+                return await asyncio.to_thread(cached.read_bytes)
+            except FileNotFoundError:
+                pass  # evicted between lookup and read
+        return await self.flights.run(key, lambda: self._produce(photo.id, source, spec, key))
+
+    async def _produce(self, photo_id: str, source: str, spec: TransformSpec, key: str) -> bytes:
+        persist = spec.name in settings.IMAGE_TRANSFORM_PERSIST_PRESETS
+        storage = self._storage()
+        data = None
+        if persist:
+            data = await self._fetch_persisted(storage, derived_key(photo_id, source, spec))
+        if data is None:
+            data = await self._render(storage, source, spec)
+            if persist:
+                await asyncio.to_thread(self._persist, storage, derived_key(photo_id, source, spec), data, spec)
+        await asyncio.to_thread(self.cache.put_bytes, key, data)
+        return data
+
+    async def _fetch_persisted(self, storage: StorageBackend, path: str) -> Optional[bytes]:
+        try:
+            chunks = [chunk async for chunk in storage.aiter_file(path, COPY_CHUNK_SIZE)]
+        except Exception:  # noqa: BLE001 - not persisted yet (or unreadable): render instead
+            return None
+        self.fetched += 1
+        return b"".join(chunks)
+
+    async def _render(self, storage: StorageBackend, source: str, spec: TransformSpec) -> bytes:
+        with tempfile.TemporaryDirectory(prefix="transform-") as temp_dir:
+            output_path = os.path.join(temp_dir, f"derived.{spec.extension}")
+            async with storage.alocal_copy(source) as local_path:
+                await get_image_workers().submit(
+                    render_transform, local_path, output_path,
+                    spec.width, spec.height, spec.fit, spec.format, spec.quality,
+                )
+            self.rendered += 1
+            return await asyncio.to_thread(Path(output_path).read_bytes)
+
+    @staticmethod
+    def _persist(storage: StorageBackend, path: str, data: bytes, spec: TransformSpec) -> None:
+        writer = storage.open_writer(path, spec.media_type)
+        try:
+            writer.write(data)
+            writer.commit()
+        except Exception as exc:  # noqa: BLE001 - the derivative is still served from the disk cache
+            writer.abort()
+            logger.warning("Could not persist derived image %s: %s", path, exc)
+
+    def metrics(self) -> Dict[str, object]:
+        return {
+            **self.cache.metrics(),
+            "rendered": self.rendered,
+            "fetched": self.fetched,
+            "coalesced": self.flights.coalesced,
+            "in_flight": len(self.flights._inflight),
+        }
+
+
+_transformer: Optional[ImageTransformer] = None
+_transformer_lock = threading.Lock()
+
+
+def get_image_transformer() -> ImageTransformer:
+    global _transformer
+    with _transformer_lock:
+        if _transformer is None:
+            directory = settings.IMAGE_TRANSFORM_CACHE_DIR or os.path.join(tempfile.gettempdir(), "visual-buct-derived")
+            _transformer = ImageTransformer(DiskCache(directory, settings.IMAGE_TRANSFORM_CACHE_MAX_BYTES))
+        return _transformer
+
+
+def reset_image_transformer() -> None:
+    """Drop the process-wide transformer (tests, settings changes)."""
+    global _transformer
+    with _transformer_lock:
+        _transformer = None
@@ -0,0 +1,192 @@
+"""
+Resumable (tus-style) upload sessions for large originals.
+
+A client creates a session with the total size, PATCHes chunks at the
+current offset and can ask for the offset again after a dropped connection.
+Each chunk goes straight to the storage backend (one S3 multipart part, or
+an append to ``originals/<id>.<ext>.part`` locally); the session row keeps
+the offset and the backend's resume state. Completing a session moves the
+object into place; the photo endpoints then run the normal processing and
+AI dispatch flow on it, and commit the session's ``completed`` status together
+with the photo row. Until then the session stays active, so a finalize that
+failed can be retried (moving the object into place again is a no-op).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.database import AsyncSessionLocal
+from app.models.upload_session import UploadSession
+from app.services.storage import generate_unique_filename, get_storage
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+SESSION_ACTIVE = "active"
+SESSION_COMPLETED = "completed"
+SESSION_ABORTED = "aborted"
+SESSION_EXPIRED = "expired"
+
+
+class UploadSessionError(ValueError):
+    """Request does not fit the session (size, chunk length, state)."""
+
+
+class UploadSessionClosed(UploadSessionError):
+    """Session already completed, aborted or expired."""
+
+
+class UploadOffsetMismatch(Exception):
+    """Chunk offset differs from the stored offset; the client should resume from ``offset``."""
+
+    def __init__(self, offset: int) -> None:
+        super().__init__(f"Upload offset is {offset}")
+        self.offset = offset
+
+
+async def create_upload_session(
+    db: AsyncSession,
+    user_id: str,
+    *,
+    filename: str,
+    mime_type: str,
+    total_size: int,
+    metadata: Optional[dict] = None,
+) -> UploadSession:
+    if total_size <= 0:
+        raise UploadSessionError("Upload length must be positive")
+    if total_size > settings.UPLOAD_SESSION_MAX_SIZE:
+        raise UploadSessionError(f"Upload exceeds the maximum size of {settings.UPLOAD_SESSION_MAX_SIZE} bytes")
+
+    photo_id, extension = generate_unique_filename(filename)
+    storage_key = f"originals/{photo_id}{extension or '.jpg'}"
+    state = await asyncio.to_thread(get_storage().begin_resumable, storage_key, mime_type)
+    session = UploadSession(
+        user_id=user_id,
+        photo_id=photo_id,
+        filename=filename,
+        mime_type=mime_type,
+        storage_key=storage_key,
+        total_size=total_size,
+        upload_offset=0,
+        storage_state=state,
+        upload_metadata=metadata or {},
+        status=SESSION_ACTIVE,
+        expires_at=datetime.utcnow() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS),
+    )
+    db.add(session)
+    await db.commit()
+    await db.refresh(session)
+    return session
+
+
+async def get_upload_session(db: AsyncSession, session_id: str, user_id: str) -> Optional[UploadSession]:
+    result = await db.execute(
+        select(UploadSession).where(UploadSession.id == session_id, UploadSession.user_id == user_id)
+    )
+    return result.scalar_one_or_none()
+
+
+def _check_active(session: UploadSession) -> None:
+    if session.status != SESSION_ACTIVE:
+        raise UploadSessionClosed(f"Upload session is {session.status}")
+    if session.expires_at <= datetime.utcnow():
+        raise UploadSessionClosed("Upload session has expired")
+
+
+async def append_chunk(db: AsyncSession, session: UploadSession, offset: int, data: bytes) -> UploadSession:
+    """Store one chunk at ``offset`` and advance the session offset."""
+    _check_active(session)
+    if offset != session.upload_offset:
+        raise UploadOffsetMismatch(session.upload_offset)
+    if not data:
+        raise UploadSessionError("Empty chunk")
+    end = offset + len(data)
+    if end > session.total_size:
+        raise UploadSessionError("Chunk exceeds the declared upload length")
+    state = session.storage_state or {}
+    if end < session.total_size and len(data) < state.get("min_chunk_size", 0):
+        raise UploadSessionError(f"Chunks before the last one must be at least {state['min_chunk_size']} bytes")
+
+    state = await asyncio.to_thread(get_storage().append_resumable, session.storage_key, state, offset, data)
+    # Only advance if nobody else moved the offset meanwhile (parallel PATCH of the same chunk).
+    # Expiry slides with activity, so only sessions idle for the whole TTL are cleaned up.
+    now = datetime.utcnow()
+    result = await db.execute(
+        update(UploadSession)
+        .where(UploadSession.id == session.id, UploadSession.upload_offset == offset)
+        .values(
+            upload_offset=end,
+            storage_state=state,
+            updated_at=now,
+            expires_at=now + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS),
+        )
+    )
+    await db.commit()
+    await db.refresh(session)
+    if result.rowcount != 1:
+        raise UploadOffsetMismatch(session.upload_offset)
+    return session
+
+
+def check_upload_complete(session: UploadSession) -> None:
+    """Raise unless the session is active and every byte has been received."""
+    _check_active(session)
+    if session.upload_offset != session.total_size:
+        raise UploadSessionError(f"Upload incomplete: {session.upload_offset} of {session.total_size} bytes received")
+
+
+async def store_completed_upload(session: UploadSession) -> None:
+    """Move the received object into place and mark the session (uncommitted) completed.
+
+    The caller commits the status in the same transaction as the photo row.
+    """
+    check_upload_complete(session)
+    await asyncio.to_thread(get_storage().complete_resumable, session.storage_key, session.storage_state or {})
+    session.status = SESSION_COMPLETED
+
+
+async def abort_upload_session(db: AsyncSession, session: UploadSession, status: str = SESSION_ABORTED) -> None:
+    if session.status == SESSION_ACTIVE:
+        storage = get_storage()
+        await asyncio.to_thread(storage.abort_resumable, session.storage_key, session.storage_state or {})
+        # A failed finalize may have moved the object into place already; no photo uses it
+        await storage.adelete_file(session.storage_key)
+    session.status = status
+    await db.commit()
+
+
+async def cleanup_expired_sessions(db: AsyncSession, now: Optional[datetime] = None) -> int:
+    """Abort active sessions past ``expires_at`` and drop their partial data."""
+    now = now or datetime.utcnow()
+    result = await db.execute(
+        select(UploadSession).where(UploadSession.status == SESSION_ACTIVE, UploadSession.expires_at <= now)
+    )
+    expired = list(result.scalars().all())
+    for session in expired:
+        try:
+            await abort_upload_session(db, session, status=SESSION_EXPIRED)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Failed to clean up upload session %s: %s", session.id, exc)
+            await db.rollback()
+    return len(expired)
+
+
+async def run_cleanup_loop(interval: int) -> None:
+    """Periodically expire idle sessions; started from the FastAPI lifespan."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionLocal() as db:
+                removed = await cleanup_expired_sessions(db)
+            if removed:
+                logger.info("Expired %d idle upload session(s)", removed)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Upload session cleanup failed: %s", exc)
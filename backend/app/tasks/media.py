@@ -0,0 +1,14 @@
+"""
+Celery wrappers for the deferred media pipeline.
+"""
+import asyncio
+from typing import Optional
+
+from app.core.celery_app import celery_app
+from app.services.photo_pipeline import run_photo_pipeline
+
+
+if celery_app is not None:
+    @celery_app.task(name="app.tasks.media.process_photo_media")
+    def process_photo_media(photo_id: str, enable_ai: bool = True, requested_by_id: Optional[str] = None) -> None:
+        asyncio.run(run_photo_pipeline(photo_id, enable_ai=enable_ai, requested_by_id=requested_by_id))
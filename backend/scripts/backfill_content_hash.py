@@ -0,0 +1,98 @@
+"""
+Fill photos.content_hash for rows ingested before content-hash dedup existed.
+
+Uploads and imports hash originals while they are written; older rows have
+content_hash NULL and are invisible to duplicate detection until this runs.
+
+Usage:
+    cd backend
+    python scripts/backfill_content_hash.py --dry-run       # count rows without a hash
+    python scripts/backfill_content_hash.py --limit 500
+    python scripts/backfill_content_hash.py --report        # also list duplicate groups
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import func, select
+
+from app.core.database import AsyncSessionLocal
+from app.models.photo import Photo
+from app.services.storage import close_storage, get_storage, sha256_file
+
+
+async def backfill(limit: int | None, dry_run: bool) -> dict[str, int]:
+    storage = get_storage()
+    stats = {"missing": 0, "hashed": 0, "failed": 0}
+    async with AsyncSessionLocal() as db:
+        query = select(Photo).where(Photo.content_hash.is_(None), Photo.original_path.isnot(None)).order_by(Photo.created_at)
+        if limit:
+            query = query.limit(limit)
+        photos = list((await db.execute(query)).scalars().all())
+        stats["missing"] = len(photos)
+        if dry_run:
+            return stats
+
+        for photo in photos:
+            try:
+                async with storage.alocal_copy(photo.original_path) as local_path:
+                    photo.content_hash = await asyncio.to_thread(sha256_file, local_path)
+                stats["hashed"] += 1
+            except Exception as exc:  # noqa: BLE001
+                stats["failed"] += 1
+                print(f"  [{photo.id}] {photo.original_path}: {exc}")
+                continue
+            if stats["hashed"] % 100 == 0:
+                await db.commit()
+                print(f"  {stats['hashed']} hashed")
+        await db.commit()
+    return stats
+
+
+async def report_duplicates() -> None:
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(
+            select(Photo.content_hash, func.count(Photo.id))
+            .where(Photo.content_hash.isnot(None), Photo.status != "deleted")
+            .group_by(Photo.content_hash)
+            .having(func.count(Photo.id) > 1)
+        )
+        groups = rows.all()
+        print(f"{len(groups)} duplicate group(s)")
+        for content_hash, count in groups:
+            ids = await db.execute(
+                select(Photo.id).where(Photo.content_hash == content_hash, Photo.status != "deleted").order_by(Photo.created_at)
+            )
+            print(f"  {content_hash[:12]} x{count}: {', '.join(ids.scalars().all())}")
+
+
+async def run(args) -> int:
+    stats = await backfill(args.limit, args.dry_run)
+    if args.dry_run:
+        print(f"{stats['missing']} photo(s) without content_hash")
+    else:
+        print(f"Done: hashed={stats['hashed']}, failed={stats['failed']}")
+    if args.report:
+        await report_duplicates()
+    return 1 if stats["failed"] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill photos.content_hash")
+    parser.add_argument("--limit", type=int, default=None, help="Hash at most N photos")
+    parser.add_argument("--dry-run", action="store_true", help="Only count rows without a hash")
+    parser.add_argument("--report", action="store_true", help="List content hashes shared by several photos")
+    args = parser.parse_args()
+    try:
+        return asyncio.run(run(args))
+    finally:
+        close_storage()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Fill photos.perceptual_hash (dHash) for rows processed before near-duplicate
+detection existed.
+
+The hash is taken from the smallest stored rendition when there is one, which
+is a few KB to fetch and decode; otherwise from the original.
+
+Usage:
+    cd backend
+    python scripts/backfill_perceptual_hash.py --dry-run       # count rows without a hash
+    python scripts/backfill_perceptual_hash.py --limit 1000
+    python scripts/backfill_perceptual_hash.py --report        # also list near-duplicate clusters
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import select
+
+from app.core.config import get_settings
+from app.core.database import AsyncSessionLocal
+from app.models.photo import Photo
+from app.services.image_processing import dhash_file, pick_rendition
+from app.services.similarity import SimilarityIndex
+from app.services.storage import close_storage, get_storage
+
+
+def hash_source(photo: Photo) -> str | None:
+    return pick_rendition(photo.renditions, 0) or photo.thumb_path or photo.original_path
+
+
+async def backfill(limit: int | None, dry_run: bool) -> dict[str, int]:
+    storage = get_storage()
+    stats = {"missing": 0, "hashed": 0, "failed": 0}
+    async with AsyncSessionLocal() as db:
+        query = (
+            select(Photo)
+            .where(Photo.perceptual_hash.is_(None), Photo.status != "deleted", Photo.original_path.isnot(None))
+            .order_by(Photo.created_at)
+        )
+        if limit:
+            query = query.limit(limit)
+        photos = list((await db.execute(query)).scalars().all())
+        stats["missing"] = len(photos)
+        if dry_run:
+            return stats
+
+        for photo in photos:
+            source = hash_source(photo)
+            try:
+                async with storage.alocal_copy(source) as local_path:
+                    perceptual_hash = await asyncio.to_thread(dhash_file, local_path)
+            except Exception as exc:  # noqa: BLE001
+                perceptual_hash = None
+                print(f"  [{photo.id}] {source}: {exc}")
+            if perceptual_hash is None:
+                stats["failed"] += 1
+                continue
+            photo.perceptual_hash = perceptual_hash
+            stats["hashed"] += 1
+            if stats["hashed"] % 100 == 0:
+                await db.commit()
+                print(f"  {stats['hashed']} hashed")
+        await db.commit()
+    return stats
+
+
+async def report_clusters(max_distance: int) -> None:
+    async with AsyncSessionLocal() as db:
+        clusters = await SimilarityIndex(refresh_seconds=0).clusters(db, max_distance)
+    print(f"{len(clusters)} near-duplicate cluster(s) at distance <= {max_distance}")
+    for cluster in clusters[:50]:
+        print(f"  x{len(cluster)}: {', '.join(cluster)}")
+    if len(clusters) > 50:
+        print(f"  ... and {len(clusters) - 50} more")
+
+
+async def run(args) -> int:
+    stats = await backfill(args.limit, args.dry_run)
+    if args.dry_run:
+        print(f"{stats['missing']} photo(s) without perceptual_hash")
+    else:
+        print(f"Done: hashed={stats['hashed']}, failed={stats['failed']}")
+    if args.report:
+        await report_clusters(args.max_distance)
+    return 1 if stats["failed"] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill photos.perceptual_hash")
+    parser.add_argument("--limit", type=int, default=None, help="Hash at most N photos")
+    parser.add_argument("--dry-run", action="store_true", help="Only count rows without a hash")
+    parser.add_argument("--report", action="store_true", help="List near-duplicate clusters afterwards")
+    parser.add_argument("--max-distance", type=int, default=get_settings().SIMILARITY_MAX_DISTANCE,
+                        help="Hamming distance for --report")
+    args = parser.parse_args()
+    try:
+        return asyncio.run(run(args))
+    finally:
+        close_storage()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
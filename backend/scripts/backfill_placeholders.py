@@ -0,0 +1,92 @@
+"""
+Fill photos.blurhash and photos.dominant_color for rows processed before
+placeholders existed.
+
+Both are computed from the smallest stored rendition when there is one,
+which is a few KB to fetch and decode; otherwise from the original.
+
+Usage:
+    cd backend
+    python scripts/backfill_placeholders.py --dry-run       # count rows without a placeholder
+    python scripts/backfill_placeholders.py --limit 1000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import or_, select
+
+from app.core.database import AsyncSessionLocal
+from app.models.photo import Photo
+from app.services.image_processing import pick_rendition, placeholder_file
+from app.services.storage import close_storage, get_storage
+
+
+def placeholder_source(photo: Photo) -> str | None:
+    return pick_rendition(photo.renditions, 0) or photo.thumb_path or photo.original_path
+
+
+async def backfill(limit: int | None, dry_run: bool) -> dict[str, int]:
+    storage = get_storage()
+    stats = {"missing": 0, "filled": 0, "failed": 0}
+    async with AsyncSessionLocal() as db:
+        query = (
+            select(Photo)
+            .where(
+                or_(Photo.blurhash.is_(None), Photo.dominant_color.is_(None)),
+                Photo.status != "deleted",
+                Photo.original_path.isnot(None),
+            )
+            .order_by(Photo.created_at)
+        )
+        if limit:
+            query = query.limit(limit)
+        photos = list((await db.execute(query)).scalars().all())
+        stats["missing"] = len(photos)
+        if dry_run:
+            return stats
+
+        for photo in photos:
+            source = placeholder_source(photo)
+            try:
+                async with storage.alocal_copy(source) as local_path:
+                    placeholder = await asyncio.to_thread(placeholder_file, local_path)
+            except Exception as exc:  # noqa: BLE001
+                placeholder = None
+                print(f"  [{photo.id}] {source}: {exc}")
+            if placeholder is None:
+                stats["failed"] += 1
+                continue
+            photo.blurhash = placeholder["blurhash"]
+            photo.dominant_color = placeholder["dominant_color"]
+            stats["filled"] += 1
+            if stats["filled"] % 100 == 0:
+                await db.commit()
+                print(f"  {stats['filled']} filled")
+        await db.commit()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill photos.blurhash / photos.dominant_color")
+    parser.add_argument("--limit", type=int, default=None, help="Process at most N photos")
+    parser.add_argument("--dry-run", action="store_true", help="Only count rows without a placeholder")
+    args = parser.parse_args()
+    try:
+        stats = asyncio.run(backfill(args.limit, args.dry_run))
+    finally:
+        close_storage()
+    if args.dry_run:
+        print(f"{stats['missing']} photo(s) without placeholder")
+        return 0
+    print(f"Done: filled={stats['filled']}, failed={stats['failed']}")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
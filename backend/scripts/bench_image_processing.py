@@ -0,0 +1,163 @@
+"""
+Benchmark the upload processing stage (dimensions + EXIF + renditions).
+
+Compares the previous pipeline ("legacy": three Image.open calls, every
+rendition resampled with LANCZOS from full resolution) with the current
+single-decode pipeline ("single": one open, JPEG draft decode, reduce() +
+cascaded LANCZOS) from app.services.image_processing.
+
+Each mode runs in its own child process so peak RSS is measured in
+isolation. Without --corpus, a synthetic set of 12MP and 24MP JPEGs is
+generated in a temp directory.
+
+Usage:
+    cd backend
+    python scripts/bench_image_processing.py                      # synthetic 12/24MP corpus
+    python scripts/bench_image_processing.py --corpus ~/campus-photos --limit 40
+    python scripts/bench_image_processing.py --generate 12 --modes single
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from PIL import Image
+
+from app.core.config import get_settings
+from app.services.image_processing import extract_date_taken, extract_exif, process_uploaded_image
+
+# 12MP (4:3) and 24MP (3:2), alternating in the synthetic corpus
+SYNTHETIC_SIZES = [(4000, 3000), (6000, 4000)]
+
+
+def _legacy_process(image_path: str, photo_uuid: str, output_dir: str) -> None:
+    """The pre-single-decode pipeline, kept here as the baseline."""
+    settings = get_settings()
+    with Image.open(image_path) as img:
+        width, _ = img.size
+    extract_date_taken(extract_exif(image_path))
+    with Image.open(image_path) as img:
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        width, height = img.size
+        for size in sorted(set(settings.IMAGE_RENDITION_SIZES)):
+            target = str(Path(output_dir) / f"{photo_uuid}_{size}.jpg")
+            if size >= width:
+                img.save(target, "JPEG", quality=settings.IMAGE_RENDITION_QUALITY, optimize=True)
+                break
+            img.resize((size, max(1, int(height * size / width))), Image.Resampling.LANCZOS).save(
+                target, "JPEG", quality=settings.IMAGE_RENDITION_QUALITY, optimize=True
+            )
+
+
+def _generate_corpus(directory: Path, count: int) -> list[Path]:
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for index in range(count):
+        width, height = SYNTHETIC_SIZES[index % len(SYNTHETIC_SIZES)]
+        # Noise over a gradient compresses roughly like a real photo (~5-10MB at q92)
+        base = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+        noise = Image.effect_noise((width, height), 48 + index).convert("RGB")
+        image = Image.blend(base, noise, 0.35)
+        path = directory / f"synthetic_{index:03d}_{width}x{height}.jpg"
+        image.save(path, "JPEG", quality=92)
+        paths.append(path)
+    return paths
+
+
+def _corpus(args) -> list[Path]:
+    directory = Path(args.corpus).expanduser()
+    paths = sorted(
+        path for path in directory.iterdir() if path.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp")
+    )
+    return paths[: args.limit] if args.limit else paths
+
+
+def _peak_rss_kib() -> int:
+    # VmHWM is per address space; ru_maxrss survives exec and would include the parent
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_worker(args) -> int:
+    """Child process: process the corpus in one mode and print JSON stats."""
+    paths = _corpus(args)
+    out_dir = Path(tempfile.mkdtemp(prefix="buct-bench-renditions-"))
+    timings = []
+    try:
+        for index, path in enumerate(paths):
+            started = time.perf_counter()
+            if args.worker == "legacy":
+                _legacy_process(str(path), f"bench{index}", str(out_dir))
+            else:
+                process_uploaded_image(str(path), f"bench{index}", output_dir=str(out_dir))
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    print(json.dumps({"timings_ms": timings, "peak_rss_kib": _peak_rss_kib()}))
+    return 0
+
+
+def _report(mode: str, stats: dict) -> None:
+    timings = stats["timings_ms"]
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(
+        f"{mode:<8} {statistics.mean(timings):>8.1f} ms/image (mean)  "
+        f"{statistics.median(timings):>8.1f} median  {p95:>8.1f} p95  "
+        f"peak RSS {stats['peak_rss_kib'] / 1024:>7.1f} MiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark upload image processing")
+    parser.add_argument("--corpus", default=None, help="Directory of sample photos (default: synthetic)")
+    parser.add_argument("--generate", type=int, default=8, help="Synthetic images to generate (default: 8)")
+    parser.add_argument("--limit", type=int, default=None, help="Max images taken from --corpus")
+    parser.add_argument("--modes", nargs="+", default=["legacy", "single"], choices=["legacy", "single"])
+    parser.add_argument("--worker", choices=["legacy", "single"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        return run_worker(args)
+
+    workdir = None
+    if args.corpus is None:
+        workdir = Path(tempfile.mkdtemp(prefix="buct-bench-corpus-"))
+        print(f"Generating {args.generate} synthetic 12/24MP JPEGs...")
+        _generate_corpus(workdir, args.generate)
+        args.corpus = str(workdir)
+    try:
+        images = _corpus(args)
+        print(f"Corpus: {len(images)} images, {sum(p.stat().st_size for p in images) / 1024 / 1024:.1f} MiB")
+        for mode in args.modes:
+            command = [sys.executable, __file__, "--worker", mode, "--corpus", args.corpus]
+            if args.limit:
+                command += ["--limit", str(args.limit)]
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            _report(mode, json.loads(output.strip().splitlines()[-1]))
+    finally:
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Benchmark thumbnail delivery: in-process FileResponse vs X-Accel-Redirect offload.
+
+By default the app runs in-process (httpx ASGI transport) against a throwaway
+SQLite database and a generated thumbnail, and the script reports how many
+thumbnail requests per second one worker can answer in each mode. With
+--url it instead hits a running deployment (nginx in front), where the
+offload mode is whatever that server is configured with.
+
+Usage:
+    cd backend
+    python scripts/bench_media_delivery.py                        # both modes, in-process
+    python scripts/bench_media_delivery.py --requests 2000 --concurrency 32
+    python scripts/bench_media_delivery.py --url http://host/api/v1/photos/<id>/image/thumbnail
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+from PIL import Image
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core import deps
+from app.core.config import get_settings
+from app.core.database import Base
+from app.models import Photo, User
+
+PHOTO_ID = "bench-photo"
+
+
+async def _seed(session_factory: async_sessionmaker, uploads_dir: Path, thumb_width: int) -> None:
+    (uploads_dir / "originals").mkdir(parents=True, exist_ok=True)
+    (uploads_dir / "thumbnails").mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", (thumb_width, thumb_width * 2 // 3), (120, 160, 90)).save(
+        uploads_dir / "thumbnails" / f"{PHOTO_ID}_thumb.jpg", "JPEG", quality=90
+    )
+    (uploads_dir / "originals" / f"{PHOTO_ID}.jpg").write_bytes(b"")
+    async with session_factory() as session:
+        session.add(User(
+            id="bench-user",
+            student_id="bench",
+            email="bench@buct.edu.cn",
+            hashed_password="-",
+            full_name="Bench",
+            role="user",
+            is_active=True,
+        ))
+        session.add(Photo(
+            id=PHOTO_ID,
+            uploader_id="bench-user",
+            filename="bench.jpg",
+            original_path=f"originals/{PHOTO_ID}.jpg",
+            thumb_path=f"thumbnails/{PHOTO_ID}_thumb.jpg",
+            category="Landscape",
+            status="approved",
+            processing_status="completed",
+        ))
+        await session.commit()
+
+
+async def _run(client: httpx.AsyncClient, url: str, total: int, concurrency: int) -> tuple[float, int, int]:
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+    body_bytes = 0
+    failures = 0
+
+    async def worker():
+        nonlocal body_bytes, failures
+        while True:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            response = await client.get(url)
+            if response.status_code != 200:
+                failures += 1
+            body_bytes += len(response.content)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started, body_bytes, failures
+
+
+def _report(label: str, total: int, elapsed: float, body_bytes: int, failures: int) -> None:
+    print(
+        f"{label:<12} {total / elapsed:>9.1f} req/s  "
+        f"{elapsed * 1000 / total:>7.2f} ms/req  "
+        f"{body_bytes / elapsed / 1024 / 1024:>8.1f} MiB/s through Python  "
+        f"failures={failures}"
+    )
+
+
+async def bench_in_process(total: int, concurrency: int, thumb_width: int, modes: list[str]) -> None:
+    from app.main import app
+
+    # Per-request access logs would dominate the measurement
+    logging.getLogger("visual_buct").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    settings = get_settings()
+    workdir = Path(tempfile.mkdtemp(prefix="buct-media-bench-"))
+    uploads_dir = workdir / "uploads"
+    settings.UPLOAD_DIR = str(uploads_dir)
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{(workdir / 'bench.db').as_posix()}")
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await _seed(session_factory, uploads_dir, thumb_width)
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[deps.get_db] = override_get_db
+    thumb_size = (uploads_dir / "thumbnails" / f"{PHOTO_ID}_thumb.jpg").stat().st_size
+    print(f"Thumbnail: {thumb_width}px, {thumb_size / 1024:.1f} KiB; {total} requests, concurrency {concurrency}")
+
+    url = f"http://bench/api/v1/photos/{PHOTO_ID}/image/thumbnail"
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport) as client:
+            for mode in modes:
+                settings.LOCAL_MEDIA_OFFLOAD = mode
+                await _run(client, url, min(50, total), concurrency)  # warm-up
+                elapsed, body_bytes, failures = await _run(client, url, total, concurrency)
+                _report(mode, total, elapsed, body_bytes, failures)
+    finally:
+        app.dependency_overrides.clear()
+        await engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def bench_remote(url: str, total: int, concurrency: int) -> None:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        await _run(client, url, min(50, total), concurrency)
+        elapsed, body_bytes, failures = await _run(client, url, total, concurrency)
+    _report("remote", total, elapsed, body_bytes, failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark local media delivery modes")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per mode (default: 1000)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients (default: 16)")
+    parser.add_argument("--thumb-width", type=int, default=800, help="Generated thumbnail width (default: 800)")
+    parser.add_argument("--modes", nargs="+", default=["none", "x-accel"], choices=["none", "x-accel", "x-sendfile"])
+    parser.add_argument("--url", default=None, help="Benchmark a running server instead of the in-process app")
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(bench_remote(args.url, args.requests, args.concurrency))
+    else:
+        asyncio.run(bench_in_process(args.requests, args.concurrency, args.thumb_width, args.modes))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
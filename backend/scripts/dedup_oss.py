@@ -16,8 +16,6 @@ from collections import defaultdict
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-import boto3
-from botocore.client import Config as BotoConfig
 from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -27,19 +25,15 @@ from app.models.photo import Photo
 from app.models.tag import PhotoTag
 from app.models.taxonomy import PhotoClassification
 from app.models.ai_analysis import AIAnalysisTask
+from app.services.storage import S3StorageBackend, close_storage, get_storage
 
 
 def _get_s3_client():
-    s = get_settings()
-    return boto3.client(
-        "s3",
-        endpoint_url=s.S3_ENDPOINT,
-        aws_access_key_id=s.S3_ACCESS_KEY,
-        aws_secret_access_key=s.S3_SECRET_KEY,
-        region_name=s.S3_REGION,
-        use_ssl=s.S3_USE_SSL,
-        config=BotoConfig(signature_version="s3v4"),
-    )
+    """Reuse the shared storage backend's pooled client."""
+    storage = get_storage()
+    if not isinstance(storage, S3StorageBackend):
+        raise SystemExit("STORAGE_BACKEND=s3 is required for this script.")
+    return storage.client
 
 
 def list_oss_photos(client) -> list[dict]:
@@ -206,7 +200,10 @@ def main():
     args = parser.parse_args()
 
     import asyncio
-    asyncio.run(run_dedup(dry_run=args.dry_run, cleanup_tests=args.cleanup_tests))
+    try:
+        asyncio.run(run_dedup(dry_run=args.dry_run, cleanup_tests=args.cleanup_tests))
+    finally:
+        close_storage()
     return 0
 
 
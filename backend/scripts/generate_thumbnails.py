@@ -2,7 +2,8 @@
 Generate thumbnails for all OSS photos and upload them back to OSS.
 
 Thumbnails are generated locally (download via boto3 GET, which works through VPN),
-then uploaded via SSH + mc pipe (PUT is blocked through VPN firewall).
+then uploaded via SSH + mc pipe (PUT is blocked through VPN firewall). All
+uploads share the storage backend's multiplexed SSH connection.
 
 Thumbnail spec: longest side 400px, JPEG quality 85, stored at:
   thumbnails/{photo_id}_thumb.jpg
@@ -20,18 +21,16 @@ import argparse
 import io
 import os
 import signal
-import subprocess
 import sys
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-import boto3
-from botocore.client import Config as BotoConfig
 from sqlalchemy import select, update
 
 from app.core.config import get_settings
 from app.core.database import AsyncSessionLocal
 from app.models.photo import Photo
+from app.services.storage import S3StorageBackend, close_storage, get_storage
 
 try:
     from PIL import Image
@@ -46,11 +45,6 @@ except ImportError:
     TQDM = False
 
 
-# ── Config ──
-SSH_HOST = "121.195.148.85"
-SSH_USER = "yanp"
-
-
 # Global flag for graceful pause
 _paused = False
 
@@ -68,17 +62,16 @@ def _handle_sigint(signum, frame):
 signal.signal(signal.SIGINT, _handle_sigint)
 
 
+def get_s3_storage() -> S3StorageBackend:
+    """Reuse the shared storage backend (pooled client + SSH channel)."""
+    storage = get_storage()
+    if not isinstance(storage, S3StorageBackend):
+        raise SystemExit("STORAGE_BACKEND=s3 is required for this script.")
+    return storage
+
+
 def get_s3_client():
-    s = get_settings()
-    return boto3.client(
-        "s3",
-        endpoint_url=s.S3_ENDPOINT,
-        aws_access_key_id=s.S3_ACCESS_KEY,
-        aws_secret_access_key=s.S3_SECRET_KEY,
-        region_name=s.S3_REGION,
-        use_ssl=s.S3_USE_SSL,
-        config=BotoConfig(signature_version="s3v4"),
-    )
+    return get_s3_storage().client
 
 
 def generate_thumbnail_bytes(image_data: bytes, max_side: int, quality: int) -> tuple[bytes, int, int]:
@@ -103,16 +96,7 @@ def generate_thumbnail_bytes(image_data: bytes, max_side: int, quality: int) ->
 
 def upload_thumbnail(thumb_bytes: bytes, thumb_key: str) -> None:
     """Upload thumbnail to MinIO via SSH + mc pipe (bypasses VPN write block)."""
-    cmd = f"mc pipe local/buctmedia/{thumb_key}"
-    proc = subprocess.run(
-        ["ssh", f"{SSH_USER}@{SSH_HOST}", cmd],
-        input=thumb_bytes,
-        capture_output=True,
-        timeout=60,
-    )
-    if proc.returncode != 0:
-        stderr = proc.stderr.decode("utf-8", errors="replace").strip()
-        raise RuntimeError(f"mc pipe failed: {stderr}")
+    get_s3_storage().ssh_put_bytes(thumb_bytes, thumb_key)
 
 
 async def generate_thumbnails(
@@ -203,12 +187,15 @@ def main():
     args = parser.parse_args()
 
     import asyncio
-    asyncio.run(generate_thumbnails(
-        limit=args.limit,
-        max_side=args.size,
-        quality=args.quality,
-        dry_run=args.dry_run,
-    ))
+    try:
+        asyncio.run(generate_thumbnails(
+            limit=args.limit,
+            max_side=args.size,
+            quality=args.quality,
+            dry_run=args.dry_run,
+        ))
+    finally:
+        close_storage()
     return 0
 
 
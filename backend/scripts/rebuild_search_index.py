@@ -0,0 +1,62 @@
+"""
+Rebuild photo search documents (and with them the FTS5 / pg_trgm index).
+
+Documents are kept current by the application on every commit; this is for
+repairs: data written by other tools straight into the database (e.g. a
+migrate_to_postgres run), or after changing what goes into a document.
+
+Usage:
+    cd backend
+    python scripts/rebuild_search_index.py --dry-run      # count photos and existing documents
+    python scripts/rebuild_search_index.py
+    python scripts/rebuild_search_index.py --photo-id <id> --photo-id <id>
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import func, select
+
+from app.core.database import AsyncSessionLocal
+from app.models.photo import Photo
+from app.models.search_document import REBUILD_BATCH_SIZE, PhotoSearchDocument, rebuild_search_documents
+
+
+async def rebuild(photo_ids: list[str] | None, dry_run: bool) -> dict[str, int]:
+    stats = {"photos": 0, "documents": 0, "written": 0}
+    async with AsyncSessionLocal() as db:
+        if not photo_ids:
+            photo_ids = list((await db.execute(select(Photo.id).order_by(Photo.created_at))).scalars().all())
+        stats["photos"] = len(photo_ids)
+        stats["documents"] = (await db.execute(select(func.count(PhotoSearchDocument.photo_id)))).scalar_one()
+        if dry_run:
+            return stats
+
+        for start in range(0, len(photo_ids), REBUILD_BATCH_SIZE):
+            batch = photo_ids[start:start + REBUILD_BATCH_SIZE]
+            stats["written"] += await db.run_sync(rebuild_search_documents, batch)
+            await db.commit()
+            print(f"  {min(start + REBUILD_BATCH_SIZE, len(photo_ids))}/{len(photo_ids)}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild photo search documents")
+    parser.add_argument("--photo-id", action="append", dest="photo_ids", help="Only rebuild this photo (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="Only count photos and existing documents")
+    args = parser.parse_args()
+    stats = asyncio.run(rebuild(args.photo_ids, args.dry_run))
+    if args.dry_run:
+        print(f"{stats['photos']} photo(s), {stats['documents']} search document(s)")
+        return 0
+    print(f"Done: {stats['written']} document(s) written for {stats['photos']} photo(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Re-run the deferred media pipeline for photos stuck in processing_status=processing.
+
+Accept-fast uploads (UPLOAD_DEFER_PROCESSING) hand renditions/EXIF/AI to a
+FastAPI background task; if the API process restarts before it finishes, the
+row stays in "processing". This script picks those rows up again.
+
+Usage:
+    cd backend
+    python scripts/resume_photo_pipeline.py --dry-run          # list stuck photos
+    python scripts/resume_photo_pipeline.py                    # older than 10 minutes
+    python scripts/resume_photo_pipeline.py --older-than 0 --no-ai
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import select
+
+from app.core.database import AsyncSessionLocal
+from app.models.photo import Photo
+from app.services.image_workers import close_image_workers
+from app.services.photo_pipeline import run_photo_pipeline
+from app.services.storage import close_storage
+
+
+async def find_stuck_photos(older_than_minutes: int) -> list[tuple[str, str]]:
+    cutoff = datetime.utcnow() - timedelta(minutes=older_than_minutes)
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(
+            select(Photo.id, Photo.uploader_id)
+            .where(Photo.processing_status == "processing", Photo.updated_at <= cutoff)
+            .order_by(Photo.created_at)
+        )
+        return [(photo_id, uploader_id) for photo_id, uploader_id in rows.all()]
+
+
+async def run(args) -> int:
+    stuck = await find_stuck_photos(args.older_than)
+    print(f"{len(stuck)} photo(s) stuck in processing")
+    if args.dry_run:
+        for photo_id, _ in stuck:
+            print(f"  {photo_id}")
+        return 0
+    results: dict[str, int] = {}
+    for photo_id, uploader_id in stuck:
+        status = await run_photo_pipeline(photo_id, enable_ai=not args.no_ai, requested_by_id=uploader_id)
+        results[str(status)] = results.get(str(status), 0) + 1
+        print(f"  {photo_id}: {status}")
+    print("Done:", ", ".join(f"{status}={count}" for status, count in sorted(results.items())) or "nothing to do")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resume deferred photo processing")
+    parser.add_argument("--older-than", type=int, default=10, help="Only rows untouched for N minutes (default: 10)")
+    parser.add_argument("--no-ai", action="store_true", help="Skip AI analysis, mark processed photos manual")
+    parser.add_argument("--dry-run", action="store_true", help="Only list stuck photos")
+    args = parser.parse_args()
+    try:
+        return asyncio.run(run(args))
+    finally:
+        close_image_workers()
+        close_storage()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,8 +10,15 @@ Usage:
     python scripts/sync_oss_photos.py --apply                   # actually import
     python scripts/sync_oss_photos.py --apply --limit 10        # import first 10
     python scripts/sync_oss_photos.py --dry-run                 # explicit preview
+    python scripts/sync_oss_photos.py --apply --hash-source-dir D:\BUCTuploader\photos
+
+Rows whose content (SHA-256) is already in photos.content_hash, or appears
+twice in the index, are skipped as duplicates. The hash comes from a hash
+column of scenery_index when present, otherwise from the local file under
+--hash-source-dir; rows without either are imported without dedup.
 """
 import argparse
+import hashlib
 import os
 import sqlite3
 import sys
@@ -32,6 +39,10 @@ CATEGORY_MAP = {
     "纪实类": "Documentary",
 }
 
+HASH_COLUMNS = ("sha256", "content_hash", "file_hash")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
 MIME_MAP = {
     ".jpg": "image/jpeg",
     ".jpeg": "image/jpeg",
@@ -93,6 +104,29 @@ def category_to_english(category: str) -> str:
     return CATEGORY_MAP.get(category, "Documentary")
 
 
+def table_columns(conn: sqlite3.Connection, table: str) -> set[str]:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_hash_for(row: sqlite3.Row, hash_column: str | None, hash_source_dir: str | None) -> str | None:
+    if hash_column and row[hash_column]:
+        return str(row[hash_column]).strip().lower()
+    if hash_source_dir:
+        name = row["original_filename"] or Path(row["oss_key"]).name
+        path = os.path.join(hash_source_dir, name)
+        if os.path.isfile(path):
+            return sha256_file(path)
+    return None
+
+
 def find_admin_user(conn: sqlite3.Connection) -> str | None:
     cursor = conn.cursor()
     cursor.execute("SELECT id FROM users WHERE role = 'admin' LIMIT 1")
@@ -110,6 +144,7 @@ def sync_photos(
     apply: bool = False,
     uploader_id: str | None = None,
     limit: int | None = None,
+    hash_source_dir: str | None = None,
 ):
     if not os.path.exists(uploader_db_path):
         print(f"[ERROR] Uploader database not found: {uploader_db_path}")
@@ -149,7 +184,14 @@ def sync_photos(
         main_conn.close()
         return
 
-    stats = {"total": len(rows), "imported": 0, "skipped": 0, "errors": 0}
+    index_columns = set(rows[0].keys())
+    hash_column = next((name for name in HASH_COLUMNS if name in index_columns), None)
+    has_hash_column = "content_hash" in table_columns(main_conn, "photos")
+    if not has_hash_column:
+        print("[WARN] photos.content_hash missing (run alembic upgrade head); duplicates are not detected.")
+    seen_hashes: set[str] = set()
+
+    stats = {"total": len(rows), "imported": 0, "skipped": 0, "duplicates": 0, "errors": 0}
     errors_list: list[str] = []
     inserts: list[dict] = []
 
@@ -177,6 +219,19 @@ def sync_photos(
             description = build_description(row)
             created_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
 
+            content_hash = None
+            if has_hash_column:
+                content_hash = content_hash_for(row, hash_column, hash_source_dir)
+            if content_hash:
+                duplicate = content_hash in seen_hashes or main_cursor.execute(
+                    "SELECT id FROM photos WHERE content_hash = ? AND status != 'deleted' LIMIT 1",
+                    (content_hash,),
+                ).fetchone()
+                if duplicate:
+                    stats["duplicates"] += 1
+                    continue
+                seen_hashes.add(content_hash)
+
             record = {
                 "id": photo_id,
                 "uploader_id": uploader_id,
@@ -188,6 +243,7 @@ def sync_photos(
                 "height": None,
                 "file_size": row["file_size_bytes"],
                 "mime_type": mime_type,
+                "content_hash": content_hash,
                 "season": None,
                 "category": category,
                 "campus": "昌平校区",
@@ -203,23 +259,10 @@ def sync_photos(
             }
 
             if apply:
+                columns = [name for name in record if name != "content_hash" or has_hash_column]
                 main_cursor.execute(
-                    """INSERT INTO photos (
-                        id, uploader_id, filename, original_path, thumb_path, processed_path,
-                        width, height, file_size, mime_type, season, category, campus,
-                        description, exif_data, status, processing_status,
-                        created_at, updated_at, captured_at, published_at, views
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                    (
-                        record["id"], record["uploader_id"], record["filename"],
-                        record["original_path"], record["thumb_path"], record["processed_path"],
-                        record["width"], record["height"], record["file_size"],
-                        record["mime_type"], record["season"], record["category"],
-                        record["campus"], record["description"], record["exif_data"],
-                        record["status"], record["processing_status"],
-                        record["created_at"], record["updated_at"],
-                        record["captured_at"], record["published_at"], record["views"],
-                    ),
+                    f"INSERT INTO photos ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                    tuple(record[name] for name in columns),
                 )
                 stats["imported"] += 1
             else:
@@ -243,6 +286,7 @@ def sync_photos(
     print(f"Total photos in uploader:      {stats['total']}")
     print(f"Newly imported:                {stats['imported']}")
     print(f"Skipped (already exists):      {stats['skipped']}")
+    print(f"Skipped (duplicate content):   {stats['duplicates']}")
     print(f"Errors:                        {stats['errors']}")
     print(f"{'=' * 60}")
 
@@ -282,6 +326,8 @@ if __name__ == "__main__":
                         help="UUID of the user to set as uploader")
     parser.add_argument("--limit", type=int, default=None,
                         help="Limit the number of photos to process")
+    parser.add_argument("--hash-source-dir", type=str, default=None,
+                        help="Local folder with the original files, hashed for duplicate detection")
     args = parser.parse_args()
 
     should_apply = args.apply and not args.dry_run
@@ -291,4 +337,5 @@ if __name__ == "__main__":
         apply=should_apply,
         uploader_id=args.uploader_id,
         limit=args.limit,
+        hash_source_dir=args.hash_source_dir,
     )
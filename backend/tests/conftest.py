@@ -6,6 +6,7 @@ from pathlib import Path
 os.environ["DEBUG"] = "false"
 os.environ.setdefault("SECRET_KEY", "test-secret-key")
 os.environ.setdefault("AI_ENABLED", "false")
+os.environ.setdefault("IMAGE_PROCESS_WORKERS", "0")
 
 BACKEND_DIR = Path(__file__).resolve().parents[1]
 if str(BACKEND_DIR) not in sys.path:
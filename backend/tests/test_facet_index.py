@@ -0,0 +1,182 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, event, insert, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core import deps
+from app.core.config import get_settings
+from app.core.database import Base
+from app.core.security import create_access_token, get_password_hash
+from app.main import app
+from app.models import Photo, User
+from app.models.taxonomy import PhotoClassification, TaxonomyFacet, TaxonomyNode
+from app.services.facet_index import FacetBitmaps, get_photo_facet_index, reset_photo_facet_index
+
+ADMIN = {"Authorization": f"Bearer {create_access_token({'sub': '20260002'})}"}
+
+
+@pytest.fixture
+def facet_client(tmp_path: Path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{(tmp_path / 'facets.db').as_posix()}", future=True)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def init_database():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as session:
+            session.add(User(id="admin", student_id="20260002", email="admin@buct.edu.cn",
+                             hashed_password=get_password_hash("password123"), full_name="Admin",
+                             role="admin", is_active=True))
+            session.add(TaxonomyFacet(id=1, key="season", name="季节"))
+            session.add(TaxonomyFacet(id=2, key="landmark", name="地标"))
+            session.add(TaxonomyNode(id=1, facet_id=1, key="autumn", name="秋天"))
+            session.add(TaxonomyNode(id=2, facet_id=2, key="library", name="图书馆"))
+            session.add(TaxonomyNode(id=3, facet_id=2, key="lake", name="湖"))
+            for photo_id, status, category in [
+                ("p1", "approved", "Campus"),
+                ("p2", "approved", "Portrait"),
+                ("p3", "pending", "Campus"),
+                ("p4", "approved", "Campus"),
+                ("p5", "approved", None),
+            ]:
+                session.add(Photo(id=photo_id, uploader_id="admin", filename=f"{photo_id}.jpg",
+                                  original_path=f"originals/{photo_id}.jpg", status=status,
+                                  processing_status="manual", category=category))
+            await session.flush()
+            for photo_id, facet_id, node_id in [("p1", 1, 1), ("p1", 2, 2), ("p2", 2, 2), ("p3", 2, 2), ("p4", 2, 3)]:
+                session.add(PhotoClassification(photo_id=photo_id, facet_id=facet_id, node_id=node_id))
+            await session.commit()
+
+    asyncio.run(init_database())
+    reset_photo_facet_index()
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[deps.get_db] = override_get_db
+    with TestClient(app) as client:
+        client.database_url = str(engine.url)
+        yield client
+    app.dependency_overrides.clear()
+    reset_photo_facet_index()
+    asyncio.run(engine.dispose())
+
+
+def listing(client, headers=None, **params) -> tuple[list[str], int]:
+    response = client.get("/api/v1/photos/public", params={**params, "limit": 100}, headers=headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    return sorted(item["id"] for item in body["items"]), body["total"]
+
+
+@pytest.mark.parametrize("headers", [ADMIN, None], ids=["admin", "anonymous"])
+def test_index_matches_sql_filters(facet_client, monkeypatch, headers):
+    cases = [
+        {},
+        {"building": "图书馆"},
+        {"building": "Library"},  # node key
+        {"building": "图书馆", "season": "秋天"},
+        {"season": "autumn"},  # season only matches node names
+        {"category": "Campus"},
+        {"building": "图书馆", "search": "p1"},
+    ]
+    with_index = [listing(facet_client, headers, **params) for params in cases]
+    monkeypatch.setattr(get_settings(), "FACET_INDEX_ENABLED", False)
+    assert [listing(facet_client, headers, **params) for params in cases] == with_index
+
+    if headers is ADMIN:
+        assert with_index[1] == (["p1", "p2"], 2)
+    else:
+        # Anonymous visitors do not see portraits, nor photos without a category
+        assert with_index[0] == (["p1", "p4"], 2)
+    assert with_index[3] == (["p1"], 1)
+    assert with_index[4] == ([], 0)
+
+
+def test_index_follows_commits(facet_client):
+    assert listing(facet_client, ADMIN, building="图书馆") == (["p1", "p2"], 2)
+    rebuilds = get_photo_facet_index().rebuilds
+
+    assert facet_client.put("/api/v1/photos/p4/classifications", json={"classifications": {"landmark": 2}},
+                             headers=ADMIN).status_code == 200
+    assert facet_client.post("/api/v1/photos/p3/approve", headers=ADMIN).status_code == 200
+    assert facet_client.delete("/api/v1/photos/p2/classifications/landmark", headers=ADMIN).status_code == 200
+    assert listing(facet_client, ADMIN, building="图书馆") == (["p1", "p3", "p4"], 3)
+
+    assert facet_client.delete("/api/v1/photos/p1", headers=ADMIN).status_code == 204
+    assert listing(facet_client, ADMIN, building="图书馆") == (["p3", "p4"], 2)
+    assert listing(facet_client, ADMIN) == (["p2", "p3", "p4", "p5"], 4)
+
+    insights = facet_client.get("/api/v1/taxonomy/insights", headers=ADMIN).json()
+    assert [(item["node_name"], item["count"]) for item in insights["facet_counts"]] == [("图书馆", 2)]
+
+    metrics = get_photo_facet_index().metrics()
+    assert metrics["rebuilds"] == rebuilds  # applied incrementally
+    assert metrics["photos"] == 4
+
+
+def test_index_follows_other_workers(facet_client):
+    assert listing(facet_client, ADMIN, building="图书馆") == (["p1", "p2"], 2)
+    rebuilds = get_photo_facet_index().rebuilds
+
+    async def other_worker(*statements):
+        # Plain Core on its own engine: no session events reach this process's index
+        engine = create_async_engine(facet_client.database_url)
+        async with engine.begin() as conn:
+            for statement in statements:
+                await conn.execute(statement)
+        await engine.dispose()
+
+    asyncio.run(other_worker(
+        insert(Photo).values(id="p6", uploader_id="admin", filename="p6.jpg", original_path="originals/p6.jpg",
+                             status="approved", processing_status="manual", category="Campus"),
+        insert(PhotoClassification).values(photo_id="p6", facet_id=2, node_id=2),
+        update(Photo).where(Photo.id == "p3").values(status="approved"),
+    ))
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.lower())
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        assert listing(facet_client, ADMIN, building="图书馆") == (["p1", "p2", "p3", "p6"], 4)
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+    assert get_photo_facet_index().rebuilds == rebuilds  # synced by updated_at
+    # No COUNT over photos or classifications per query
+    assert not [statement for statement in statements if "count(*)" in statement]
+    assert listing(facet_client, ADMIN) == (["p1", "p2", "p3", "p4", "p5", "p6"], 6)
+
+    asyncio.run(other_worker(
+        delete(PhotoClassification).where(PhotoClassification.photo_id == "p2"),
+        delete(Photo).where(Photo.id == "p2"),
+    ))
+    # Rows come from the database, so the deleted photo is gone from the page at once
+    assert listing(facet_client, ADMIN, building="图书馆")[0] == ["p1", "p3", "p6"]
+    # Row counts are compared every FACET_INDEX_DELETE_CHECK_SECONDS; then totals follow too
+    get_photo_facet_index().delete_check_seconds = 0
+    assert listing(facet_client, ADMIN, building="图书馆") == (["p1", "p3", "p6"], 3)
+    assert listing(facet_client, ADMIN) == (["p1", "p3", "p4", "p5", "p6"], 5)
+
+
+def test_facet_bitmaps():
+    bitmaps = FacetBitmaps([
+        ("a", [("status", "approved"), ("category", None), ("node", 1)]),
+        ("b", [("status", "approved"), ("category", "Campus"), ("node", 2)]),
+    ])
+    assert bitmaps.ids(bitmaps.select(status="approved", node_groups=[{1, 2}])) == ["a", "b"]
+    assert bitmaps.ids(bitmaps.select(exclude_categories=["Portrait"])) == ["b"]
+
+    bitmaps.set("a", [("status", "approved"), ("category", "Campus"), ("node", 2)])
+    bitmaps.set("c", [("status", "pending"), ("category", "Campus")])
+    bitmaps.remove("b")
+    assert bitmaps.ids(bitmaps.select(category="Campus")) == ["a", "c"]
+    assert bitmaps.node_counts() == {1: 0, 2: 1}
+    assert bitmaps.metrics()["unused_ordinals"] == 1
+    assert bitmaps.classifications == 1
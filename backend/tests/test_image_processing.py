@@ -0,0 +1,100 @@
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+from PIL import Image
+
+from app.services import image_processing
+from app.services.image_processing import compute_blurhash, compute_placeholder, process_uploaded_image
+from app.services.image_workers import ImageWorkerPool, ImageWorkersBusy
+
+
+def make_jpeg(path, width=3000, height=2000):
+    exif = Image.Exif()
+    exif[0x0132] = "2025:10:01 08:30:00"  # DateTime
+    Image.new("RGB", (width, height), (80, 140, 60)).save(path, "JPEG", quality=90, exif=exif)
+
+
+def test_single_open_produces_dimensions_exif_and_every_rendition(tmp_path, monkeypatch):
+    original = tmp_path / "campus.jpg"
+    make_jpeg(original)
+    opened = []
+    real_open = Image.open
+
+    def counting_open(*args, **kwargs):
+        opened.append(args[0])
+        return real_open(*args, **kwargs)
+
+    monkeypatch.setattr(image_processing.Image, "open", counting_open)
+
+    result = process_uploaded_image(str(original), "photo", output_dir=str(tmp_path))
+
+    assert len(opened) == 1
+    assert (result["width"], result["height"]) == (3000, 2000)
+    assert result["captured_at"] == datetime(2025, 10, 1, 8, 30)
+    assert sorted(result["renditions"]) == [160, 400, 800, 1600]
+    monkeypatch.setattr(image_processing.Image, "open", real_open)
+    for width, path in result["renditions"].items():
+        with Image.open(path) as rendition:
+            assert rendition.size == (width, int(2000 * width / 3000))
+    assert result["thumb_path"] == result["renditions"][800]
+    assert len(result["blurhash"]) == 28
+    red, green, blue = (int(result["dominant_color"][i:i + 2], 16) for i in (1, 3, 5))
+    assert max(abs(red - 80), abs(green - 140), abs(blue - 60)) <= 4
+
+
+def test_blurhash_matches_reference_encoding():
+    # Reference value for a black image (4 x 3 components, all AC terms zero)
+    assert compute_blurhash(Image.new("RGB", (64, 48))) == "L00000fQfQfQfQfQfQfQfQfQfQfQ"
+
+    split = Image.new("RGB", (160, 100), (200, 30, 30))
+    split.paste((30, 30, 200), (80, 0, 160, 100))
+    placeholder = compute_placeholder(split)
+    assert placeholder["blurhash"][0] == "L" and placeholder["blurhash"][6:] != "fQ" * 11
+    assert placeholder["dominant_color"] in ("#c81e1e", "#1e1ec8")
+
+
+def _slow_double(value):
+    time.sleep(0.3)
+    return value * 2
+
+
+def test_worker_pool_rejects_when_full_and_records_timings():
+    pool = ImageWorkerPool(workers=0, max_pending=1, retry_after=7)
+
+    async def scenario():
+        first = asyncio.create_task(pool.submit(_slow_double, 1))
+        second = asyncio.create_task(pool.submit(_slow_double, 2))
+        await asyncio.sleep(0.05)
+        with pytest.raises(ImageWorkersBusy) as busy:
+            await pool.submit(_slow_double, 3)
+        return await first, await second, busy.value.retry_after
+
+    try:
+        first, second, retry_after = asyncio.run(scenario())
+        metrics = pool.metrics()
+    finally:
+        pool.close()
+
+    assert (first, second, retry_after) == (2, 4, 7)
+    assert metrics["completed"] == 2
+    assert metrics["rejected"] == 1
+    assert metrics["outstanding"] == 0
+    assert metrics["run_ms_p50"] >= 250
+    # The second job waited behind the first on the single thread
+    assert metrics["queue_ms_p95"] >= 250
+
+
+def test_process_pool_renders_in_a_worker_process(tmp_path):
+    original = tmp_path / "campus.jpg"
+    make_jpeg(original, width=900, height=600)
+    pool = ImageWorkerPool(workers=1, max_pending=0)
+    try:
+        result = asyncio.run(pool.process_image(str(original), "photo", str(tmp_path)))
+    finally:
+        pool.close()
+
+    assert (result["width"], result["height"]) == (900, 600)
+    assert sorted(result["renditions"]) == [160, 400, 800, 1600]
+    assert pool.metrics()["mode"] == "process"
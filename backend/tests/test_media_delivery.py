@@ -0,0 +1,402 @@
+import asyncio
+import io
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core import deps
+from app.core.config import get_settings
+from app.core.database import Base
+from app.core.security import create_access_token, get_password_hash
+from app.main import app
+from app.models import Photo, User
+from app.services import transforms
+from app.services.archive import ArchiveEntry, stream_zip
+from app.services.image_processing import render_transform
+from app.services.storage import S3StorageBackend
+from app.services.disk_cache import DiskCache
+from app.services.media_http import media_validators
+from app.services.transforms import SingleFlight, reset_image_transformer
+
+
+def create_auth_headers(token: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def setup_database(session_factory: async_sessionmaker, uploads_dir: Path) -> dict[str, str]:
+    (uploads_dir / "originals").mkdir(parents=True, exist_ok=True)
+    (uploads_dir / "thumbnails").mkdir(parents=True, exist_ok=True)
+    (uploads_dir / "originals" / "public.jpg").write_bytes(b"original-bytes")
+    for width in (160, 400, 800):
+        (uploads_dir / "thumbnails" / f"public_{width}.jpg").write_bytes(f"rendition-{width}".encode())
+
+    async with session_factory() as session:
+        owner = User(
+            id="owner-user",
+            student_id="20260001",
+            email="owner@buct.edu.cn",
+            hashed_password=get_password_hash("password123"),
+            full_name="Owner",
+            role="user",
+            is_active=True,
+        )
+        session.add(owner)
+        session.add(
+            Photo(
+                id="public-photo",
+                uploader_id=owner.id,
+                filename="public.jpg",
+                original_path="originals/public.jpg",
+                thumb_path="thumbnails/public_800.jpg",
+                renditions={
+                    "160": "thumbnails/public_160.jpg",
+                    "400": "thumbnails/public_400.jpg",
+                    "800": "thumbnails/public_800.jpg",
+                },
+                width=1200,
+                height=800,
+                mime_type="image/jpeg",
+                category="Landscape",
+                status="approved",
+                processing_status="completed",
+                views=0,
+            )
+        )
+        await session.commit()
+
+    return {
+        "owner_token": create_access_token({"sub": "20260001"}),
+        "photo_id": "public-photo",
+    }
+
+
+@pytest.fixture
+def media_client(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    uploads_dir = tmp_path / "uploads"
+    monkeypatch.setattr(get_settings(), "UPLOAD_DIR", str(uploads_dir))
+
+    db_path = tmp_path / "media.db"
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path.as_posix()}", future=True)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def init_database():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(init_database())
+    test_data = asyncio.run(setup_database(session_factory, uploads_dir))
+
+    async def override_get_db():
+        async with session_factory() as session:
+            try:
+                yield session
+            finally:
+                await session.close()
+
+    app.dependency_overrides[deps.get_db] = override_get_db
+
+    with TestClient(app) as client:
+        yield client, test_data
+
+    app.dependency_overrides.clear()
+    asyncio.run(engine.dispose())
+
+
+def test_rendition_endpoint_serves_closest_stored_width(media_client):
+    client, data = media_client
+    photo_id = data["photo_id"]
+
+    small = client.get(f"/api/v1/photos/{photo_id}/image/120")
+    medium = client.get(f"/api/v1/photos/{photo_id}/image/401")
+    oversized = client.get(f"/api/v1/photos/{photo_id}/image/2400")
+
+    assert small.status_code == 200
+    assert small.content == b"rendition-160"
+    assert medium.content == b"rendition-800"
+    assert oversized.content == b"rendition-800"
+
+
+def test_thumbnail_endpoint_keeps_serving_default_rendition(media_client):
+    client, data = media_client
+
+    response = client.get(f"/api/v1/photos/{data['photo_id']}/image/thumbnail")
+
+    assert response.status_code == 200
+    assert response.content == b"rendition-800"
+
+
+def test_media_responses_carry_validators_and_cache_policy(media_client):
+    client, data = media_client
+
+    response = client.get(f"/api/v1/photos/{data['photo_id']}/image/400")
+
+    assert response.status_code == 200
+    assert response.headers["etag"].startswith('"')
+    assert response.headers["cache-control"].startswith("public, max-age=")
+
+
+def test_conditional_get_returns_304_without_touching_storage(media_client, tmp_path):
+    client, data = media_client
+    url = f"/api/v1/photos/{data['photo_id']}/image/thumbnail"
+    first = client.get(url)
+
+    # Storage is not consulted for revalidation, so a missing file still yields 304
+    (tmp_path / "uploads" / "thumbnails" / "public_800.jpg").unlink()
+    by_etag = client.get(url, headers={"If-None-Match": first.headers["etag"]})
+    # No media timestamp to compare against: a date alone never earns a 304
+    by_date = client.get(url, headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+    stale = client.get(url, headers={"If-None-Match": '"something-else"'})
+
+    assert by_etag.status_code == 304
+    assert by_etag.content == b""
+    assert by_etag.headers["etag"] == first.headers["etag"]
+    assert "last-modified" not in by_etag.headers
+    assert by_date.status_code == 404
+    assert stale.status_code == 404
+
+
+def test_validators_ignore_views_and_metadata_edits(media_client):
+    client, data = media_client
+    photo_id = data["photo_id"]
+    url = f"/api/v1/photos/{photo_id}/image/thumbnail"
+    owner = create_auth_headers(data["owner_token"])
+    first = client.get(url)
+    updated_at = client.get(f"/api/v1/photos/{photo_id}", headers=owner).json()["updated_at"]
+
+    view = client.post(f"/api/v1/stats/view/{photo_id}")
+    assert view.status_code == 200, view.text
+    assert view.json()["views"] == 1
+    assert client.get(f"/api/v1/photos/{photo_id}", headers=owner).json()["updated_at"] == updated_at
+
+    assert client.patch(f"/api/v1/photos/{photo_id}", json={"description": "新的描述"}, headers=owner).status_code == 200
+    revalidated = client.get(url, headers={"If-None-Match": first.headers["etag"]})
+    assert revalidated.status_code == 304
+
+    # Media changes do: other files, or a re-uploaded original
+    photo = Photo(id=photo_id, original_path="originals/public.jpg", thumb_path="thumbnails/public_800.jpg",
+                  content_hash="a" * 64, file_size=14, created_at=datetime(2026, 1, 1))
+    etag = media_validators(photo, photo.thumb_path, "thumbnail", True).etag
+    photo.updated_at, photo.views, photo.description = datetime(2026, 5, 1), 9, "edited"
+    assert media_validators(photo, photo.thumb_path, "thumbnail", True).etag == etag
+    assert media_validators(photo, "thumbnails/public_400.jpg", "thumbnail", True).etag != etag
+    photo.content_hash = "b" * 64
+    assert media_validators(photo, photo.thumb_path, "thumbnail", True).etag != etag
+
+
+def test_single_range_returns_partial_content(media_client):
+    client, data = media_client
+    url = f"/api/v1/photos/{data['photo_id']}/image/original"
+
+    full = client.get(url)
+    partial = client.get(url, headers={"Range": "bytes=0-7"})
+    suffix = client.get(url, headers={"Range": "bytes=-5"})
+    unsatisfiable = client.get(url, headers={"Range": "bytes=500-"})
+
+    assert full.headers["accept-ranges"] == "bytes"
+    assert partial.status_code == 206
+    assert partial.content == b"original"
+    assert partial.headers["content-range"] == "bytes 0-7/14"
+    assert partial.headers["content-length"] == "8"
+    assert suffix.content == b"bytes"
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == "bytes */14"
+
+
+def test_multi_range_returns_multipart_byteranges(media_client):
+    client, data = media_client
+
+    response = client.get(
+        f"/api/v1/photos/{data['photo_id']}/image/original",
+        headers={"Range": "bytes=0-1,9-13"},
+    )
+
+    assert response.status_code == 206
+    assert response.headers["content-type"].startswith("multipart/byteranges; boundary=")
+    assert int(response.headers["content-length"]) == len(response.content)
+    assert b"Content-Range: bytes 0-1/14\r\n\r\nor\r\n" in response.content
+    assert b"Content-Range: bytes 9-13/14\r\n\r\nbytes\r\n" in response.content
+
+
+def test_stale_if_range_falls_back_to_full_body(media_client):
+    client, data = media_client
+
+    response = client.get(
+        f"/api/v1/photos/{data['photo_id']}/image/original",
+        headers={"Range": "bytes=0-7", "If-Range": '"outdated"'},
+    )
+
+    assert response.status_code == 200
+    assert response.content == b"original-bytes"
+
+
+def test_local_x_accel_offload_returns_internal_redirect(media_client, monkeypatch: pytest.MonkeyPatch):
+    client, data = media_client
+    monkeypatch.setattr(get_settings(), "LOCAL_MEDIA_OFFLOAD", "x-accel")
+
+    response = client.get(f"/api/v1/photos/{data['photo_id']}/image/thumbnail")
+
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["x-accel-redirect"] == "/_protected_media/thumbnails/public_800.jpg"
+    assert response.headers["content-type"] == "image/jpeg"
+    assert "etag" in response.headers
+
+
+class FakePresignClient:
+    def __init__(self):
+        self.calls = []
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        self.calls.append((operation, Params, ExpiresIn))
+        return f"https://minio.example/{Params['Key']}?sig={len(self.calls)}"
+
+
+def test_s3_redirect_mode_reuses_presigned_url_within_window(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(get_settings(), "S3_MEDIA_DELIVERY", "redirect")
+    monkeypatch.setattr(get_settings(), "S3_PRESIGN_EXPIRE_SECONDS", 600)
+    backend = S3StorageBackend.__new__(S3StorageBackend)
+    backend.bucket = "test-bucket"
+    backend.presign_client = FakePresignClient()
+
+    first = backend.build_media_response("thumbnails/redirect_400.jpg")
+    second = backend.build_media_response("thumbnails/redirect_400.jpg")
+    download = backend.build_media_response("originals/redirect.jpg", download_name="校园.jpg")
+
+    assert first.status_code == 307
+    assert first.headers["location"] == second.headers["location"]
+    assert 0 < int(first.headers["cache-control"].split("max-age=")[1]) <= 300
+    assert "etag" not in first.headers
+    assert len(backend.presign_client.calls) == 2
+    assert backend.presign_client.calls[1][1]["ResponseContentDisposition"].startswith("attachment; filename*=utf-8''")
+
+
+def test_archive_download_streams_zip_of_accessible_photos(media_client):
+    client, data = media_client
+    photo_id = data["photo_id"]
+
+    response = client.get("/api/v1/photos/download/archive", params={"ids": [photo_id, photo_id], "filename": "校园"})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/zip"
+    assert "filename*=utf-8''%E6%A0%A1%E5%9B%AD.zip" in response.headers["content-disposition"]
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.namelist() == ["public.jpg"]
+        assert archive.read("public.jpg") == b"original-bytes"
+
+    renditions = client.post("/api/v1/photos/download/archive", json={"category": "Landscape", "size": 300})
+    with zipfile.ZipFile(io.BytesIO(renditions.content)) as archive:
+        assert archive.read("public.jpg") == b"rendition-400"
+
+    denied = client.get("/api/v1/photos/download/archive", params={"ids": [photo_id, "missing"]})
+    assert denied.status_code == 404
+    assert denied.json()["detail"]["photo_ids"] == ["missing"]
+
+
+def test_stream_zip_prefetches_within_window_and_skips_missing_objects():
+    class FakeStorage:
+        active = 0
+        peak = 0
+
+        async def aiter_file(self, path, chunk_size):
+            if path == "gone.jpg":
+                raise FileNotFoundError(path)
+            FakeStorage.active += 1
+            FakeStorage.peak = max(FakeStorage.peak, FakeStorage.active)
+            try:
+                for index in range(3):
+                    await asyncio.sleep(0.001)
+                    yield f"{path}:{index};".encode()
+            finally:
+                FakeStorage.active -= 1
+
+    entries = [ArchiveEntry(f"{n}.jpg", f"{n}.jpg") for n in range(10)]
+    entries.insert(3, ArchiveEntry("gone.jpg", "gone.jpg"))
+
+    async def collect() -> bytes:
+        return b"".join([chunk async for chunk in stream_zip(entries, storage=FakeStorage(), prefetch=3, buffer_chunks=1)])
+
+    body = asyncio.run(collect())
+    assert FakeStorage.peak <= 3
+    with zipfile.ZipFile(io.BytesIO(body)) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == [f"{n}.jpg" for n in range(10)] + ["MISSING.txt"]
+        assert archive.read("7.jpg") == b"7.jpg:0;7.jpg:1;7.jpg:2;"
+        assert archive.read("MISSING.txt") == b"gone.jpg\n"
+        assert archive.getinfo("0.jpg").compress_type == zipfile.ZIP_STORED
+
+
+def test_transform_endpoint_serves_allowlisted_presets_from_cache(media_client, tmp_path, monkeypatch: pytest.MonkeyPatch):
+    client, data = media_client
+    photo_id = data["photo_id"]
+    uploads_dir = Path(get_settings().UPLOAD_DIR)
+    for width in (160, 400, 800):
+        Image.new("RGB", (width, width * 2 // 3), (90, 120, 200)).save(uploads_dir / "thumbnails" / f"public_{width}.jpg")
+    monkeypatch.setattr(get_settings(), "IMAGE_TRANSFORM_CACHE_DIR", str(tmp_path / "derived-cache"))
+    renders = []
+    monkeypatch.setattr(transforms, "render_transform", lambda *args: renders.append(args[0]) or render_transform(*args))
+    reset_image_transformer()
+    try:
+        card = client.get(f"/api/v1/photos/{photo_id}/image/transform", params={"preset": "card"})
+        assert card.status_code == 200, card.text
+        assert card.headers["content-type"] == "image/webp"
+        assert Image.open(io.BytesIO(card.content)).size == (600, 400)
+        # Rendered from the 800px rendition, not the original; "card" is also persisted to storage
+        assert [Path(path).name for path in renders] == ["public_800.jpg"]
+        assert list((uploads_dir / "derived").iterdir())
+
+        same = client.get(f"/api/v1/photos/{photo_id}/image/transform", params={"w": 600, "format": "webp"})
+        assert same.content == card.content
+        assert client.get(
+            f"/api/v1/photos/{photo_id}/image/transform", params={"preset": "card"},
+            headers={"If-None-Match": card.headers["etag"]},
+        ).status_code == 304
+        assert len(renders) == 1
+
+        assert client.get(f"/api/v1/photos/{photo_id}/image/transform", params={"w": 333}).status_code == 400
+        assert client.get(f"/api/v1/photos/{photo_id}/image/transform", params={"preset": "huge"}).status_code == 400
+    finally:
+        reset_image_transformer()
+
+
+def test_persisted_derivatives_are_keyed_by_their_source():
+    spec = transforms.transform_presets()["card"]
+    photo = Photo(id="p1", original_path="originals/p1.jpg", width=3000, height=2000, renditions={})
+    from_original = transforms.derived_key(photo.id, transforms.transform_source(photo, spec), spec)
+    # A deferred pipeline stores renditions later: the derivative is rendered again from them
+    photo.renditions = {"800": "thumbnails/p1_800.jpg", "1600": "thumbnails/p1_1600.jpg"}
+    from_rendition = transforms.derived_key(photo.id, transforms.transform_source(photo, spec), spec)
+    assert from_rendition != from_original
+    assert {from_original, from_rendition} <= set(transforms.derived_media_paths(photo))
+
+
+def test_derived_cache_evicts_lru_and_single_flight_coalesces(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=10)
+    cache.put_bytes("aa-first", b"1111")
+    cache.put_bytes("bb-second", b"2222")
+    assert cache.get("aa-first") is not None  # now most recently used
+    cache.put_bytes("cc-third", b"3333")
+    assert cache.get("bb-second") is None
+    assert cache.get("aa-first").read_bytes() == b"1111"
+    assert cache.metrics()["bytes"] == 8
+    assert DiskCache(str(tmp_path), max_bytes=10).metrics()["entries"] == 2
+
+    async def coalesce():
+        flights, gate, calls = SingleFlight(), asyncio.Event(), []
+
+        async def render():
+            calls.append(1)
+            await gate.wait()
+            return b"derived"
+
+        waiters = [asyncio.create_task(flights.run("key", render)) for _ in range(5)]
+        await asyncio.sleep(0)
+        gate.set()
+        return await asyncio.gather(*waiters), calls, flights.coalesced
+
+    results, calls, coalesced = asyncio.run(coalesce())
+    assert results == [b"derived"] * 5
+    assert (len(calls), coalesced) == (1, 4)
@@ -0,0 +1,177 @@
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core import deps
+from app.core.database import Base
+from app.core.security import create_access_token, get_password_hash
+from app.main import app
+from app.models import Photo, User
+from app.models.favorite import Favorite
+from app.models.tag import PhotoTag, Tag
+from app.models.taxonomy import PhotoClassification, TaxonomyFacet, TaxonomyNode
+
+
+def create_auth_headers(token: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def listing_client(tmp_path: Path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{(tmp_path / 'pages.db').as_posix()}", future=True)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    start = datetime(2026, 1, 1)
+
+    async def init_database():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as session:
+            session.add(User(id="viewer", student_id="20260001", email="viewer@buct.edu.cn",
+                             hashed_password=get_password_hash("password123"), full_name="Viewer",
+                             role="user", is_active=True))
+            # campus > building > room, so serializing a classification walks two parents
+            session.add(TaxonomyFacet(id=1, key="landmark", name="地标"))
+            session.add(TaxonomyNode(id=1, facet_id=1, key="east", name="东校区"))
+            session.add(TaxonomyNode(id=2, facet_id=1, parent_id=1, key="library", name="图书馆"))
+            session.add(TaxonomyNode(id=3, facet_id=1, parent_id=2, key="reading-room", name="阅览室"))
+            session.add_all([Tag(id=1, name="sunset"), Tag(id=2, name="snow")])
+            for index in range(23):
+                session.add(Photo(
+                    id=f"photo-{index:02d}", uploader_id="viewer", filename=f"{index}.jpg",
+                    original_path=f"originals/{index}.jpg", status="approved", processing_status="manual", category="Campus",
+                    # Ties on created_at and views, and a block of NULL published_at
+                    created_at=start + timedelta(hours=index // 3),
+                    published_at=None if index % 4 == 0 else start + timedelta(days=index),
+                    views=index % 3,
+                ))
+                session.add(PhotoClassification(photo_id=f"photo-{index:02d}", facet_id=1, node_id=3 - index % 3))
+                session.add(PhotoTag(photo_id=f"photo-{index:02d}", tag_id=1 + index % 2))
+                session.add(Favorite(id=f"fav-{index:02d}", user_id="viewer", photo_id=f"photo-{index:02d}",
+                                     created_at=start + timedelta(minutes=index // 2)))
+            await session.commit()
+
+    asyncio.run(init_database())
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[deps.get_db] = override_get_db
+    with TestClient(app) as client:
+        yield client
+    app.dependency_overrides.clear()
+    asyncio.run(engine.dispose())
+
+
+def walk(client, url, key="items", **params):
+    ids, cursor = [], None
+    while True:
+        page = client.get(url, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert page.status_code == 200, page.text
+        payload = page.json()
+        ids.extend(item["id"] if isinstance(item, dict) else item for item in payload[key])
+        cursor = payload["next_cursor"]
+        if cursor is None:
+            return ids, payload["total"]
+
+
+@pytest.mark.parametrize("sort_by", ["created_at", "views", "published_at"])
+@pytest.mark.parametrize("sort_order", ["desc", "asc"])
+def test_cursor_pages_cover_listing_exactly_once(listing_client, sort_by, sort_order):
+    params = {"sort_by": sort_by, "sort_order": sort_order}
+    full = listing_client.get("/api/v1/photos/public", params={**params, "limit": 100}).json()
+    expected = [item["id"] for item in full["items"]]
+
+    ids, total = walk(listing_client, "/api/v1/photos/public", limit=4, **params)
+
+    assert ids == expected
+    assert total == len(expected) == 23
+    # Photos without published_at sort by their upload time
+    if sort_by == "published_at":
+        start = datetime(2026, 1, 1)
+        keys = {
+            f"photo-{index:02d}": (
+                start + timedelta(hours=index // 3) if index % 4 == 0 else start + timedelta(days=index),
+                f"photo-{index:02d}",
+            )
+            for index in range(23)
+        }
+        assert expected == sorted(keys, key=keys.get, reverse=sort_order == "desc")
+
+
+@pytest.mark.parametrize("sort_by", ["created_at", "views", "published_at"])
+def test_cursor_pages_seek_an_index(listing_client, tmp_path, sort_by):
+    first = listing_client.get("/api/v1/photos/public", params={"sort_by": sort_by, "limit": 4}).json()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "ORDER BY" in statement:
+            statements.append((statement, parameters))
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        page = listing_client.get("/api/v1/photos/public",
+                                  params={"sort_by": sort_by, "limit": 4, "cursor": first["next_cursor"]})
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+    assert page.status_code == 200
+
+    statement, parameters = statements[0]
+    with sqlite3.connect(tmp_path / "pages.db") as conn:
+        plan = " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters))
+    assert "USING INDEX ix_photos_status_" in plan
+    assert "TEMP B-TREE" not in plan, (statement, plan)  # the index serves the ORDER BY
+
+
+def test_listing_rejects_non_positive_limit(listing_client):
+    assert listing_client.get("/api/v1/photos/public", params={"limit": 0}).status_code == 422
+    assert listing_client.get("/api/v1/photos/public", params={"skip": -1}).status_code == 422
+
+
+def test_favorites_cursor_and_invalid_cursor(listing_client):
+    headers = create_auth_headers(create_access_token({"sub": "20260001"}))
+    listing_client.headers.update(headers)
+
+    ids, total = walk(listing_client, "/api/v1/photos/favorites/my", key="photo_ids", limit=5)
+    assert total == 23
+    assert ids == [f"photo-{index:02d}" for index in reversed(range(23))]
+
+    first = listing_client.get("/api/v1/photos/public", params={"limit": 4, "sort_by": "views"}).json()
+    mismatched = listing_client.get("/api/v1/photos/public", params={"cursor": first["next_cursor"]})
+    assert mismatched.status_code == 400
+    assert listing_client.get("/api/v1/photos/my-submissions", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_listing_query_count_does_not_grow_with_page_size(listing_client):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def queries_for(limit):
+        statements.clear()
+        response = listing_client.get("/api/v1/photos/public", params={"limit": limit})
+        assert response.status_code == 200
+        return len(statements), response.json()["items"]
+
+    event.listen(Engine, "before_cursor_execute", count)
+    try:
+        queries_for(1)  # builds the in-process facet index
+        small, _ = queries_for(2)
+        large, items = queries_for(20)
+    finally:
+        event.remove(Engine, "before_cursor_execute", count)
+
+    assert small == large
+    item = next(item for item in items if item["id"] == "photo-21")
+    assert item["tags"] == ["snow"]
+    assert item["favorite_count"] == 1
+    assert item["uploader_name"] == "Viewer"
+    assert item["classifications"]["landmark"]["path"] == ["东校区", "图书馆", "阅览室"]
@@ -0,0 +1,199 @@
+import asyncio
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, insert, select, text, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core import deps
+from app.core.database import Base
+from app.core.security import create_access_token, get_password_hash
+from app.main import app
+from app.models import Photo, PhotoSearchDocument, User
+from app.models.tag import PhotoTag, Tag
+from app.models.taxonomy import PhotoClassification, TaxonomyAlias, TaxonomyFacet, TaxonomyNode
+from app.services import search_index
+from app.services.search_index import NgramIndex, get_photo_search_index, query_terms, reset_photo_search_index
+
+
+def create_auth_headers(token: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def search_env(tmp_path: Path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{(tmp_path / 'search.db').as_posix()}", future=True)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def init_database():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as session:
+            session.add(User(id="admin", student_id="20260002", email="admin@buct.edu.cn",
+                             hashed_password=get_password_hash("password123"), full_name="Admin",
+                             role="admin", is_active=True))
+            session.add(TaxonomyFacet(id=1, key="landmark", name="地标"))
+            session.add(TaxonomyNode(id=1, facet_id=1, key="library", name="图书馆"))
+            session.add(TaxonomyAlias(node_id=1, alias="Library Hall"))
+            session.add(TaxonomyFacet(id=2, key="season", name="季节"))
+            session.add(TaxonomyNode(id=2, facet_id=2, key="autumn", name="秋天"))
+            session.add(Tag(id=1, name="snowfall"))
+            session.add(Tag(id=2, name="银杏"))
+            for photo_id, filename, description in [
+                ("lake", "sunset_over_lake.jpg", "湖边日落"),
+                ("snow", "img_0002.jpg", None),
+                ("library", "img_0003.jpg", None),
+                ("plain", "img_0004.jpg", None),
+                ("ginkgo", "img_0005.jpg", "图书馆前的银杏大道"),
+            ]:
+                session.add(Photo(id=photo_id, uploader_id="admin", filename=filename, description=description,
+                                  original_path=f"originals/{filename}",
+                                  status="approved", processing_status="manual", category="Campus"))
+            await session.flush()
+            session.add(PhotoTag(photo_id="snow", tag_id=1))
+            session.add(PhotoClassification(photo_id="library", facet_id=1, node_id=1))
+            session.add(PhotoClassification(photo_id="library", facet_id=2, node_id=2))
+            session.add(PhotoTag(photo_id="library", tag_id=2))
+            await session.commit()
+
+    asyncio.run(init_database())
+    reset_photo_search_index()
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[deps.get_db] = override_get_db
+    with TestClient(app) as client:
+        client.headers.update(create_auth_headers(create_access_token({"sub": "20260002"})))
+        yield client, session_factory
+    app.dependency_overrides.clear()
+    reset_photo_search_index()
+    asyncio.run(engine.dispose())
+
+
+def found(client, **params) -> set[str]:
+    response = client.get("/api/v1/photos/public", params={**params, "limit": 100})
+    assert response.status_code == 200, response.text
+    return {item["id"] for item in response.json()["items"]}
+
+
+def test_search_uses_photo_documents(search_env):
+    client, _ = search_env
+
+    assert found(client, search="SUNSET") == {"lake"}
+    assert found(client, search="日落") == {"lake"}  # shorter than a trigram
+    assert found(client, search="图书馆") == {"library", "ginkgo"}
+    # Unspaced Chinese: 秋天 / 图书馆 / 银杏 each have to occur, in any field
+    assert found(client, search="秋天图书馆银杏") == {"library"}
+    assert found(client, search="图书馆的银杏") == {"library", "ginkgo"}
+    assert found(client, search="library hall") == {"library"}  # taxonomy alias
+    assert found(client, search="snowfall") == {"snow"}
+    assert found(client, tag="Snow") == {"snow"}
+    assert found(client, tag="sunset") == set()
+
+
+def test_search_documents_follow_changes(search_env):
+    client, session_factory = search_env
+
+    assert client.patch("/api/v1/photos/plain", json={"description": "Morning fog"}).status_code == 200
+    assert found(client, search="fog") == {"plain"}
+
+    assert client.delete("/api/v1/photos/snow/tags/1").status_code == 200
+    assert found(client, tag="snowfall") == set()
+
+    async def rename_node_and_tag():
+        async with session_factory() as session:
+            node = await session.get(TaxonomyNode, 1)
+            node.name = "逸夫图书馆"
+            session.add(PhotoTag(photo_id="lake", tag_id=1))
+            await session.commit()
+            tag = await session.get(Tag, 1)
+            tag.name = "afterglow"
+            await session.commit()
+
+    asyncio.run(rename_node_and_tag())
+    assert found(client, search="逸夫") == {"library"}
+    assert found(client, search="图书馆") == {"library", "ginkgo"}
+    assert found(client, tag="afterglow") == {"lake"}
+
+    assert client.delete("/api/v1/photos/lake").status_code == 204
+
+    async def documents():
+        async with session_factory() as session:
+            # Raises if the FTS index drifted from the document rows
+            await session.execute(text("INSERT INTO photo_search_fts(photo_search_fts) VALUES ('integrity-check')"))
+            return set((await session.execute(select(PhotoSearchDocument.photo_id))).scalars().all())
+
+    assert asyncio.run(documents()) == {"snow", "library", "plain", "ginkgo"}
+
+
+def test_search_follows_other_workers(search_env, tmp_path: Path):
+    client, _ = search_env
+    assert found(client, search="fog") == set()
+    index = get_photo_search_index()
+    rebuilds, dictionary_loads = index.rebuilds, index.dictionary_loads
+
+    async def other_worker(*statements):
+        # Plain Core on its own engine: no session events reach this process's index
+        engine = create_async_engine(f"sqlite+aiosqlite:///{(tmp_path / 'search.db').as_posix()}")
+        async with engine.begin() as conn:
+            for statement in statements:
+                await conn.execute(statement)
+        await engine.dispose()
+
+    asyncio.run(other_worker(
+        update(PhotoSearchDocument).where(PhotoSearchDocument.photo_id == "plain")
+        .values(document="img_0004.jpg\nmorning fog", updated_at=datetime.utcnow()),
+        insert(Photo).values(id="rime", uploader_id="admin", filename="img_0006.jpg", original_path="originals/rime.jpg",
+                             status="approved", processing_status="manual", category="Campus"),
+        insert(PhotoSearchDocument).values(photo_id="rime", document="img_0006.jpg\n雾凇", tag_names=""),
+    ))
+    # Found by the very next search, without a rebuild or a dictionary reload
+    assert found(client, search="fog") == {"plain"}
+    assert found(client, search="雾凇") == {"rime"}
+    assert (index.rebuilds, index.dictionary_loads) == (rebuilds, dictionary_loads)
+
+    asyncio.run(other_worker(
+        delete(PhotoSearchDocument).where(PhotoSearchDocument.photo_id == "lake"),
+        insert(Tag).values(id=3, name="湖边日落"),
+    ))
+    index.sync_seconds = 0  # deletions and dictionary changes are checked every SEARCH_INDEX_SYNC_SECONDS
+    assert found(client, search="日落") == set()
+    assert index.index.text("lake") is None
+    assert "湖边日落" in index.dictionary
+    assert index.dictionary_loads == dictionary_loads + 1
+    assert index.rebuilds == rebuilds
+
+
+def test_query_segmentation_and_ngram_index():
+    dictionary = frozenset({"秋天", "图书馆", "银杏"})
+    assert query_terms("秋天图书馆的银杏", dictionary, 3) == ["秋天", "图书馆", "银杏"]
+    assert query_terms("逸夫楼 Sunset!", dictionary, 3) == ["逸夫楼", "sunset"]
+    assert query_terms("的 a") == []
+
+    index = NgramIndex([("a", "逸夫楼前"), ("b", "夫楼 逸夫"), ("c", "Sunset over lake")])
+    # Both documents hold the bigrams 逸夫 and 夫楼; only "a" contains the phrase
+    assert index.search(["逸夫楼"]) == ["a"]
+    assert sorted(index.search(["楼"])) == ["a", "b"]
+    assert index.search(["sunset", "lake"]) == ["c"]
+
+    index.add("b", "逸夫楼")
+    index.remove("a")
+    assert index.search(["逸夫楼"]) == ["b"]
+    assert index.metrics()["tombstones"] == 2
+
+
+def test_dense_postings_switch_to_bitmaps(monkeypatch):
+    monkeypatch.setattr(search_index, "DENSE_MIN_POSTINGS", 4)
+    documents = [(f"p{i}", f"图书馆{i}" if i % 3 else f"秋天图书馆{i}") for i in range(40)]
+    index = NgramIndex(documents)
+    assert index.metrics()["bitmaps"] > 0
+
+    expected = [key for key, text in documents if "秋天" in text and "馆1" in text]
+    assert index.search(["秋天", "图书馆", "馆1"]) == expected
+    index.add("p40", "秋天图书馆1")
+    index.remove("p3")
+    assert index.search(["秋天", "馆1"]) == [key for key in expected if key != "p3"] + ["p40"]
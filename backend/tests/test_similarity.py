@@ -0,0 +1,200 @@
+import asyncio
+import itertools
+import random
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image, ImageDraw
+from sqlalchemy import event, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core import deps
+from app.core.database import Base
+from app.core.security import create_access_token, get_password_hash
+from app.main import app
+from app.models import Photo, User
+from app.services.image_processing import compute_dhash, dhash_file
+from app.services.similarity import HammingIndex, get_similarity_index, hamming_distance, reset_similarity_index
+
+
+def create_auth_headers(token: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def scene(width: int = 1200, height: int = 800) -> Image.Image:
+    img = Image.new("RGB", (width, height), (40, 90, 160))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, height * 0.6, width, height), fill=(60, 140, 50))
+    draw.ellipse((width * 0.65, height * 0.1, width * 0.85, height * 0.4), fill=(250, 220, 90))
+    draw.polygon([(width * 0.1, height * 0.6), (width * 0.3, height * 0.2), (width * 0.5, height * 0.6)], fill=(120, 110, 100))
+    return img
+
+
+def test_dhash_survives_resize_and_recompression_but_not_a_different_image(tmp_path):
+    original = scene()
+    original.save(tmp_path / "original.jpg", "JPEG", quality=95)
+    original.resize((600, 400)).save(tmp_path / "small.jpg", "JPEG", quality=40)
+    rng = random.Random(3)
+    other = Image.frombytes("L", (90, 60), rng.randbytes(90 * 60))
+
+    base = int(dhash_file(tmp_path / "original.jpg"), 16)
+    assert hamming_distance(base, int(dhash_file(tmp_path / "small.jpg"), 16)) <= 4
+    assert hamming_distance(base, int(compute_dhash(other), 16)) > 12
+
+
+def test_hamming_index_matches_brute_force():
+    rng = random.Random(7)
+    items = [(f"p{i:04d}", rng.getrandbits(64)) for i in range(2000)]
+    for i in range(100):
+        flips = sum(1 << bit for bit in rng.sample(range(64), rng.randint(0, 9)))
+        items.append((f"d{i:04d}", items[i][1] ^ flips))
+    index = HammingIndex(items)
+    hashes = dict(items)
+
+    for key, value in items[:50] + items[-50:]:
+        expected = sorted(
+            ((other, hamming_distance(value, other_value)) for other, other_value in items
+             if hamming_distance(value, other_value) <= 9),
+            key=lambda match: (match[1], match[0]),
+        )
+        assert index.query(value, 9) == expected
+
+    expected_pairs = {
+        frozenset((a, b)) for a, b in itertools.combinations(hashes, 2) if hamming_distance(hashes[a], hashes[b]) <= 6
+    }
+    assert {frozenset(pair) for pair in index.pairs(6)} == expected_pairs
+    clustered = {key for cluster in index.clusters(6) for key in cluster}
+    assert clustered == {key for pair in expected_pairs for key in pair}
+
+    index.remove("d0000")
+    assert "d0000" not in [key for key, _ in index.query(hashes["d0000"], 0)]
+
+
+@pytest.fixture
+def similarity_client(tmp_path: Path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{(tmp_path / 'similar.db').as_posix()}", future=True)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    base = int(compute_dhash(scene()), 16)
+
+    async def init_database():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as session:
+            session.add_all([
+                User(id="owner", student_id="20260001", email="owner@buct.edu.cn",
+                     hashed_password=get_password_hash("password123"), full_name="Owner", role="user", is_active=True),
+                User(id="auditor", student_id="20260003", email="auditor@buct.edu.cn",
+                     hashed_password=get_password_hash("password123"), full_name="Auditor", role="auditor", is_active=True),
+            ])
+            rows = {
+                "shot": (base, "approved"),
+                "re-export": (base ^ 0b101, "approved"),
+                "pending-copy": (base ^ 0b1, "pending"),
+                "unrelated": (base ^ (2 ** 64 - 1), "approved"),
+                "deleted-copy": (base, "deleted"),
+            }
+            for photo_id, (value, photo_status) in rows.items():
+                session.add(Photo(
+                    id=photo_id, uploader_id="owner", filename=f"{photo_id}.jpg", original_path=f"originals/{photo_id}.jpg",
+                    perceptual_hash=f"{value:016x}", status=photo_status, processing_status="manual",
+                ))
+            await session.commit()
+
+    asyncio.run(init_database())
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    reset_similarity_index()
+    app.dependency_overrides[deps.get_db] = override_get_db
+    with TestClient(app) as client:
+        client.base_hash = base
+        client.session_factory = session_factory
+        client.database_url = str(engine.url)
+        yield client
+    app.dependency_overrides.clear()
+    reset_similarity_index()
+    asyncio.run(engine.dispose())
+
+
+def test_similar_photos_and_reviewer_clusters(similarity_client):
+    client = similarity_client
+
+    public = client.get("/api/v1/photos/shot/similar")
+    assert public.status_code == 200, public.text
+    assert [(item["photo"]["id"], item["distance"]) for item in public.json()["items"]] == [("re-export", 2)]
+
+    auditor = create_auth_headers(create_access_token({"sub": "20260003"}))
+    reviewed = client.get("/api/v1/photos/shot/similar", headers=auditor).json()
+    assert [item["photo"]["id"] for item in reviewed["items"]] == ["pending-copy", "re-export"]
+
+    assert client.get("/api/v1/photos/near-duplicates", headers=create_auth_headers(
+        create_access_token({"sub": "20260001"}))).status_code == 403
+    clusters = client.get("/api/v1/photos/near-duplicates", headers=auditor)
+    assert clusters.status_code == 200, clusters.text
+    payload = clusters.json()
+    assert payload["total"] == 1
+    assert sorted(photo["id"] for photo in payload["clusters"][0]["photos"]) == ["pending-copy", "re-export", "shot"]
+
+
+def test_similarity_index_follows_writes(similarity_client):
+    client = similarity_client
+    auditor = create_auth_headers(create_access_token({"sub": "20260003"}))
+    owner = create_auth_headers(create_access_token({"sub": "20260001"}))
+
+    def similar_ids(headers=None):
+        response = client.get("/api/v1/photos/shot/similar", headers=headers)
+        assert response.status_code == 200, response.text
+        return [item["photo"]["id"] for item in response.json()["items"]]
+
+    assert similar_ids() == ["re-export"]
+    loaded_at = get_similarity_index().loaded_at
+
+    async def add_copies():
+        # Through the ORM: this process's session events mark the new photos
+        async with client.session_factory() as session:
+            for i in range(3):
+                session.add(Photo(id=f"copy-{i}", uploader_id="owner", filename=f"copy-{i}.jpg",
+                                  original_path=f"originals/copy-{i}.jpg", status="approved",
+                                  perceptual_hash=f"{client.base_hash ^ (1 << (10 + i)):016x}",
+                                  processing_status="manual", category="Portrait" if i else None))
+            await session.commit()
+        # Plain Core on its own engine, as another worker would: picked up by updated_at
+        engine = create_async_engine(client.database_url)
+        async with engine.begin() as conn:
+            await conn.execute(insert(Photo).values(
+                id="other-worker", uploader_id="owner", filename="other.jpg", original_path="originals/other.jpg",
+                perceptual_hash=f"{client.base_hash ^ (1 << 20):016x}", status="approved", processing_status="manual",
+            ))
+        await engine.dispose()
+
+    asyncio.run(add_copies())
+    # Anonymous visitors do not see portraits (copy-1, copy-2); one permission check covers both
+    assert similar_ids() == ["copy-0", "other-worker", "re-export"]
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", count)
+    try:
+        assert similar_ids(owner) == ["copy-0", "copy-1", "copy-2", "other-worker", "pending-copy", "re-export"]
+        many = len(statements)
+        statements.clear()
+        client.get("/api/v1/photos/shot/similar", params={"limit": 1}, headers=owner)
+        assert len(statements) == many  # independent of the number of matches
+    finally:
+        event.remove(Engine, "before_cursor_execute", count)
+
+    assert client.delete("/api/v1/photos/re-export", headers=owner).status_code == 204
+    assert similar_ids() == ["copy-0", "other-worker"]
+    assert "re-export" not in get_similarity_index().index
+
+    clusters = client.get("/api/v1/photos/near-duplicates", headers=auditor).json()
+    assert [sorted(photo["id"] for photo in cluster["photos"]) for cluster in clusters["clusters"]] == [
+        ["copy-0", "copy-1", "copy-2", "other-worker", "pending-copy", "shot"]]
+    assert get_similarity_index().loaded_at == loaded_at  # no rebuild along the way
@@ -0,0 +1,123 @@
+import sys
+import textwrap
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from app.services.ssh_channel import MinioSSHWriter, SSHChannel, SSHChannelError
+
+FAKE_SSH = textwrap.dedent(
+    """
+    import shlex, sys, time
+    from pathlib import Path
+
+    state = Path(sys.argv[1])
+    args = sys.argv[2:]
+    with open(state / "calls.log", "a") as log:
+        log.write(" ".join(args[-2:]) + "\\n")
+    if "-O" in args:
+        master_down = state / "master_down"
+        if args[-2] == "check" and master_down.exists():
+            sys.exit(255)
+        if args[-2] == "exit":
+            master_down.unlink(missing_ok=True)
+        sys.exit(0)
+    fail_once = state / "fail_once"
+    if fail_once.exists():
+        fail_once.unlink()
+        sys.stderr.write("mux_client_request_session: session request failed")
+        sys.exit(255)
+    command = shlex.split(args[-1])
+    if command[0] == "sleep":
+        (state / "sleeping").touch()
+        time.sleep(float(command[1]))
+    elif command[:2] == ["mc", "pipe"]:
+        target = state / "objects" / command[2].replace("/", "__")
+        target.parent.mkdir(exist_ok=True)
+        target.write_bytes(sys.stdin.buffer.read())
+    elif command[:2] == ["mc", "rm"]:
+        target = state / "objects" / command[2].replace("/", "__")
+        if not target.exists():
+            sys.exit(1)
+        target.unlink()
+    """
+)
+
+
+@pytest.fixture
+def fake_ssh(tmp_path: Path):
+    script = tmp_path / "fake_ssh.py"
+    script.write_text(FAKE_SSH)
+
+    def make_channel(**kwargs) -> SSHChannel:
+        return SSHChannel("storage.example", "media", ssh_command=[sys.executable, str(script), str(tmp_path)], **kwargs)
+
+    return make_channel, tmp_path
+
+
+def test_writer_pipes_and_removes_objects_over_the_channel(fake_ssh, tmp_path: Path):
+    make_channel, state = fake_ssh
+    channel = make_channel()
+    writer = MinioSSHWriter(channel, "buctmedia")
+    local_file = tmp_path / "thumb.jpg"
+    local_file.write_bytes(b"jpeg-bytes")
+
+    writer.put_file(str(local_file), "thumbnails/a b.jpg")
+    writer.put_bytes(b"more", "thumbnails/c.jpg")
+
+    assert (state / "objects" / "local__buctmedia__thumbnails__a b.jpg").read_bytes() == b"jpeg-bytes"
+    assert writer.remove("thumbnails/c.jpg") is True
+    assert writer.remove("thumbnails/missing.jpg") is False
+    assert channel.commands == 4
+
+
+def test_channel_reconnects_after_connection_failure(fake_ssh):
+    make_channel, state = fake_ssh
+    channel = make_channel()
+    (state / "fail_once").touch()
+    (state / "master_down").touch()
+
+    channel.run("true")
+
+    lines = (state / "calls.log").read_text().splitlines()
+    assert lines == [
+        "media@storage.example true",
+        "check media@storage.example",
+        "exit media@storage.example",
+        "media@storage.example true",
+    ]
+    assert channel.reconnects == 1
+
+
+def test_failed_session_keeps_a_live_master_for_commands_in_flight(fake_ssh):
+    make_channel, state = fake_ssh
+    channel = make_channel(max_concurrency=4)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        in_flight = pool.submit(channel.run, "sleep 0.5")
+        while not (state / "sleeping").exists():
+            time.sleep(0.01)
+        (state / "fail_once").touch()  # e.g. MaxSessions reached: the master itself is fine
+        channel.run("true")
+        in_flight.result()
+
+    lines = (state / "calls.log").read_text().splitlines()
+    assert "check media@storage.example" in lines
+    assert "exit media@storage.example" not in lines
+    assert channel.reconnects == 0
+    assert channel.commands == 3
+
+
+def test_channel_enforces_timeout_and_concurrency_limit(fake_ssh):
+    make_channel, _ = fake_ssh
+    channel = make_channel(max_concurrency=2)
+
+    with pytest.raises(SSHChannelError, match="timed out"):
+        channel.run("sleep 5", timeout=0.5)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda _: channel.run("sleep 0.3"), range(4)))
+    assert time.perf_counter() - started >= 0.6
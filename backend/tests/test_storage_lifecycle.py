@@ -0,0 +1,250 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import get_settings
+from app.main import app
+from app.services import storage as storage_module
+from app.services.storage import S3StorageBackend, StorageBackend, close_storage, get_storage
+
+
+class _ObjectHandler(BaseHTTPRequestHandler):
+    """Serves every key as the same five-byte object."""
+
+    protocol_version = "HTTP/1.1"
+    body = b"hello"
+    gets: list = []
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.body)))
+        self.send_header("Content-Type", "image/jpeg")
+        self.end_headers()
+
+    def do_GET(self):
+        _ObjectHandler.gets.append(self.path)
+        payload, status = self.body, 200
+        requested = self.headers.get("Range")
+        if requested:
+            start, end = (int(value) for value in requested.split("=")[1].split("-"))
+            payload, status = self.body[start:end + 1], 206
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("Content-Type", "image/jpeg")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_s3(monkeypatch: pytest.MonkeyPatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ObjectHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings = get_settings()
+    monkeypatch.setattr(settings, "S3_ENDPOINT", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(settings, "S3_BUCKET", "test-bucket")
+    monkeypatch.setattr(settings, "S3_ACCESS_KEY", "key")
+    monkeypatch.setattr(settings, "S3_SECRET_KEY", "secret")
+    monkeypatch.setattr(settings, "S3_REGION", "us-east-1")
+    monkeypatch.setattr(settings, "S3_MAX_POOL_CONNECTIONS", 2)
+    monkeypatch.setattr(settings, "S3_MEDIA_CACHE_MAX_BYTES", 0)
+    _ObjectHandler.gets = []
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_storage_returns_process_wide_singleton():
+    close_storage()
+    first = get_storage()
+
+    assert get_storage() is first
+    close_storage()
+    assert storage_module._storage is None
+    assert get_storage() is not first
+    close_storage()
+
+
+def test_lifespan_creates_and_closes_shared_backend():
+    close_storage()
+    with TestClient(app):
+        assert storage_module._storage is not None
+        shared = get_storage()
+        assert get_storage() is shared
+    assert storage_module._storage is None
+
+
+def test_s3_pool_metrics_track_requests_and_saturation(fake_s3):
+    backend = S3StorageBackend()
+    try:
+        def head(_):
+            return backend.client.head_object(Bucket="test-bucket", Key="thumbnails/a.jpg")
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(head, range(24)))
+        metrics = backend.metrics()
+    finally:
+        backend.close()
+
+    assert all(item["ContentLength"] == 5 for item in results)
+    assert metrics["backend"] == "s3"
+    assert metrics["max_pool_connections"] == 2
+    assert metrics["requests"] == 24
+    assert metrics["in_flight"] == 0
+    assert metrics["errors"] == 0
+    assert 1 <= metrics["connections_idle"] <= 2
+    assert metrics["peak_connections_in_use"] <= 2
+
+
+def test_s3_async_media_response_streams_body(fake_s3):
+    backend = S3StorageBackend()
+
+    async def collect(response):
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    async def scenario():
+        full = await backend.abuild_media_response("thumbnails/a.jpg")
+        partial = await backend.abuild_media_response("thumbnails/a.jpg", range_header="bytes=0-1,3-4")
+        return full, await collect(full), partial, await collect(partial)
+
+    try:
+        full, full_body, partial, partial_body = asyncio.run(scenario())
+        metrics = backend.metrics()
+    finally:
+        backend.close()
+
+    assert full_body == b"hello"
+    assert full.headers["content-length"] == "5"
+    assert partial.status_code == 206
+    assert int(partial.headers["content-length"]) == len(partial_body)
+    assert b"\r\n\r\nhe\r\n" in partial_body and b"\r\n\r\nlo\r\n" in partial_body
+    # Streamed bodies are closed after the last chunk, returning connections to the pool
+    assert metrics["connections_in_use"] == 0
+
+
+class SlowBackend(StorageBackend):
+    def __init__(self):
+        self.deleted = []
+        self.released = []
+
+    def delete_file(self, file_path):
+        time.sleep(0.2)
+        self.deleted.append(file_path)
+        return True
+
+    @contextmanager
+    def local_copy(self, file_path):
+        try:
+            yield f"/tmp/{file_path}"
+        finally:
+            self.released.append(file_path)
+
+
+def test_async_api_offloads_blocking_calls_from_event_loop():
+    backend = SlowBackend()
+
+    async def scenario():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beat = asyncio.create_task(heartbeat())
+        started = time.perf_counter()
+        deleted = await backend.adelete_files(["a.jpg", None, "b.jpg", "c.jpg", "d.jpg"])
+        elapsed = time.perf_counter() - started
+        with pytest.raises(ValueError):
+            async with backend.alocal_copy("photo.jpg") as local_path:
+                assert local_path == "/tmp/photo.jpg"
+                raise ValueError("analysis failed")
+        beat.cancel()
+        return deleted, elapsed, ticks
+
+    deleted, elapsed, ticks = asyncio.run(scenario())
+
+    assert deleted == 4
+    assert sorted(backend.deleted) == ["a.jpg", "b.jpg", "c.jpg", "d.jpg"]
+    assert elapsed < 0.6
+    assert ticks >= 10
+    assert backend.released == ["photo.jpg"]
+
+
+def test_s3_read_through_cache_serves_warm_thumbnails_from_disk(fake_s3, tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(get_settings(), "S3_MEDIA_CACHE_MAX_BYTES", 1024 * 1024)
+    monkeypatch.setattr(get_settings(), "S3_MEDIA_CACHE_DIR", str(tmp_path / "media-cache"))
+    backend = S3StorageBackend()
+
+    async def read(key, range_header=None):
+        response = await backend.abuild_media_response(key, range_header=range_header)
+        if hasattr(response, "body_iterator"):
+            return response.status_code, b"".join([chunk async for chunk in response.body_iterator])
+        return response.status_code, Path(response.path).read_bytes()
+
+    try:
+        assert asyncio.run(read("thumbnails/a.jpg")) == (200, b"hello")
+        fetched = len(_ObjectHandler.gets)
+        assert asyncio.run(read("thumbnails/a.jpg")) == (200, b"hello")
+        assert asyncio.run(read("thumbnails/a.jpg", "bytes=1-2")) == (206, b"el")
+        assert len(_ObjectHandler.gets) == fetched  # warm: served from disk
+
+        asyncio.run(read("originals/a.jpg"))
+        assert len(_ObjectHandler.gets) == fetched + 1  # outside S3_MEDIA_CACHE_PREFIXES
+
+        monkeypatch.setattr(backend.client, "delete_object", lambda **kwargs: {})
+        assert backend.delete_file("thumbnails/a.jpg")
+        asyncio.run(read("thumbnails/a.jpg"))
+        assert len(_ObjectHandler.gets) > fetched + 1  # invalidated, fetched again
+        metrics = backend.metrics()["media_cache"]
+    finally:
+        backend.close()
+
+    assert (metrics["hits"], metrics["misses"], metrics["invalidations"]) == (2, 2, 1)
+    assert metrics["entries"] == 1 and metrics["bytes"] == 5
+
+
+def test_s3_cache_hit_survives_eviction_by_another_worker(fake_s3, tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(get_settings(), "S3_MEDIA_CACHE_MAX_BYTES", 1024 * 1024)
+    monkeypatch.setattr(get_settings(), "S3_MEDIA_CACHE_DIR", str(tmp_path / "media-cache"))
+    backend = S3StorageBackend()
+
+    async def collect(response):
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    try:
+        cached = Path(backend.cached_copy("thumbnails/a.jpg"))
+        fetched = len(_ObjectHandler.gets)
+        # Evicted after the response was built: the open file is still served
+        response = backend.build_media_response("thumbnails/a.jpg")
+        cached.unlink()
+        assert asyncio.run(collect(response)) == b"hello"
+        assert len(_ObjectHandler.gets) == fetched
+
+        # Evicted between the lookup and the open: falls back to S3 instead of a 500
+        with monkeypatch.context() as patch:
+            patch.setattr(backend, "cached_copy", lambda key: str(tmp_path / "evicted.jpg"))
+            assert asyncio.run(collect(backend.build_media_response("thumbnails/a.jpg"))) == b"hello"
+        assert len(_ObjectHandler.gets) == fetched + 1
+
+        # A failed delete leaves the cached copy in place
+        def unavailable(**kwargs):
+            raise RuntimeError("unreachable")
+
+        monkeypatch.setattr(backend.client, "delete_object", unavailable)
+        monkeypatch.setattr(backend, "_mc_rm", lambda key: False)
+        assert not backend.delete_file("thumbnails/a.jpg")
+        assert backend.metrics()["media_cache"]["invalidations"] == 0
+    finally:
+        backend.close()
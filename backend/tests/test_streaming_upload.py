@@ -0,0 +1,683 @@
+import asyncio
+import hashlib
+import io
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.api.v1.endpoints import photos as photos_endpoint
+from app.core import deps
+from app.core.config import get_settings
+from app.core.database import Base
+from app.core.security import create_access_token, get_password_hash
+from app.main import app
+from app.models import Photo, User
+from app.services import photo_pipeline, task_dispatcher
+from app.services.image_workers import get_image_workers
+from app.services.ingest import StreamingIngest
+from app.services.storage import S3MultipartWriter, S3StorageBackend, StorageUnavailable, get_storage
+from app.services.upload_sessions import cleanup_expired_sessions
+
+
+def create_auth_headers(token: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def jpeg_bytes(width: int = 1000, height: int = 600) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (30, 120, 200)).save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+async def setup_database(session_factory: async_sessionmaker) -> None:
+    async with session_factory() as session:
+        session.add(
+            User(
+                id="uploader",
+                student_id="20260002",
+                email="uploader@buct.edu.cn",
+                hashed_password=get_password_hash("password123"),
+                full_name="Uploader",
+                role="user",
+                is_active=True,
+            )
+        )
+        await session.commit()
+
+
+@pytest.fixture
+def upload_client(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    uploads_dir = tmp_path / "uploads"
+    monkeypatch.setattr(get_settings(), "UPLOAD_DIR", str(uploads_dir))
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{(tmp_path / 'upload.db').as_posix()}", future=True)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def init_database():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(init_database())
+    asyncio.run(setup_database(session_factory))
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[deps.get_db] = override_get_db
+    with TestClient(app) as client:
+        yield client, session_factory, uploads_dir
+    app.dependency_overrides.clear()
+    asyncio.run(engine.dispose())
+
+
+def test_stream_upload_writes_original_in_place_and_builds_renditions(upload_client):
+    client, session_factory, uploads_dir = upload_client
+    body = jpeg_bytes()
+
+    response = client.post(
+        "/api/v1/photos/upload/stream",
+        params={"filename": "操场.jpg", "category": "Landscape", "enable_ai": "false"},
+        content=body,
+        headers={**create_auth_headers(create_access_token({"sub": "20260002"})), "Content-Type": "image/jpeg"},
+    )
+
+    assert response.status_code == 201, response.text
+    payload = response.json()
+    assert payload["width"] == 1000
+    assert len(payload["content_hash"]) == 64
+    assert (uploads_dir / payload["original_path"]).read_bytes() == body
+    assert not list(uploads_dir.rglob("*.part"))
+
+    async def load():
+        async with session_factory() as session:
+            return (await session.execute(select(Photo))).scalar_one()
+
+    photo = asyncio.run(load())
+    assert photo.file_size == len(body)
+    assert photo.filename == "操场.jpg"
+    assert set(photo.renditions) == {"160", "400", "800", "1600"}
+    with Image.open(uploads_dir / photo.renditions["1600"]) as native:
+        assert native.width == 1000
+
+
+
+def test_deferred_upload_returns_202_and_pipeline_fills_in_renditions(upload_client, monkeypatch: pytest.MonkeyPatch):
+    client, session_factory, uploads_dir = upload_client
+    monkeypatch.setattr(photo_pipeline, "AsyncSessionLocal", session_factory)
+    pool = get_image_workers()
+    pool.outstanding = pool.max_outstanding  # accept path must not touch the image pool
+    pool_released = False
+
+    async def release_pool_then_run(*args, **kwargs):
+        nonlocal pool_released
+        pool.outstanding, pool_released = 0, True
+        return await run_pipeline(*args, **kwargs)
+
+    run_pipeline = photo_pipeline.run_photo_pipeline
+    monkeypatch.setattr(task_dispatcher, "run_photo_pipeline", release_pool_then_run)
+    try:
+        response = client.post(
+            "/api/v1/photos/upload",
+            files={"file": ("湖.jpg", jpeg_bytes(), "image/jpeg")},
+            data={"category": "Landscape", "enable_ai": "false", "defer_processing": "true"},
+            headers=create_auth_headers(create_access_token({"sub": "20260002"})),
+        )
+    finally:
+        pool.outstanding = 0
+
+    assert response.status_code == 202, response.text
+    payload = response.json()
+    assert payload["processing_status"] == "processing"
+    assert payload["thumb_path"] is None
+    assert (uploads_dir / payload["original_path"]).is_file()
+    assert pool_released
+
+    async def load():
+        async with session_factory() as session:
+            return (await session.execute(select(Photo))).scalar_one()
+
+    # TestClient runs background tasks before returning
+    photo = asyncio.run(load())
+    assert photo.processing_status == "manual"
+    assert photo.width == 1000
+    assert set(photo.renditions) == {"160", "400", "800", "1600"}
+    assert (uploads_dir / photo.thumb_path).is_file()
+
+def test_stream_upload_rejects_oversized_body_early(upload_client, monkeypatch: pytest.MonkeyPatch):
+    client, _, uploads_dir = upload_client
+    monkeypatch.setattr(get_settings(), "MAX_UPLOAD_SIZE", 1024)
+    headers = {**create_auth_headers(create_access_token({"sub": "20260002"})), "Content-Type": "image/jpeg"}
+
+    declared = client.post("/api/v1/photos/upload/stream", params={"filename": "big.jpg"}, content=b"x" * 4096, headers=headers)
+
+    def chunked():
+        for _ in range(8):
+            yield b"x" * 512
+
+    streamed = client.post("/api/v1/photos/upload/stream", params={"filename": "big.jpg"}, content=chunked(), headers=headers)
+
+    assert declared.status_code == 413
+    assert streamed.status_code == 413
+    assert not [path for path in uploads_dir.rglob("*") if path.is_file()]
+
+
+def test_uploads_get_503_with_retry_after_while_image_pool_is_saturated(upload_client):
+    client, _, uploads_dir = upload_client
+    pool = get_image_workers()
+    pool.outstanding = pool.max_outstanding
+    try:
+        response = client.post(
+            "/api/v1/photos/upload/stream",
+            params={"filename": "busy.jpg"},
+            content=jpeg_bytes(),
+            headers={**create_auth_headers(create_access_token({"sub": "20260002"})), "Content-Type": "image/jpeg"},
+        )
+    finally:
+        pool.outstanding = 0
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(get_settings().IMAGE_PROCESS_RETRY_AFTER)
+    assert not [path for path in uploads_dir.rglob("*") if path.is_file()]
+    assert pool.metrics()["rejected"] == 1
+
+
+class FakeMultipartClient:
+    def __init__(self, fail_create: bool = False, fail_parts: int = 0):
+        self.fail_create = fail_create
+        self.fail_parts = fail_parts
+        self.parts = []
+        self.completed = None
+        self.put = None
+
+    def create_multipart_upload(self, **kwargs):
+        if self.fail_create:
+            raise RuntimeError("AccessDenied")
+        return {"UploadId": "upload-1"}
+
+    def upload_part(self, PartNumber, Body, **kwargs):
+        if self.fail_parts:
+            self.fail_parts -= 1
+            raise RuntimeError("SlowDown")
+        self.parts.append((PartNumber, len(Body)))
+        return {"ETag": f'"etag-{PartNumber}"'}
+
+    def complete_multipart_upload(self, MultipartUpload, **kwargs):
+        self.completed = MultipartUpload["Parts"]
+
+    def abort_multipart_upload(self, **kwargs):
+        pass
+
+    def put_object(self, Body, **kwargs):
+        self.put = Body
+
+
+class FakeS3Backend:
+    bucket = "test-bucket"
+
+    def __init__(self, client):
+        self.client = client
+        self.uploaded = None
+
+    def _upload(self, local_path, key):
+        self.uploaded = (key, Path(local_path).read_bytes())
+
+    def invalidate_cached(self, key):
+        self.invalidated = key
+
+
+def test_s3_writer_streams_parts_and_falls_back_when_multipart_is_blocked():
+    part = 5 * 1024 * 1024
+    backend = FakeS3Backend(FakeMultipartClient())
+    writer = S3MultipartWriter(backend, "originals/a.jpg", "image/jpeg", part)
+    for _ in range(11):
+        writer.write(b"a" * (1024 * 1024))
+    writer.commit()
+
+    assert backend.client.parts == [(1, part), (2, part), (3, 1024 * 1024)]
+    assert [item["PartNumber"] for item in backend.client.completed] == [1, 2, 3]
+
+    small = FakeS3Backend(FakeMultipartClient())
+    writer = S3MultipartWriter(small, "originals/b.jpg", "image/jpeg", part)
+    writer.write(b"tiny")
+    writer.commit()
+    assert small.client.put == b"tiny"
+
+    blocked = FakeS3Backend(FakeMultipartClient(fail_create=True))
+    writer = S3MultipartWriter(blocked, "originals/c.jpg", "image/jpeg", part)
+    for _ in range(6):
+        writer.write(b"b" * (1024 * 1024))
+    writer.commit()
+    assert blocked.uploaded == ("originals/c.jpg", b"b" * (6 * 1024 * 1024))
+
+
+def test_remote_ingest_stages_decode_source_on_disk():
+    body = jpeg_bytes(800, 500)
+    backend = FakeS3Backend(FakeMultipartClient())
+    ingest = StreamingIngest(S3MultipartWriter(backend, "originals/d.jpg", "image/jpeg", 5 * 1024 * 1024))
+    for offset in range(0, len(body), 4096):
+        ingest.write(body[offset:offset + 4096])
+    ingest.commit()
+
+    # A path for the image worker to open, not bytes to pickle across processes
+    source = ingest.decode_source()
+    assert isinstance(source, str) and source.endswith(".jpg")
+    assert Path(source).read_bytes() == body == backend.client.put
+    with Image.open(source) as image:
+        assert image.size == (800, 500)
+
+    ingest.close()
+    assert not Path(source).exists()
+
+
+def test_resumable_upload_resumes_at_offset_and_finalizes_into_photo(upload_client):
+    client, session_factory, uploads_dir = upload_client
+    headers = create_auth_headers(create_access_token({"sub": "20260002"}))
+    body = jpeg_bytes()
+    half = len(body) // 2
+
+    created = client.post(
+        "/api/v1/photos/uploads",
+        json={"filename": "运动会.jpg", "total_size": len(body), "mime_type": "image/jpeg", "enable_ai": False},
+        headers=headers,
+    )
+    assert created.status_code == 201, created.text
+    session = created.json()
+    url = f"/api/v1/photos/uploads/{session['id']}"
+    assert created.headers["location"].endswith(url)
+
+    first = client.patch(url, content=body[:half], headers={**headers, "Upload-Offset": "0"})
+    assert first.status_code == 204
+    assert first.headers["upload-offset"] == str(half)
+
+    # A retry of the first chunk after a dropped response is told where to resume
+    stale = client.patch(url, content=body[:half], headers={**headers, "Upload-Offset": "0"})
+    assert stale.status_code == 409
+    assert client.head(url, headers=headers).headers["upload-offset"] == str(half)
+
+    early = client.post(f"{url}/finalize", headers=headers)
+    assert early.status_code == 409
+
+    rest = client.patch(url, content=body[half:], headers={**headers, "Upload-Offset": str(half)})
+    assert rest.headers["upload-offset"] == str(len(body))
+
+    finalized = client.post(f"{url}/finalize", headers=headers)
+    assert finalized.status_code == 201, finalized.text
+    payload = finalized.json()
+    assert payload["id"] == session["photo_id"]
+    assert payload["width"] == 1000
+    assert (uploads_dir / payload["original_path"]).read_bytes() == body
+    assert not list(uploads_dir.rglob("*.part"))
+    assert client.get(url, headers=headers).json()["status"] == "completed"
+
+    async def load():
+        async with session_factory() as db:
+            return (await db.execute(select(Photo))).scalar_one()
+
+    photo = asyncio.run(load())
+    assert photo.filename == "运动会.jpg"
+    assert photo.processing_status == "manual"
+    assert set(photo.renditions) == {"160", "400", "800", "1600"}
+
+
+def test_failed_finalize_keeps_the_session_open_for_a_retry(upload_client, monkeypatch: pytest.MonkeyPatch):
+    client, session_factory, uploads_dir = upload_client
+    headers = create_auth_headers(create_access_token({"sub": "20260002"}))
+    body = jpeg_bytes(900, 600)
+    session = client.post(
+        "/api/v1/photos/uploads",
+        json={"filename": "large.jpg", "total_size": len(body), "mime_type": "image/jpeg", "enable_ai": False},
+        headers=headers,
+    ).json()
+    url = f"/api/v1/photos/uploads/{session['id']}"
+    assert client.patch(url, content=body, headers={**headers, "Upload-Offset": "0"}).status_code == 204
+
+    register = photos_endpoint._register_uploaded_photo
+
+    async def fail_once(*args, **kwargs):
+        monkeypatch.setattr(photos_endpoint, "_register_uploaded_photo", register)
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(photos_endpoint, "_register_uploaded_photo", fail_once)
+    failed = client.post(f"{url}/finalize", headers=headers)
+    assert failed.status_code == 500
+    assert client.get(url, headers=headers).json()["status"] == "active"
+    assert (uploads_dir / "originals" / f"{session['photo_id']}.jpg").read_bytes() == body
+
+    retried = client.post(f"{url}/finalize", headers=headers)
+    assert retried.status_code == 201, retried.text
+    assert retried.json()["width"] == 900
+    assert client.get(url, headers=headers).json()["status"] == "completed"
+
+
+def test_expired_upload_sessions_are_cleaned_up(upload_client):
+    client, session_factory, uploads_dir = upload_client
+    headers = create_auth_headers(create_access_token({"sub": "20260002"}))
+    created = client.post(
+        "/api/v1/photos/uploads",
+        json={"filename": "a.jpg", "total_size": 10, "mime_type": "image/jpeg"},
+        headers=headers,
+    ).json()
+    client.patch(f"/api/v1/photos/uploads/{created['id']}", content=b"12345", headers={**headers, "Upload-Offset": "0"})
+    assert len(list(uploads_dir.rglob("*.part"))) == 1
+
+    async def cleanup():
+        async with session_factory() as db:
+            return await cleanup_expired_sessions(db, now=datetime.utcnow() + timedelta(days=2))
+
+    assert asyncio.run(cleanup()) == 1
+    assert not list(uploads_dir.rglob("*.part"))
+    gone = client.patch(f"/api/v1/photos/uploads/{created['id']}", content=b"67890", headers={**headers, "Upload-Offset": "5"})
+    assert gone.status_code == 410
+
+
+def test_s3_resumable_upload_sends_one_part_per_chunk_and_never_spools_locally():
+    part = 5 * 1024 * 1024
+    backend = object.__new__(S3StorageBackend)
+    backend.bucket, backend.client = "test-bucket", FakeMultipartClient()
+    state = backend.begin_resumable("originals/a.jpg", "image/jpeg")
+    assert state["min_chunk_size"] == part
+    state = backend.append_resumable("originals/a.jpg", state, 0, b"a" * part)
+    state = backend.append_resumable("originals/a.jpg", state, part, b"a" * 10)
+    backend.complete_resumable("originals/a.jpg", state)
+    assert backend.client.parts == [(1, part), (2, 10)]
+    assert [item["PartNumber"] for item in backend.client.completed] == [1, 2]
+
+    # A later chunk may land on another worker, so S3 errors surface instead of spooling to this host
+    blocked = object.__new__(S3StorageBackend)
+    blocked.bucket, blocked.client = "test-bucket", FakeMultipartClient(fail_create=True)
+    with pytest.raises(StorageUnavailable):
+        blocked.begin_resumable("originals/b.jpg", "image/jpeg")
+
+    flaky = object.__new__(S3StorageBackend)
+    flaky.bucket, flaky.client = "test-bucket", FakeMultipartClient(fail_parts=1)
+    state = flaky.begin_resumable("originals/c.jpg", "image/jpeg")
+    with pytest.raises(StorageUnavailable):
+        flaky.append_resumable("originals/c.jpg", state, 0, b"c" * part)
+    state = flaky.append_resumable("originals/c.jpg", state, 0, b"c" * part)  # client retries the same chunk
+    flaky.complete_resumable("originals/c.jpg", state)
+    assert flaky.client.completed == [{"ETag": '"etag-1"', "PartNumber": 1}]
+
+
+def test_resumable_upload_returns_503_while_storage_is_unavailable(upload_client, monkeypatch: pytest.MonkeyPatch):
+    client, _, _ = upload_client
+    headers = create_auth_headers(create_access_token({"sub": "20260002"}))
+    storage = get_storage()
+
+    def unavailable(*args):
+        raise StorageUnavailable("SlowDown")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(storage, "begin_resumable", unavailable)
+        refused = client.post(
+            "/api/v1/photos/uploads",
+            json={"filename": "a.jpg", "total_size": 10, "mime_type": "image/jpeg"},
+            headers=headers,
+        )
+    assert refused.status_code == 503
+    assert refused.headers["Retry-After"] == str(StorageUnavailable.retry_after)
+
+    created = client.post(
+        "/api/v1/photos/uploads",
+        json={"filename": "a.jpg", "total_size": 10, "mime_type": "image/jpeg"},
+        headers=headers,
+    ).json()
+    url = f"/api/v1/photos/uploads/{created['id']}"
+    with monkeypatch.context() as patch:
+        patch.setattr(storage, "append_resumable", unavailable)
+        failed = client.patch(url, content=b"12345", headers={**headers, "Upload-Offset": "0"})
+    assert failed.status_code == 503
+    assert client.head(url, headers=headers).headers["Upload-Offset"] == "0"
+    resent = client.patch(url, content=b"12345", headers={**headers, "Upload-Offset": "0"})
+    assert resent.headers["Upload-Offset"] == "5"
+
+
+def test_batch_upload_shares_setup_and_reports_per_item_results(upload_client, monkeypatch: pytest.MonkeyPatch):
+    client, session_factory, uploads_dir = upload_client
+    headers = create_auth_headers(create_access_token({"sub": "20260002"}))
+    body = jpeg_bytes(800, 600)
+    session = client.post(
+        "/api/v1/photos/uploads",
+        json={"filename": "续传.jpg", "total_size": len(body), "mime_type": "image/jpeg", "campus": "昌平校区"},
+        headers=headers,
+    ).json()
+    client.patch(f"/api/v1/photos/uploads/{session['id']}", content=body, headers={**headers, "Upload-Offset": "0"})
+
+    calls = {"runtime_settings": 0, "taxonomy": 0}
+    real_runtime_settings = photos_endpoint.get_runtime_settings
+
+    async def counting_runtime_settings(db):
+        calls["runtime_settings"] += 1
+        return await real_runtime_settings(db)
+
+    async def counting_taxonomy(db):
+        calls["taxonomy"] += 1
+
+    monkeypatch.setattr(photos_endpoint, "get_runtime_settings", counting_runtime_settings)
+    monkeypatch.setattr(photos_endpoint, "ensure_default_taxonomy", counting_taxonomy)
+
+    response = client.post(
+        "/api/v1/photos/upload/batch",
+        files=[
+            ("files", ("a.jpg", jpeg_bytes(), "image/jpeg")),
+            ("files", ("notes.txt", b"not an image", "text/plain")),
+            ("files", ("b.jpg", jpeg_bytes(640, 480), "image/jpeg")),
+        ],
+        data={"session_ids": [session["id"], "missing"], "category": "Activity", "enable_ai": "false"},
+        headers=headers,
+    )
+
+    assert response.status_code == 200, response.text
+    payload = response.json()
+    assert (payload["total"], payload["succeeded"], payload["failed"]) == (5, 3, 2)
+    assert [item["success"] for item in payload["items"]] == [True, False, True, True, False]
+    assert payload["items"][1]["error"] == "File must be an image"
+    assert payload["items"][3]["photo"]["id"] == session["photo_id"]
+    assert calls == {"runtime_settings": 1, "taxonomy": 1}
+
+    async def load():
+        async with session_factory() as db:
+            return (await db.execute(select(Photo).order_by(Photo.filename))).scalars().all()
+
+    photos = asyncio.run(load())
+    assert sorted(photo.filename for photo in photos) == ["a.jpg", "b.jpg", "续传.jpg"]
+    assert {photo.category for photo in photos} == {"Activity"}
+    assert {photo.processing_status for photo in photos} == {"manual"}
+    resumed = next(photo for photo in photos if photo.id == session["photo_id"])
+    assert resumed.campus == "昌平校区"
+    assert resumed.width == 800
+    assert client.get(f"/api/v1/photos/uploads/{session['id']}", headers=headers).json()["status"] == "completed"
+
+
+def test_batch_session_item_that_fails_stays_retryable(upload_client, monkeypatch: pytest.MonkeyPatch):
+    client, session_factory, uploads_dir = upload_client
+    headers = create_auth_headers(create_access_token({"sub": "20260002"}))
+    body = jpeg_bytes(700, 500)
+    session = client.post(
+        "/api/v1/photos/uploads",
+        json={"filename": "big.jpg", "total_size": len(body), "mime_type": "image/jpeg", "enable_ai": False},
+        headers=headers,
+    ).json()
+    url = f"/api/v1/photos/uploads/{session['id']}"
+    client.patch(url, content=body, headers={**headers, "Upload-Offset": "0"})
+
+    process = photos_endpoint._process_stored_original
+
+    async def fail(*args, **kwargs):
+        raise RuntimeError("worker crashed")
+
+    monkeypatch.setattr(photos_endpoint, "_process_stored_original", fail)
+    response = client.post(
+        "/api/v1/photos/upload/batch",
+        files=[("files", ("other.jpg", jpeg_bytes(), "image/jpeg"))],
+        data={"session_ids": [session["id"]], "enable_ai": "false"},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    assert [item["success"] for item in response.json()["items"]] == [True, False]
+    # The other item's commit does not close the failed session, and its data is kept
+    assert client.get(url, headers=headers).json()["status"] == "active"
+    assert (uploads_dir / "originals" / f"{session['photo_id']}.jpg").read_bytes() == body
+
+    monkeypatch.setattr(photos_endpoint, "_process_stored_original", process)
+    retried = client.post(f"{url}/finalize", headers=headers)
+    assert retried.status_code == 201, retried.text
+    assert retried.json()["width"] == 700
+
+
+def test_duplicate_uploads_are_rejected_or_linked_to_existing_media(upload_client, monkeypatch: pytest.MonkeyPatch):
+    client, session_factory, uploads_dir = upload_client
+    headers = {**create_auth_headers(create_access_token({"sub": "20260002"})), "Content-Type": "image/jpeg"}
+    body = jpeg_bytes()
+
+    def stream(filename: str):
+        return client.post(
+            "/api/v1/photos/upload/stream",
+            params={"filename": filename, "category": "Landscape", "enable_ai": "false"},
+            content=body,
+            headers=headers,
+        )
+
+    first = stream("first.jpg").json()
+    rejected = stream("again.jpg")
+    assert rejected.status_code == 409, rejected.text
+    assert rejected.json()["detail"]["duplicate_of"] == first["id"]
+    assert len(list((uploads_dir / "originals").iterdir())) == 1
+
+    monkeypatch.setattr(get_settings(), "UPLOAD_DUPLICATE_POLICY", "link")
+    linked = stream("linked.jpg")
+    assert linked.status_code == 201, linked.text
+    payload = linked.json()
+    assert payload["duplicate_of"] == first["id"]
+    assert payload["original_path"] == first["original_path"]
+    assert payload["content_hash"] == first["content_hash"]
+    assert len(list((uploads_dir / "originals").iterdir())) == 1
+
+    deleted = client.delete(f"/api/v1/photos/{first['id']}", headers=headers)
+    assert deleted.status_code == 204, deleted.text
+    assert (uploads_dir / first["original_path"]).read_bytes() == body
+
+
+def test_batch_upload_reports_or_links_duplicates(upload_client, monkeypatch: pytest.MonkeyPatch):
+    client, session_factory, uploads_dir = upload_client
+    headers = create_auth_headers(create_access_token({"sub": "20260002"}))
+    body, other = jpeg_bytes(), jpeg_bytes(640, 480)
+
+    def batch(*files: tuple[str, bytes]):
+        response = client.post(
+            "/api/v1/photos/upload/batch",
+            files=[("files", (name, image, "image/jpeg")) for name, image in files],
+            data={"enable_ai": "false"},
+            headers=headers,
+        )
+        assert response.status_code == 200, response.text
+        return response.json()["items"]
+
+    def stored_originals() -> int:
+        return len(list((uploads_dir / "originals").iterdir()))
+
+    first = batch(("first.jpg", body))[0]["photo"]
+    # Default reject policy: an existing photo and a copy within the batch are per-item errors
+    items = batch(("again.jpg", body), ("fresh.jpg", other), ("fresh-copy.jpg", other))
+    assert items[0]["success"] is False
+    assert items[0]["error"] == f"An identical photo has already been uploaded: {first['id']}"
+    assert sorted(item["success"] for item in items[1:]) == [False, True]
+    assert stored_originals() == 2
+
+    monkeypatch.setattr(get_settings(), "UPLOAD_DUPLICATE_POLICY", "link")
+    third = jpeg_bytes(320, 240)
+    items = batch(("linked.jpg", third), ("linked-copy.jpg", third))
+    assert [item["success"] for item in items] == [True, True]
+    original, copy = sorted((item["photo"] for item in items), key=lambda photo: photo["duplicate_of"] or "")
+    assert copy["duplicate_of"] == original["id"]
+    assert copy["original_path"] == original["original_path"]
+    assert stored_originals() == 3
+
+    items = batch(("existing.jpg", body), ("existing-copy.jpg", body))
+    assert [item["photo"]["duplicate_of"] for item in items] == [first["id"], first["id"]]
+    assert stored_originals() == 3
+
+
+def test_deferred_batch_stores_copies_on_their_own(upload_client, monkeypatch: pytest.MonkeyPatch):
+    client, session_factory, uploads_dir = upload_client
+    monkeypatch.setattr(photo_pipeline, "AsyncSessionLocal", session_factory)
+    monkeypatch.setattr(get_settings(), "UPLOAD_DUPLICATE_POLICY", "link")
+    body = jpeg_bytes(720, 480)
+
+    response = client.post(
+        "/api/v1/photos/upload/batch",
+        files=[("files", (name, body, "image/jpeg")) for name in ("a.jpg", "a-copy.jpg")],
+        data={"enable_ai": "false", "defer_processing": "true"},
+        headers=create_auth_headers(create_access_token({"sub": "20260002"})),
+    )
+    assert response.status_code == 200, response.text
+    items = response.json()["items"]
+    assert [item["success"] for item in items] == [True, True]
+    # The first copy has no renditions yet, so nothing links to it
+    assert [item["photo"]["duplicate_of"] for item in items] == [None, None]
+
+    async def load():
+        async with session_factory() as session:
+            return (await session.execute(select(Photo))).scalars().all()
+
+    # The background pipeline runs for both, before TestClient returns
+    photos = asyncio.run(load())
+    assert len(photos) == 2
+    for photo in photos:
+        assert photo.processing_status == "manual"
+        assert photo.width == 720
+        assert photo.perceptual_hash
+        assert (uploads_dir / photo.thumb_path).is_file()
+
+
+def test_resumable_uploads_are_hashed_and_deduplicated(upload_client, monkeypatch: pytest.MonkeyPatch):
+    client, session_factory, uploads_dir = upload_client
+    headers = create_auth_headers(create_access_token({"sub": "20260002"}))
+    body = jpeg_bytes(960, 640)
+
+    def uploaded_session(filename: str) -> str:
+        session = client.post(
+            "/api/v1/photos/uploads",
+            json={"filename": filename, "total_size": len(body), "mime_type": "image/jpeg", "enable_ai": False},
+            headers=headers,
+        ).json()
+        url = f"/api/v1/photos/uploads/{session['id']}"
+        assert client.patch(url, content=body, headers={**headers, "Upload-Offset": "0"}).status_code == 204
+        return session["id"]
+
+    first = client.post(f"/api/v1/photos/uploads/{uploaded_session('first.jpg')}/finalize", headers=headers)
+    assert first.status_code == 201, first.text
+    first = first.json()
+    assert first["content_hash"] == hashlib.sha256(body).hexdigest()
+
+    rejected_id = uploaded_session("again.jpg")
+    rejected = client.post(f"/api/v1/photos/uploads/{rejected_id}/finalize", headers=headers)
+    assert rejected.status_code == 409, rejected.text
+    assert rejected.json()["detail"]["duplicate_of"] == first["id"]
+    assert client.get(f"/api/v1/photos/uploads/{rejected_id}", headers=headers).json()["status"] == "active"
+    assert client.delete(f"/api/v1/photos/uploads/{rejected_id}", headers=headers).status_code == 204
+    assert len(list((uploads_dir / "originals").iterdir())) == 1
+
+    monkeypatch.setattr(get_settings(), "UPLOAD_DUPLICATE_POLICY", "link")
+    linked = client.post(f"/api/v1/photos/uploads/{uploaded_session('linked.jpg')}/finalize", headers=headers)
+    assert linked.status_code == 201, linked.text
+    assert linked.json()["duplicate_of"] == first["id"]
+    assert linked.json()["original_path"] == first["original_path"]
+
+    batch = client.post(
+        "/api/v1/photos/upload/batch",
+        data={"session_ids": [uploaded_session("batch.jpg")], "enable_ai": "false"},
+        headers=headers,
+    )
+    assert batch.status_code == 200, batch.text
+    [item] = batch.json()["items"]
+    assert item["photo"]["duplicate_of"] == first["id"]
+    assert item["photo"]["content_hash"] == first["content_hash"]
+    # Linked copies do not keep their own upload
+    assert len(list((uploads_dir / "originals").iterdir())) == 1
+
@@ -22,6 +22,8 @@ export interface Photo {
   height: number | null
   file_size: number | null
   mime_type: string | null
+  blurhash: string | null
+  dominant_color: string | null
   season: string | null
   category: string | null
   campus: string | null
@@ -37,6 +39,7 @@ export interface Photo {
   free_tags: string[]
   classifications: Record<string, TaxonomyValue>
   uploader_name: string | null
+  favorite_count: number
 }
 
 export interface PhotoUploadResponse {
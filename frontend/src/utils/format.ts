@@ -60,7 +60,10 @@ export function getImageUrl(path: string | null, baseUrl?: string): string {
   return `${base}${path.startsWith('/') ? '' : '/'}${path}`
 }
 
-export function getPhotoUrl(photoId: string, type: 'original' | 'thumbnail' = 'original'): string {
+/**
+ * 获取照片图片 URL，type 为数字时请求最接近该宽度的缩略图档位
+ */
+export function getPhotoUrl(photoId: string, type: 'original' | 'thumbnail' | number = 'original'): string {
   // In production, use empty base (relative path) since Nginx handles /api proxy
   // In development, use full localhost URL
   const base = import.meta.env.VITE_API_BASE_URL || (import.meta.env.DEV ? 'http://localhost:8000' : '')